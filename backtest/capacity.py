@@ -0,0 +1,250 @@
+# backtest/capacity.py
+"""
+容量分析：按成交额 (turnover) 的滚动 ADV 限制每笔交易的参与率，看收益随资金规模 (AUM) 的衰减
+
+约定与 backtest/engine.py 相同:
+    weights: 目标权重宽表，t 日收盘按目标调仓；t 日组合收益 = Σ 持仓[t-1] × returns[t]
+    持仓在两次调仓之间保持权重不变（不考虑价格漂移），AUM 在整个区间内固定（不随净值复利）
+
+每个交易日、每个 AUM 档位:
+    订单   = 目标权重 - 当前持仓
+    上限   = participation × ADV[t] / AUM      （ADV: 截至 t-1 的 adv_window 日平均成交额，不含当天）
+    成交   = clip(订单, -卖出上限, 买入上限)   停牌时上限为 0，涨停不能买、跌停不能卖，没有 ADV（预热期、新上市）时不能交易
+    未成交部分不撤单：下一天的订单仍是 目标 - 持仓，自动顺延
+逐日推进是路径依赖的（今天的成交决定明天的订单），但每一步都是 (AUM 档位 × 股票) 的整块数组运算，
+全部 AUM 档位在同一次遍历中完成，不是每个档位各跑一遍回测。
+AUM=0 档位为基准：不受参与率上限限制，但同样受停牌 / 涨跌停 / 没有 ADV 的限制，是 AUM→0 的极限，
+收益衰减只反映资金规模的影响（ADV 预热期内任何 AUM>0 都不能交易，基准若照常交易，AUM→0 时衰减也不为 0）。
+因此 AUM=0 一般不等于 backtest.engine.run_backtest（后者假设任何时候都能按目标调仓）；
+trading_limits=False 不加这些限制，此时 AUM=0 与 run_backtest 的 net_return 相同，
+但收益衰减中包含没有 ADV 时无法交易的部分，AUM→0 时不趋于 0。
+
+用法:
+    analyzer = CapacityAnalyzer.from_panel(weights, panel, participation=0.1)
+    summary = analyzer.run([1e7, 1e8, 1e9, 1e10])
+    analyzer.returns_                          # 日度净收益 (date × AUM)
+    analyzer.capacity(max_drag=0.5)            # 年化收益衰减不超过基准一半的最大 AUM
+
+    python -m backtest.capacity --factor_name illiq_guiji --aum 1e7 1e8 1e9 1e10
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from backtest.performance import performance_summary
+from utils.dense_panel import to_wide
+from utils.log import timed
+
+# 订单 / 成交小于这个权重视为 0
+_TOL = 1e-12
+
+
+def rolling_adv(turnover: pd.DataFrame, window: int = 20) -> pd.DataFrame:
+    """截至前一交易日的 window 日平均成交额（停牌日不计入均值）"""
+    return turnover.rolling(window, min_periods=max(window // 2, 1)).mean().shift(1)
+
+
+class CapacityAnalyzer:
+    """
+    参数:
+        weights: 目标权重宽表 (index=date, columns=code)
+        returns: 日收益宽表 ret_1d，index 为全部交易日；缺失视为 0 收益
+        turnover: 成交额宽表（元）
+        participation: 单只股票单日成交额占 ADV 的上限
+        adv_window: ADV 的滚动窗口（交易日）
+        cost_rate: 单边交易费率，按实际成交的换手扣除
+        suspended, limit_up, limit_down: 0/1 宽表（可选），停牌不能交易，涨停不能买，跌停不能卖
+        trading_limits: False 时忽略停牌 / 涨跌停表，基准也不受没有 ADV 的限制（AUM=0 即 run_backtest）
+    """
+
+    def __init__(self, weights: pd.DataFrame, returns: pd.DataFrame, turnover: pd.DataFrame,
+                 participation: float = 0.1, adv_window: int = 20, cost_rate: float = 0.0,
+                 suspended: pd.DataFrame | None = None, limit_up: pd.DataFrame | None = None,
+                 limit_down: pd.DataFrame | None = None, trading_limits: bool = True):
+        if participation <= 0:
+            raise ValueError(f"participation 必须为正数: {participation}")
+        self.dates = returns.index
+        self.codes = returns.columns
+        self.participation = participation
+        self.adv_window = adv_window
+        self.cost_rate = cost_rate
+
+        def grid(df, fill):
+            if df is None:
+                return None
+            return df.reindex(index=self.dates, columns=self.codes).to_numpy(dtype=np.float64, na_value=fill)
+
+        self.target = weights.reindex(index=self.dates, columns=self.codes).ffill().fillna(0.0).to_numpy()
+        self.ret = grid(returns, 0.0)
+        adv = rolling_adv(turnover.reindex(index=self.dates, columns=self.codes), adv_window)
+        self.adv = np.nan_to_num(adv.to_numpy(dtype=np.float64), nan=0.0)   # 没有成交记录时不能交易
+
+        self.can_buy = np.ones_like(self.target, dtype=bool)
+        self.can_sell = np.ones_like(self.target, dtype=bool)
+        if not trading_limits:
+            return
+        halted = grid(suspended, 0.0)
+        up = grid(limit_up, 0.0)
+        down = grid(limit_down, 0.0)
+        # 没有 ADV 时任何 AUM>0 的上限都是 0，基准同样不能交易
+        self.can_buy &= self.adv > 0
+        self.can_sell &= self.adv > 0
+        if halted is not None:
+            self.can_buy &= halted == 0
+            self.can_sell &= halted == 0
+        if up is not None:
+            self.can_buy &= up == 0
+        if down is not None:
+            self.can_sell &= down == 0
+
+    @classmethod
+    def from_panel(cls, weights: pd.DataFrame, panel: pd.DataFrame, trading_limits: bool = True,
+                   **kwargs) -> 'CapacityAnalyzer':
+        """
+        从清洗后的 panel 取 ret_1d / turnover / suspended / limit_up / limit_down
+
+        参数:
+            trading_limits: False 时不使用停牌 / 涨跌停 / 没有 ADV 的限制，AUM=0 档位即 run_backtest 的结果
+        """
+        limit_cols = ('suspended', 'limit_up', 'limit_down') if trading_limits else ()
+        optional = {c: to_wide(panel[c]) for c in limit_cols if c in panel.columns}
+        return cls(weights, to_wide(panel['ret_1d']), to_wide(panel['turnover']), **optional,
+                   trading_limits=trading_limits, **kwargs)
+
+    @timed('CapacityAnalyzer.run')
+    def run(self, aum_grid) -> pd.DataFrame:
+        """
+        参数:
+            aum_grid: AUM 档位（元），自动加入 0（不受参与率上限限制的基准，仍受停牌 / 涨跌停 / 没有 ADV 的限制）
+        返回:
+            DataFrame(index=AUM): 绩效指标、相对基准的年化收益衰减、平均偏离目标、参与率与受限订单比例
+        """
+        aum = np.unique(np.concatenate([[0.0], np.asarray(aum_grid, dtype=np.float64)]))
+        if (aum < 0).any():
+            raise ValueError("AUM 不能为负数")
+        n_aum, (n_dates, n_codes) = len(aum), self.target.shape
+        inv_aum = np.zeros((n_aum, 1))
+        inv_aum[1:, 0] = 1.0 / aum[1:]
+
+        hold = np.zeros((n_aum, n_codes))
+        gross = np.zeros((n_aum, n_dates))
+        traded = np.zeros((n_aum, n_dates))
+        gap = np.zeros((n_aum, n_dates))
+        orders = np.zeros(n_aum)
+        capped = np.zeros(n_aum)
+        fills = np.zeros(n_aum)
+        part_sum = np.zeros(n_aum)
+        part_max = np.zeros(n_aum)
+
+        for t in range(n_dates):
+            gross[:, t] = hold @ self.ret[t]
+            order = self.target[t] - hold
+            active = np.abs(order) > _TOL
+            if not active.any():
+                continue
+            cap = self.participation * self.adv[t] * inv_aum    # (AUM, code)，权重单位
+            cap[0] = np.inf                                      # AUM=0: 不受流动性限制
+            buy_cap = np.where(self.can_buy[t], cap, 0.0)
+            sell_cap = np.where(self.can_sell[t], cap, 0.0)
+            fill = np.clip(order, -sell_cap, buy_cap)
+            hold += fill
+
+            size = np.abs(fill)
+            traded[:, t] = size.sum(axis=1)
+            gap[:, t] = np.abs(self.target[t] - hold).sum(axis=1)
+            orders += active.sum(axis=1)
+            capped += (active & (np.abs(order - fill) > _TOL)).sum(axis=1)
+            filled = size > _TOL
+            fills += filled.sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                part = np.where(filled, size * aum[:, None] / self.adv[t], 0.0)
+            part_sum += part.sum(axis=1)
+            part_max = np.maximum(part_max, part.max(axis=1))
+
+        cost = traded * self.cost_rate
+        net = gross - cost
+        columns = pd.Index(aum, name='aum')
+        self.returns_ = pd.DataFrame(net.T, index=self.dates, columns=columns)
+        self.turnover_ = pd.DataFrame(traded.T, index=self.dates, columns=columns)
+        self.gap_ = pd.DataFrame(gap.T, index=self.dates, columns=columns)
+
+        summary = pd.DataFrame({a: performance_summary(self.returns_[a]) for a in aum}).T
+        summary.index.name = 'aum'
+        base = summary.loc[0.0, 'Annual Return']
+        summary['Return Drag'] = base - summary['Annual Return']
+        summary['Avg Gap'] = self.gap_.mean()
+        summary['Annual Turnover'] = self.turnover_.mean() * 252
+        with np.errstate(divide='ignore', invalid='ignore'):
+            summary['Capped Orders'] = np.where(orders > 0, capped / orders, np.nan)
+            summary['Avg Participation'] = np.where(fills > 0, part_sum / fills, np.nan)
+        summary['Max Participation'] = part_max
+        summary.loc[0.0, ['Avg Participation', 'Max Participation']] = np.nan   # 基准没有参与率上限，参与率无意义
+        self.summary_ = summary
+        return summary
+
+    def capacity(self, max_drag: float = 0.5) -> float:
+        """
+        年化收益不低于基准 (1 - max_drag) 倍的最大 AUM（在档位之间按对数 AUM 线性插值）
+
+        参数:
+            max_drag: 允许的相对衰减比例
+        """
+        if not hasattr(self, 'summary_'):
+            raise ValueError("请先调用 run()")
+        s = self.summary_
+        base = s.loc[0.0, 'Annual Return']
+        if not np.isfinite(base) or base <= 0:
+            return np.nan
+        floor = base * (1 - max_drag)
+        levels = s.drop(index=0.0)
+        ok = levels['Annual Return'] >= floor
+        if ok.all():
+            return float(levels.index[-1])
+        if not ok.iloc[0]:
+            return np.nan
+        i = int(np.argmin(ok.to_numpy()))
+        a0, a1 = levels.index[i - 1], levels.index[i]
+        r0, r1 = levels['Annual Return'].iloc[i - 1], levels['Annual Return'].iloc[i]
+        frac = (r0 - floor) / (r0 - r1)
+        return float(np.exp(np.log(a0) + frac * (np.log(a1) - np.log(a0))))
+
+
+def main():
+    from strategy.single_factor_strategy import SingleFactorStrategy
+    from utils.io import PROCESSED_PATH, RESULTS_PATH
+
+    parser = argparse.ArgumentParser(description="因子组合容量分析")
+    parser.add_argument('--factor_name', type=str, default='illiq_guiji')
+    parser.add_argument('--method', type=str, default='top_quantile', choices=['top_n', 'top_quantile', 'long_short'])
+    parser.add_argument('--quantile', type=float, default=0.2)
+    parser.add_argument('--rebalance', type=str, default='W', choices=['D', 'W', 'M', 'Q'])
+    parser.add_argument('--ascending', action='store_true', help='因子值越小越好')
+    parser.add_argument('--aum', type=float, nargs='+', default=[1e7, 1e8, 1e9, 1e10], help='AUM 档位（元）')
+    parser.add_argument('--participation', type=float, default=0.1, help='单日成交额占 ADV 的上限')
+    parser.add_argument('--adv_window', type=int, default=20)
+    parser.add_argument('--cost', type=float, default=0.0, help='单边交易费率')
+    parser.add_argument('--no-trading-limits', action='store_true', help='不考虑停牌 / 涨跌停 / 没有 ADV 的限制（基准即 run_backtest）')
+    args = parser.parse_args()
+
+    panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    strategy = SingleFactorStrategy(args.factor_name, method=args.method, quantile=args.quantile,
+                                    rebalance=args.rebalance, ascending=args.ascending)
+    weights = strategy.generate_weights(panel)
+    analyzer = CapacityAnalyzer.from_panel(weights, panel, trading_limits=not args.no_trading_limits,
+                                           participation=args.participation, adv_window=args.adv_window,
+                                           cost_rate=args.cost)
+    summary = analyzer.run(args.aum)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(summary)
+    print(f"\n容量（年化收益衰减不超过一半）: {analyzer.capacity(0.5):.4g} 元")
+
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    out = os.path.join(RESULTS_PATH, f'{args.factor_name}_capacity.csv')
+    summary.to_csv(out)
+    print(f"结果已保存至: {out}")
+
+
+if __name__ == "__main__":
+    main()
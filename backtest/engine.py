@@ -0,0 +1,38 @@
+# backtest/engine.py
+"""
+向量化日频回测引擎
+
+约定:
+    weights: 目标权重宽表 (index=date, columns=code)，t 日的权重在 t 日收盘建仓
+    returns: 日收益宽表 ret_1d (t-1 收盘 → t 收盘)，停牌 / 缺失视为 0 收益
+    t 日组合收益 = Σ weights[t-1] × returns[t]
+持仓在两次调仓之间按目标权重持有（不考虑价格漂移带来的权重变化）。
+"""
+import pandas as pd
+
+
+def run_backtest(weights: pd.DataFrame, returns: pd.DataFrame, cost_rate: float = 0.0) -> pd.DataFrame:
+    """
+    参数:
+        weights: 目标权重宽表
+        returns: 日收益宽表（index 为全部交易日）
+        cost_rate: 单边交易费率，按换手（Σ|Δw|）扣除
+    返回:
+        DataFrame(index=date): return 毛收益, turnover 换手, cost 成本, net_return 净收益, nav 净值
+    """
+    weights = weights.reindex(index=returns.index, columns=returns.columns).ffill().fillna(0.0)
+    held = weights.shift(1).fillna(0.0)
+    gross = (held * returns.fillna(0.0)).sum(axis=1)
+
+    turnover = weights.diff().abs().sum(axis=1)
+    turnover.iloc[0] = weights.iloc[0].abs().sum()
+    cost = turnover * cost_rate
+    net = gross - cost
+
+    return pd.DataFrame({
+        'return': gross,
+        'turnover': turnover,
+        'cost': cost,
+        'net_return': net,
+        'nav': (1 + net).cumprod(),
+    })
@@ -0,0 +1,33 @@
+# backtest/performance.py
+"""绩效统计：年化收益、波动率、夏普、最大回撤、胜率"""
+import numpy as np
+import pandas as pd
+
+
+def max_drawdown(nav: pd.Series) -> float:
+    """最大回撤（负数）"""
+    return float((nav / nav.cummax() - 1).min())
+
+
+def performance_summary(returns: pd.Series, periods_per_year: int = 252) -> pd.Series:
+    """
+    参数:
+        returns: 日收益序列
+        periods_per_year: 年化因子
+    返回:
+        pd.Series: Annual Return / Annual Vol / Sharpe / Max Drawdown / Win Rate / Days
+    """
+    returns = returns.dropna()
+    nav = (1 + returns).cumprod()
+    n = len(returns)
+    annual_ret = nav.iloc[-1] ** (periods_per_year / n) - 1 if n > 0 else np.nan
+    annual_vol = returns.std() * np.sqrt(periods_per_year)
+    sharpe = returns.mean() / returns.std() * np.sqrt(periods_per_year) if returns.std() > 0 else np.nan
+    return pd.Series({
+        'Annual Return': annual_ret,
+        'Annual Vol': annual_vol,
+        'Sharpe': sharpe,
+        'Max Drawdown': max_drawdown(nav) if n > 0 else np.nan,
+        'Win Rate': (returns > 0).mean() if n > 0 else np.nan,
+        'Days': n,
+    })
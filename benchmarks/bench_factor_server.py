@@ -0,0 +1,183 @@
+# benchmarks/bench_factor_server.py
+"""
+因子查询服务压测（utils/factor_server.py）
+
+在临时目录生成合成因子库（或使用 --root 指定的因子库），在子进程中启动服务，
+多个客户端线程各自保持一个连接，按比例混合发送三类查询:
+    point   1 只股票 × 1 个因子 × 最新一天
+    cross   --codes 只股票 × 全部因子 × 随机一天（横截面）
+    range   --codes 只股票 × 1 个因子 × 最近 20 天
+报告每类查询与总体的 p50 / p99 延迟（毫秒）和每秒查询数；
+最后（仅合成因子库）追加一个交易日并触发热更新，检查服务返回的最新日期已前移。
+
+用法:
+    python -m benchmarks.bench_factor_server
+    python -m benchmarks.bench_factor_server --n-codes-universe 5000 --n-factors 20 --clients 8 --duration 10
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.factor_server import FactorCache, FactorClient, make_server
+
+MIX = {'point': 0.5, 'cross': 0.3, 'range': 0.2}
+
+
+def make_factor_library(root: str, n_dates: int, n_codes: int, n_factors: int, seed: int = 0) -> list[str]:
+    """在 root 下写 n_factors 个合成因子（与 utils.io.save_factor 相同的长表格式）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=n_dates, name='date')
+    codes = pd.Index([f'{i:06d}.XSHE' for i in range(n_codes)], name='code')
+    index = pd.MultiIndex.from_product([dates, codes], names=['date', 'code'])
+    os.makedirs(root, exist_ok=True)
+    names = [f'factor_{k:02d}' for k in range(n_factors)]
+    for name in names:
+        values = rng.standard_normal(len(index))
+        pd.DataFrame({name: values}, index=index).reset_index().to_pickle(os.path.join(root, f'{name}.pkl'))
+    return names
+
+
+def append_date(root: str, name: str, seed: int = 1) -> pd.Timestamp:
+    """给因子追加下一个交易日（模拟夜间批处理），原子替换文件"""
+    path = os.path.join(root, f'{name}.pkl')
+    df = pd.read_pickle(path)
+    last = df['date'].max()
+    new_date = last + pd.offsets.BDay(1)
+    codes = df.loc[df['date'] == last, 'code'].to_numpy()
+    rng = np.random.default_rng(seed)
+    new = pd.DataFrame({'date': new_date, 'code': codes, name: rng.standard_normal(len(codes))})
+    tmp = f'{path}.tmp'
+    pd.concat([df, new], ignore_index=True).to_pickle(tmp)
+    os.replace(tmp, path)
+    return new_date
+
+
+def _serve(root: str, days: int, queue):
+    cache = FactorCache(root=root, days=days)
+    server = make_server(cache, port=0)
+    queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server(root: str, days: int):
+    """子进程中启动服务，返回 (进程, 端口)"""
+    ctx = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else mp.get_context()
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_serve, args=(root, days, queue), daemon=True)
+    proc.start()
+    return proc, queue.get(timeout=120)
+
+
+def _client_loop(port: int, info: dict, n_codes: int, duration: float, seed: int, out: list):
+    rng = np.random.default_rng(seed)
+    client = FactorClient(port=port)
+    codes = np.array(info['codes'])
+    factors = info['factors']
+    dates = pd.bdate_range(end=info['end'], periods=info['n_dates'])
+    kinds = list(MIX)
+    probs = np.array(list(MIX.values()))
+    records = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        kind = kinds[rng.choice(len(kinds), p=probs)]
+        if kind == 'point':
+            params = dict(factors=[factors[rng.integers(len(factors))]], codes=[codes[rng.integers(len(codes))]])
+        elif kind == 'cross':
+            params = dict(codes=list(rng.choice(codes, n_codes, replace=False)),
+                          date=str(dates[rng.integers(len(dates))].date()))
+        else:
+            params = dict(factors=[factors[rng.integers(len(factors))]],
+                          codes=list(rng.choice(codes, n_codes, replace=False)),
+                          start=str(dates[-20].date()))
+        t0 = time.perf_counter()
+        client.query_raw(**params)
+        records.append((kind, time.perf_counter() - t0))
+    client.close()
+    out.extend(records)
+
+
+def summarize(records: list, elapsed: float) -> pd.DataFrame:
+    df = pd.DataFrame(records, columns=['kind', 'latency'])
+    rows = {}
+    for kind, group in list(df.groupby('kind')) + [('all', df)]:
+        lat = group['latency'].to_numpy() * 1000
+        rows[kind] = {
+            'count': len(lat),
+            'p50_ms': np.percentile(lat, 50),
+            'p99_ms': np.percentile(lat, 99),
+            'qps': len(lat) / elapsed,
+        }
+    return pd.DataFrame(rows).T
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="因子查询服务压测")
+    parser.add_argument('--root', type=str, default=None, help='因子库目录，默认生成合成因子库')
+    parser.add_argument('--n-dates', type=int, default=300)
+    parser.add_argument('--n-codes-universe', type=int, default=3000)
+    parser.add_argument('--n-factors', type=int, default=5)
+    parser.add_argument('--days', type=int, default=250, help='服务在内存中保留的交易日数')
+    parser.add_argument('--codes', type=int, default=300, help='cross / range 查询的股票数')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0, help='压测时长（秒）')
+    args = parser.parse_args(argv)
+
+    tmp = None
+    root = args.root
+    if root is None:
+        tmp = tempfile.mkdtemp(prefix='factor_server_bench_')
+        root = tmp
+        print(f"生成合成因子库: {args.n_factors} 个因子, {args.n_dates} dates × {args.n_codes_universe} codes")
+        make_factor_library(root, args.n_dates, args.n_codes_universe, args.n_factors)
+    try:
+        t0 = time.perf_counter()
+        proc, port = start_server(root, args.days)
+        client = FactorClient(port=port)
+        info = client.info()
+        print(f"服务启动 {time.perf_counter() - t0:.2f} s: {len(info['factors'])} 个因子, "
+              f"{info['n_dates']} 天 × {info['n_codes']} 只股票")
+        info['codes'] = list(client.query(factors=info['factors'][:1]).popitem()[1].columns)
+
+        records = []
+        threads = [threading.Thread(target=_client_loop,
+                                    args=(port, info, min(args.codes, info['n_codes']), args.duration, i, records))
+                   for i in range(args.clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        print(f"\n{args.clients} 个客户端, {elapsed:.1f} s:")
+        print(summarize(records, elapsed).to_string(float_format=lambda v: f'{v:.3f}'))
+
+        if tmp is None:   # 不改动用户指定的因子库
+            client.close()
+            proc.terminate()
+            return
+
+        # 热更新：追加一个交易日后服务返回的最新日期应前移
+        name = info['factors'][0]
+        new_date = append_date(root, name)
+        t0 = time.perf_counter()
+        reloaded = client.reload()
+        print(f"\n热更新: 重新加载 {reloaded['reloaded']} 用时 {time.perf_counter() - t0:.3f} s, "
+              f"最新日期 {info['end']} -> {reloaded['end']}")
+        if reloaded['end'] != str(new_date.date()):
+            raise RuntimeError(f"热更新后最新日期应为 {new_date.date()}，实际为 {reloaded['end']}")
+        client.close()
+        proc.terminate()
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
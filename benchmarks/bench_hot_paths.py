@@ -0,0 +1,265 @@
+# benchmarks/bench_hot_paths.py
+"""
+热点路径基准测试（基于 utils.synthetic 生成的合成面板，可复现）
+
+覆盖: 对齐 (align_data)、清洗 (add_status_fields)、每个已注册因子的 calculate、
+后处理 (_post_process: 去极值 + 标准化 + 中性化)、IC (ICAnalyzer)、分层 (LayerBacktester)
+
+每项记录:
+    wall_s        最好一次的耗时（秒）
+    cells_per_s   吞吐量 = dates × codes / wall_s
+    relative      cells_per_s / 参考内核的 cells_per_s（与机器快慢无关）
+    peak_mb       tracemalloc 记录的峰值内存（MB）
+
+参考内核（reference_kernel）是固定规模的 pandas 排名 + rolling + groupby，每次运行都先测一遍。
+与 benchmarks/baseline.json 比较时用 relative（旧基准没有 relative 时退回 cells_per_s），
+相对吞吐量下降或峰值内存上升超过 --tolerance 即视为退化，进程以退出码 1 结束。
+
+热点路径的实现变化后（包括有意的变慢，如增加校验）需要重新生成基准，并与代码改动放在同一个提交里:
+    python -m benchmarks.bench_hot_paths --scale tiny --repeat 5 --save-baseline
+
+用法:
+    python -m benchmarks.bench_hot_paths --scale tiny
+    python -m benchmarks.bench_hot_paths --scale small --only clean ic
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+from utils import log
+from utils.synthetic import make_raw, raw_to_panel
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# 规模: dates × codes
+SCALES = {
+    'tiny': (500, 300),
+    'small': (1000, 1000),
+    'medium': (2500, 3000),
+    'large': (4000, 5000),
+}
+
+
+# =========================
+# 各项基准（setup 只做一次，fn 被计时）
+# =========================
+def _bench_align(ctx):
+    from preprocess.align_data import align_data
+    raw = ctx['raw']
+    return lambda: align_data(dict(raw))
+
+
+def _bench_clean(ctx):
+    from preprocess.clean_data import add_status_fields
+    panel = ctx['panel']
+    return lambda: add_status_fields(panel)
+
+
+def _bench_factor(name):
+    def setup(ctx):
+        from factors.base_factor import get_factor
+        factor = get_factor(name)
+        panel = ctx['cleaned']
+        return lambda: factor.calculate(panel)
+    return setup
+
+
+def _bench_post_process(ctx):
+    from factors.base_factor import get_factor
+    factor = get_factor('illiq_guiji', do_winsor=True, do_zscore=True,
+                        neutralize_cols=['market_capitalization'])
+    panel = ctx['cleaned']
+    raw_factor = ctx['factor_df'].rename(columns={'factor': factor.name})[[factor.name]]
+    return lambda: factor._post_process(panel, raw_factor.copy())
+
+
+def _bench_ic(ctx):
+    from factor_evaluation.ic_analysis import ICAnalyzer
+    merged = ctx['merged']
+    return lambda: ICAnalyzer(merged).calculate_daily_ic()
+
+
+def _bench_layer(ctx):
+    from factor_evaluation.layer_backtest import LayerBacktester
+    merged = ctx['merged']
+    return lambda: LayerBacktester(merged, groups=5).run()
+
+
+def _registered_factors() -> list[str]:
+    """因子库中可以直接由日频 panel 计算的因子（composite 依赖因子库文件，illiq_minute 依赖分钟线字段）"""
+    from factors.registry import available_factors
+    return [name for name in available_factors() if name not in ('composite', 'illiq_minute')]
+
+
+def build_benchmarks() -> dict:
+    benches = {'align': _bench_align, 'clean': _bench_clean}
+    for name in _registered_factors():
+        benches[f'factor:{name}'] = _bench_factor(name)
+    benches.update({'post_process': _bench_post_process, 'ic': _bench_ic, 'layer': _bench_layer})
+    return benches
+
+
+def build_context(n_dates: int, n_codes: int, seed: int = 0) -> dict:
+    """生成一次合成数据，供所有基准共用"""
+    from preprocess.clean_data import add_status_fields
+    from factor_evaluation.util import get_clean_factor_and_forward_returns
+    raw = make_raw(n_dates, n_codes, seed=seed)
+    panel = raw_to_panel(raw)
+    cleaned = add_status_fields(panel)
+    # 用 illiq_guiji 的原始值作为 IC / 分层的输入因子
+    from factors.base_factor import get_factor
+    factor_df = get_factor('illiq_guiji').calculate(cleaned).rename('factor').to_frame()
+    merged = get_clean_factor_and_forward_returns(factor_df, cleaned, factor_name='factor')
+    return {'raw': raw, 'panel': panel, 'cleaned': cleaned, 'factor_df': factor_df, 'merged': merged}
+
+
+# =========================
+# 参考内核：固定规模，用来把吞吐量换算成与机器无关的比值
+# =========================
+REFERENCE_SHAPE = (250, 300)
+
+
+def reference_kernel():
+    """固定的 250 × 300 宽表：横截面排名 + 20 日 rolling 均值 + 按行业 groupby 均值"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    wide = pd.DataFrame(rng.standard_normal(REFERENCE_SHAPE))
+    keys = np.arange(REFERENCE_SHAPE[1]) % 10
+
+    def fn():
+        ranks = wide.rank(axis=1)
+        rolled = wide.rolling(20, min_periods=10).mean()
+        return (ranks + rolled).T.groupby(keys).mean()
+    return fn
+
+
+def measure_reference(repeat: int = 3) -> dict:
+    m = measure(reference_kernel(), repeat=max(repeat, 5), memory=False)
+    m['cells_per_s'] = REFERENCE_SHAPE[0] * REFERENCE_SHAPE[1] / m['wall_s']
+    return m
+
+
+# =========================
+# 计时与内存
+# =========================
+def measure(fn, repeat: int = 3, memory: bool = True) -> dict:
+    """先跑一次（测峰值内存，同时作为预热），再计时 repeat 次取最好"""
+    peak_mb = None
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    else:
+        fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {'wall_s': min(times), 'peak_mb': peak_mb}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """返回退化项描述列表"""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base or key.startswith('_'):
+            continue
+        if 'relative' in cur and 'relative' in base:
+            if cur['relative'] < base['relative'] * (1 - tolerance):
+                regressions.append(
+                    f"{key}: 相对吞吐量 {cur['relative']:.3g} < 基准 {base['relative']:.3g} (× 参考内核)"
+                )
+        elif cur['cells_per_s'] < base['cells_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{key}: 吞吐量 {cur['cells_per_s']:.3g} < 基准 {base['cells_per_s']:.3g} cells/s"
+            )
+        if cur.get('peak_mb') and base.get('peak_mb') and cur['peak_mb'] > base['peak_mb'] * (1 + tolerance):
+            regressions.append(f"{key}: 峰值内存 {cur['peak_mb']:.1f} > 基准 {base['peak_mb']:.1f} MB")
+    return regressions
+
+
+def run(scale: str, only=None, repeat: int = 3, memory: bool = True, seed: int = 0,
+        reference: dict | None = None) -> dict:
+    n_dates, n_codes = SCALES[scale]
+    cells = n_dates * n_codes
+    print(f"生成合成数据: {n_dates} dates × {n_codes} codes ...")
+    ctx = build_context(n_dates, n_codes, seed=seed)
+
+    results = {}
+    for name, setup in build_benchmarks().items():
+        if only and not any(name == o or name.startswith(o + ':') for o in only):
+            continue
+        m = measure(setup(ctx), repeat=repeat, memory=memory)
+        m['cells_per_s'] = cells / m['wall_s']
+        if reference:
+            m['relative'] = m['cells_per_s'] / reference['cells_per_s']
+        results[f'{scale}/{name}'] = m
+        peak = f"{m['peak_mb']:9.1f} MB" if m['peak_mb'] is not None else '        - '
+        rel = f"{m['relative']:8.3f} ×ref" if reference else ''
+        print(f"  {name:<24s} {m['wall_s']:9.3f} s  {m['cells_per_s']:12.4g} cells/s  {peak}  {rel}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="热点路径基准测试")
+    parser.add_argument('--scale', nargs='*', default=['tiny'], choices=list(SCALES))
+    parser.add_argument('--only', nargs='*', default=None, help='只运行这些基准（如 clean ic factor）')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='不测峰值内存（tracemalloc 会拖慢运行）')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的相对退化幅度')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基准文件')
+    parser.add_argument('--output', default=None, help='本次结果另存为 JSON')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+    log.configure(enabled=False)     # 基准测试中不写埋点日志
+
+    reference = measure_reference(args.repeat)
+    print(f"参考内核: {reference['wall_s'] * 1000:.2f} ms  {reference['cells_per_s']:.4g} cells/s")
+    results = {'_reference': reference}
+    for scale in args.scale:
+        results.update(run(scale, only=args.only, repeat=args.repeat, memory=not args.no_memory,
+                           reference=reference))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+
+    if args.save_baseline:
+        # 丢弃没有 relative 的旧条目（绝对吞吐量只对当时的机器有意义）
+        baseline = {k: v for k, v in baseline.items() if 'relative' in v}
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"基准已更新: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n性能退化:")
+        for r in regressions:
+            print(f"  ✗ {r}")
+        return 1
+    print("\n未发现性能退化" if baseline else "\n没有基准文件，使用 --save-baseline 生成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,7 @@
 # main.py
 # 调用惊恐因子并保存结果
-import pandas as pd
-import numpy as np
 import os
 from factors.base_factor import get_factor
-import factors.panic_factor  # 导入因子模块以注册因子
 
 from load_data import load_panel_data
 
@@ -14,16 +11,9 @@ def main():
     print("开始计算惊恐因子 (Panic Factor)")
     print("=" * 60)
     
+    # load_panel_data 已保证完整的 (date × code) 稠密网格，这里不需要再 reindex
     panel = load_panel_data()
     
-    # 确保索引格式正确
-    dates = pd.unique(panel.index.get_level_values('date'))
-    assets = pd.unique(panel.index.get_level_values('code'))
-    
-    # 创建完整的 MultiIndex 并重新索引（确保所有日期-股票组合都存在）
-    new_index = pd.MultiIndex.from_product([dates, assets], names=['date', 'code'])
-    panel = panel.reindex(new_index)
-    
     # 2. 实例化因子
     # 注意：使用 @register_factor 中定义的名称
     # 参数说明：
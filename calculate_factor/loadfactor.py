@@ -1,19 +1,15 @@
 import pandas as pd
-import numpy as np
 import os
 from factors.base_factor import get_factor
-import factors.panic_factor 
+from utils.dense_panel import ensure_dense
 # 1. Create Mock Data
 root=os.path.dirname(os.path.abspath(__file__))
 data_path=os.path.join(root, 'data', 'processed', 'panel_cleaned.pkl')
 factor_path=os.path.join(root, 'data', 'factors', 'panic_factor.pkl')
 df = pd.read_pickle(data_path)
 
-dates = pd.unique(df.index.get_level_values('date'))
-assets = pd.unique(df.index.get_level_values('code'))
-# 创建 MultiIndex 并重新索引
-new_index = pd.MultiIndex.from_product([dates, assets], names=['date', 'code'])
-df = df.reindex(new_index)
+# 保证完整的 (date × code) 网格（已是稠密布局时为空操作）
+df = ensure_dense(df)
 
 # 2. Instantiate the Factor
 # notice: we use the name defined in @register_factor
@@ -0,0 +1,273 @@
+# factor_evaluation/correlation.py
+"""
+因子相关性 / 冗余度矩阵
+
+新因子加入 FACTOR_REGISTRY 之前需要检查它和已有因子的相关性。逐对 groupby(date).corr 是 K² 次 Python 级循环，
+这里改为一次批量计算：
+
+1. 按日期块处理：块内每个因子做横截面排名，并在各自的有效样本上标准化：z = (rank - mean) / std，缺失记 0
+2. 块内每个日期的 K×K 秩相关矩阵 = Zᵀ Z / (n - 1)，用批量矩阵乘法（np.matmul）一次算完
+3. 只累加 K×K 的相关系数之和与有效天数，最后相除 → 平均截面秩相关矩阵
+
+因子值从源 Series 按日期块散布成二维数组（GridSource），不分配 T × N × K 的整体数组，
+峰值内存由 max_memory_mb 控制。
+
+pairwise=True 时在每对因子的共同样本上计算 Pearson（多 4 次矩阵乘法；秩仍按各自样本计算，与逐对 Spearman
+只有很小差异），适合各因子缺失模式差异很大的情况。
+
+另外计算因子收益（标准化秩对前瞻收益的单变量截面回归斜率）的时间序列相关性，
+并列出相关性超过阈值的近似重复因子对。
+
+用法:
+    python -m factor_evaluation.correlation                       # 因子库中全部因子
+    python -m factor_evaluation.correlation --factors a b c --threshold 0.7
+"""
+import argparse
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.io import PROCESSED_PATH, RESULTS_PATH, list_factors, load_factor
+
+
+def load_factors(names: list[str]) -> tuple[dict[str, pd.Series], pd.Index, pd.Index]:
+    """读取多个因子，返回 ({name: Series}, 日期并集, 股票并集)"""
+    series = {}
+    dates, codes = pd.Index([]), pd.Index([])
+    for name in names:
+        df = load_factor(name)
+        s = df[name] if name in df.columns else df.iloc[:, 0]
+        index = s.index.remove_unused_levels()
+        dates = dates.union(index.levels[index.names.index('date')])
+        codes = codes.union(index.levels[index.names.index('code')])
+        series[name] = s
+    return series, dates, codes
+
+
+def standardized_ranks(values: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """
+    T × N 因子矩阵 → 横截面标准化秩（每行均值 0、标准差 1；缺失为 0）
+    """
+    ranks = pd.DataFrame(values).rank(axis=1).to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mu = np.nanmean(ranks, axis=1, keepdims=True)
+        sigma = np.nanstd(ranks, axis=1, ddof=1, keepdims=True)
+        z = (ranks - mu) / sigma
+    return np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0).astype(dtype)
+
+
+class GridSource:
+    """
+    (date, code) 长表按日期位置排好序的 (行, 列, 值)，可以按日期块取出 dates × codes 的二维数组
+
+    只在构造时定位一次，之后每块是一次 searchsorted + 散布，不需要整张 T × N 宽表
+    """
+
+    def __init__(self, series: pd.Series, dates: pd.Index, codes: pd.Index):
+        index = series.index
+        d, c = index.names.index('date'), index.names.index('code')
+        rows = dates.get_indexer(index.levels[d])[index.codes[d]]
+        cols = codes.get_indexer(index.levels[c])[index.codes[c]]
+        values = series.to_numpy(dtype=np.float64)
+        ok = (rows >= 0) & (cols >= 0) & np.isfinite(values)
+        rows, cols, values = rows[ok], cols[ok], values[ok]
+        if len(rows) and (np.diff(rows) < 0).any():
+            order = np.argsort(rows, kind='stable')
+            rows, cols, values = rows[order], cols[order], values[order]
+        self.rows, self.cols, self.values = rows.astype(np.int32), cols.astype(np.int32), values
+        self.n_codes = len(codes)
+
+    def block(self, start: int, stop: int) -> np.ndarray:
+        """日期位置 [start, stop) 的 (stop - start) × N 数组，缺失为 NaN"""
+        lo, hi = np.searchsorted(self.rows, [start, stop])
+        out = np.full((stop - start, self.n_codes), np.nan)
+        out[self.rows[lo:hi] - start, self.cols[lo:hi]] = self.values[lo:hi]
+        return out
+
+
+def _date_blocks(n_dates: int, n_codes: int, k: int, max_memory_mb: float):
+    # 块内 Z (float32) + M + daily_rank_corr 中的 float64 副本 / 乘积，另加单个因子排名时的宽表与 K×K 中间结果
+    per_date = n_codes * k * (4 + 1 + 8 * 4) + n_codes * 8 * 3 + k * k * 8 * 6
+    size = max(1, int(max_memory_mb * 1024 * 1024 // per_date))
+    for start in range(0, n_dates, size):
+        yield slice(start, min(start + size, n_dates))
+
+
+def iter_rank_blocks(sources: list[GridSource], n_dates: int, max_memory_mb: float = 256, dtype=np.float32):
+    """
+    按日期块逐块排名，依次产出 (rows, Z, M)：
+        rows: 日期位置 slice
+        Z: 块内 T_b × N × K 标准化秩（缺失为 0）
+        M: 块内 T_b × N × K 有效样本标记
+    排名是逐日的横截面运算，分块结果与整体计算相同；峰值内存按 max_memory_mb 控制
+    """
+    k = len(sources)
+    n_codes = sources[0].n_codes if sources else 0
+    for rows in _date_blocks(n_dates, n_codes, k, max_memory_mb):
+        z = np.zeros((rows.stop - rows.start, n_codes, k), dtype=dtype)
+        m = np.zeros(z.shape, dtype=bool)
+        for j, source in enumerate(sources):
+            grid = source.block(rows.start, rows.stop)
+            m[:, :, j] = np.isfinite(grid)
+            z[:, :, j] = standardized_ranks(grid, dtype=dtype)
+        yield rows, z, m
+
+
+def daily_rank_corr(z: np.ndarray, m: np.ndarray, pairwise: bool = False, min_stocks: int = 10) -> np.ndarray:
+    """
+    逐日截面秩相关矩阵
+
+    参数:
+        z, m: iter_rank_blocks() 产出的一块
+        pairwise: False 时用各自样本上的标准化秩直接相乘（快）；True 时在每对因子的共同样本上计算 Pearson
+        min_stocks: 共同有效股票少于此数的日期 / 因子对记为 NaN
+    返回:
+        T_b × K × K
+    """
+    zb = z.astype(np.float64)
+    mb = m.astype(np.float64)
+    zt, mt = zb.transpose(0, 2, 1), mb.transpose(0, 2, 1)
+    n = mt @ mb                                         # 共同样本数
+    sxy = zt @ zb
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if pairwise:
+            sx = zt @ mb                                 # sx[i, j] = Σ_{共同样本} z_i
+            sxx = (zt * zt) @ mb
+            num = n * sxy - sx * sx.transpose(0, 2, 1)
+            den = np.sqrt((n * sxx - sx * sx) * (n * sxx - sx * sx).transpose(0, 2, 1))
+            corr = num / den
+        else:
+            diag = np.einsum('tkk->tk', n)
+            corr = sxy / np.sqrt((diag[:, :, None] - 1) * (diag[:, None, :] - 1))
+    corr[n < min_stocks] = np.nan
+    return corr
+
+
+def factor_returns(z: np.ndarray, ret: np.ndarray) -> np.ndarray:
+    """
+    因子收益：每个日期标准化秩对前瞻收益的单变量截面回归斜率 Σ z·r / Σ z²
+
+    返回:
+        T × K
+    """
+    valid = np.isfinite(ret)
+    r = np.where(valid, ret, 0.0)
+    zr = np.einsum('tnk,tn->tk', z.astype(np.float64), r)
+    zz = np.einsum('tnk,tnk,tn->tk', z.astype(np.float64), z.astype(np.float64), valid.astype(np.float64))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(zz > 0, zr / zz, np.nan)
+
+
+def rank_correlation(series: dict[str, pd.Series], dates: pd.Index, codes: pd.Index, ret: pd.Series | None = None,
+                     pairwise: bool = False, min_stocks: int = 10,
+                     max_memory_mb: float = 256) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+    """
+    平均截面秩相关矩阵与因子收益（逐日期块流式计算）
+
+    每块算出逐日 K×K 相关矩阵后只累加到 K×K 的总和与有效天数，因子收益每块写入 T × K；
+    不再分配 T × N × K 的整体数组，峰值内存由 max_memory_mb 控制
+
+    参数:
+        series: {name: 因子值 Series}
+        dates, codes: 网格的两个轴
+        ret: 前瞻收益（index=['date', 'code']）；None 时不计算因子收益
+    返回:
+        (K×K 平均截面秩相关, T×K 因子收益 DataFrame 或 None)
+    """
+    names = list(series)
+    k = len(names)
+    sources = [GridSource(s, dates, codes) for s in series.values()]
+    ret_source = GridSource(ret, dates, codes) if ret is not None else None
+    total = np.zeros((k, k))
+    n_days = np.zeros((k, k))
+    fr = np.full((len(dates), k), np.nan) if ret is not None else None
+    for rows, z, m in iter_rank_blocks(sources, len(dates), max_memory_mb=max_memory_mb):
+        daily = daily_rank_corr(z, m, pairwise=pairwise, min_stocks=min_stocks)
+        valid = np.isfinite(daily)
+        total += np.where(valid, daily, 0.0).sum(axis=0)
+        n_days += valid.sum(axis=0)
+        if ret_source is not None:
+            fr[rows] = factor_returns(z, ret_source.block(rows.start, rows.stop))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rank_corr = pd.DataFrame(np.where(n_days > 0, total / n_days, np.nan), index=names, columns=names)
+    returns = pd.DataFrame(fr, index=dates, columns=names) if fr is not None else None
+    return rank_corr, returns
+
+
+def near_duplicates(corr: pd.DataFrame, threshold: float = 0.7, return_corr: pd.DataFrame | None = None) -> pd.DataFrame:
+    """列出 |平均秩相关| >= threshold 的因子对，按相关性绝对值降序"""
+    names = corr.index
+    iu, ju = np.triu_indices(len(names), k=1)
+    values = corr.to_numpy()[iu, ju]
+    hit = np.abs(values) >= threshold
+    table = pd.DataFrame({
+        'factor_a': names[iu[hit]],
+        'factor_b': names[ju[hit]],
+        'rank_corr': values[hit],
+    })
+    if return_corr is not None:
+        table['return_corr'] = return_corr.to_numpy()[iu[hit], ju[hit]]
+    return table.reindex(table['rank_corr'].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+
+def correlation_report(names: list[str] | None = None, panel: pd.DataFrame | None = None,
+                       fwd_ret_col: str = 'ret_fwd_1d', threshold: float = 0.7, pairwise: bool = False,
+                       max_memory_mb: float = 256) -> dict:
+    """
+    因子库中因子的冗余度报告
+
+    参数:
+        names: 因子名称，默认因子库中全部因子
+        panel: 含前瞻收益列的 panel；None 时不计算因子收益相关性
+        threshold: 近似重复的阈值
+    返回:
+        dict: rank_corr (K×K 平均截面秩相关), return_corr (K×K 因子收益相关, 可能为 None),
+              duplicates (近似重复因子对)
+    """
+    names = list(names) if names else list_factors()
+    if len(names) < 2:
+        raise ValueError(f"至少需要两个因子，实际为: {names}")
+    series, dates, codes = load_factors(names)
+    ret = panel[fwd_ret_col] if panel is not None else None
+    rank_corr, fr = rank_correlation(series, dates, codes, ret, pairwise=pairwise, max_memory_mb=max_memory_mb)
+    return_corr = fr.corr() if fr is not None else None
+
+    return {
+        'rank_corr': rank_corr,
+        'return_corr': return_corr,
+        'duplicates': near_duplicates(rank_corr, threshold, return_corr),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="因子相关性 / 冗余度矩阵")
+    parser.add_argument('--factors', nargs='*', default=None, help='默认因子库中全部因子')
+    parser.add_argument('--threshold', type=float, default=0.7, help='近似重复阈值')
+    parser.add_argument('--pairwise', action='store_true', help='在每对因子的共同样本上计算')
+    parser.add_argument('--no-returns', action='store_true', help='不计算因子收益相关性')
+    args = parser.parse_args()
+
+    panel = None
+    if not args.no_returns:
+        panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    report = correlation_report(args.factors, panel, threshold=args.threshold, pairwise=args.pairwise)
+
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    report['rank_corr'].to_csv(os.path.join(RESULTS_PATH, 'factor_rank_corr.csv'))
+    if report['return_corr'] is not None:
+        report['return_corr'].to_csv(os.path.join(RESULTS_PATH, 'factor_return_corr.csv'))
+    print("平均截面秩相关:")
+    print(report['rank_corr'].round(3))
+    if report['return_corr'] is not None:
+        print("\n因子收益相关:")
+        print(report['return_corr'].round(3))
+    print(f"\n|相关性| >= {args.threshold} 的因子对:")
+    print(report['duplicates'] if len(report['duplicates']) else "无")
+    print(f"\n结果已保存至: {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
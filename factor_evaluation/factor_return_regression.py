@@ -0,0 +1,173 @@
+# factor_evaluation/factor_return_regression.py
+"""
+因子收益回归（横截面）
+
+每个交易日 t 做一次加权最小二乘:
+    ret_fwd_1d[t, i] = f0[t] + Σ_k X[t, i, k] · f_k[t] + u[t, i]
+- X: 风格暴露（如 ln_mkt_cap）与因子库中的因子，逐日横截面 zscore，缺失暴露记为 0（横截面均值）
+- 权重: 默认 sqrt(市值)（大市值股票残差方差更小），也可等权
+- f[t] 为 t 日暴露对应的因子收益（t → t+1 实现），u[t, i] 为特异收益
+
+全部日期的 X'WX / X'Wy 用 einsum 按日期块批量计算、批量求解 K×K 方程，没有逐日循环。
+结果供 strategy/risk_model.py 估计因子协方差和特异风险。
+
+用法:
+    reg = FactorReturnRegression(panel, factors=['illiq_guiji', 'panic_factor'], style_cols=['ln_mkt_cap'])
+    factor_ret = reg.run()          # DataFrame(date × [market, ln_mkt_cap, illiq_guiji, panic_factor])
+    reg.residuals_, reg.r2_, reg.get_summary()
+"""
+import numpy as np
+import pandas as pd
+
+from factor_processing.combination import cross_zscore, load_factor_cube, to_grid
+from factor_processing.neutralize import resolve_style
+from utils.calendar import TradingCalendar
+from utils.log import timed
+
+INTERCEPT = 'market'
+
+
+def exposure_cube(panel: pd.DataFrame, factors=None, style_cols=None, dates=None, codes=None):
+    """
+    风格列 + 因子库因子 → dates × codes × K 的暴露数组（横截面 zscore）
+
+    返回:
+        (X, names)
+    """
+    style = resolve_style(panel, list(style_cols or []))
+    missing = [c for c in (style_cols or []) if c not in style.columns]
+    if missing:
+        raise ValueError(f"Panel 中找不到风格列: {missing}")
+    parts, names = [], []
+    if style.shape[1]:
+        parts.append(cross_zscore(np.stack([to_grid(style[c], dates, codes) for c in style.columns], axis=2)))
+        names += list(style.columns)
+    if factors:
+        parts.append(load_factor_cube(list(factors), dates, codes))
+        names += list(factors)
+    if not parts:
+        raise ValueError("至少需要一个风格列或因子")
+    return np.concatenate(parts, axis=2), names
+
+
+def cross_sectional_regression(ret: np.ndarray, X: np.ndarray, weights: np.ndarray | None = None,
+                               intercept: bool = True, min_stocks: int = 10, chunk: int = 256):
+    """
+    逐日横截面加权回归（批量）
+
+    参数:
+        ret: 收益 (T, N)
+        X: 暴露 (T, N, K)，NaN 视为 0
+        weights: 回归权重 (T, N)，None 为等权；非正 / 缺失的样本不参与回归
+        intercept: 是否加截距（市场因子）
+        min_stocks: 有效股票数少于 K + min_stocks 的日期结果为 NaN
+        chunk: 每批处理的日期数（控制 T×N×K 中间数组的内存）
+    返回:
+        (factor_ret (T, K'), resid (T, N), r2 (T,))，K' = K + intercept
+    """
+    T, N, K = X.shape
+    k = K + int(intercept)
+    factor_ret = np.full((T, k), np.nan)
+    resid = np.full((T, N), np.nan)
+    r2 = np.full(T, np.nan)
+    for t0 in range(0, T, chunk):
+        t1 = min(t0 + chunk, T)
+        y = ret[t0:t1]
+        x = np.nan_to_num(X[t0:t1], nan=0.0)
+        if intercept:
+            x = np.concatenate([np.ones(x.shape[:2] + (1,)), x], axis=2)
+        w = np.ones_like(y) if weights is None else weights[t0:t1]
+        mask = np.isfinite(y) & np.isfinite(w) & (w > 0)
+        w = np.where(mask, w, 0.0)
+        y0 = np.where(mask, y, 0.0)
+
+        xtx = np.einsum('tnk,tn,tnl->tkl', x, w, x)
+        xty = np.einsum('tnk,tn->tk', x, w * y0)
+        # 按对角线缩放后求伪逆（与 factor_processing.neutralize 相同）
+        scale = np.sqrt(np.einsum('tkk->tk', xtx))
+        scale[scale == 0] = 1.0
+        beta = np.einsum('tkl,tl->tk', np.linalg.pinv(xtx / (scale[:, :, None] * scale[:, None, :])),
+                         xty / scale) / scale
+
+        fitted = np.einsum('tnk,tk->tn', x, beta)
+        u = np.where(mask, y - fitted, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            wsum = w.sum(axis=1)
+            ybar = (w * y0).sum(axis=1) / wsum
+            sst = (w * (y0 - ybar[:, None]) ** 2).sum(axis=1)
+            sse = (w * np.nan_to_num(u) ** 2).sum(axis=1)
+            fit_r2 = 1 - sse / sst
+        enough = mask.sum(axis=1) >= k + min_stocks
+        factor_ret[t0:t1] = np.where(enough[:, None], beta, np.nan)
+        resid[t0:t1] = np.where(enough[:, None], u, np.nan)
+        r2[t0:t1] = np.where(enough, fit_r2, np.nan)
+    return factor_ret, resid, r2
+
+
+class FactorReturnRegression:
+    """
+    参数:
+        panel: 清洗后的 panel（含前瞻收益列、风格列所需字段）
+        factors: 因子库中的因子名
+        style_cols: 风格列（panel 列名或可派生的列，如 'ln_mkt_cap'）
+        fwd_ret_col: 被解释变量
+        weight: 'sqrt_cap'（sqrt(市值)）或 None（等权）
+        min_stocks: 每日至少的有效股票数（在参数个数之外）
+    """
+
+    def __init__(self, panel, factors=None, style_cols=('ln_mkt_cap',), fwd_ret_col='ret_fwd_1d',
+                 weight='sqrt_cap', min_stocks=10):
+        if fwd_ret_col not in panel.columns:
+            raise ValueError(f"Panel 中找不到列: {fwd_ret_col}")
+        if weight not in ('sqrt_cap', None):
+            raise ValueError(f"不支持的回归权重: {weight}，可选: ['sqrt_cap', None]")
+        self.calendar = TradingCalendar.from_panel(panel)
+        index = panel.index.remove_unused_levels()
+        self.dates = self.calendar.dates
+        self.codes = index.levels[index.names.index('code')]
+        self.X, names = exposure_cube(panel, factors, style_cols, self.dates, self.codes)
+        self.factor_names = [INTERCEPT] + names
+        self.ret = to_grid(panel[fwd_ret_col], self.dates, self.codes)
+        self.weights = None
+        if weight == 'sqrt_cap':
+            if 'market_capitalization' not in panel.columns:
+                raise ValueError("sqrt_cap 权重需要 market_capitalization 列")
+            cap = to_grid(panel['market_capitalization'], self.dates, self.codes)
+            self.weights = np.sqrt(np.where(cap > 0, cap, np.nan))
+        # 停牌 / 未上市的股票不参与回归
+        if {'suspended', 'listed'}.issubset(panel.columns):
+            tradable = ((to_grid(panel['suspended'], self.dates, self.codes) == 0)
+                        & (to_grid(panel['listed'], self.dates, self.codes) == 1))
+            self.ret = np.where(tradable, self.ret, np.nan)
+        self.min_stocks = min_stocks
+
+    @timed('FactorReturnRegression.run')
+    def run(self) -> pd.DataFrame:
+        """返回因子收益 DataFrame(index=date, columns=[market, 风格列..., 因子...])"""
+        f, u, r2 = cross_sectional_regression(self.ret, self.X, self.weights, min_stocks=self.min_stocks)
+        self.factor_returns_ = pd.DataFrame(f, index=self.dates, columns=self.factor_names)
+        self.residuals_ = pd.DataFrame(u, index=self.dates, columns=self.codes)
+        self.r2_ = pd.Series(r2, index=self.dates, name='R2')
+        return self.factor_returns_
+
+    def exposures(self, date=None) -> pd.DataFrame:
+        """某日（默认最后一天）的暴露矩阵 DataFrame(index=code, columns=factor_names)，缺失暴露为 0"""
+        t = len(self.dates) - 1 if date is None else self.dates.get_loc(pd.Timestamp(date))
+        x = np.nan_to_num(self.X[t], nan=0.0)
+        return pd.DataFrame(np.column_stack([np.ones(len(self.codes)), x]), index=self.codes,
+                            columns=self.factor_names)
+
+    def get_summary(self) -> pd.DataFrame:
+        """各因子收益的均值、t 值、年化波动、胜率，以及平均 R²"""
+        if not hasattr(self, 'factor_returns_'):
+            self.run()
+        f = self.factor_returns_
+        n = f.count()
+        return pd.DataFrame({
+            'Mean': f.mean(),
+            't-stat': f.mean() / f.std() * np.sqrt(n),
+            'Annual Vol': f.std() * np.sqrt(252),
+            'Win Rate (>0)': (f > 0).sum() / n,
+            'Days': n,
+            'Avg R2': self.r2_.mean(),
+        })
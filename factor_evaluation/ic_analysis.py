@@ -1,14 +1,19 @@
 # factor_evaluation/ic_analysis.py
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 
+from utils import plot
+from utils.calendar import TradingCalendar
+from utils.log import timed
+
 class ICAnalyzer:
     def __init__(self, cleaned_data, factor_name='factor'):
         self.data = cleaned_data
         self.factor_name = factor_name
+        self.calendar = TradingCalendar.from_panel(cleaned_data)
 
+    @timed('ICAnalyzer.calculate_daily_ic')
     def calculate_daily_ic(self, method='spearman', min_stocks=10):
         """
         計算每日 IC 序列
@@ -19,9 +24,31 @@ class ICAnalyzer:
                 return np.nan
             return group['factor'].corr(group['ret'], method=method)
 
-        self.ic_series = self.data.groupby(level='date').apply(_calc)
+        # 按整数日期位置分组，结果再映射回日期
+        pos = self.calendar.panel_positions(self.data.index)
+        ic = self.data.groupby(pos).apply(_calc)
+        self.ic_series = pd.Series(ic.to_numpy(), index=self.calendar.dates[ic.index.to_numpy()], name='IC')
         return self.ic_series
 
+    def period_ic(self, freq='M'):
+        """
+        按周期汇总 IC（月度 / 季度 / 年度），用于报告
+        freq: 'W' / 'M' / 'Q' / 'Y'
+        """
+        if not hasattr(self, 'ic_series'):
+            self.calculate_daily_ic()
+        ids = self.calendar.period_ids(freq)[self.calendar.positions(self.ic_series.index)]
+        grouped = self.ic_series.groupby(ids)
+        table = pd.DataFrame({
+            'IC Mean': grouped.mean(),
+            'IC Std': grouped.std(),
+            'Win Rate (>0)': grouped.apply(lambda s: (s > 0).sum() / s.count() if s.count() else np.nan),
+            'Valid Days': grouped.count(),
+        })
+        table.index = self.calendar.period_labels(freq)[table.index.to_numpy()]
+        table.index.name = 'period'
+        return table
+
     def get_summary(self):
         if not hasattr(self, 'ic_series'):
             self.calculate_daily_ic()
@@ -41,33 +68,27 @@ class ICAnalyzer:
             "Valid Days": self.ic_series.count()
         })
 
-    def plot_ic(self, save_path=None):
+    def plot_ic(self, save_path=None, show=True):
         if not hasattr(self, 'ic_series'):
             self.calculate_daily_ic()
-            
+
+        # 無界面路徑：降採樣 + 面積圖，複用 Figure，不阻塞 (見 utils/plot.py)
+        if not show:
+            plot.plot_ic(self.ic_series, self.factor_name, save_path=save_path)
+            if save_path:
+                print(f"IC 分析图已保存至: {save_path}")
+            return
+
+        import matplotlib.pyplot as plt   # 只有彈窗畫圖時才導入 pyplot
         plt.figure(figsize=(12, 5))
-        # 畫柱狀圖
-        self.ic_series.plot(kind='bar', color='skyblue', alpha=0.6, label='Daily IC')
-        
-        # 畫均線
-        ma_ic = self.ic_series.rolling(window=20).mean()
-        plt.plot(ma_ic.index, ma_ic.values, color='orange', label='20D MA')
-        
-        plt.axhline(self.ic_series.mean(), color='red', linestyle='--', label=f'Mean: {self.ic_series.mean():.3f}')
-        plt.title(f"Factor Rank IC Series - {self.factor_name}")
-        
-        # 因為 X 軸是日期，bar圖標籤會太密，簡化顯示
-        ax = plt.gca()
-        ax.xaxis.set_major_locator(plt.MaxNLocator(10)) 
-        
-        plt.legend()
-        plt.grid(axis='y', linestyle='--', alpha=0.5)
+        # 日度 IC 畫成面積（幾千根柱子太慢），疊加 20 日均線和均值
+        plot.draw_ic(plt.gca(), self.ic_series, self.factor_name)
         plt.tight_layout()
-        
+
         # 保存图片
         if save_path:
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
             plt.savefig(save_path, dpi=300, bbox_inches='tight')
             print(f"IC 分析图已保存至: {save_path}")
-        
-        plt.show()
\ No newline at end of file
+
+        plt.show()
@@ -1,14 +1,17 @@
 # factor_evaluation/layer_backtest.py
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
 
+from utils import plot
+from utils.log import timed
+
 class LayerBacktester:
     def __init__(self, cleaned_data, groups=5, factor_name='factor'):
         self.data = cleaned_data.copy()
         self.groups = groups
         self.factor_name = factor_name
 
+    @timed('LayerBacktester.run')
     def run(self):
         # 1. 每日分組
         # 使用 qcut 進行等頻分箱，labels=False 得到 0, 1, 2, 3, 4
@@ -37,30 +40,25 @@ class LayerBacktester:
         
         return layer_ret
 
-    def plot_cumulative(self, layer_ret, save_path=None):
-        # 計算累積收益 (使用單利累加近似，或者複利 (1+r).cumprod())
-        # 為了看清楚趨勢，這裡用 log return 的累加比較科學，或者簡單單利累加
-        cum_ret = layer_ret.cumsum()
+    def plot_cumulative(self, layer_ret, save_path=None, show=True):
+        # 累積收益使用單利累加近似 (layer_ret.cumsum())，長序列先降採樣
 
-        plt.figure(figsize=(12, 6))
-        
-        # 畫各組曲線
-        for col in layer_ret.columns:
-            if col == 'Long-Short': continue
-            plt.plot(cum_ret.index, cum_ret[col], label=col, alpha=0.6)
+        # 無界面路徑：複用 Figure，不阻塞 (見 utils/plot.py)
+        if not show:
+            plot.plot_cumulative(layer_ret, self.factor_name, save_path=save_path, groups=self.groups)
+            if save_path:
+                print(f"分层回测图已保存至: {save_path}")
+            return
 
-        # 突出顯示多空曲線
-        plt.plot(cum_ret.index, cum_ret['Long-Short'], label='Long-Short', color='black', linewidth=2.5)
-
-        plt.title(f"Layered Cumulative Return - {self.factor_name} (Groups={self.groups})")
-        plt.legend()
-        plt.grid(True, alpha=0.3)
+        import matplotlib.pyplot as plt   # 只有彈窗畫圖時才導入 pyplot
+        plt.figure(figsize=(12, 6))
+        plot.draw_cumulative(plt.gca(), layer_ret, self.factor_name, groups=self.groups)
         plt.tight_layout()
-        
+
         # 保存图片
         if save_path:
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
             plt.savefig(save_path, dpi=300, bbox_inches='tight')
             print(f"分层回测图已保存至: {save_path}")
-        
-        plt.show()
\ No newline at end of file
+
+        plt.show()
@@ -0,0 +1,244 @@
+# factor_evaluation/screening.py
+"""
+因子快速筛选（近似评估 + 提前停止）
+
+挖掘候选因子时先用很小的代价判断"值不值得做完整评估":
+1. 分层抽样：日期每隔 date_step 天取一天；股票按市值（全历史中位数）分成 strata 层，每层抽 code_fraction
+   （至少 min_codes 只，股票池较小时即全部股票）。抽样网格与前瞻收益只在构造 FactorScreener 时准备一次，
+   之后每个候选因子只需对齐到小网格并计算 Rank IC
+2. 顺序检验：抽样日期按随机顺序分批（每批 batch 天）计算 Rank IC，每批之后给出 IC 均值的置信区间
+   （正态近似；共 m 次查看，每次用 alpha / m 的 Bonferroni 水平，整体犯错概率不超过 alpha）
+       区间完全落在 (-threshold, threshold) 内  → reject（IC 绝对值显著小于阈值），立即停止
+       区间完全在 threshold 之外（任一方向）  → pass，立即停止
+       用完全部抽样日期仍无结论               → inconclusive
+3. pass 与 inconclusive 为幸存者，只对幸存者做完整评估（summary_report.evaluate_factor）
+
+抽样日期间隔 5 天，相邻样本的 IC 相关性较弱，置信区间按独立样本计算；ICIR 的区间用
+se ≈ sqrt((1 + ICIR² / 2) / n)。
+
+用法:
+    screener = FactorScreener(panel, date_step=5, code_fraction=0.2)
+    screener.screen(factor_series, threshold=0.02)       # 一行结果: IC / ICIR 及置信区间、使用天数、结论
+    screener.screen_many({'a': s1, 'b': s2})
+
+    python -m factor_evaluation.screening --factors illiq_guiji panic_factor --threshold 0.02 --full
+    python run.py --factor_name illiq_guiji --screen        # 未通过筛选时不做完整评估
+"""
+import argparse
+import os
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from factor_processing.combination import daily_rank_ic, to_grid
+from utils.calendar import TradingCalendar
+from utils.io import PROCESSED_PATH, RESULTS_PATH, list_factors, load_factor
+from utils.log import timed
+
+DECISIONS = ('pass', 'reject', 'inconclusive')
+
+
+def stratified_codes(panel: pd.DataFrame, fraction: float = 0.2, strata: int = 5, min_codes: int = 50,
+                     col: str = 'market_capitalization', seed: int = 0) -> pd.Index:
+    """
+    按 col 的全历史中位数把股票分成 strata 层，每层随机抽取 fraction（至少 min_codes 只，按层大小分摊）
+
+    col 缺失的股票单独成一层
+    """
+    index = panel.index.remove_unused_levels()
+    codes = index.levels[index.names.index('code')]
+    n_pick = min(len(codes), max(int(round(fraction * len(codes))), min_codes))
+    if n_pick >= len(codes):
+        return codes
+    if col in panel.columns:
+        level = panel[col].groupby(level='code').median().reindex(codes).to_numpy()
+    else:
+        level = np.full(len(codes), np.nan)
+    ok = np.isfinite(level)
+    labels = np.full(len(codes), strata)
+    if ok.sum() >= strata:
+        labels[ok] = pd.qcut(pd.Series(level[ok]).rank(method='first'), strata, labels=False).to_numpy()
+    elif ok.any():
+        labels[ok] = 0
+
+    rng = np.random.default_rng(seed)
+    picked = []
+    for s in np.unique(labels):
+        members = np.flatnonzero(labels == s)
+        k = max(1, int(round(n_pick * len(members) / len(codes))))
+        picked.append(rng.choice(members, min(k, len(members)), replace=False))
+    return codes[np.sort(np.concatenate(picked))]
+
+
+def _factor_grid(factor, dates: pd.Index, codes: pd.Index) -> np.ndarray:
+    """长表 Series / 单列 DataFrame（index=['date', 'code']）或宽表 (date × code) → dates × codes 数组"""
+    if isinstance(factor, pd.DataFrame):
+        if isinstance(factor.index, pd.MultiIndex):
+            factor = factor.iloc[:, 0]
+        else:
+            return factor.reindex(index=dates, columns=codes).to_numpy(dtype=np.float64)
+    return to_grid(factor, dates, codes)
+
+
+class FactorScreener:
+    """
+    参数:
+        panel: 清洗后的 panel
+        fwd_ret_col: 前瞻收益列
+        date_step: 每隔多少个交易日抽一天
+        code_fraction: 每个市值分层抽取的股票比例
+        strata: 市值分层数
+        min_codes: 抽样股票数下限
+        min_stocks: 当天有效股票少于此数则不计算 IC（与 ICAnalyzer 一致）
+        seed: 抽样与日期顺序的随机种子
+    """
+
+    def __init__(self, panel, fwd_ret_col='ret_fwd_1d', date_step=5, code_fraction=0.2, strata=5,
+                 min_codes=50, min_stocks=10, seed=0):
+        if fwd_ret_col not in panel.columns:
+            raise ValueError(f"Panel 中找不到列: {fwd_ret_col}")
+        if date_step < 1 or not 0 < code_fraction <= 1:
+            raise ValueError(f"date_step 须 >= 1、code_fraction 须在 (0, 1] 之间: {date_step}, {code_fraction}")
+        calendar = TradingCalendar.from_panel(panel)
+        self.dates = calendar.dates[::date_step]
+        self.codes = stratified_codes(panel, code_fraction, strata, min_codes, seed=seed)
+        self.ret = to_grid(panel[fwd_ret_col], self.dates, self.codes)
+        self.min_stocks = min_stocks
+        # 随机日期顺序：前几批就覆盖整个样本区间，不会只看到最早的几年
+        self.order = np.random.default_rng(seed).permutation(len(self.dates))
+
+    def __repr__(self):
+        return f"FactorScreener({len(self.dates)} dates × {len(self.codes)} codes)"
+
+    def screen(self, factor, threshold: float = 0.02, alpha: float = 0.05, batch: int = 60,
+               name: str | None = None) -> pd.Series:
+        """
+        筛选单个因子
+
+        参数:
+            factor: 因子值，长表 Series（index=['date', 'code']）或宽表 (date × code)
+            threshold: |IC Mean| 的门槛
+            alpha: 整体显著性水平
+            batch: 每次查看新增的抽样日期数
+        返回:
+            Series: IC Mean / 置信区间、ICIR / 置信区间、Days、Looks、Decision、Seconds
+        """
+        start = time.perf_counter()
+        grid = _factor_grid(factor, self.dates, self.codes)
+        n_looks = max(1, int(np.ceil(len(self.order) / batch)))
+        z = NormalDist().inv_cdf(1 - alpha / n_looks / 2)
+
+        ics = []
+        decision, look = 'inconclusive', 0
+        for look, b0 in enumerate(range(0, len(self.order), batch), start=1):
+            rows = self.order[b0:b0 + batch]
+            ic = daily_rank_ic(grid[rows][:, :, None], self.ret[rows], self.min_stocks)[:, 0]
+            ics.append(ic[np.isfinite(ic)])
+            values = np.concatenate(ics)
+            if len(values) < 2:
+                continue
+            mean, half = values.mean(), z * values.std(ddof=1) / np.sqrt(len(values))
+            if -threshold < mean - half and mean + half < threshold:
+                decision = 'reject'
+                break
+            if mean - half > threshold or mean + half < -threshold:
+                decision = 'pass'
+                break
+
+        values = np.concatenate(ics) if ics else np.array([])
+        n = len(values)
+        mean = values.mean() if n else np.nan
+        std = values.std(ddof=1) if n > 1 else np.nan
+        half = z * std / np.sqrt(n) if n > 1 else np.nan
+        icir = mean / std if n > 1 and std > 0 else np.nan
+        ir_half = z * np.sqrt((1 + icir ** 2 / 2) / n) if n > 1 else np.nan
+        return pd.Series({
+            'IC Mean': mean,
+            'IC Low': mean - half,
+            'IC High': mean + half,
+            'ICIR': icir,
+            'ICIR Low': icir - ir_half,
+            'ICIR High': icir + ir_half,
+            'Days': n,
+            'Looks': look,
+            'Decision': decision,
+            'Seconds': time.perf_counter() - start,
+        }, name=name)
+
+    @timed('FactorScreener.screen_many')
+    def screen_many(self, factors, **kwargs) -> pd.DataFrame:
+        """
+        批量筛选
+
+        参数:
+            factors: {名称: 因子值} 或因子库中的因子名列表（逐个读取，不同时占用内存）
+        """
+        items = factors.items() if isinstance(factors, dict) else ((n, None) for n in factors)
+        rows = []
+        for name, values in items:
+            if values is None:
+                values = load_factor(name)
+            rows.append(self.screen(values, name=name, **kwargs))
+        table = pd.DataFrame(rows)
+        table.index.name = 'factor'
+        return table
+
+
+def screen_factors(names: list[str] | None = None, panel: pd.DataFrame | None = None, full: bool = True,
+                   groups: int = 5, screener_kwargs: dict | None = None, **kwargs):
+    """
+    先筛选、再只对幸存者做完整评估
+
+    返回:
+        (screen_table, full_table)：full=False 或没有幸存者时 full_table 为空表
+    """
+    from factor_evaluation.summary_report import evaluate_factor
+
+    names = names or list_factors()
+    if panel is None:
+        panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    screener = FactorScreener(panel, **(screener_kwargs or {}))
+    table = screener.screen_many(names, **kwargs)
+    survivors = table.index[table['Decision'] != 'reject']
+    full_rows = []
+    if full:
+        for name in survivors:
+            summary, _ = evaluate_factor(name, panel, groups=groups)
+            full_rows.append(summary)
+    return table, pd.DataFrame(full_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="因子快速筛选")
+    parser.add_argument('--factors', type=str, nargs='*', default=None, help='因子名称，默认因子库中全部因子')
+    parser.add_argument('--threshold', type=float, default=0.02, help='|IC Mean| 门槛')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--date_step', type=int, default=5)
+    parser.add_argument('--code_fraction', type=float, default=0.2)
+    parser.add_argument('--batch', type=int, default=60, help='每次查看新增的抽样日期数')
+    parser.add_argument('--full', action='store_true', help='对幸存者做完整评估')
+    args = parser.parse_args()
+
+    table, full = screen_factors(args.factors, full=args.full,
+                                 screener_kwargs=dict(date_step=args.date_step, code_fraction=args.code_fraction),
+                                 threshold=args.threshold, alpha=args.alpha, batch=args.batch)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(table)
+        print(f"\n幸存 {int((table['Decision'] != 'reject').sum())} / {len(table)}，"
+              f"筛选总用时 {table['Seconds'].sum():.2f} s")
+        if len(full):
+            print("\n完整评估:")
+            print(full)
+
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    out = os.path.join(RESULTS_PATH, 'screening.csv')
+    table.to_csv(out)
+    if len(full):
+        full.to_csv(os.path.join(RESULTS_PATH, 'screening_full.csv'))
+    print(f"结果已保存至: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# factor_evaluation/significance.py
+"""
+IC / 多空收益的显著性检验（置换检验 + 日期块 bootstrap）+ 多重检验校正
+
+输入与 ICAnalyzer / LayerBacktester 相同（index=['date', 'code']，含 'factor'、'ret' 列），检验三个统计量：
+IC Mean、ICIR、LS Mean（LayerBacktester 的日度 Long-Short 均值）。
+
+1. 预处理只做一次：按日期把样本排成连续片段，计算每日标准化秩 zF、zR（每日 Σz = 0、Σz² = 1，
+   于是 Rank IC_t = Σ zF·zR），以及多空权重 L（顶组 +1/n_top，底组 -1/n_bottom，于是 LS_t = Σ L·ret）
+2. 置换检验：每日在截面内打乱收益（因子与收益的对应关系被破坏，保留每日的分布和样本数），
+   一批 B 次置换 = 一次 (B × n) 的下标收集 + 矩阵向量乘；按日期块分给进程池，
+   各 worker 只回传每次置换的 Σ IC、Σ IC²、Σ LS，汇总后得到三个统计量的零分布
+3. 日期块 bootstrap：对日度 IC / LS 序列做循环块重采样（保留序列相关），
+   得到置信区间，以及以观测值为中心的 bootstrap p 值
+4. adjust_pvalues()：Benjamini-Hochberg / Holm / Bonferroni 校正，significance_report() 对因子库批量检验
+
+随机数按 (seed, 日期位置) 生成，结果与 worker 数无关。
+
+用法:
+    tester = SignificanceTester(merged, groups=5, factor_name='illiq_guiji')
+    tester.get_summary(n_resamples=10000, workers=4)
+
+    python -m factor_evaluation.significance --factors illiq_guiji panic_factor --n_resamples 10000
+"""
+import argparse
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.calendar import TradingCalendar
+from utils.io import PROCESSED_PATH, RESULTS_PATH, list_factors, load_factor
+from utils.log import timed
+from utils.parallel import fork_pool
+
+STATS = ['IC Mean', 'ICIR', 'LS Mean']
+
+# worker 进程中共享的预处理数组（fork 时直接继承，不重复序列化）
+_ARRAYS = None
+
+# 每批置换的 B × n 元素上限（控制 worker 内存）
+_BATCH_ELEMENTS = 4_000_000
+
+
+def _init_worker(arrays):
+    global _ARRAYS
+    _ARRAYS = arrays
+
+
+def _segment_sum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """按日期片段求和（空片段为 0）"""
+    out = np.zeros(len(offsets) - 1)
+    nonempty = offsets[1:] > offsets[:-1]
+    out[nonempty] = np.add.reduceat(values, offsets[:-1][nonempty])
+    return out
+
+
+def _permute_days(t0: int, t1: int, n_resamples: int, seed: int):
+    """
+    对日期位置 [t0, t1) 做 n_resamples 次截面置换
+
+    返回:
+        (Σ IC, Σ IC², Σ LS)，每个为 (n_resamples,) 数组
+    """
+    a = _ARRAYS
+    offsets = a['offsets']
+    s_ic = np.zeros(n_resamples)
+    ss_ic = np.zeros(n_resamples)
+    s_ls = np.zeros(n_resamples)
+    for t in range(t0, t1):
+        ic_ok, ls_ok = a['ic_valid'][t], a['ls_valid'][t]
+        if not (ic_ok or ls_ok):
+            continue
+        lo, hi = offsets[t], offsets[t + 1]
+        n = hi - lo
+        zf, zr, w, r = a['zf'][lo:hi], a['zr'][lo:hi], a['weight'][lo:hi], a['ret'][lo:hi]
+        rng = np.random.default_rng([seed, t])
+        batch = max(1, _BATCH_ELEMENTS // n)
+        base = np.broadcast_to(np.arange(n), (min(batch, n_resamples), n))
+        for b0 in range(0, n_resamples, batch):
+            b1 = min(b0 + batch, n_resamples)
+            perm = rng.permuted(base[:b1 - b0], axis=1)
+            if ic_ok:
+                ic = zr[perm] @ zf
+                s_ic[b0:b1] += ic
+                ss_ic[b0:b1] += ic.astype(np.float64) ** 2
+            if ls_ok:
+                s_ls[b0:b1] += r[perm] @ w
+    return s_ic, ss_ic, s_ls
+
+
+def _split_days(counts: np.ndarray, n_parts: int) -> list[tuple[int, int]]:
+    """按样本数均衡地把日期切成 n_parts 段"""
+    cum = np.cumsum(counts)
+    bounds = np.searchsorted(cum, np.linspace(0, cum[-1], n_parts + 1)[1:-1])
+    edges = np.unique(np.concatenate([[0], bounds, [len(counts)]]))
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+def _pvalue(null: np.ndarray, observed: float) -> float:
+    """双侧置换 p 值 (1 + #{|null| ≥ |obs|}) / (1 + B)"""
+    null = null[np.isfinite(null)]
+    if not np.isfinite(observed) or len(null) == 0:
+        return np.nan
+    return (1 + np.sum(np.abs(null) >= abs(observed))) / (1 + len(null))
+
+
+class SignificanceTester:
+    """
+    因子显著性检验
+
+    参数:
+        cleaned_data: get_clean_factor_and_forward_returns 的输出
+        groups: 分层数（与 LayerBacktester 一致，LS = 顶组 - 底组）
+        min_stocks: 当天有效股票少于此数则不计算 IC（与 ICAnalyzer 一致）
+    """
+
+    def __init__(self, cleaned_data, groups=5, factor_name='factor', min_stocks=10):
+        self.factor_name = factor_name
+        self.groups = groups
+        self.min_stocks = min_stocks
+        self.calendar = TradingCalendar.from_panel(cleaned_data)
+        self.arrays = self._prepare(cleaned_data)
+
+    @timed('SignificanceTester._prepare')
+    def _prepare(self, data) -> dict:
+        """按日期排序 → 每日标准化秩 zF / zR 与多空权重（整个检验过程只做一次）"""
+        pos = self.calendar.panel_positions(data.index)
+        order = np.argsort(pos, kind='stable')
+        pos = pos[order]
+        factor = data['factor'].to_numpy(dtype=np.float64)[order]
+        ret = data['ret'].to_numpy(dtype=np.float64)[order]
+        counts = np.bincount(pos, minlength=len(self.calendar.dates))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        def standardize(values):
+            ranks = pd.Series(values).groupby(pos).rank().to_numpy()
+            centered = ranks - (_segment_sum(ranks, offsets) / np.maximum(counts, 1))[pos]
+            norm = np.sqrt(_segment_sum(centered ** 2, offsets))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                z = centered / norm[pos]
+            return np.nan_to_num(z), norm > 0
+
+        zf, f_ok = standardize(factor)
+        zr, r_ok = standardize(ret)
+        ic_valid = (counts >= self.min_stocks) & f_ok & r_ok
+
+        # 多空权重：与 LayerBacktester 相同的 qcut 分组（线性插值分位点、右闭区间、重复边界时当天不计）
+        weight = np.zeros(len(factor))
+        ls_valid = np.zeros(len(counts), dtype=bool)
+        q = np.linspace(0, 1, self.groups + 1)
+        for t in np.flatnonzero(counts):
+            lo, hi = offsets[t], offsets[t + 1]
+            x = factor[lo:hi]
+            edges = np.quantile(x, q)
+            if len(np.unique(edges)) < len(edges):
+                continue
+            label = np.searchsorted(edges[1:-1], x, side='left')
+            top, bottom = label == self.groups - 1, label == 0
+            if top.any() and bottom.any():
+                weight[lo:hi] = top / top.sum() - bottom / bottom.sum()
+                ls_valid[t] = True
+
+        return {
+            'offsets': offsets, 'counts': counts,
+            'zf': zf.astype(np.float32), 'zr': zr.astype(np.float32),
+            'weight': weight.astype(np.float32), 'ret': ret.astype(np.float32),
+            'ic_valid': ic_valid, 'ls_valid': ls_valid,
+            '_zf64': zf, '_zr64': zr, '_w64': weight, '_ret64': ret,
+        }
+
+    # -------- 观测值 --------
+    def daily_ic(self) -> pd.Series:
+        """日度 Rank IC（与 ICAnalyzer.calculate_daily_ic 相同）"""
+        a = self.arrays
+        ic = _segment_sum(a['_zf64'] * a['_zr64'], a['offsets'])
+        return pd.Series(ic[a['ic_valid']], index=self.calendar.dates[a['ic_valid']], name='IC')
+
+    def daily_long_short(self) -> pd.Series:
+        """日度多空收益（与 LayerBacktester.run()['Long-Short'] 相同）"""
+        a = self.arrays
+        ls = _segment_sum(a['_w64'] * a['_ret64'], a['offsets'])
+        return pd.Series(ls[a['ls_valid']], index=self.calendar.dates[a['ls_valid']], name='Long-Short')
+
+    def observed(self) -> pd.Series:
+        ic = self.daily_ic()
+        return pd.Series({
+            'IC Mean': ic.mean(),
+            'ICIR': ic.mean() / ic.std() if ic.std() != 0 else 0,
+            'LS Mean': self.daily_long_short().mean(),
+        })
+
+    # -------- 置换检验 --------
+    @timed('SignificanceTester.permutation_test')
+    def permutation_test(self, n_resamples=1000, seed=0, workers=None) -> pd.DataFrame:
+        """
+        截面置换检验
+
+        参数:
+            n_resamples: 置换次数
+            workers: 进程数，默认 CPU 数；1 表示在当前进程中计算
+        返回:
+            DataFrame: index=STATS，columns=[Observed, Null Mean, Null Std, p-value]
+        """
+        null = self.permutation_null(n_resamples, seed, workers)
+        observed = self.observed()
+        return pd.DataFrame({
+            'Observed': observed,
+            'Null Mean': null.mean(),
+            'Null Std': null.std(),
+            'p-value': pd.Series({s: _pvalue(null[s].to_numpy(), observed[s]) for s in STATS}),
+        }).loc[STATS]
+
+    def permutation_null(self, n_resamples=1000, seed=0, workers=None) -> pd.DataFrame:
+        """三个统计量的置换零分布，DataFrame (n_resamples × STATS)"""
+        global _ARRAYS
+        a = self.arrays
+        active = np.where(a['ic_valid'] | a['ls_valid'], a['counts'], 0)
+        workers = workers or os.cpu_count() or 1
+        parts = _split_days(active, max(workers * 4, 1)) if active.sum() else []
+        shared = {k: v for k, v in a.items() if not k.startswith('_')}
+
+        s_ic, ss_ic, s_ls = np.zeros(n_resamples), np.zeros(n_resamples), np.zeros(n_resamples)
+        pool = fork_pool(_init_worker, (shared,), workers if len(parts) > 1 else 1)
+        if pool is None:
+            results = [_permute_days(t0, t1, n_resamples, seed) for t0, t1 in parts]
+            _ARRAYS = None
+        else:
+            with pool:
+                futures = [pool.submit(_permute_days, t0, t1, n_resamples, seed) for t0, t1 in parts]
+                results = [f.result() for f in futures]
+        for r_ic, r_ss, r_ls in results:
+            s_ic += r_ic
+            ss_ic += r_ss
+            s_ls += r_ls
+
+        n_ic, n_ls = a['ic_valid'].sum(), a['ls_valid'].sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = s_ic / n_ic
+            std = np.sqrt(np.maximum(ss_ic - n_ic * mean ** 2, 0) / (n_ic - 1))
+            return pd.DataFrame({'IC Mean': mean, 'ICIR': mean / std, 'LS Mean': s_ls / n_ls})
+
+    # -------- 日期块 bootstrap --------
+    @timed('SignificanceTester.bootstrap')
+    def bootstrap(self, n_resamples=1000, block_size=None, seed=0, alpha=0.05) -> pd.DataFrame:
+        """
+        日度 IC / LS 序列的循环块 bootstrap
+
+        参数:
+            block_size: 块长度（交易日），默认 T^(1/3)
+            alpha: 置信区间为 [alpha/2, 1 - alpha/2] 分位数
+        返回:
+            DataFrame: index=STATS，columns=[Observed, CI Low, CI High, p-value]
+        """
+        ic = self.daily_ic().to_numpy()
+        ls = self.daily_long_short().to_numpy()
+        rng = np.random.default_rng(seed)
+        draws = {
+            'IC Mean': self._block_resample(ic, n_resamples, block_size, rng, ['mean', 'icir']),
+            'LS Mean': self._block_resample(ls, n_resamples, block_size, rng, ['mean']),
+        }
+        boot = pd.DataFrame({'IC Mean': draws['IC Mean'][0], 'ICIR': draws['IC Mean'][1],
+                             'LS Mean': draws['LS Mean'][0]})
+        observed = self.observed()
+        # 以观测值为中心的 bootstrap 分布近似零假设 (均值 = 0) 下的分布
+        return pd.DataFrame({
+            'Observed': observed,
+            'CI Low': boot.quantile(alpha / 2),
+            'CI High': boot.quantile(1 - alpha / 2),
+            'p-value': pd.Series({s: _pvalue(boot[s].to_numpy() - observed[s], observed[s]) for s in STATS}),
+        }).loc[STATS]
+
+    @staticmethod
+    def _block_resample(values, n_resamples, block_size, rng, stats) -> list[np.ndarray]:
+        """循环块重采样，按批计算 (B × T) 下标矩阵上的均值 / ICIR"""
+        n = len(values)
+        out = [np.full(n_resamples, np.nan) for _ in stats]
+        if n < 2:
+            return out
+        block = block_size or max(1, int(round(n ** (1 / 3))))
+        n_blocks = -(-n // block)
+        batch = max(1, _BATCH_ELEMENTS // n)
+        for b0 in range(0, n_resamples, batch):
+            b1 = min(b0 + batch, n_resamples)
+            starts = rng.integers(0, n, size=(b1 - b0, n_blocks))
+            idx = ((starts[:, :, None] + np.arange(block)) % n).reshape(b1 - b0, -1)[:, :n]
+            sample = values[idx]
+            mean = sample.mean(axis=1)
+            for i, stat in enumerate(stats):
+                if stat == 'mean':
+                    out[i][b0:b1] = mean
+                else:
+                    std = sample.std(axis=1, ddof=1)
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        out[i][b0:b1] = mean / std
+        return out
+
+    def get_summary(self, n_resamples=1000, block_size=None, seed=0, workers=None) -> pd.Series:
+        """观测值 + 置换 p 值 + bootstrap 置信区间 / p 值，展平为一个 Series"""
+        perm = self.permutation_test(n_resamples, seed=seed, workers=workers)
+        boot = self.bootstrap(n_resamples, block_size=block_size, seed=seed)
+        out = {}
+        for s in STATS:
+            out[s] = perm.loc[s, 'Observed']
+            out[f'{s} Perm p'] = perm.loc[s, 'p-value']
+            out[f'{s} Boot p'] = boot.loc[s, 'p-value']
+            out[f'{s} CI Low'] = boot.loc[s, 'CI Low']
+            out[f'{s} CI High'] = boot.loc[s, 'CI High']
+        return pd.Series(out)
+
+
+# =========================
+# 多重检验校正
+# =========================
+def adjust_pvalues(pvalues, method: str = 'bh'):
+    """
+    多重检验校正
+
+    参数:
+        pvalues: p 值（array / Series，NaN 不参与校正）
+        method: 'bh' (Benjamini-Hochberg, 控制 FDR) / 'holm' / 'bonferroni' (控制 FWER)
+    返回:
+        与输入同类型的校正后 p 值
+    """
+    p = np.asarray(pvalues, dtype=np.float64)
+    out = np.full_like(p, np.nan)
+    ok = np.isfinite(p)
+    m = ok.sum()
+    if m:
+        x = p[ok]
+        order = np.argsort(x)
+        ranked = x[order]
+        if method == 'bh':
+            adj = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+        elif method == 'holm':
+            adj = np.maximum.accumulate(ranked * (m - np.arange(m)))
+        elif method == 'bonferroni':
+            adj = ranked * m
+        else:
+            raise ValueError(f"不支持的校正方法: {method}")
+        res = np.empty(m)
+        res[order] = np.minimum(adj, 1.0)
+        out[ok] = res
+    if isinstance(pvalues, pd.Series):
+        return pd.Series(out, index=pvalues.index, name=pvalues.name)
+    return out
+
+
+def significance_report(names: list[str] | None = None, panel: pd.DataFrame | None = None,
+                        fwd_ret_col: str = 'ret_fwd_1d', groups: int = 5, n_resamples: int = 1000,
+                        block_size: int | None = None, seed: int = 0, workers: int | None = None) -> pd.DataFrame:
+    """
+    对因子库中的多个因子做显著性检验，并在因子之间做多重检验校正
+
+    返回:
+        DataFrame: index=因子名称；每个统计量的观测值、置换 / bootstrap p 值、置信区间，
+        以及置换 p 值的 BH 与 Holm 校正结果（'... BH q'、'... Holm p'）
+    """
+    from factor_evaluation.util import get_clean_factor_and_forward_returns
+
+    names = list(names) if names else list_factors()
+    if not names:
+        raise ValueError("因子库为空，请先运行因子计算脚本")
+    if panel is None:
+        panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    rows = {}
+    for name in names:
+        merged = get_clean_factor_and_forward_returns(load_factor(name), panel, factor_name=name,
+                                                      fwd_ret_col=fwd_ret_col)
+        tester = SignificanceTester(merged, groups=groups, factor_name=name)
+        rows[name] = tester.get_summary(n_resamples, block_size=block_size, seed=seed, workers=workers)
+        print(f"  ✓ {name}")
+    report = pd.DataFrame(rows).T
+    report.index.name = 'factor'
+    for s in STATS:
+        report[f'{s} BH q'] = adjust_pvalues(report[f'{s} Perm p'], 'bh')
+        report[f'{s} Holm p'] = adjust_pvalues(report[f'{s} Perm p'], 'holm')
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="因子显著性检验（置换 + 块 bootstrap + 多重检验校正）")
+    parser.add_argument('--factors', nargs='*', default=None, help='默认因子库中全部因子')
+    parser.add_argument('--fwd_ret_col', type=str, default='ret_fwd_1d')
+    parser.add_argument('--groups', type=int, default=5)
+    parser.add_argument('--n_resamples', type=int, default=1000)
+    parser.add_argument('--block_size', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+    report = significance_report(args.factors, fwd_ret_col=args.fwd_ret_col, groups=args.groups,
+                                 n_resamples=args.n_resamples, block_size=args.block_size,
+                                 seed=args.seed, workers=args.workers)
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    path = os.path.join(RESULTS_PATH, 'significance_report.csv')
+    report.to_csv(path)
+    with pd.option_context('display.width', 200, 'display.max_columns', 40):
+        print(report.round(4))
+    print(f"显著性检验结果已保存至: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# factor_evaluation/summary_report.py
+"""
+因子库批量评估报告
+
+panel 只读取一次，因子库 (data/factors) 中的每个因子在并行 worker 中独立评估：
+IC / ICIR / 胜率、分层收益、多空夏普与回撤、换手率与秩自相关，
+汇总成一张表写到 data/results/summary_report.csv（及 .parquet），每个因子的图表写到 data/results/figures/。
+
+worker 为进程池：Linux 上用 fork 启动，子进程直接共享父进程已读入的 panel（写时复制，不重复读取 / 序列化）；
+其他平台由每个 worker 在初始化时读取一次。
+
+用法:
+    python -m factor_evaluation.summary_report                    # 全部因子
+    python -m factor_evaluation.summary_report --factors illiq_guiji panic_factor --workers 4 --no-figures
+"""
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import as_completed
+
+import pandas as pd
+
+from utils.io import PROCESSED_PATH, RESULTS_PATH, list_factors, load_factor
+from utils.parallel import fork_pool
+
+PANEL_PATH = os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl')
+
+# worker 进程中共享的 panel
+_PANEL = None
+
+
+def _init_worker(panel_path: str):
+    global _PANEL
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+    if _PANEL is None:
+        _PANEL = pd.read_pickle(panel_path)
+
+
+def evaluate_factor(name: str, panel: pd.DataFrame | None = None, fwd_ret_col: str = 'ret_fwd_1d',
+                    groups: int = 5, figure_dir: str | None = None) -> tuple[pd.Series, pd.DataFrame]:
+    """
+    评估单个因子
+
+    参数:
+        name: 因子名称（因子库中的文件名）
+        panel: 清洗后的 panel，None 时使用 worker 中共享的 panel
+        figure_dir: 图表输出目录，None 表示不画图
+    返回:
+        (summary, layer_ret): 汇总指标 Series 与分层收益 DataFrame
+    """
+    from backtest.performance import performance_summary
+    from factor_evaluation.ic_analysis import ICAnalyzer
+    from factor_evaluation.layer_backtest import LayerBacktester
+    from factor_evaluation.turnover_analysis import TurnoverAnalyzer
+    from factor_evaluation.util import get_clean_factor_and_forward_returns
+
+    panel = _PANEL if panel is None else panel
+    start = time.perf_counter()
+    merged = get_clean_factor_and_forward_returns(load_factor(name), panel, factor_name=name, fwd_ret_col=fwd_ret_col)
+
+    ic_analyzer = ICAnalyzer(merged, factor_name=name)
+    ic_summary = ic_analyzer.get_summary()
+    layer_tester = LayerBacktester(merged, groups=groups, factor_name=name)
+    layer_ret = layer_tester.run()
+    ls = performance_summary(layer_ret['Long-Short'])
+    turnover = TurnoverAnalyzer(merged, groups=groups, factor_name=name).get_summary()
+
+    summary = pd.concat([
+        ic_summary,
+        pd.Series({
+            'LS Annual Return': ls['Annual Return'],
+            'LS Sharpe': ls['Sharpe'],
+            'LS Max Drawdown': ls['Max Drawdown'],
+            f'G{groups} Annual Return': layer_ret[f'G{groups}'].mean() * 252,
+            'G1 Annual Return': layer_ret['G1'].mean() * 252,
+        }),
+        turnover,
+    ])
+
+    if figure_dir:
+        ic_analyzer.plot_ic(save_path=os.path.join(figure_dir, f'{name}_ic_analysis.png'), show=False)
+        layer_tester.plot_cumulative(layer_ret, save_path=os.path.join(figure_dir, f'{name}_layer_backtest.png'),
+                                     show=False)
+
+    summary['Seconds'] = time.perf_counter() - start
+    return summary.rename(name), layer_ret
+
+
+def _evaluate_task(name, fwd_ret_col, groups, figure_dir):
+    return evaluate_factor(name, None, fwd_ret_col, groups, figure_dir)
+
+
+def generate_report(names: list[str] | None = None, panel_path: str = PANEL_PATH, fwd_ret_col: str = 'ret_fwd_1d',
+                    groups: int = 5, workers: int | None = None, figures: bool = True,
+                    output_dir: str = RESULTS_PATH) -> pd.DataFrame:
+    """
+    评估多个因子并写出汇总表
+
+    参数:
+        names: 因子名称列表，默认因子库中全部因子
+        workers: 并行进程数，默认 min(因子数, CPU 数)；1 表示在当前进程中顺序执行
+        figures: 是否为每个因子输出 IC 图和分层回测图
+    返回:
+        DataFrame: index=因子名称，columns=各项指标
+    """
+    global _PANEL
+    names = list(names) if names else list_factors()
+    if not names:
+        raise ValueError("因子库为空，请先运行因子计算脚本")
+    if not os.path.exists(panel_path):
+        raise FileNotFoundError(f"找不到 Panel 文件: {panel_path}\n请先运行 clean_data.py")
+    workers = workers or min(len(names), os.cpu_count() or 1)
+    figure_dir = os.path.join(output_dir, 'figures') if figures else None
+    if figures:
+        import matplotlib
+        matplotlib.use('Agg')
+
+    print(f"正在讀取 Panel 數據: {panel_path}")
+    _PANEL = pd.read_pickle(panel_path)
+    print(f"共 {len(names)} 个因子，{workers} 个 worker")
+
+    rows, layers, failed = {}, {}, {}
+    pool = fork_pool(_init_worker, (panel_path,), workers)
+    if pool is None:
+        for name in names:
+            try:
+                rows[name], layers[name] = evaluate_factor(name, _PANEL, fwd_ret_col, groups, figure_dir)
+                print(f"  ✓ {name} ({rows[name]['Seconds']:.1f}s)")
+            except Exception as e:   # 单个因子失败不影响其他因子
+                failed[name] = repr(e)
+                print(f"  ✗ {name}: {e}")
+    else:
+        with pool:
+            futures = {pool.submit(_evaluate_task, name, fwd_ret_col, groups, figure_dir): name for name in names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    rows[name], layers[name] = future.result()
+                    print(f"  ✓ {name} ({rows[name]['Seconds']:.1f}s)")
+                except Exception as e:
+                    failed[name] = repr(e)
+                    print(f"  ✗ {name}: {e}")
+
+    report = pd.DataFrame([rows[n] for n in names if n in rows])
+    report.index.name = 'factor'
+    if failed:
+        print(f"评估失败的因子: {failed}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    csv_path = os.path.join(output_dir, 'summary_report.csv')
+    report.to_csv(csv_path)
+    print(f"汇总表已保存至: {csv_path}")
+    try:
+        report.to_parquet(csv_path.replace('.csv', '.parquet'))
+    except ImportError:
+        print("注意: parquet 格式不可用，仅保存为 csv 格式")
+    for name, layer_ret in layers.items():
+        layer_ret.to_csv(os.path.join(output_dir, f'{name}_layer_returns.csv'))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="因子库批量评估报告")
+    parser.add_argument('--factors', nargs='*', default=None, help='默认因子库中全部因子')
+    parser.add_argument('--fwd_ret_col', type=str, default='ret_fwd_1d')
+    parser.add_argument('--groups', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-figures', action='store_true', help='不输出图表')
+    args = parser.parse_args()
+
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+    report = generate_report(args.factors, fwd_ret_col=args.fwd_ret_col, groups=args.groups,
+                             workers=args.workers, figures=not args.no_figures)
+    with pd.option_context('display.width', 200, 'display.max_columns', 30):
+        print(report.round(4))
+
+
+if __name__ == "__main__":
+    main()
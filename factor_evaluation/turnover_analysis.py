@@ -0,0 +1,63 @@
+# factor_evaluation/turnover_analysis.py
+import numpy as np
+import pandas as pd
+
+
+class TurnoverAnalyzer:
+    """
+    因子换手率分析（输入与 ICAnalyzer / LayerBacktester 相同：index=['date', 'code']，含 'factor' 列）
+
+    - 分组换手率：每日按因子分位分组，第 g 组成分股相对前一日的换出比例
+    - 因子秩自相关：t 日与 t-lag 日因子横截面排名的相关系数（越高说明因子越稳定、换手越低）
+
+    全部在宽表 (date × code) 上向量化计算
+    """
+
+    def __init__(self, cleaned_data, groups=5, factor_name='factor'):
+        self.data = cleaned_data
+        self.groups = groups
+        self.factor_name = factor_name
+        self.factor = cleaned_data['factor'].unstack('code')
+
+    def group_membership(self):
+        """每日分组编号宽表：0 (因子最小) ~ groups-1 (因子最大)，缺失为 NaN"""
+        pct = self.factor.rank(axis=1, pct=True)
+        return np.ceil(pct * self.groups) - 1
+
+    def group_turnover(self):
+        """
+        各组每日换手率 = 1 - |今日成分 ∩ 昨日成分| / |昨日成分|
+        返回 DataFrame: index=date, columns=G1..Gn
+        """
+        member = self.group_membership()
+        values = member.to_numpy()
+        out = {}
+        for g in range(self.groups):
+            cur = values == g
+            prev = np.vstack([np.zeros((1, cur.shape[1]), dtype=bool), cur[:-1]])
+            n_prev = prev.sum(axis=1)
+            kept = (cur & prev).sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[f'G{g + 1}'] = np.where(n_prev > 0, 1 - kept / n_prev, np.nan)
+        return pd.DataFrame(out, index=member.index)
+
+    def factor_autocorr(self, lag=1):
+        """因子横截面秩自相关序列（两日都有值的股票上计算）"""
+        ranks = self.factor.rank(axis=1)
+        prev = ranks.shift(lag)
+        both = ranks.notna() & prev.notna()
+        a = ranks.where(both)
+        b = prev.where(both)
+        a = a.sub(a.mean(axis=1), axis=0)
+        b = b.sub(b.mean(axis=1), axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = (a * b).sum(axis=1) / np.sqrt((a * a).sum(axis=1) * (b * b).sum(axis=1))
+        return corr.where(both.sum(axis=1) >= 3)
+
+    def get_summary(self):
+        turnover = self.group_turnover()
+        return pd.Series({
+            "Top Turnover": turnover[f'G{self.groups}'].mean(),
+            "Bottom Turnover": turnover['G1'].mean(),
+            "Rank Autocorr": self.factor_autocorr().mean(),
+        })
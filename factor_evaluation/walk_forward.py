@@ -0,0 +1,322 @@
+# factor_evaluation/walk_forward.py
+"""
+滚动 / 扩展窗口的样本外 (walk-forward) 评估
+
+把交易日历切成若干 (训练窗口, 测试窗口)，每个窗口只用训练窗口的数据拟合，在测试窗口上做样本外 IC 和分层回测：
+
+- 中性化 beta：因子 ~ 风格列 (如 ln_mkt_cap)，训练窗口内逐日去均值后的合并 OLS
+- 合成权重：'equal' / 'ic'（中性化后因子与收益的合并相关系数）/ 'regression'（合并 OLS 系数）；
+  单因子时 'ic' 权重即训练期 IC 的符号（因子方向也在样本外确定）
+- 分层分位点：训练窗口内横截面标准化后的合成得分的分位数（测试期用固定分位点分组，而非每日 qcut）
+
+拟合用到的量都是逐日充分统计量（z'y、X'y、z'z、X'z、X'X）的线性函数：全历史 cumsum 一次，
+任一窗口的统计量 = 两个前缀和之差，后面的窗口不重新拟合、也不重新扫描训练数据。
+分位点从训练窗口中最多 max_cutoff_days 个等间隔日期估计。
+各窗口拟合完成后相互独立，测试窗口的评估在进程池中并行；测试窗口不重叠时总计算量约等于一次全样本评估。
+
+每个窗口的拟合结果（WindowState: betas / weights / cutoffs）保存在 states_ 中，可用 score() 复用到任意日期区间。
+
+用法:
+    wf = WalkForward(panel, ['illiq_guiji', 'panic_factor'], method='ic', neutralize_cols=['ln_mkt_cap'])
+    summary = wf.run(train=252, test=21, mode='rolling', workers=4)
+    wf.ic_series, wf.layer_ret                      # 拼接后的样本外日度 IC / 分层收益
+
+    python run.py --factor_name illiq_guiji --walk_forward --train 252 --test 21
+"""
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from factor_processing.combination import cross_zscore, daily_rank_ic, load_factor_cube, to_grid
+from factor_processing.neutralize import resolve_style
+from utils.calendar import TradingCalendar
+from utils.log import timed
+from utils.parallel import fork_pool
+
+MODES = ('rolling', 'expanding')
+
+# worker 进程中共享的数组（fork 时直接继承）
+_SHARED = None
+
+
+def _init_worker(shared):
+    global _SHARED
+    _SHARED = shared
+
+
+def walk_forward_windows(n_dates: int, train: int = 252, test: int = 21, step: int | None = None,
+                         mode: str = 'rolling', gap: int = 1, min_train: int | None = None) -> list[dict]:
+    """
+    切分训练 / 测试窗口（日期位置，左闭右开）
+
+    参数:
+        train: 训练窗口长度（rolling 时为固定长度，expanding 时为第一个窗口的最短长度）
+        test: 测试窗口长度
+        step: 相邻窗口起点间隔，默认 = test（测试窗口首尾相接、不重叠）
+        gap: 训练窗口结束与测试窗口开始之间空出的天数（前瞻收益的期数，避免训练期用到测试期的收益）
+        min_train: expanding 模式下训练窗口的最短长度，默认 = train
+    返回:
+        [{'train': (start, end), 'test': (start, end)}, ...]
+    """
+    if mode not in MODES:
+        raise ValueError(f"不支持的窗口模式: {mode}，可选: {list(MODES)}")
+    step = step or test
+    min_train = train if min_train is None else min_train
+    windows = []
+    test_start = min_train + gap
+    while test_start < n_dates:
+        train_end = test_start - gap
+        train_start = max(train_end - train, 0) if mode == 'rolling' else 0
+        windows.append({'train': (train_start, train_end), 'test': (test_start, min(test_start + test, n_dates))})
+        test_start += step
+    return windows
+
+
+class WindowState:
+    """一个窗口的拟合结果"""
+
+    def __init__(self, train: tuple, test: tuple, betas: np.ndarray, weights: np.ndarray, cutoffs: np.ndarray):
+        self.train = train        # 训练窗口 (start, end) 日期位置
+        self.test = test          # 测试窗口 (start, end)
+        self.betas = betas        # S × K 中性化系数
+        self.weights = weights    # K 合成权重（按绝对值之和归一化）
+        self.cutoffs = cutoffs    # groups - 1 个内部分位点
+
+    def __repr__(self):
+        return f"WindowState(train={self.train}, test={self.test}, weights={np.round(self.weights, 4)})"
+
+
+def _score(shared: dict, state: WindowState, rows) -> np.ndarray:
+    """用窗口状态计算 rows（日期位置切片或数组）上的合成得分（横截面标准化，无效位置为 NaN）"""
+    z = shared['z'][rows]
+    x = shared['x'][rows]
+    mask = shared['mask'][rows]
+    resid = z - np.einsum('tns,sk->tnk', x, state.betas) if x.shape[2] else z
+    resid = np.where(mask[:, :, None], resid, np.nan)
+    score = cross_zscore(resid) @ state.weights
+    return cross_zscore(score)
+
+
+def _evaluate_window(state: WindowState, groups: int) -> tuple[np.ndarray, np.ndarray]:
+    """测试窗口：日度 Rank IC 与各组 / 多空收益（固定分位点下某组当天为空时，该组及多空收益为 NaN）"""
+    shared = _SHARED
+    t0, t1 = state.test
+    score = _score(shared, state, slice(t0, t1))
+    ret = shared['ret'][t0:t1]
+    ic = daily_rank_ic(score[:, :, None], ret)[:, 0]
+
+    layer = np.full((t1 - t0, groups + 1), np.nan)
+    if np.isfinite(state.cutoffs).all():
+        valid = np.isfinite(score) & np.isfinite(ret)
+        label = np.searchsorted(state.cutoffs, np.where(valid, score, 0.0), side='left')
+        rows = np.broadcast_to(np.arange(t1 - t0)[:, None], score.shape)
+        key = rows[valid] * groups + label[valid]
+        total = np.bincount(key, weights=ret[valid], minlength=(t1 - t0) * groups)
+        count = np.bincount(key, minlength=(t1 - t0) * groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (total / count).reshape(t1 - t0, groups)
+        layer[:, :groups] = mean
+        layer[:, groups] = mean[:, -1] - mean[:, 0]
+    return ic, layer
+
+
+def _evaluate_many(states: list, groups: int) -> list:
+    return [_evaluate_window(s, groups) for s in states]
+
+
+class WalkForward:
+    """
+    样本外滚动评估
+
+    参数:
+        panel: 清洗后的 panel（含前瞻收益列及中性化用到的风格列）
+        factors: 因子库中的因子名列表，或 index=['date', 'code'] 的 DataFrame（每列一个因子）
+        fwd_ret_col: 前瞻收益列
+        horizon: 前瞻收益期数（训练 / 测试之间空出的天数）
+        method: 合成权重 'equal' / 'ic' / 'regression'
+        neutralize_cols: 风格列（如 ['ln_mkt_cap']），用训练窗口的合并 beta 中性化
+        groups: 分层数
+        max_cutoff_days: 估计分位点时从训练窗口中最多抽取的日期数
+    """
+
+    def __init__(self, panel, factors, fwd_ret_col='ret_fwd_1d', horizon=1, method='ic',
+                 neutralize_cols=None, groups=5, max_cutoff_days=60):
+        if method not in ('equal', 'ic', 'regression'):
+            raise ValueError(f"不支持的合成方法: {method}，可选: ['equal', 'ic', 'regression']")
+        if fwd_ret_col not in panel.columns:
+            raise ValueError(f"Panel 中找不到列: {fwd_ret_col}")
+        self.horizon = horizon
+        self.method = method
+        self.groups = groups
+        self.max_cutoff_days = max_cutoff_days
+        self.calendar = TradingCalendar.from_panel(panel)
+        index = panel.index.remove_unused_levels()
+        self.dates, self.codes = self.calendar.dates, index.levels[index.names.index('code')]
+
+        if isinstance(factors, pd.DataFrame):
+            self.factor_names = list(factors.columns)
+            cube = np.stack([to_grid(factors[c], self.dates, self.codes) for c in factors.columns], axis=2)
+            cube = cross_zscore(cube)
+        else:
+            self.factor_names = list(factors)
+            cube = load_factor_cube(self.factor_names, self.dates, self.codes)
+        ret = to_grid(panel[fwd_ret_col], self.dates, self.codes)
+        style = resolve_style(panel, neutralize_cols or [])
+        self.style_names = list(style.columns)
+        x = (np.stack([to_grid(style[c], self.dates, self.codes) for c in style.columns], axis=2)
+             if len(style.columns) else np.zeros(ret.shape + (0,)))
+        self.shared = self._prepare(cube, ret, x)
+        self.states_ = []
+
+    @timed('WalkForward._prepare')
+    def _prepare(self, cube, ret, x) -> dict:
+        """逐日去均值 + 逐日充分统计量的前缀和（整个评估只做一次）"""
+        mask = np.isfinite(ret) & np.isfinite(cube).all(axis=2) & np.isfinite(x).all(axis=2)
+        n = mask.sum(axis=1)
+
+        def demean(values):
+            v = np.where(mask[:, :, None], values, 0.0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mu = v.sum(axis=1, keepdims=True) / n[:, None, None]
+            return np.where(mask[:, :, None], v - np.nan_to_num(mu), 0.0)
+
+        z = demean(cube)
+        xs = demean(x)
+        y = np.nan_to_num(np.where(mask, cross_zscore(np.where(mask, ret, np.nan)), 0.0))
+        daily = {
+            'zy': np.einsum('tnk,tn->tk', z, y),
+            'xy': np.einsum('tns,tn->ts', xs, y),
+            'zz': np.einsum('tnk,tnl->tkl', z, z),
+            'xz': np.einsum('tns,tnk->tsk', xs, z),
+            'xx': np.einsum('tns,tnr->tsr', xs, xs),
+            'yy': (y * y).sum(axis=1),
+            'days': (n > cube.shape[2] + x.shape[2]).astype(float),
+        }
+        prefix = {k: np.concatenate([np.zeros((1,) + v.shape[1:]), np.cumsum(v, axis=0)]) for k, v in daily.items()}
+        return {'z': z, 'x': xs, 'ret': np.where(mask, ret, np.nan), 'mask': mask, 'prefix': prefix}
+
+    # -------- 拟合 --------
+    def _window_stats(self, start: int, end: int) -> dict:
+        p = self.shared['prefix']
+        return {k: v[end] - v[start] for k, v in p.items()}
+
+    def fit_window(self, train: tuple, test: tuple) -> WindowState:
+        """用训练窗口 [start, end) 的充分统计量拟合中性化 beta、合成权重和分位点"""
+        s = self._window_stats(*train)
+        k, n_style = len(self.factor_names), len(self.style_names)
+        betas = np.linalg.pinv(s['xx']) @ s['xz'] if n_style else np.zeros((0, k))
+        # 中性化后 r = z - X·B 的统计量：r'y = z'y - B'X'y，r'r = z'z - B'X'z - z'X·B + B'X'X·B
+        ry = s['zy'] - betas.T @ s['xy']
+        rr = s['zz'] - betas.T @ s['xz'] - s['xz'].T @ betas + betas.T @ s['xx'] @ betas
+
+        if s['days'] < 2:
+            weights = np.full(k, np.nan)
+        elif self.method == 'equal':
+            weights = np.full(k, 1.0 / k)
+        elif self.method == 'ic':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weights = ry / np.sqrt(np.diag(rr) * s['yy'])
+        else:
+            weights = np.linalg.pinv(rr) @ ry
+        total = np.nansum(np.abs(weights))
+        weights = weights / total if total > 0 else np.full(k, np.nan)
+
+        state = WindowState(train, test, betas, weights, np.full(self.groups - 1, np.nan))
+        if np.isfinite(weights).all():
+            start, end = train
+            rows = np.unique(np.linspace(start, end - 1, min(self.max_cutoff_days, end - start)).astype(int))
+            sample = _score(self.shared, state, rows)
+            sample = sample[np.isfinite(sample)]
+            if len(sample) >= self.groups:
+                state.cutoffs = np.quantile(sample, np.linspace(0, 1, self.groups + 1)[1:-1])
+        return state
+
+    def score(self, state: WindowState, start=None, end=None) -> pd.Series:
+        """用某个窗口的拟合结果计算 [start, end] 日期区间的合成得分（复用拟合状态），返回 (date, code) 长表"""
+        rows = self.calendar.slice(start, end)
+        t0, t1, _ = rows.indices(len(self.dates))
+        values = _score(self.shared, state, slice(t0, t1))
+        index = pd.MultiIndex.from_product([self.dates[t0:t1], self.codes], names=['date', 'code'])
+        return pd.Series(values.ravel(), index=index, name='score').dropna()
+
+    # -------- 评估 --------
+    @timed('WalkForward.run')
+    def run(self, train=252, test=21, step=None, mode='rolling', min_train=None, workers=None) -> pd.DataFrame:
+        """
+        运行 walk-forward
+
+        参数:
+            train, test, step, mode, min_train: 见 walk_forward_windows
+            workers: 进程数，默认 CPU 数；1 表示在当前进程中顺序执行
+        返回:
+            DataFrame: 每个窗口一行（训练 / 测试区间、样本外 IC Mean / ICIR / LS Mean、合成权重）；
+            拼接后的样本外序列保存在 self.ic_series（日度 IC）与 self.layer_ret（G1..Gn, Long-Short）
+        """
+        windows = walk_forward_windows(len(self.dates), train, test, step, mode, gap=self.horizon,
+                                       min_train=min_train)
+        if not windows:
+            raise ValueError(f"样本只有 {len(self.dates)} 个交易日，不足以切出训练窗口 {train} + 测试窗口")
+        self.states_ = [self.fit_window(w['train'], w['test']) for w in windows]
+
+        workers = workers or os.cpu_count() or 1
+        pool = fork_pool(_init_worker, (self.shared,), workers if len(self.states_) > 1 else 1)
+        if pool is None:
+            results = _evaluate_many(self.states_, self.groups)
+        else:
+            chunks = [self.states_[i::workers] for i in range(workers)]
+            with pool:
+                parts = list(pool.map(_evaluate_many, chunks, [self.groups] * len(chunks)))
+            results = [None] * len(self.states_)
+            for i, part in enumerate(parts):
+                results[i::workers] = part
+        return self._collect(results)
+
+    def _collect(self, results) -> pd.DataFrame:
+        cols = [f'G{i + 1}' for i in range(self.groups)] + ['Long-Short']
+        rows, ics, layers = [], [], []
+        for state, (ic, layer) in zip(self.states_, results):
+            t0, t1 = state.test
+            dates = self.dates[t0:t1]
+            ic_s = pd.Series(ic, index=dates, name='IC')
+            layer_df = pd.DataFrame(layer, index=dates, columns=cols)
+            ics.append(ic_s)
+            layers.append(layer_df)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                row = {
+                    'Train Start': self.dates[state.train[0]], 'Train End': self.dates[state.train[1] - 1],
+                    'Test Start': dates[0], 'Test End': dates[-1],
+                    'IC Mean': ic_s.mean(),
+                    'ICIR': ic_s.mean() / ic_s.std() if ic_s.std() > 0 else np.nan,
+                    'LS Mean': layer_df['Long-Short'].mean(),
+                }
+            row.update({f'w_{name}': w for name, w in zip(self.factor_names, state.weights)})
+            rows.append(row)
+
+        # step < test 时测试窗口重叠，同一日期保留最新窗口的结果
+        self.ic_series = pd.concat(ics)
+        self.ic_series = self.ic_series[~self.ic_series.index.duplicated(keep='last')]
+        self.layer_ret = pd.concat(layers)
+        self.layer_ret = self.layer_ret[~self.layer_ret.index.duplicated(keep='last')]
+        summary = pd.DataFrame(rows)
+        summary.index.name = 'window'
+        return summary
+
+    def get_summary(self) -> pd.Series:
+        """拼接后的样本外序列的汇总（口径与 ICAnalyzer.get_summary 一致，另加多空收益）"""
+        if not self.states_:
+            raise ValueError("请先调用 run()")
+        ic = self.ic_series.dropna()
+        ls = self.layer_ret['Long-Short'].dropna()
+        ic_std = ic.std()
+        return pd.Series({
+            "IC Mean": ic.mean(),
+            "IC Std": ic_std,
+            "ICIR": ic.mean() / ic_std if ic_std != 0 else 0,
+            "Win Rate (>0)": (ic > 0).sum() / ic.count() if ic.count() else np.nan,
+            "Valid Days": ic.count(),
+            "LS Annual Return": ls.mean() * 252,
+            "Windows": len(self.states_),
+        })
@@ -0,0 +1,149 @@
+# factor_mining/export.py
+"""
+把挖掘出的表达式导出为注册因子
+
+ExpressionFactor 是按表达式计算的 BaseFactor：inputs 为表达式用到的字段，lookback 为表达式的历史长度，
+含横截面算子时 chunk_axis='date'（分块计算时按日期分块），否则为 'code'。
+
+export_factor() 写一个 mined_<hash>.py（hash 取表达式键的 sha1 前 8 位，同一个表达式总是同一个名字），
+模块顶层带 @register_factor。默认写到暂存目录 STAGING_DIR（data/store/mined_factors/，不会被发现），
+检查后用 install_factor() 移入 factors/（或导出时传 install=True），factors/registry.py 扫描源码即可发现，
+之后与手写因子一样使用:
+    python -m factors.registry compute mined_1a2b3c4d
+    python run.py --factor_name mined_1a2b3c4d
+
+用法:
+    name, path = export_factor('cs_rank(ts_std(ts_ret(close, 1), 20))', stats={'IC Mean': 0.03})   # 暂存
+    install_factor(name)
+    get_factor(name).run(panel)
+"""
+import hashlib
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from factor_mining.expression import evaluate, parse
+from factors.base_factor import BaseFactor
+from factors.registry import FACTORS_DIR, discover
+from utils.dense_panel import from_wide, to_wide
+from utils.io import DATA_PATH
+
+PREFIX = 'mined_'
+STAGING_DIR = os.path.join(DATA_PATH, 'store', 'mined_factors')
+
+_TEMPLATE = '''# factors/{name}.py
+"""
+自动挖掘的因子（由 factor_mining 生成）
+
+表达式: {expression}
+{stats}生成时间: {created}
+"""
+from factor_mining.export import ExpressionFactor
+from factors.base_factor import register_factor
+
+
+@register_factor("{name}")
+class {cls}(ExpressionFactor):
+
+    expression = {expression!r}
+
+    def __init__(self, **kwargs):
+        super().__init__(name="{name}", **kwargs)
+'''
+
+
+class ExpressionFactor(BaseFactor):
+    """
+    参数:
+        name: 因子名称
+        expression: 表达式文本（默认取类属性 expression）
+    """
+
+    expression: str | None = None
+
+    def __init__(self, name: str, expression: str | None = None, **kwargs):
+        self.expression = expression or self.expression
+        if not self.expression:
+            raise ValueError("ExpressionFactor 需要表达式")
+        self.expr = parse(self.expression)
+        kwargs.setdefault('lookback', self.expr.span)
+        super().__init__(name=name, **kwargs)
+        self.chunk_axis = 'date' if self.expr.has_cross_section() else 'code'
+
+    @property
+    def inputs(self) -> list[str]:
+        return self.expr.fields()
+
+    def calculate(self, panel: pd.DataFrame) -> pd.Series:
+        if not isinstance(panel.index, pd.MultiIndex) or panel.index.names != ['date', 'code']:
+            raise ValueError("panel 必须是 MultiIndex, 且 index 顺序为 ('date', 'code')")
+        missing = [f for f in self.inputs if f not in panel.columns]
+        if missing:
+            raise ValueError(f"panel 中缺少表达式需要的列: {missing}")
+
+        wides = {f: to_wide(panel[f]) for f in self.inputs}
+        like = next(iter(wides.values()))
+        values = evaluate(self.expr, {f: w.to_numpy(dtype=np.float64) for f, w in wides.items()})
+        result = from_wide(pd.DataFrame(values, index=like.index, columns=like.columns), panel.index)
+
+        # 与手写因子一致：当天无收盘价（如停牌）时因子值为 NaN
+        if 'close' in panel.columns:
+            result = result.where(panel['close'].notna())
+        return result
+
+
+def factor_name(expression: str) -> str:
+    """表达式 → 稳定的因子名 mined_<sha1 前 8 位>（按规范键计算，书写顺序不同的同一表达式同名）"""
+    key = parse(expression).key
+    return PREFIX + hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+
+
+def export_factor(expression: str, name: str | None = None, stats=None, directory: str | None = None,
+                  install: bool = False) -> tuple[str, str]:
+    """
+    写出因子模块；写入 factors/ 时刷新因子发现
+
+    参数:
+        expression: 表达式文本
+        name: 因子名称，默认 factor_name(expression)
+        stats: 写入模块文档字符串的指标（dict / Series，如训练期与验证期 IC）
+        directory: 输出目录，默认暂存目录 STAGING_DIR
+        install: True 时直接写入 factors/（注册为因子）；不能与 directory 同时给出
+    返回:
+        (因子名, 文件路径)
+    """
+    if install and directory is not None:
+        raise ValueError("install=True 时固定写入 factors/，不能再指定 directory")
+    directory = FACTORS_DIR if install else (directory or STAGING_DIR)
+    key = parse(expression).key
+    name = name or factor_name(key)
+    cls = ''.join(part.capitalize() for part in name.split('_')) + 'Factor'
+    lines = ''
+    if stats is not None:
+        lines = ''.join(f"{k}: {v:.4f}\n" if isinstance(v, (float, np.floating)) else f"{k}: {v}\n"
+                        for k, v in dict(stats).items())
+    source = _TEMPLATE.format(name=name, cls=cls, expression=key, stats=lines,
+                              created=time.strftime('%Y-%m-%d %H:%M:%S'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.py')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(source)
+    os.replace(tmp, path)
+    if os.path.abspath(directory) == os.path.abspath(FACTORS_DIR):
+        discover(refresh=True)
+    return name, path
+
+
+def install_factor(name: str, staging: str | None = None) -> str:
+    """把暂存目录（默认 STAGING_DIR）中检查过的因子模块移入 factors/ 并刷新因子发现，返回新路径"""
+    src = os.path.join(staging or STAGING_DIR, f'{name}.py')
+    if not os.path.exists(src):
+        raise FileNotFoundError(f"暂存目录中没有因子: {src}")
+    dst = os.path.join(FACTORS_DIR, f'{name}.py')
+    shutil.move(src, dst)
+    discover(refresh=True)
+    return dst
@@ -0,0 +1,403 @@
+# factor_mining/expression.py
+"""
+因子表达式：panel 字段上的时间序列 / 横截面算子树
+
+表达式的文本形式即其规范键 (key)，例如:
+    cs_rank(ts_mean(div(turnover, market_capitalization), 20))
+    ts_corr(close, volume, 10)
+时间序列算子的最后一个参数是窗口（交易日）。可交换算子 (add / mul) 的参数按键排序，
+因此 add(a, b) 与 add(b, a) 是同一个键，不会被重复计算。
+
+所有算子都在 dates × codes 的二维数组上运算（axis 0 为时间、axis 1 为股票），NaN 传播，±inf 记为 NaN；
+滚动窗口的 min_periods 为窗口的一半（与 factors/illiq_guiji.py 等手写因子一致）。
+
+evaluate(node, fields, cache) 自底向上求值，每个子表达式的结果按键放入 cache；
+不同候选因子共享的子树（如 ts_mean(close, 20)）只计算一次。
+
+用法:
+    expr = parse('cs_rank(ts_std(div(close, delay(close, 1)), 20))')
+    values = evaluate(expr, {'close': close_wide})          # ndarray (dates, codes)
+    expr.fields(), expr.span, expr.size
+"""
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from factor_processing.combination import cross_zscore
+
+# 算子注册表: 名称 -> Operator
+OPERATORS = {}
+
+# 参与运算的 panel 字段
+FIELDS = ['close', 'volume', 'turnover', 'market_capitalization', 'daily_turnover_rate']
+
+COMMUTATIVE = {'add', 'mul'}
+
+# 字段量纲（基本单位 -> 指数），用于剪掉 close + volume 这类量纲不一致的表达式
+FIELD_UNITS = {
+    'close': {'price': 1},
+    'open_price': {'price': 1},
+    'high': {'price': 1},
+    'low': {'price': 1},
+    'volume': {'shares': 1},
+    'turnover': {'money': 1},
+    'market_capitalization': {'money': 1},
+    'daily_turnover_rate': {},
+}
+
+# 输出无量纲的算子（比率、排名、相关系数、对数）
+DIMENSIONLESS = {'ts_ret', 'ts_rank', 'ts_corr', 'cs_rank', 'cs_zscore', 'slog'}
+
+
+class Operator:
+    """
+    参数:
+        name: 算子名
+        arity: 数组参数个数
+        kind: 'ts'（带窗口的时间序列）/ 'cs'（横截面）/ 'elem'（逐元素）
+        func: func(*arrays) 或 func(*arrays, window)
+    """
+
+    def __init__(self, name: str, arity: int, kind: str, func):
+        self.name = name
+        self.arity = arity
+        self.kind = kind
+        self.func = func
+
+
+def register_operator(name: str, arity: int = 1, kind: str = 'elem'):
+    def decorator(func):
+        OPERATORS[name] = Operator(name, arity, kind, func)
+        return func
+    return decorator
+
+
+# =========================
+# 算子实现
+# =========================
+def _clean(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def _rolling(x: np.ndarray, window: int):
+    return pd.DataFrame(x, copy=False).rolling(window, min_periods=max(window // 2, 2))
+
+
+def _shift(x: np.ndarray, periods: int) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    return out
+
+
+@register_operator('abs')
+def _abs(x):
+    return np.abs(x)
+
+
+@register_operator('neg')
+def _neg(x):
+    return -x
+
+
+@register_operator('slog')
+def _slog(x):
+    """符号保持的对数 sign(x)·log(1 + |x|)，压缩成交额、市值等量纲很大的字段"""
+    return np.sign(x) * np.log1p(np.abs(x))
+
+
+@register_operator('add', 2)
+def _add(a, b):
+    return a + b
+
+
+@register_operator('sub', 2)
+def _sub(a, b):
+    return a - b
+
+
+@register_operator('mul', 2)
+def _mul(a, b):
+    return a * b
+
+
+@register_operator('div', 2)
+def _div(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b != 0, a / b, np.nan)
+
+
+@register_operator('delay', 1, 'ts')
+def _delay(x, window):
+    return _shift(x, window)
+
+
+@register_operator('delta', 1, 'ts')
+def _delta(x, window):
+    return x - _shift(x, window)
+
+
+@register_operator('ts_ret', 1, 'ts')
+def _ts_ret(x, window):
+    """window 日变化率 x[t] / x[t-window] - 1"""
+    prev = _shift(x, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prev != 0, x / prev - 1, np.nan)
+
+
+@register_operator('ts_mean', 1, 'ts')
+def _ts_mean(x, window):
+    return _rolling(x, window).mean().to_numpy()
+
+
+@register_operator('ts_sum', 1, 'ts')
+def _ts_sum(x, window):
+    return _rolling(x, window).sum().to_numpy()
+
+
+@register_operator('ts_std', 1, 'ts')
+def _ts_std(x, window):
+    return _rolling(x, window).std().to_numpy()
+
+
+@register_operator('ts_max', 1, 'ts')
+def _ts_max(x, window):
+    return _rolling(x, window).max().to_numpy()
+
+
+@register_operator('ts_min', 1, 'ts')
+def _ts_min(x, window):
+    return _rolling(x, window).min().to_numpy()
+
+
+@register_operator('ts_rank', 1, 'ts')
+def _ts_rank(x, window):
+    """当天值在过去 window 天中的分位"""
+    return _rolling(x, window).rank(pct=True).to_numpy()
+
+
+@register_operator('ts_corr', 2, 'ts')
+def _ts_corr(a, b, window):
+    return _rolling(a, window).corr(pd.DataFrame(b, copy=False)).to_numpy()
+
+
+@register_operator('cs_rank', 1, 'cs')
+def _cs_rank(x):
+    return pd.DataFrame(x, copy=False).rank(axis=1, pct=True).to_numpy()
+
+
+@register_operator('cs_zscore', 1, 'cs')
+def _cs_zscore(x):
+    return cross_zscore(x)
+
+
+# =========================
+# 表达式树
+# =========================
+class Node:
+    """
+    表达式节点：字段 (op='field', name=字段名) 或算子 (op=算子名, children, window)
+
+    节点不可变，key 在构造时确定
+    """
+
+    __slots__ = ('op', 'children', 'window', 'name', 'key', 'depth', 'size', 'span')
+
+    def __init__(self, op: str, children=(), window: int | None = None, name: str | None = None):
+        if op == 'field':
+            self.op, self.children, self.window, self.name = op, (), None, name
+            self.key, self.depth, self.size, self.span = name, 1, 1, 0
+            return
+        if op not in OPERATORS:
+            raise ValueError(f"未知算子: {op}，可选: {sorted(OPERATORS)}")
+        spec = OPERATORS[op]
+        if len(children) != spec.arity:
+            raise ValueError(f"算子 {op} 需要 {spec.arity} 个参数，实际 {len(children)} 个")
+        if (spec.kind == 'ts') != (window is not None):
+            raise ValueError(f"算子 {op} {'需要' if spec.kind == 'ts' else '不接受'}窗口参数")
+        if window is not None and window < 1:
+            raise ValueError(f"窗口必须为正整数: {window}")
+        if op in COMMUTATIVE:
+            children = tuple(sorted(children, key=lambda c: c.key))
+        self.op, self.children, self.window, self.name = op, tuple(children), window, None
+        args = [c.key for c in self.children] + ([str(window)] if window is not None else [])
+        self.key = f"{op}({', '.join(args)})"
+        self.depth = 1 + max(c.depth for c in self.children)
+        self.size = 1 + sum(c.size for c in self.children)
+        # 需要的历史长度（窗口沿路径相加），用作 BaseFactor.lookback
+        self.span = (window or 0) + max(c.span for c in self.children)
+
+    @classmethod
+    def field(cls, name: str) -> 'Node':
+        return cls('field', name=name)
+
+    def __repr__(self):
+        return self.key
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def walk(self):
+        """前序遍历全部子树（含自身）"""
+        yield self
+        for c in self.children:
+            yield from c.walk()
+
+    def fields(self) -> list[str]:
+        return sorted({n.name for n in self.walk() if n.op == 'field'})
+
+    def has_cross_section(self) -> bool:
+        return any(n.op in OPERATORS and OPERATORS[n.op].kind == 'cs' for n in self.walk())
+
+    def replace(self, target: 'Node', new: 'Node') -> 'Node':
+        """把子树 target（按 key 匹配的第一处）替换为 new"""
+        if self.key == target.key:
+            return new
+        for i, c in enumerate(self.children):
+            if target.key in c.key:
+                replaced = c.replace(target, new)
+                if replaced is not c:
+                    children = self.children[:i] + (replaced,) + self.children[i + 1:]
+                    return Node(self.op, children, self.window)
+        return self
+
+
+def unit(node: Node) -> dict | None:
+    """表达式的量纲 {基本单位: 指数}；加减两边量纲不一致时返回 None（无意义的表达式）"""
+    if node.op == 'field':
+        return dict(FIELD_UNITS.get(node.name, {}))
+    units = [unit(c) for c in node.children]
+    if any(u is None for u in units):
+        return None
+    if node.op in DIMENSIONLESS:
+        return {}
+    if node.op in ('add', 'sub'):
+        return units[0] if units[0] == units[1] else None
+    if node.op in ('mul', 'div'):
+        sign = 1 if node.op == 'mul' else -1
+        out = dict(units[0])
+        for base, exp in units[1].items():
+            out[base] = out.get(base, 0) + sign * exp
+        return {b: e for b, e in out.items() if e != 0}
+    return units[0]
+
+
+_TOKEN = re.compile(r'\s*(?:([A-Za-z_][A-Za-z0-9_]*)|(\d+)|([(),]))')
+
+
+def parse(text: str) -> Node:
+    """表达式文本 → Node（文本格式与 Node.key 相同）"""
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"无法解析表达式: {text!r}（位置 {pos}）")
+        tokens.append(m.group(1) or m.group(2) or m.group(3))
+        pos = m.end()
+
+    def node(i):
+        name = tokens[i]
+        if i + 1 >= len(tokens) or tokens[i + 1] != '(':
+            if name in OPERATORS:
+                raise ValueError(f"算子 {name} 缺少参数")
+            return Node.field(name), i + 1
+        i += 2
+        children, window = [], None
+        while True:
+            if tokens[i].isdigit():
+                window = int(tokens[i])
+                i += 1
+            else:
+                child, i = node(i)
+                children.append(child)
+            if tokens[i] == ')':
+                return Node(name, children, window), i + 1
+            if tokens[i] != ',':
+                raise ValueError(f"无法解析表达式: {text!r}")
+            i += 1
+
+    try:
+        root, end = node(0)
+    except IndexError:
+        raise ValueError(f"表达式不完整: {text!r}") from None
+    if end != len(tokens):
+        raise ValueError(f"表达式末尾有多余内容: {text!r}")
+    return root
+
+
+# =========================
+# 求值与子表达式缓存
+# =========================
+class SubexprCache:
+    """
+    子表达式结果的 LRU 缓存（按字节数限额）
+
+    参数:
+        max_mb: 缓存上限（MB），超出时淘汰最久未使用的结果
+    """
+
+    def __init__(self, max_mb: float = 1024):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: np.ndarray):
+        if value.nbytes > self.max_bytes or key in self._data:
+            return
+        self._data[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, old = self._data.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+
+def evaluate(node: Node, fields, cache: SubexprCache | None = None) -> np.ndarray:
+    """
+    参数:
+        node: 表达式
+        fields: {字段名: (dates, codes) 数组}（可以是 memmap）
+        cache: 子表达式缓存，None 为不缓存
+    返回:
+        (dates, codes) float64 数组（缓存中的数组，调用方不要原地修改）
+    """
+    if cache is not None:
+        hit = cache.get(node.key)
+        if hit is not None:
+            return hit
+    if node.op == 'field':
+        if node.name not in fields:
+            raise KeyError(f"缺少字段: {node.name}")
+        values = np.array(fields[node.name], dtype=np.float64)
+    else:
+        args = [evaluate(c, fields, cache) for c in node.children]
+        spec = OPERATORS[node.op]
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            values = spec.func(*args, node.window) if spec.kind == 'ts' else spec.func(*args)
+        values = _clean(values)
+    values.setflags(write=False)
+    if cache is not None:
+        cache.put(node.key, values)
+    return values
@@ -0,0 +1,484 @@
+# factor_mining/search.py
+"""
+因子挖掘：在表达式空间上做遗传规划 (genetic programming) 搜索
+
+1. 数据: panel 的字段与前瞻收益写入磁盘 ArrayStore（data/store/mining，memmap）；
+   进程池的每个 worker 以只读 memmap 打开同一份文件，操作系统页缓存在进程间共享，不复制、不序列化 panel；
+   存储中记录数据指纹（panel 文件的 mtime / 内容 hash），数据被修正后重新写入，而不是沿用旧数组
+2. 搜索: 随机生成初始种群 → 锦标赛选择 → 子树交叉 / 变异（换窗口、换同类算子、替换子树）→ 精英保留，迭代若干代
+   剪枝: 量纲不一致（close + volume）、平凡结构（sub(x, x)、abs(abs(x))、cs_rank(cs_rank(x))）、超过最大深度、
+   键已评估过（可交换算子的参数已规范排序）、只是已有候选套了一层单调变换（slog / cs_rank / cs_zscore / neg，
+   Rank IC 不变）的候选不进入评估
+3. 评估: 只用训练期（前 train_frac 的交易日）的逐日 Rank IC，适应度为 |IC Mean|；
+   覆盖率（有值的单元格占比）低于 min_coverage、或有效 IC 天数少于 min_days 的候选适应度为 -inf
+   （只在少数几天有值的表达式 IC 均值噪声很大，不能靠偶然的高 IC 进入下一代）
+   每个 worker 持有一个子表达式 LRU 缓存，整个搜索过程中保留（跨代复用）；
+   新候选按子树排序后连续分块，共享子树的候选大多落在同一个 worker 上
+4. 选择: 训练期 |IC| ≥ min_ic、验证期 IC 与训练期同号，按训练期 |IC| 从高到低贪心选取，
+   与已选因子的平均截面秩相关 ≥ max_corr 的跳过（每天只在两者都有值的股票上计算，只对有效日期取平均）
+5. 导出: 幸存者先写到暂存目录 data/store/mined_factors/（见 factor_mining/export.py），人工检查后
+   用 --install（或 install_factor）放进 factors/，由 factors/registry.py 自动发现
+
+用法:
+    miner = FactorMiner(store, population=200, generations=5, workers=4)
+    candidates = miner.run()
+    survivors = miner.select(top=10, min_ic=0.02, max_corr=0.7)
+
+    python -m factor_mining.search --population 200 --generations 5 --workers 4 --export
+    python -m factor_mining.search --install --save           # 直接写入 factors/ 并计算保存幸存者
+"""
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from factor_mining.expression import (FIELDS, OPERATORS, Node, SubexprCache, evaluate, parse, unit)
+from factor_processing.combination import daily_rank_ic
+from factor_processing.factor_pipeline import file_fingerprint
+from utils.array_store import ArrayStore
+from utils.io import DATA_PATH, PROCESSED_PATH, RESULTS_PATH
+from utils.log import timed
+from utils.parallel import fork_pool
+
+MINING_STORE = os.path.join(DATA_PATH, 'store', 'mining')
+
+# 叠加两次等于一次的算子
+IDEMPOTENT = {'abs', 'cs_rank', 'cs_zscore'}
+
+# 单调变换：不改变截面排序（neg 只翻转方向），套在根节点上的 Rank IC 与去掉后相同
+MONOTONE = {'slog', 'cs_rank', 'cs_zscore', 'neg'}
+
+RESULT_COLUMNS = ['IC Mean', 'ICIR', 'Days', 'Coverage', 'Size', 'Depth', 'Generation']
+
+# worker 进程中共享的只读数据（memmap 字段、训练期收益、子表达式缓存）
+_SHARED = None
+
+
+def _panel_fingerprint(panel: pd.DataFrame, source: str | None, cached: dict | None = None) -> dict:
+    """
+    数据指纹：给出 source 时为该文件的 mtime / size / 内容 hash（同一文件 mtime 与 size 未变时复用 cached 的 hash），
+    否则为 panel 内容的 hash
+    """
+    if source is not None:
+        source = os.path.abspath(source)
+        cached = cached if cached and cached.get('source') == source else None
+        return {'source': source, **file_fingerprint(source, cached)}
+    digest = hashlib.blake2b(pd.util.hash_pandas_object(panel, index=True).to_numpy().tobytes(), digest_size=16)
+    return {'hash': digest.hexdigest()}
+
+
+def build_store(panel: pd.DataFrame, path: str = MINING_STORE, fields=FIELDS,
+                ret_col: str = 'ret_fwd_1d', source: str | None = None) -> ArrayStore:
+    """
+    把挖掘需要的字段写入 ArrayStore；已有且日期 / 股票 / 字段与数据指纹都一致时直接复用
+
+    参数:
+        source: panel 的来源文件；给出时按文件指纹判断（同 factor_pipeline 的缓存），否则对 panel 内容做 hash
+    """
+    needed = list(fields) + [ret_col]
+    missing = [f for f in needed if f not in panel.columns]
+    if missing:
+        raise ValueError(f"Panel 中找不到列: {missing}")
+    stored = {}
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        store = ArrayStore(path)
+        stored = store.info.get('fingerprint', {})
+    fingerprint = _panel_fingerprint(panel[needed], source, stored)
+    if stored and stored.get('hash') == fingerprint['hash']:
+        index = panel.index.remove_unused_levels()
+        if (set(needed).issubset(store.fields)
+                and store.dates.equals(pd.DatetimeIndex(index.levels[index.names.index('date')]))
+                and store.codes.equals(index.levels[index.names.index('code')])):
+            if fingerprint != stored:          # 只是 touch 过：记录新的 mtime
+                store.set_info(fingerprint=fingerprint)
+            return store
+    store = ArrayStore.from_panel(panel, path, fields=needed)
+    store.set_info(fingerprint=fingerprint)
+    return store
+
+
+# =========================
+# worker
+# =========================
+def _init_worker(store_path: str, n_train: int, ret_col: str, min_stocks: int, min_coverage: float,
+                 min_days: int, cache_mb: float):
+    global _SHARED
+    store = ArrayStore(store_path)
+    rows = slice(0, n_train)
+    # 训练期最后一天的前瞻收益用到了验证期第一天的价格，不参与 IC
+    ret = np.array(store.array(ret_col)[:max(n_train - 1, 0)], dtype=np.float64)
+    _SHARED = {
+        'fields': {f: store.array(f)[rows] for f in store.fields if f != ret_col},
+        'ret': ret,
+        'min_stocks': min_stocks,
+        'min_coverage': min_coverage,
+        'min_days': min_days,
+        'cache': SubexprCache(cache_mb),
+    }
+
+
+def _fitness(values: np.ndarray, ret: np.ndarray, min_stocks: int, min_coverage: float, min_days: int = 2) -> dict:
+    """逐日 Rank IC 的均值与 ICIR；覆盖率不足或有效 IC 天数少于 min_days（至少 2）时 IC Mean 为 NaN"""
+    values = values[:len(ret)]
+    valid = np.isfinite(ret)
+    coverage = np.isfinite(values)[valid].mean() if valid.any() else 0.0
+    out = {'IC Mean': np.nan, 'ICIR': np.nan, 'Days': 0, 'Coverage': coverage}
+    if coverage < min_coverage:
+        return out
+    ic = daily_rank_ic(values[:, :, None], ret, min_stocks)[:, 0]
+    ic = ic[np.isfinite(ic)]
+    out['Days'] = len(ic)
+    if len(ic) >= max(min_days, 2):
+        std = ic.std(ddof=1)
+        out.update({'IC Mean': ic.mean(), 'ICIR': ic.mean() / std if std > 0 else np.nan})
+    return out
+
+
+def _score_batch(keys: list[str]) -> tuple[list[dict], int, int]:
+    """评估一批表达式，返回 (结果, 缓存命中数, 未命中数)"""
+    s = _SHARED
+    cache = s['cache']
+    hits, misses = cache.hits, cache.misses
+    results = []
+    for key in keys:
+        values = evaluate(parse(key), s['fields'], cache)
+        results.append(_fitness(values, s['ret'], s['min_stocks'], s['min_coverage'], s['min_days']))
+    return results, cache.hits - hits, cache.misses - misses
+
+
+# =========================
+# 搜索
+# =========================
+def _is_trivial(node: Node) -> bool:
+    for n in node.walk():
+        if len(n.children) == 2 and n.children[0].key == n.children[1].key:
+            return True
+        if len(n.children) == 1 and n.children[0].op == n.op and n.op in IDEMPOTENT | {'neg'}:
+            return True
+    return False
+
+
+def rank_key(node: Node) -> str:
+    """去掉根部单调变换后的键：rank_key 相同的表达式 |Rank IC| 相同，只评估一个"""
+    while node.op in MONOTONE:
+        node = node.children[0]
+    return node.key
+
+
+class FactorMiner:
+    """
+    参数:
+        store: build_store() 建立的 ArrayStore
+        fields: 参与搜索的字段
+        ret_col: 前瞻收益字段
+        train_frac: 训练期占全部交易日的比例（之后为验证期）
+        windows: 时间序列算子可选的窗口
+        max_depth: 表达式最大深度
+        population: 每代种群大小
+        generations: 迭代代数
+        elite: 每代直接保留的精英比例
+        tournament: 锦标赛规模
+        p_crossover: 交叉概率（其余为变异）
+        min_stocks: 当天有效股票少于此数则不计算 IC
+        min_coverage: 训练期有值单元格占比下限
+        min_days: 训练期有效 IC 天数下限；< 1 时为占训练期交易日的比例，不达标的候选适应度为 -inf
+        workers: 进程数，None 为 CPU 核数，<= 1 时在主进程中顺序评估
+        cache_mb: 每个 worker 的子表达式缓存上限
+        seed: 随机种子
+    """
+
+    def __init__(self, store: ArrayStore, fields=FIELDS, ret_col='ret_fwd_1d', train_frac=0.7,
+                 windows=(5, 10, 20, 60), max_depth=4, population=200, generations=5, elite=0.1,
+                 tournament=5, p_crossover=0.6, min_stocks=10, min_coverage=0.5, min_days=0.5, workers=None,
+                 cache_mb=1024, seed=0):
+        missing = [f for f in list(fields) + [ret_col] if f not in store.fields]
+        if missing:
+            raise ValueError(f"存储中缺少字段: {missing}")
+        if not 0 < train_frac <= 1:
+            raise ValueError(f"train_frac 必须在 (0, 1] 之间: {train_frac}")
+        self.store = store
+        self.fields = list(fields)
+        self.ret_col = ret_col
+        self.n_train = int(len(store.dates) * train_frac)
+        self.windows = list(windows)
+        self.max_depth = max_depth
+        self.population = population
+        self.generations = generations
+        self.n_elite = max(1, int(population * elite))
+        self.tournament = tournament
+        self.p_crossover = p_crossover
+        self.min_stocks = min_stocks
+        self.min_coverage = min_coverage
+        # 训练期最后一天的前瞻收益不参与 IC，可用日期为 n_train - 1
+        self.min_days = int(np.ceil(min_days * max(self.n_train - 1, 0))) if min_days < 1 else int(min_days)
+        self.workers = os.cpu_count() if workers is None else workers
+        self.cache_mb = cache_mb
+        self.rng = np.random.default_rng(seed)
+        self.scores = {}          # key -> 结果 dict
+        self.nodes = {}           # key -> Node
+        self.rank_keys = set()    # 已进入种群的 rank_key
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # 每类算子按参数个数分组，变异时换同类算子
+        self._ops = [op for op in OPERATORS.values()]
+        self._similar = {op.name: [o.name for o in self._ops if (o.arity, o.kind) == (op.arity, op.kind)]
+                         for op in self._ops}
+
+    # -------- 生成与变异 --------
+    def _valid(self, node: Node) -> bool:
+        return node.depth <= self.max_depth and not _is_trivial(node) and unit(node) is not None
+
+    def random_tree(self, depth: int) -> Node:
+        if depth <= 1 or self.rng.random() < 0.2:
+            return Node.field(self.fields[self.rng.integers(len(self.fields))])
+        op = self._ops[self.rng.integers(len(self._ops))]
+        children = [self.random_tree(depth - 1) for _ in range(op.arity)]
+        window = int(self.rng.choice(self.windows)) if op.kind == 'ts' else None
+        return Node(op.name, children, window)
+
+    def _random_valid(self, depth: int, tries: int = 50) -> Node | None:
+        for _ in range(tries):
+            node = self.random_tree(depth)
+            if self._valid(node) and node.op != 'field':
+                return node
+        return None
+
+    def _subtrees(self, node: Node) -> list[Node]:
+        return list(node.walk())
+
+    def crossover(self, a: Node, b: Node) -> Node:
+        """a 中随机一棵子树替换为 b 中随机一棵子树"""
+        sa, sb = self._subtrees(a), self._subtrees(b)
+        return a.replace(sa[self.rng.integers(len(sa))], sb[self.rng.integers(len(sb))])
+
+    def mutate(self, node: Node) -> Node:
+        """随机选一棵子树：换窗口 / 换同类算子 / 替换为新的随机子树"""
+        subs = self._subtrees(node)
+        target = subs[self.rng.integers(len(subs))]
+        choice = self.rng.random()
+        if target.op != 'field' and choice < 0.6:
+            if target.window is not None and choice < 0.3:
+                new = Node(target.op, target.children, int(self.rng.choice(self.windows)))
+            else:
+                similar = self._similar[target.op]
+                op = similar[self.rng.integers(len(similar))]
+                new = Node(op, target.children, target.window)
+            return node.replace(target, new)
+        new = self.random_tree(self.rng.integers(1, 3) + 1)
+        return node.replace(target, new)
+
+    def _tournament(self, ranked: list[str]) -> Node:
+        pick = self.rng.choice(len(ranked), size=min(self.tournament, len(ranked)), replace=False)
+        return self.nodes[ranked[pick.min()]]     # ranked 已按适应度从高到低排序
+
+    def _fitness_of(self, key: str) -> float:
+        ic = self.scores[key]['IC Mean']
+        return abs(ic) if np.isfinite(ic) else -np.inf
+
+    # -------- 评估 --------
+    def _pool(self):
+        args = (self.store.path, self.n_train, self.ret_col, self.min_stocks, self.min_coverage, self.min_days,
+                self.cache_mb)
+        return fork_pool(_init_worker, args, self.workers)
+
+    def _evaluate(self, pool, nodes: list[Node], generation: int):
+        """评估尚未评估过的候选；按子树键排序后连续分块，共享子树的候选尽量落到同一个 worker"""
+        new = sorted({n.key: n for n in nodes if n.key not in self.scores}.values(),
+                     key=lambda n: ([c.key for c in n.children], n.key))
+        if not new:
+            return
+        keys = [n.key for n in new]
+        if pool is None:
+            batches = [keys]
+            outputs = [_score_batch(keys)]
+        else:
+            n_chunks = min(len(keys), self.workers * 4)
+            batches = [list(b) for b in np.array_split(np.array(keys, dtype=object), n_chunks)]
+            outputs = list(pool.map(_score_batch, batches))
+        for batch, (results, hits, misses) in zip(batches, outputs):
+            self.cache_hits += hits
+            self.cache_misses += misses
+            for key, result in zip(batch, results):
+                node = self.nodes[key]
+                self.scores[key] = {**result, 'Size': node.size, 'Depth': node.depth, 'Generation': generation}
+
+    @timed('FactorMiner.run')
+    def run(self) -> pd.DataFrame:
+        """
+        返回:
+            全部评估过的候选 DataFrame(index=表达式, columns=RESULT_COLUMNS)，按训练期 |IC Mean| 降序
+        """
+        pool = self._pool()
+        try:
+            population = []
+            seen = set()
+            attempts = 0
+            while len(population) < self.population and attempts < self.population * 20:
+                attempts += 1
+                node = self._random_valid(self.rng.integers(2, self.max_depth + 1))
+                if node is not None and rank_key(node) not in seen:
+                    seen.add(rank_key(node))
+                    population.append(node)
+            self.rank_keys |= seen
+            self.nodes.update({n.key: n for n in population})
+
+            for gen in range(self.generations):
+                start = time.perf_counter()
+                self._evaluate(pool, population, gen)
+                ranked = sorted({n.key for n in population}, key=self._fitness_of, reverse=True)
+                best = self.scores[ranked[0]]
+                print(f"第 {gen + 1}/{self.generations} 代: 已评估 {len(self.scores)} 个表达式，"
+                      f"最优 |IC| = {abs(best['IC Mean']):.4f} {ranked[0]}，用时 {time.perf_counter() - start:.1f} s")
+                if gen == self.generations - 1:
+                    break
+
+                children = [self.nodes[k] for k in ranked[:self.n_elite]]
+                keys = set(ranked[:self.n_elite])
+                attempts = 0
+                while len(children) < self.population and attempts < self.population * 20:
+                    attempts += 1
+                    parent = self._tournament(ranked)
+                    if self.rng.random() < self.p_crossover:
+                        child = self.crossover(parent, self._tournament(ranked))
+                    else:
+                        child = self.mutate(parent)
+                    if child.key in keys or child.op == 'field' or not self._valid(child):
+                        continue
+                    if child.key not in self.nodes and rank_key(child) in self.rank_keys:
+                        continue
+                    keys.add(child.key)
+                    self.rank_keys.add(rank_key(child))
+                    self.nodes.setdefault(child.key, child)
+                    children.append(self.nodes[child.key])
+                population = children
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        table = pd.DataFrame.from_dict(self.scores, orient='index')[RESULT_COLUMNS]
+        table.index.name = 'expression'
+        order = table['IC Mean'].abs().fillna(0).sort_values(ascending=False, kind='stable').index
+        self.candidates_ = table.loc[order]
+        return self.candidates_
+
+    @property
+    def cache_hit_rate(self) -> float:
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else np.nan
+
+    # -------- 选择 --------
+    def _full_values(self, node: Node, cache: SubexprCache) -> np.ndarray:
+        fields = {f: self.store.array(f) for f in node.fields()}
+        return evaluate(node, fields, cache)
+
+    def _rank_corr(self, a: np.ndarray, b: np.ndarray) -> float:
+        """
+        平均截面秩相关：每天只在两个因子都有值的股票上计算 Spearman，
+        只对共同有值的股票不少于 min_stocks 的日期取平均（预热期等无数据的日期不计入）；没有这样的日期时为 NaN
+        """
+        corr = daily_rank_ic(a[:, :, None], b, self.min_stocks)[:, 0]
+        corr = corr[np.isfinite(corr)]
+        return corr.mean() if len(corr) else np.nan
+
+    @timed('FactorMiner.select')
+    def select(self, top: int = 10, min_ic: float = 0.02, max_corr: float = 0.7,
+               corr_step: int = 5) -> pd.DataFrame:
+        """
+        从候选中选出幸存者
+
+        参数:
+            top: 最多保留的因子数
+            min_ic: 训练期 |IC Mean| 下限
+            max_corr: 与已选因子的平均截面秩相关上限（训练期每 corr_step 天取一天计算）
+        返回:
+            DataFrame(index=表达式): 训练期与验证期 IC / ICIR
+        """
+        if not hasattr(self, 'candidates_'):
+            raise ValueError("请先调用 run()")
+        pool = self.candidates_[self.candidates_['IC Mean'].abs() >= min_ic]
+        ret = np.asarray(self.store.array(self.ret_col), dtype=np.float64)
+        n_valid = len(ret) - self.n_train
+        cache = SubexprCache(self.cache_mb)
+        rows = slice(0, self.n_train, corr_step)
+
+        chosen, sampled = [], []
+        for key, row in pool.iterrows():
+            if len(chosen) >= top:
+                break
+            values = self._full_values(self.nodes.get(key) or parse(key), cache)
+            valid = {'Valid IC Mean': np.nan, 'Valid ICIR': np.nan}
+            if n_valid > 1:
+                stats = _fitness(values[self.n_train:], ret[self.n_train:], self.min_stocks, 0.0)
+                valid = {'Valid IC Mean': stats['IC Mean'], 'Valid ICIR': stats['ICIR']}
+                if not np.sign(valid['Valid IC Mean']) == np.sign(row['IC Mean']):
+                    continue
+            sample = values[rows]
+            if any(abs(self._rank_corr(sample, other)) >= max_corr for other in sampled):
+                continue
+            chosen.append({'expression': key, 'IC Mean': row['IC Mean'], 'ICIR': row['ICIR'], **valid,
+                           'Coverage': row['Coverage'], 'Size': int(row['Size'])})
+            sampled.append(sample)
+
+        self.survivors_ = pd.DataFrame(chosen, columns=['expression', 'IC Mean', 'ICIR', 'Valid IC Mean',
+                                                        'Valid ICIR', 'Coverage', 'Size']).set_index('expression')
+        return self.survivors_
+
+
+def main():
+    from factor_mining.export import export_factor
+
+    parser = argparse.ArgumentParser(description="表达式因子挖掘（遗传规划）")
+    parser.add_argument('--population', type=int, default=200)
+    parser.add_argument('--generations', type=int, default=5)
+    parser.add_argument('--max_depth', type=int, default=4)
+    parser.add_argument('--train_frac', type=float, default=0.7, help='训练期占全部交易日的比例')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache_mb', type=float, default=1024, help='每个 worker 的子表达式缓存上限')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--min_ic', type=float, default=0.02)
+    parser.add_argument('--max_corr', type=float, default=0.7)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--store', type=str, default=MINING_STORE)
+    parser.add_argument('--min_days', type=float, default=0.5, help='训练期有效 IC 天数下限（< 1 为比例）')
+    parser.add_argument('--export', action='store_true', help='把幸存者导出到暂存目录（不注册）')
+    parser.add_argument('--install', action='store_true', help='把幸存者直接导出为 factors/mined_*.py')
+    parser.add_argument('--save', action='store_true', help='计算幸存者并保存到因子库（需要 --install）')
+    args = parser.parse_args()
+    if args.save and not args.install:
+        parser.error("--save 需要先用 --install 把幸存者注册为因子")
+
+    panel_file = os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl')
+    panel = pd.read_pickle(panel_file)
+    store = build_store(panel, args.store, source=panel_file)
+    miner = FactorMiner(store, train_frac=args.train_frac, max_depth=args.max_depth, population=args.population,
+                        generations=args.generations, min_days=args.min_days, workers=args.workers,
+                        cache_mb=args.cache_mb, seed=args.seed)
+    print(f"训练期 {store.dates[0].date()} ~ {store.dates[miner.n_train - 1].date()}，"
+          f"{len(store.codes)} 只股票，{miner.workers} 个进程")
+    candidates = miner.run()
+    print(f"\n共评估 {len(candidates)} 个表达式，子表达式缓存命中率 {miner.cache_hit_rate:.1%}")
+    survivors = miner.select(top=args.top, min_ic=args.min_ic, max_corr=args.max_corr)
+    with pd.option_context('display.width', 250, 'display.max_columns', 20, 'display.max_colwidth', 100):
+        print(f"\n幸存 {len(survivors)} 个:")
+        print(survivors)
+
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    candidates.to_csv(os.path.join(RESULTS_PATH, 'mining_candidates.csv'))
+    survivors.to_csv(os.path.join(RESULTS_PATH, 'mining_survivors.csv'))
+    print(f"结果已保存至: {RESULTS_PATH}")
+
+    if args.export or args.install:
+        from factors.base_factor import get_factor
+        from utils.io import save_factor
+        for expr, row in survivors.iterrows():
+            name, path = export_factor(expr, stats=row, install=args.install)
+            print(f"导出因子 {name}: {path}")
+            if args.save:
+                save_factor(get_factor(name).run(panel), name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# factor_processing/combination.py
+"""
+多因子合成
+
+1. 对齐：因子库中的 K 个因子一次性对齐成 dates × codes × factors 的三维数组（横截面 zscore）
+2. 权重：
+   - equal:      等权
+   - ic:         过去 lookback 日 Rank IC 均值
+   - icir:       过去 lookback 日 Rank IC 均值 / 标准差
+   - regression: 过去 lookback 日的横截面回归 ret ~ 因子 的合并 OLS 系数
+   滚动估计全部基于充分统计量的累加和（IC、IC²、X'X、X'y 的 cumsum），
+   每个日期的窗口统计 = 两个前缀和之差，不对每个日期重新拟合。
+3. 合成：composite_t = Σ_k w_t,k · z_t,k
+
+避免未来函数：t 日的权重只使用 t - horizon 及之前日期的 IC / 回归统计量
+（ret_fwd_1d 在 t+1 日收盘才已知，故 horizon 默认 1）。
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.dense_panel import DenseLayout
+from utils.io import load_factor
+
+METHODS = ('equal', 'ic', 'icir', 'regression')
+
+
+# =========================
+# 对齐
+# =========================
+def to_grid(series: pd.Series, dates: pd.Index, codes: pd.Index) -> np.ndarray:
+    """(date, code) 长表 → dates × codes 的二维数组（用 MultiIndex 的 levels / codes 定位，不做 unstack）"""
+    layout = DenseLayout.of(series)
+    if layout is not None and layout.dates.equals(dates) and layout.codes.equals(codes):
+        return layout.to_grid(series.to_numpy(dtype=np.float64)).copy()
+    index = series.index
+    d, c = index.names.index('date'), index.names.index('code')
+    rows = dates.get_indexer(index.levels[d])[index.codes[d]]
+    cols = codes.get_indexer(index.levels[c])[index.codes[c]]
+    ok = (rows >= 0) & (cols >= 0)
+    out = np.full((len(dates), len(codes)), np.nan)
+    out[rows[ok], cols[ok]] = series.to_numpy(dtype=np.float64)[ok]
+    return out
+
+
+def from_grid(values: np.ndarray, dates: pd.Index, codes: pd.Index, index: pd.MultiIndex,
+              name: str | None = None) -> pd.Series:
+    """dates × codes 二维数组 → 按 index 取值的长表（index 外的位置为 NaN）"""
+    layout = DenseLayout.of(index)
+    if layout is not None and layout.dates.equals(dates) and layout.codes.equals(codes):
+        return layout.from_grid(values, name=name)
+    d, c = index.names.index('date'), index.names.index('code')
+    rows = dates.get_indexer(index.levels[d])[index.codes[d]]
+    cols = codes.get_indexer(index.levels[c])[index.codes[c]]
+    ok = (rows >= 0) & (cols >= 0)
+    out = np.full(len(index), np.nan)
+    out[ok] = values[rows[ok], cols[ok]]
+    return pd.Series(out, index=index, name=name)
+
+
+def cross_zscore(values: np.ndarray) -> np.ndarray:
+    """沿股票轴 (axis=1) 做横截面标准化，支持 T×N 或 T×N×K"""
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mu = np.nanmean(values, axis=1, keepdims=True)
+        sigma = np.nanstd(values, axis=1, ddof=1, keepdims=True)
+        return np.where(sigma > 0, (values - mu) / sigma, np.nan)
+
+
+def load_factor_cube(names: list[str], dates: pd.Index, codes: pd.Index) -> np.ndarray:
+    """
+    从因子库读取多个因子并对齐到同一网格
+
+    返回:
+        np.ndarray: dates × codes × len(names)，已做横截面 zscore
+    """
+    cube = np.full((len(dates), len(codes), len(names)), np.nan)
+    for k, name in enumerate(names):
+        df = load_factor(name)
+        col = df[name] if name in df.columns else df.iloc[:, 0]
+        cube[:, :, k] = to_grid(col, dates, codes)
+    return cross_zscore(cube)
+
+
+# =========================
+# IC / 回归的逐日统计量
+# =========================
+def _rank_rows(values: np.ndarray) -> np.ndarray:
+    """按行排名（NaN 保持 NaN，并列取平均名次）"""
+    return pd.DataFrame(values).rank(axis=1).to_numpy()
+
+
+def daily_rank_ic(cube: np.ndarray, ret: np.ndarray, min_stocks: int = 10) -> np.ndarray:
+    """
+    每个因子的逐日 Rank IC
+
+    参数:
+        cube: T × N × K 因子值
+        ret: T × N 前瞻收益
+    返回:
+        T × K，有效股票少于 min_stocks 的日期为 NaN
+    """
+    t, _, k = cube.shape
+    ic = np.full((t, k), np.nan)
+    for j in range(k):
+        mask = np.isfinite(cube[:, :, j]) & np.isfinite(ret)
+        fx = _rank_rows(np.where(mask, cube[:, :, j], np.nan))
+        ry = _rank_rows(np.where(mask, ret, np.nan))
+        n = mask.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)   # 全空的日期
+            fx = fx - np.nanmean(fx, axis=1, keepdims=True)
+            ry = ry - np.nanmean(ry, axis=1, keepdims=True)
+            cov = np.nansum(fx * ry, axis=1)
+            corr = cov / np.sqrt(np.nansum(fx * fx, axis=1) * np.nansum(ry * ry, axis=1))
+        ic[:, j] = np.where(n >= min_stocks, corr, np.nan)
+    return ic
+
+
+def _window_sum(stat: np.ndarray, lookback: int, horizon: int) -> np.ndarray:
+    """
+    rolling 窗口和（增量）：第 t 行 = stat[t-horizon-lookback+1 : t-horizon+1] 之和
+    由一次 cumsum 得到全部日期，NaN 记为 0
+    """
+    csum = np.cumsum(np.nan_to_num(stat), axis=0)
+    csum = np.concatenate([np.zeros((1,) + stat.shape[1:]), csum], axis=0)
+    t = np.arange(stat.shape[0])
+    end = np.clip(t - horizon + 1, 0, stat.shape[0])
+    start = np.clip(end - lookback, 0, None)
+    return csum[end] - csum[start]
+
+
+def combination_weights(cube: np.ndarray, ret: np.ndarray | None = None, method: str = 'ic',
+                        lookback: int = 60, horizon: int = 1, min_periods: int | None = None) -> np.ndarray:
+    """
+    逐日合成权重
+
+    参数:
+        cube: T × N × K 因子值（已标准化）
+        ret: T × N 前瞻收益，method != 'equal' 时需要
+        method: 'equal' / 'ic' / 'icir' / 'regression'
+        lookback: 滚动估计窗口（交易日）
+        horizon: 前瞻收益的期数，t 日只用 t - horizon 及之前的统计量
+        min_periods: 窗口内最少有效日期数，默认 lookback // 2
+    返回:
+        T × K 权重（按绝对值之和归一化）；样本不足的日期为 NaN
+    """
+    if method not in METHODS:
+        raise ValueError(f"不支持的合成方法: {method}，可选: {list(METHODS)}")
+    t, _, k = cube.shape
+    if method == 'equal':
+        return np.full((t, k), 1.0 / k)
+    if ret is None:
+        raise ValueError(f"合成方法 {method} 需要前瞻收益 ret")
+    min_periods = lookback // 2 if min_periods is None else min_periods
+
+    if method in ('ic', 'icir'):
+        ic = daily_rank_ic(cube, ret)
+        n = _window_sum(np.isfinite(ic).astype(float), lookback, horizon)
+        s1 = _window_sum(ic, lookback, horizon)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = s1 / n
+            raw = mean
+            if method == 'icir':
+                s2 = _window_sum(ic * ic, lookback, horizon)
+                std = np.sqrt(np.maximum(s2 / n - mean ** 2, 0.0) * n / (n - 1))
+                raw = mean / std
+        raw = np.where(n >= max(min_periods, 2), raw, np.nan)
+    else:
+        # 逐日横截面的 X'X (K×K) 与 X'y (K)，窗口内求和后解正规方程（合并 OLS）
+        mask = np.isfinite(ret) & np.isfinite(cube).all(axis=2)
+        x = np.where(mask[:, :, None], cube, 0.0)
+        y = np.where(mask, cross_zscore(np.where(mask, ret, np.nan)), 0.0)
+        y = np.nan_to_num(y)
+        xtx = np.einsum('tnk,tnl->tkl', x, x)
+        xty = np.einsum('tnk,tn->tk', x, y)
+        valid_day = (mask.sum(axis=1) > k).astype(float)
+        n = _window_sum(valid_day[:, None], lookback, horizon)[:, 0]
+        sxx = _window_sum(xtx, lookback, horizon)
+        sxy = _window_sum(xty, lookback, horizon)
+        raw = np.einsum('tkl,tl->tk', np.linalg.pinv(sxx), sxy)
+        raw[n < max(min_periods, 1)] = np.nan
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = np.nansum(np.abs(raw), axis=1, keepdims=True)
+        return np.where(total > 0, raw / total, np.nan)
+
+
+def combine(cube: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    composite_t = Σ_k w_t,k · z_t,k
+
+    某只股票缺失部分因子时，只用其已有因子并按已有因子的权重绝对值重新归一化；全部缺失为 NaN
+    """
+    present = np.isfinite(cube)
+    w = np.where(present, weights[:, None, :], 0.0)
+    w = np.nan_to_num(w)
+    scale = np.abs(w).sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = (np.where(present, cube, 0.0) * w).sum(axis=2) / scale
+    return np.where(scale > 0, out, np.nan)
@@ -0,0 +1,575 @@
+# factor_processing/factor_pipeline.py
+"""
+因子流水线编排器（DAG）
+
+把原来手工依次运行的脚本
+    preprocess/load_data.py → validate_data.py → align_data.py → clean_data.py → calcu_factor.py → run.py
+组织成一个有向无环图：
+- 每个 Stage 声明自己依赖的上游 Stage、读取的外部文件 (inputs) 和写出的文件 (outputs)
+- 输入（外部文件 + 上游输出 + 参数 + 代码文件）未变化且输出仍在时，直接跳过该 Stage
+  文件是否变化先比较 mtime/size，变了再比较内容 hash（仅 touch 过的文件不会触发重算）
+- 代码文件由 Stage 函数的 import 闭包自动得出（静态解析 import 语句，含函数内的延迟 import，只取仓库内的文件），
+  不需要手工维护；按名称动态加载、不会被 import 的文件（如因子插件）通过 code= 补充
+- 同一进程内上游结果直接保存在内存中传给下游；被跳过的上游只有在下游真正需要时才从磁盘读取
+- 互不依赖的 Stage（如多个因子）并行执行
+
+用法:
+    python -m factor_processing.factor_pipeline
+    python -m factor_processing.factor_pipeline --factors illiq_guiji panic_factor --workers 4
+    python -m factor_processing.factor_pipeline --force          # 忽略缓存全部重算
+"""
+import argparse
+import ast
+import hashlib
+import inspect
+import json
+import os
+import textwrap
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from utils.io import DATA_PATH, INTERIM_PATH, ROOT, PROCESSED_PATH, RAW_PATH, RESULTS_PATH, factor_file, save_factor
+
+CACHE_FILE = os.path.join(DATA_PATH, '.pipeline_cache.json')
+
+
+# =========================
+# 文件指纹（mtime + 内容 hash）
+# =========================
+def _hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_fingerprint(path: str, cached: dict | None = None) -> dict | None:
+    """
+    返回文件指纹 {'mtime': ..., 'size': ..., 'hash': ...}，文件不存在返回 None
+    如果 mtime 和 size 与 cached 一致，直接复用 cached 的 hash，不重新读文件
+    """
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    if cached and cached.get('mtime') == st.st_mtime_ns and cached.get('size') == st.st_size:
+        return cached
+    return {'mtime': st.st_mtime_ns, 'size': st.st_size, 'hash': _hash_file(path)}
+
+
+def _digest(obj) -> str:
+    return hashlib.blake2b(json.dumps(obj, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+# =========================
+# 代码指纹（import 闭包）
+# =========================
+_IMPORTS_CACHE: dict[str, tuple] = {}    # 源文件 -> ((mtime, size, root), import 到的文件)
+
+
+def _module_file(name: str, root: str) -> str | None:
+    """模块名 → root 下的源文件（包取 __init__.py）；不在 root 下（标准库、第三方库）返回 None"""
+    base = os.path.join(root, *name.split('.'))
+    for path in (base + '.py', os.path.join(base, '__init__.py')):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _package(path: str, root: str) -> str:
+    """源文件所在的包名（用于解析相对 import）"""
+    rel = os.path.relpath(os.path.dirname(path), root)
+    return '' if rel == '.' else rel.replace(os.sep, '.')
+
+
+def _imported_modules(nodes, package: str) -> list[str]:
+    """import 语句 → 模块名；from a import b 时 b 也可能是子模块 a.b，两者都列出（解析不到的会被忽略）"""
+    names = []
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            names += [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            mod = node.module or ''
+            if node.level:
+                parts = package.split('.') if package else []
+                parts = parts[:len(parts) - node.level + 1]
+                mod = '.'.join(p for p in parts + [mod] if p)
+            names += [mod] + [f'{mod}.{a.name}' if mod else a.name for a in node.names]
+    return [n for n in names if n]
+
+
+def _resolve(modules, root: str) -> list[str]:
+    """模块名 → root 下的文件；a.b.c 同时包含 a、a.b 的 __init__.py（import 时会执行）"""
+    files = set()
+    for name in modules:
+        parts = name.split('.')
+        for i in range(1, len(parts) + 1):
+            path = _module_file('.'.join(parts[:i]), root)
+            if path:
+                files.add(path)
+    return sorted(files)
+
+
+def _file_imports(path: str, root: str) -> list[str]:
+    """源文件中全部 import（含函数内的延迟 import）对应的 root 下的文件；按 mtime/size 缓存解析结果"""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size, root)
+    cached = _IMPORTS_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    files = _resolve(_imported_modules(ast.walk(tree), _package(path, root)), root)
+    _IMPORTS_CACHE[path] = (key, files)
+    return files
+
+
+def function_sources(func, root: str | None = None) -> tuple[str | None, list[str]]:
+    """
+    函数所在文件，以及函数直接依赖的 root 下的源文件:
+    函数体内的 import + 函数体用到的模块级 import 名称。同一文件中的不同函数因此各自只依赖自己用到的模块。
+
+    返回:
+        (函数所在文件, 依赖文件列表)；取不到源码（内置函数等）时为 (None, [])
+    """
+    root = root or ROOT
+    try:
+        path = os.path.abspath(inspect.getsourcefile(func))
+        body = ast.parse(textwrap.dedent(inspect.getsource(func)))
+    except (TypeError, OSError):
+        return None, []
+    used = {n.id for n in ast.walk(body) if isinstance(n, ast.Name)}
+    with open(path, 'r', encoding='utf-8') as f:
+        module = ast.parse(f.read(), path)
+    package = _package(path, root)
+    modules = _imported_modules(ast.walk(body), package)
+    for node in module.body:
+        if isinstance(node, ast.Import):
+            modules += [a.name for a in node.names if (a.asname or a.name.split('.')[0]) in used]
+        elif isinstance(node, ast.ImportFrom):
+            aliases = [a for a in node.names if (a.asname or a.name) in used]
+            if aliases:
+                modules += _imported_modules([ast.ImportFrom(node.module, aliases, node.level)], package)
+    return path, _resolve(modules, root)
+
+
+def code_closure(paths, root: str | None = None, leaves=()) -> list[str]:
+    """
+    源文件的 import 闭包（只包含 root 下的文件，root 默认仓库根目录）
+
+    参数:
+        paths: 起点文件（包含在结果中，并展开其 import）
+        leaves: 只计入结果、不展开 import 的文件（如 Stage 函数所在的文件，只看函数自己用到的模块）
+    返回:
+        排序后的文件列表
+    """
+    root = root or ROOT
+    seen = {os.path.abspath(p) for p in leaves if p}
+    result = set(seen)
+    stack = [os.path.abspath(p) for p in paths if p]
+    while stack:
+        path = stack.pop()
+        if path in result or not os.path.isfile(path):
+            continue
+        result.add(path)
+        stack.extend(_file_imports(path, root))
+    return sorted(result)
+
+
+# =========================
+# Stage 定义
+# =========================
+class Stage:
+    """
+    流水线中的一个步骤
+
+    参数:
+        name: Stage 名称（唯一）
+        func: 计算函数, func(*上游结果(按 deps 顺序), **params) -> result
+        deps: 依赖的上游 Stage 名称
+        inputs: 读取的外部文件（不由其它 Stage 产生），如 data/raw/*.pkl
+        outputs: 写出的文件，save(result) 负责写出
+        save: save(result) 把结果写到 outputs
+        load: load() -> result，Stage 被跳过、下游又需要它时从 outputs 读回
+        params: 传给 func 的参数（参与缓存签名）
+        code: 额外的源文件（按名称动态加载、不会被 import 的文件，如因子插件）；
+              参与缓存签名的代码文件 = func 的 import 闭包 + code 的 import 闭包，见 code_files()
+        executor: 'thread' 或 'process'；'process' 要求 func 可被 pickle（模块顶层函数）
+    """
+
+    def __init__(self, name, func, deps=(), inputs=(), outputs=(), save=None, load=None,
+                 params=None, code=None, executor='thread'):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.save = save
+        self.load = load
+        self.params = params or {}
+        self.executor = executor
+        self.code = [c for c in (code or []) if c]
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, deps={self.deps})"
+
+    def code_files(self) -> list[str]:
+        """参与缓存签名的源文件（每次计算签名时重新解析，新增的 import 会被自动纳入）"""
+        path, deps = function_sources(self.func)
+        return code_closure(deps + self.code, leaves=[path] if path else [])
+
+
+# =========================
+# 流水线
+# =========================
+class Pipeline:
+    def __init__(self, stages=(), cache_file: str = CACHE_FILE):
+        self.stages: dict[str, Stage] = {}
+        self.cache_file = cache_file
+        self.results = {}                # 内存中的 Stage 结果
+        self._locks = {}
+        for s in stages:
+            self.add(s)
+
+    def add(self, stage: Stage) -> Stage:
+        if stage.name in self.stages:
+            raise ValueError(f"Stage {stage.name} 重复定义")
+        self.stages[stage.name] = stage
+        self._locks[stage.name] = threading.Lock()
+        return stage
+
+    # -------- 拓扑 --------
+    def _toposort(self, targets=None) -> list[str]:
+        """返回 targets（默认全部）及其全部上游的拓扑序"""
+        order, state = [], {}
+
+        def visit(name):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"流水线存在循环依赖: {name}")
+            if name not in self.stages:
+                raise ValueError(f"未定义的 Stage: {name}")
+            state[name] = 'visiting'
+            for d in self.stages[name].deps:
+                visit(d)
+            state[name] = 'done'
+            order.append(name)
+
+        for name in (targets or self.stages):
+            visit(name)
+        return order
+
+    # -------- 缓存 --------
+    def _load_cache(self) -> dict:
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return {}
+        return {}
+
+    def _save_cache(self, cache: dict):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp = self.cache_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=1)
+        os.replace(tmp, self.cache_file)
+
+    def _signature(self, stage: Stage, entry: dict, out_sigs: dict) -> tuple[str, dict]:
+        """
+        计算 Stage 的输入签名：外部输入文件 + 上游输出 + 参数 + 代码文件
+        返回 (签名, 最新的文件指纹)
+        """
+        old_files = entry.get('files', {})
+        files = {}
+        for p in stage.inputs + stage.code_files():
+            files[p] = file_fingerprint(p, old_files.get(p))
+        sig = _digest({
+            'inputs': {p: (fp or {}).get('hash') for p, fp in files.items()},
+            'deps': {d: out_sigs[d] for d in stage.deps},
+            'params': stage.params,
+        })
+        return sig, files
+
+    def _outputs_fingerprint(self, stage: Stage, entry: dict) -> dict | None:
+        """输出文件指纹；任何一个输出缺失返回 None"""
+        old = entry.get('outputs', {})
+        fps = {}
+        for p in stage.outputs:
+            fp = file_fingerprint(p, old.get(p))
+            if fp is None:
+                return None
+            fps[p] = fp
+        return fps
+
+    # -------- 结果获取（内存优先） --------
+    def get(self, name: str):
+        """取 Stage 结果：优先内存，否则调用 stage.load() 从磁盘读取并缓存在内存中"""
+        if name in self.results:
+            return self.results[name]
+        with self._locks[name]:
+            if name not in self.results:
+                stage = self.stages[name]
+                if stage.load is None:
+                    raise RuntimeError(f"Stage {name} 已跳过但没有定义 load()，无法提供结果")
+                self.results[name] = stage.load()
+        return self.results[name]
+
+    def _execute(self, stage: Stage):
+        args = [self.get(d) for d in stage.deps]
+        t0 = time.perf_counter()
+        result = stage.func(*args, **stage.params)
+        if stage.save is not None:
+            stage.save(result)
+        return result, time.perf_counter() - t0
+
+    # -------- 主入口 --------
+    def run(self, targets=None, force: bool = False, workers: int = 4) -> dict:
+        """
+        运行流水线
+
+        参数:
+            targets: 需要产出的 Stage 名称列表，默认全部（自动包含上游）
+            force: True 时忽略缓存全部重算
+            workers: 并行执行互不依赖 Stage 的线程/进程数
+        返回:
+            dict: {stage_name: 'skipped' | 'ran'}
+        """
+        order = self._toposort(targets)
+        cache = self._load_cache()
+        status, out_sigs = {}, {}
+        pending = list(order)
+        running = {}
+        t_start = time.perf_counter()
+
+        thread_pool = ThreadPoolExecutor(max_workers=workers)
+        process_pool = None
+        try:
+            while pending or running:
+                # 1. 把依赖都已完成的 Stage 提交执行（或直接跳过）
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if any(d not in status for d in stage.deps):
+                        continue
+                    pending.remove(name)
+                    entry = cache.get(name, {})
+                    sig, files = self._signature(stage, entry, out_sigs)
+                    outputs = self._outputs_fingerprint(stage, entry)
+                    if (not force and outputs is not None and entry.get('signature') == sig
+                            and all(entry.get('outputs', {}).get(p, {}).get('hash') == fp['hash']
+                                    for p, fp in outputs.items())):
+                        # 输入未变、输出仍在且未被改写：跳过
+                        status[name] = 'skipped'
+                        out_sigs[name] = _digest({p: fp['hash'] for p, fp in outputs.items()}) if outputs else sig
+                        cache[name] = {**entry, 'files': files, 'outputs': outputs}
+                        print(f"[跳过] {name}")
+                        continue
+                    print(f"[运行] {name} ...")
+                    if stage.executor == 'process':
+                        if process_pool is None:
+                            process_pool = ProcessPoolExecutor(max_workers=workers)
+                        args = [self.get(d) for d in stage.deps]
+                        fut = process_pool.submit(_run_in_process, stage.func, args, stage.params)
+                    else:
+                        fut = thread_pool.submit(self._execute, stage)
+                    running[fut] = (name, sig, files)
+
+                if not running:
+                    continue
+
+                # 2. 等待任意一个 Stage 完成
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name, sig, files = running.pop(fut)
+                    stage = self.stages[name]
+                    result, elapsed = fut.result()
+                    if stage.executor == 'process' and stage.save is not None:
+                        stage.save(result)
+                    self.results[name] = result
+                    outputs = self._outputs_fingerprint(stage, {}) or {}
+                    status[name] = 'ran'
+                    out_sigs[name] = _digest({p: fp['hash'] for p, fp in outputs.items()}) if outputs else sig
+                    cache[name] = {'signature': sig, 'files': files, 'outputs': outputs}
+                    self._save_cache(cache)
+                    print(f"[完成] {name} ({elapsed:.2f}s)")
+        finally:
+            thread_pool.shutdown(wait=True)
+            if process_pool is not None:
+                process_pool.shutdown(wait=True)
+
+        self._save_cache(cache)
+        n_ran = sum(v == 'ran' for v in status.values())
+        print(f"流水线结束: 运行 {n_ran} 个, 跳过 {len(status) - n_ran} 个, 耗时 {time.perf_counter() - t_start:.2f}s")
+        return status
+
+
+def _run_in_process(func, args, kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+# =========================
+# 默认日频流水线: 对齐 → 清洗 → 因子 → 评估
+# =========================
+RAW_FILES = ['CLOSE.pkl', 'HIGH.pkl', 'LOW.pkl', 'OPEN.pkl', 'VOLUME.pkl',
+             'market_cap.pkl', 'TURNOVER.pkl', 'DAILY_TURNOVER_RATE.pkl']
+ALIGNED_FIELDS = ['close', 'high', 'low', 'open_price', 'volume',
+                  'market_capitalization', 'turnover', 'daily_turnover_rate']
+PANEL_ALIGNED = os.path.join(INTERIM_PATH, 'panel_aligned.pkl')
+PANEL_CLEANED = os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl')
+DATA_ISSUES = os.path.join(INTERIM_PATH, 'data_issues.csv')
+
+# 默认计算的因子及参数（与 calcu_factor.py 一致）
+DEFAULT_FACTORS = {
+    'illiq_guiji': {'lookback': 20},
+    'panic_factor': {'lookback': 21, 'weight_method': 'equal'},
+}
+
+
+def stage_validate(max_errors=0):
+    """原始数据质量校验；error 级问题超过 max_errors 时抛出 ValueError，下游不再运行"""
+    from preprocess.load_data import RAW_FIELDS, load_fields
+    from preprocess.validate_data import gate, save_issues, validate
+    issues = validate(load_fields(RAW_FIELDS))
+    save_issues(issues)     # 未通过时也留下问题表
+    return gate(issues, max_errors=max_errors)
+
+
+def stage_align(validate=None):
+    from preprocess.align_data import align_data, load_raw
+    return align_data(load_raw())
+
+
+def _save_aligned(result):
+    aligned, panel = result
+    os.makedirs(INTERIM_PATH, exist_ok=True)
+    for name, df in aligned.items():
+        df.to_pickle(os.path.join(INTERIM_PATH, f'{name}_aligned.pkl'))
+    panel.to_pickle(PANEL_ALIGNED)
+
+
+def _load_aligned():
+    aligned = {name: pd.read_pickle(os.path.join(INTERIM_PATH, f'{name}_aligned.pkl')) for name in ALIGNED_FIELDS}
+    return aligned, pd.read_pickle(PANEL_ALIGNED)
+
+
+def stage_clean(align):
+    from preprocess.clean_data import add_status_fields
+    _, panel = align
+    return add_status_fields(panel)
+
+
+def _save_cleaned(panel):
+    os.makedirs(PROCESSED_PATH, exist_ok=True)
+    panel.to_pickle(PANEL_CLEANED)
+
+
+def stage_factor(clean, factor_name, factor_params):
+    from factors.base_factor import get_factor
+    factor = get_factor(factor_name, **factor_params)
+    return factor.run(clean)
+
+
+def stage_evaluate(clean, factor, factor_name, fwd_ret_col='ret_fwd_1d', groups=5):
+    """IC 汇总 + 分层收益（不画图，不阻塞），返回 (ic_summary, layer_ret)"""
+    from factor_evaluation.util import get_clean_factor_and_forward_returns
+    from factor_evaluation.ic_analysis import ICAnalyzer
+    from factor_evaluation.layer_backtest import LayerBacktester
+    merged = get_clean_factor_and_forward_returns(factor, clean, factor_name=factor_name, fwd_ret_col=fwd_ret_col)
+    ic_summary = ICAnalyzer(merged, factor_name=factor_name).get_summary()
+    layer_ret = LayerBacktester(merged, groups=groups, factor_name=factor_name).run()
+    return ic_summary, layer_ret
+
+
+def build_default_pipeline(factors: dict | None = None, evaluate: bool = True, max_errors: int = 0) -> Pipeline:
+    """
+    构建默认日频流水线
+
+    参数:
+        factors: {因子名: 参数}，默认 DEFAULT_FACTORS
+        evaluate: 是否加入评估 Stage（IC 汇总、分层收益写到 data/results/）
+        max_errors: 原始数据校验允许的 error 级单元格数
+    """
+    factors = DEFAULT_FACTORS if factors is None else factors
+    pipe = Pipeline()
+    pipe.add(Stage(
+        'validate', stage_validate,
+        inputs=[os.path.join(RAW_PATH, f) for f in RAW_FILES],
+        outputs=[DATA_ISSUES],                  # stage_validate 自己写问题表（未通过时也写）
+        load=lambda: pd.read_csv(DATA_ISSUES),
+        params={'max_errors': max_errors},
+    ))
+    pipe.add(Stage(
+        'align', stage_align, deps=['validate'],
+        inputs=[os.path.join(RAW_PATH, f) for f in RAW_FILES],
+        outputs=[os.path.join(INTERIM_PATH, f'{n}_aligned.pkl') for n in ALIGNED_FIELDS] + [PANEL_ALIGNED],
+        save=_save_aligned, load=_load_aligned,
+    ))
+    pipe.add(Stage(
+        'clean', stage_clean, deps=['align'],
+        outputs=[PANEL_CLEANED], save=_save_cleaned,
+        load=lambda: pd.read_pickle(PANEL_CLEANED),
+    ))
+    for name, params in factors.items():
+        _add_factor_stages(pipe, name, params, evaluate)
+    return pipe
+
+
+def _add_factor_stages(pipe: Pipeline, name: str, params: dict, evaluate: bool):
+    path = factor_file(name)
+    # 因子类按名称从注册表取得，因子文件不会被 import 语句引用，需要显式加入代码指纹
+    # （base_factor.py、neutralize.py、dense_panel.py 等由 stage_factor 的 import 闭包自动包含）
+    plugin = os.path.join(ROOT, 'factors', f'{name}.py')
+    factor_code = [plugin] if os.path.exists(plugin) else []
+
+    pipe.add(Stage(
+        f'factor:{name}', stage_factor, deps=['clean'],
+        outputs=[path], save=lambda r: save_factor(r, name),
+        load=lambda: pd.read_pickle(path).set_index(['date', 'code']),
+        params={'factor_name': name, 'factor_params': params},
+        code=factor_code,
+    ))
+    if not evaluate:
+        return
+
+    ic_path = os.path.join(RESULTS_PATH, f'{name}_ic_summary.csv')
+    layer_path = os.path.join(RESULTS_PATH, f'{name}_layer_returns.csv')
+
+    def save_eval(result):
+        os.makedirs(RESULTS_PATH, exist_ok=True)
+        ic_summary, layer_ret = result
+        ic_summary.to_csv(ic_path, header=['value'])
+        layer_ret.to_csv(layer_path)
+
+    pipe.add(Stage(
+        f'evaluate:{name}', stage_evaluate, deps=['clean', f'factor:{name}'],
+        outputs=[ic_path, layer_path], save=save_eval,
+        params={'factor_name': name},
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="因子流水线（带 Stage 级缓存）")
+    parser.add_argument('--factors', nargs='*', default=None, help='只计算这些因子（默认全部 DEFAULT_FACTORS）')
+    parser.add_argument('--stages', nargs='*', default=None, help='只运行这些 Stage 及其上游')
+    parser.add_argument('--workers', type=int, default=4, help='并行 worker 数')
+    parser.add_argument('--force', action='store_true', help='忽略缓存全部重算')
+    parser.add_argument('--no-eval', action='store_true', help='不运行评估 Stage')
+    parser.add_argument('--max-errors', type=int, default=0, help='原始数据校验允许的 error 级单元格数')
+    args = parser.parse_args()
+
+    factors = DEFAULT_FACTORS
+    if args.factors:
+        factors = {name: DEFAULT_FACTORS.get(name, {}) for name in args.factors}
+    pipe = build_default_pipeline(factors, evaluate=not args.no_eval, max_errors=args.max_errors)
+    pipe.run(targets=args.stages, force=args.force, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# factor_processing/neutralize.py
+"""
+行业 / 风格中性化
+
+行业分类表 (code → industry，可随时间变化) 编码为整数行业 id，中性化时不构造 N×30 的哑变量矩阵：
+
+    因子 ~ 行业哑变量 + 风格列 (如 ln_mkt_cap)
+
+按 Frisch–Waugh–Lovell 定理等价于：
+1. 在 (日期, 行业) 组内去均值 y 和每个风格列（np.bincount 一次完成全部日期）
+2. 去均值后的 y 对去均值后的风格列做回归（每个日期一个 K×K 正规方程，批量求解）
+3. 残差即中性化后的因子
+
+全历史只需对因子矩阵做几次整体扫描，没有逐日循环。
+不传行业时组内去均值退化为按日期去均值，等价于带截距的 OLS（与原 BaseFactor._neutralize 相同）。
+
+行业分类表格式（pickle / csv）:
+    code, industry                 静态分类
+    code, date, industry           随时间变化：date 为生效日，之后沿用直到下一次变更
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.io import RAW_PATH
+
+INDUSTRY_FILE = os.path.join(RAW_PATH, 'industry.pkl')
+
+# 可以从 panel 原始字段派生的风格列: 名称 -> (依赖字段, 计算函数)
+STYLE_COLUMNS = {
+    'ln_mkt_cap': (['market_capitalization'],
+                   lambda panel: np.log(panel['market_capitalization'].where(panel['market_capitalization'] > 0))),
+}
+
+
+# =========================
+# 行业分类
+# =========================
+def load_industry(path: str | None = None) -> pd.DataFrame:
+    """读取行业分类表，返回含 code, industry（以及可选 date）列的长表"""
+    path = path or INDUSTRY_FILE
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到行业分类文件: {path}")
+    table = pd.read_csv(path) if path.endswith('.csv') else pd.read_pickle(path)
+    if not {'code', 'industry'}.issubset(table.columns):
+        table = table.reset_index()
+    if not {'code', 'industry'}.issubset(table.columns):
+        raise ValueError(f"行业分类表必须包含 code, industry 列，实际为: {list(table.columns)}")
+    if 'date' in table.columns:
+        table['date'] = pd.to_datetime(table['date'])
+    return table
+
+
+def encode_industry(table: pd.DataFrame, dates, codes) -> tuple[np.ndarray, list]:
+    """
+    把行业分类表展开成 dates × codes 的整数行业 id 矩阵
+
+    参数:
+        table: load_industry() 的返回值
+        dates, codes: 目标网格
+    返回:
+        (ids, names): ids 为 int32 矩阵，-1 表示无分类；names[i] 为 id=i 的行业名称
+    """
+    dates = pd.DatetimeIndex(dates)
+    codes = pd.Index(codes)
+    names, table_ids = np.unique(table['industry'].astype(str).to_numpy(), return_inverse=True)
+    col = codes.get_indexer(table['code'])
+    keep = col >= 0
+
+    ids = np.full((len(dates), len(codes)), -1, dtype=np.int32)
+    if 'date' not in table.columns:
+        ids[:, col[keep]] = table_ids[keep]
+        return ids, list(names)
+
+    # 随时间变化：在生效日写入新 id，再按列前向填充（生效日早于网格起点的记在第 0 行）
+    row = np.searchsorted(dates.asi8, table['date'].to_numpy().astype('datetime64[ns]').astype(np.int64))
+    keep &= row < len(dates)
+    order = np.argsort(table['date'].to_numpy()[keep], kind='stable')
+    changes = np.full(ids.shape, -1, dtype=np.int64)
+    changes[row[keep][order], col[keep][order]] = table_ids[keep][order]
+    has = changes >= 0
+    last_row = np.where(has, np.arange(len(dates))[:, None], 0)
+    np.maximum.accumulate(last_row, axis=0, out=last_row)
+    filled = changes[last_row, np.arange(len(codes))[None, :]]
+    ids[:] = np.where(filled >= 0, filled, -1)
+    return ids, list(names)
+
+
+def add_industry(panel: pd.DataFrame, table: pd.DataFrame | None = None, col: str = 'industry') -> pd.DataFrame:
+    """给 (date, code) panel 增加一列整数行业 id（无分类为 -1），table 默认读取 data/raw/industry.pkl"""
+    table = load_industry() if table is None else table
+    t, n, dates, codes = _grid(panel.index)
+    ids, names = encode_industry(table, dates, codes)
+    panel = panel.copy()
+    panel[col] = ids[t, n]
+    panel.attrs[f'{col}_names'] = names
+    return panel
+
+
+# =========================
+# 中性化
+# =========================
+def _grid(index: pd.MultiIndex):
+    """(date, code) MultiIndex → 每行的 (日期位置, 股票位置) 以及两个轴的标签"""
+    index = index.remove_unused_levels()
+    d, c = index.names.index('date'), index.names.index('code')
+    return (np.asarray(index.codes[d]), np.asarray(index.codes[c]), index.levels[d], index.levels[c])
+
+
+def _group_demean(values: np.ndarray, keys: np.ndarray, n_keys: int, mask: np.ndarray) -> np.ndarray:
+    """在 keys 分组内去均值（只用 mask 为 True 的样本计算均值），values 为一维"""
+    counts = np.bincount(keys[mask], minlength=n_keys)
+    sums = np.bincount(keys[mask], weights=values[mask], minlength=n_keys)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return values - means[keys]
+
+
+def neutralize_values(y: np.ndarray, dates: np.ndarray, X: np.ndarray | None = None,
+                      groups: np.ndarray | None = None, n_dates: int | None = None) -> np.ndarray:
+    """
+    在长表（一维数组）上做行业 + 风格中性化
+
+    参数:
+        y: 因子值 (R,)
+        dates: 每行的日期位置 (R,)，0 ~ n_dates-1
+        X: 风格暴露 (R, K)，缺失值用当日横截面均值填充；None 表示只做行业中性化
+        groups: 每行的整数行业 id (R,)，<0 或 NaN 表示无分类（结果为 NaN）；None 表示不分行业（只有截距）
+        n_dates: 日期个数，默认 dates.max() + 1
+    返回:
+        残差 (R,)；有效样本不足的日期保留原值
+    """
+    y = np.asarray(y, dtype=np.float64)
+    dates = np.asarray(dates, dtype=np.int64)
+    n_dates = int(dates.max()) + 1 if n_dates is None and len(dates) else (n_dates or 0)
+    X = np.zeros((len(y), 0)) if X is None else np.asarray(X, dtype=np.float64).reshape(len(y), -1)
+    k = X.shape[1]
+
+    # 风格列缺失值用当日横截面均值填充
+    if k:
+        X = X.copy()
+        for j in range(k):
+            nan = np.isnan(X[:, j])
+            if nan.any():
+                cnt = np.bincount(dates[~nan], minlength=n_dates)
+                tot = np.bincount(dates[~nan], weights=X[~nan, j], minlength=n_dates)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    X[nan, j] = (tot / cnt)[dates[nan]]
+
+    # 组键 = 日期 × 行业
+    if groups is None:
+        g = np.zeros(len(y), dtype=np.int64)
+        n_groups = 1
+    else:
+        groups = np.asarray(groups, dtype=np.float64)
+        g = np.where(np.isnan(groups), -1, groups).astype(np.int64)
+        n_groups = int(g.max()) + 1 if len(g) and g.max() >= 0 else 1
+    mask = ~np.isnan(y) & (g >= 0) & ~np.isnan(X).any(axis=1)
+    keys = dates * n_groups + np.maximum(g, 0)
+    n_keys = n_dates * n_groups
+
+    # 1. 组内去均值（FWL：吸收行业哑变量 / 截距）
+    y_dm = _group_demean(y, keys, n_keys, mask)
+    X_dm = np.column_stack([_group_demean(X[:, j], keys, n_keys, mask) for j in range(k)]) if k else X
+
+    # 2. 每个日期一个 K×K 正规方程，批量求解
+    resid = y_dm
+    if k:
+        Xm = np.where(mask[:, None], X_dm, 0.0)
+        ym = np.where(mask, y_dm, 0.0)
+        xtx = np.zeros((n_dates, k, k))
+        xty = np.zeros((n_dates, k))
+        for a in range(k):
+            xty[:, a] = np.bincount(dates, Xm[:, a] * ym, n_dates)
+            for b in range(a, k):
+                xtx[:, a, b] = xtx[:, b, a] = np.bincount(dates, Xm[:, a] * Xm[:, b], n_dates)
+        # 按对角线缩放后再求伪逆，避免风格列量纲差异（如成交额 ~1e8）导致的数值误差
+        scale = np.sqrt(np.einsum('tkk->tk', xtx))
+        scale[scale == 0] = 1.0
+        xtx_s = xtx / (scale[:, :, None] * scale[:, None, :])
+        beta = np.einsum('tkl,tl->tk', np.linalg.pinv(xtx_s), xty / scale) / scale
+        resid = y_dm - np.einsum('rk,rk->r', X_dm, beta[dates])
+
+    # 3. 有效样本不足（少于 组数 + K + 1）的日期保留原值
+    n_valid = np.bincount(dates[mask], minlength=n_dates)
+    n_active = np.bincount(np.unique(keys[mask]) // n_groups, minlength=n_dates)
+    enough = n_valid >= n_active + k + 1
+    out = np.where(mask, resid, np.nan)
+    return np.where(enough[dates], out, y)
+
+
+def resolve_style(panel: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    """取出风格列；不在 panel 中但可以派生的（见 STYLE_COLUMNS）现算，都没有的跳过"""
+    data = {}
+    for c in cols:
+        if c in panel.columns:
+            data[c] = panel[c].astype(float)
+        elif c in STYLE_COLUMNS and set(STYLE_COLUMNS[c][0]).issubset(panel.columns):
+            data[c] = STYLE_COLUMNS[c][1](panel).astype(float)
+    return pd.DataFrame(data, index=panel.index)
+
+
+def neutralize(factor: pd.Series, panel: pd.DataFrame, style_cols: list[str] | None = None,
+               industry_col: str | None = None) -> pd.Series:
+    """
+    行业 + 风格中性化（pandas 接口）
+
+    参数:
+        factor: 因子值，index=['date', 'code']
+        panel: 含风格列 / 行业列的 panel，与 factor 同索引（或为其超集）
+        style_cols: 风格列，如 ['ln_mkt_cap']
+        industry_col: 整数行业 id 列（见 add_industry），None 表示不做行业中性化
+    返回:
+        pd.Series: 残差，index 与 factor 相同
+    """
+    panel = panel.reindex(factor.index) if not panel.index.equals(factor.index) else panel
+    style = resolve_style(panel, style_cols or [])
+    groups = None
+    if industry_col is not None and industry_col in panel.columns:
+        groups = panel[industry_col].to_numpy(dtype=np.float64)
+    if groups is None and style.shape[1] == 0:
+        return factor.copy()
+    t, _, dates, _ = _grid(factor.index)
+    resid = neutralize_values(factor.to_numpy(dtype=np.float64), t, style.to_numpy() if style.shape[1] else None,
+                              groups, n_dates=len(dates))
+    return pd.Series(resid, index=factor.index, name=factor.name)
@@ -3,6 +3,9 @@ import abc
 import numpy as np
 import pandas as pd
 
+from utils.dense_panel import DenseLayout
+from utils.log import stage_timer
+
 # =========================
 # 因子注册器（方便通过名字创建因子）
 # =========================
@@ -25,10 +28,13 @@ def get_factor(name: str, **kwargs):
     """
     通过名字创建因子实例：
     factor = get_factor("illiq_guiji", window=20)
+
+    未注册的因子按 factors/registry.py 发现的位置导入其模块（不需要事先 import 因子模块）
     """
     cls = FACTOR_REGISTRY.get(name)
     if cls is None:
-        raise ValueError(f"Factor {name} not found in registry.")
+        from factors.registry import load
+        cls = load(name)
     return cls(**kwargs)
 
 
@@ -43,6 +49,10 @@ class BaseFactor(abc.ABC):
     - 方便回测模块直接调用
     """
 
+    # 分块计算（factors/chunked.py）用到的声明，子类按需覆盖
+    inputs: list[str] | None = None   # calculate() 需要的 panel 列，None 表示全部
+    chunk_axis: str = 'code'          # 'code': 纯时间序列因子，可按股票分块；'date': 含横截面计算，按日期分块
+
     def __init__(
         self,
         name: str,
@@ -52,6 +62,7 @@ class BaseFactor(abc.ABC):
         do_winsor: bool = False,
         do_zscore: bool = False,           # 是否做横截面标准化
         neutralize_cols: list[str] | None = None,  # 需要中性化的列，如 ["ln_mkt_cap"]
+        industry_col: str | None = None,  # 整数行业 id 列（见 factor_processing.neutralize.add_industry）
     ):
         self.name = name
         self.lookback = lookback
@@ -60,6 +71,7 @@ class BaseFactor(abc.ABC):
         self.do_winsor = do_winsor
         self.do_zscore = do_zscore
         self.neutralize_cols = neutralize_cols or []
+        self.industry_col = industry_col
 
     # -------- 外部主要调用入口 --------
     def run(self, panel: pd.DataFrame) -> pd.DataFrame:
@@ -70,11 +82,16 @@ class BaseFactor(abc.ABC):
         返回:
             DataFrame: 与 panel 对齐，包含一列 self.name
         """
+        with stage_timer(f'{self.name}.run', rows=len(panel)):
+            return self._run(panel)
+
+    def _run(self, panel: pd.DataFrame) -> pd.DataFrame:
         # 统一一下索引格式：index = [trade_date, asset]
         panel = self._ensure_multiindex(panel)
 
         # 1. 计算原始因子值（子类实现）
-        raw_factor = self.calculate(panel)
+        with stage_timer('calculate', rows=len(panel)):
+            raw_factor = self.calculate(panel)
 
         # 2. 将 calculate() 的返回值转换为标准格式
         # calculate() 可能返回 Series 或 DataFrame，统一转换为 DataFrame
@@ -93,16 +110,38 @@ class BaseFactor(abc.ABC):
         factor_df = factor_df.sort_index()
 
         # 3. 按日期横截面地做清洗和处理
-        factor_df = self._post_process(panel, factor_df)
+        with stage_timer('_post_process', rows=len(factor_df)):
+            factor_df = self._post_process(panel, factor_df)
 
         # 4. 滞后处理（避免未来函数）
         if self.lag > 0:
-            factor_df[self.name] = (
-                factor_df.groupby(level=1)[self.name].shift(self.lag)
-            )
+            layout = DenseLayout.of(factor_df)
+            if layout is not None:
+                # 稠密布局：按股票平移 lag 天 = 整列平移 lag * n_codes 行
+                factor_df[self.name] = layout.shift(factor_df[self.name].to_numpy(), self.lag)
+            else:
+                factor_df[self.name] = (
+                    factor_df.groupby(level=1)[self.name].shift(self.lag)
+                )
 
         return factor_df
 
+    def run_chunked(self, store, out_path: str | None = None, max_memory_mb: float = 512):
+        """
+        分块（out-of-core）版本的 run()：从磁盘 ArrayStore 流式读取，结果逐块写回磁盘
+        详见 factors/chunked.py
+
+        返回:
+            ArrayStore，包含一个字段 self.name
+        """
+        from factors.chunked import run_chunked
+        return run_chunked(self, store, out_path=out_path, max_memory_mb=max_memory_mb)
+
+    @property
+    def warmup(self) -> int:
+        """按日期分块时每块需要向前多读的历史行数（收益率需要前一天，故 +1）"""
+        return (self.lookback or 0) + 1
+
     @abc.abstractmethod
     def calculate(self, panel: pd.DataFrame) -> pd.DataFrame:
         """
@@ -141,8 +180,9 @@ class BaseFactor(abc.ABC):
             factor_df[name] = factor_df.groupby(level=0)[name].transform(self._zscore)
 
         # 3. 中性化（对市值、行业等）
-        if self.neutralize_cols:
-            factor_df[name] = self._neutralize(panel, factor_df[name])
+        if self.neutralize_cols or self.industry_col:
+            with stage_timer('_neutralize', rows=len(factor_df)):
+                factor_df[name] = self._neutralize(panel, factor_df[name])
 
         return factor_df
 
@@ -164,37 +204,11 @@ class BaseFactor(abc.ABC):
 
     def _neutralize(self, panel: pd.DataFrame, factor: pd.Series) -> pd.Series:
         """
-        简单线性回归中性化：
-        因子 ~ neutralize_cols
+        线性回归中性化：
+        因子 ~ 行业哑变量 (industry_col) + neutralize_cols
         残差作为新的因子值
+
+        行业用组内去均值吸收，风格列的小回归对全部日期批量求解，见 factor_processing/neutralize.py
         """
-        # panel 和 factor 已经是 MultiIndex 对齐的
-        df = panel.copy()
-        df[self.name] = factor
-
-        results = []
-
-        for date, sub in df.groupby(level=0):
-            y = sub[self.name]
-            X_cols = [c for c in self.neutralize_cols if c in sub.columns]
-            if not X_cols:
-                results.append(y)
-                continue
-
-            X = sub[X_cols].astype(float)
-            X = X.fillna(X.mean())  # 简单填充
-            X = np.column_stack([np.ones(len(X)), X.values])  # 加截距
-
-            mask = ~y.isna() & ~np.isnan(X).any(axis=1)
-            if mask.sum() < len(X_cols) + 2:
-                results.append(y)
-                continue
-
-            beta, *_ = np.linalg.lstsq(X[mask], y[mask].values, rcond=None)
-            y_hat = X @ beta
-            resid = y - y_hat
-            resid[~mask] = np.nan
-            results.append(resid)
-
-        resid_all = pd.concat(results).sort_index()
-        return resid_all
+        from factor_processing.neutralize import neutralize
+        return neutralize(factor, panel, self.neutralize_cols, self.industry_col)
@@ -0,0 +1,171 @@
+# factors/chunked.py
+"""
+分块（out-of-core）因子计算
+
+BaseFactor.run() 需要整张面板在内存中；对于分钟数据衍生或超长历史的数据放不下。
+这里把一次 run() 拆成两个阶段，数据从 ArrayStore（磁盘 memmap）流式读取，结果逐块写回磁盘：
+
+1. 时间序列阶段 (calculate)
+   - chunk_axis='code'：按股票列分块，每块包含这些股票的全部历史（滚动窗口只需要单只股票的历史）
+   - chunk_axis='date'：按日期行分块，每块向前多读 warmup 行历史（用于含横截面计算的因子，
+     例如 PanicFactor 的市场收益 r_m,t 需要当天全部股票）
+2. 横截面阶段 (_post_process: 去极值 / 标准化 / 中性化)
+   按日期行分块，每个日期只依赖当天的横截面
+3. 滞后 (lag)：在输出 memmap 上按行整体下移
+
+读取通过 utils.io.prefetch 预取：计算当前块时后台线程已在读取下一块（内存中最多两块输入数据）。
+
+每块的大小由 max_memory_mb 决定（按 行数 × 列数 × 字段数 × 8 字节 × overhead 估算），
+overhead 是 pandas groupby/rolling 相对原始数据的内存放大系数。
+
+用法:
+    store = ArrayStore.from_panel(panel, 'data/store/panel')
+    out = run_chunked(get_factor('illiq_guiji'), store, max_memory_mb=256)
+    result = out.to_frame()      # 与 factor.run(panel) 相同
+"""
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from factor_processing.neutralize import STYLE_COLUMNS
+from utils.array_store import ArrayStore
+from utils.dense_panel import align_to
+from utils.io import prefetch
+from utils.log import stage_timer
+
+# pandas 分组滚动计算相对原始 float64 数据的内存放大系数（经验值）
+DEFAULT_OVERHEAD = 12
+
+
+def _block_size(n_other: int, n_fields: int, max_memory_mb: float, overhead: float) -> int:
+    """给定另一维长度和字段数，返回满足内存预算的块大小（至少为 1）"""
+    per_unit = n_other * max(n_fields, 1) * 8 * overhead
+    return max(1, int(max_memory_mb * 1024 * 1024 // per_unit))
+
+
+def _blocks(n: int, size: int):
+    for start in range(0, n, size):
+        yield start, min(start + size, n)
+
+
+def _factor_inputs(factor, store: ArrayStore) -> list[str]:
+    fields = getattr(factor, 'inputs', None) or store.fields
+    missing = [f for f in fields if f not in store.fields]
+    if missing:
+        raise ValueError(f"存储中缺少因子 {factor.name} 需要的字段: {missing}")
+    return list(fields)
+
+
+def _to_values(raw_factor, factor, index: pd.MultiIndex, shape) -> np.ndarray:
+    """把 calculate() 的返回值按块内 (date, code) 网格整理成二维数组"""
+    if isinstance(raw_factor, pd.DataFrame):
+        raw_factor = raw_factor[factor.name] if factor.name in raw_factor.columns else raw_factor.iloc[:, 0]
+    return align_to(raw_factor, index).to_numpy(dtype=np.float64).reshape(shape)
+
+
+def run_chunked(factor, store: ArrayStore, out_path: str | None = None,
+                max_memory_mb: float = 512, overhead: float = DEFAULT_OVERHEAD) -> ArrayStore:
+    """
+    分块运行因子，结果写入磁盘
+
+    参数:
+        factor: BaseFactor 实例
+        store: 输入数据 ArrayStore（完整 dates × codes 网格）
+        out_path: 输出目录，默认与 store 同级的 factor_{factor.name}
+        max_memory_mb: 每块计算允许使用的内存（MB）
+        overhead: 内存放大系数，见 DEFAULT_OVERHEAD
+    返回:
+        ArrayStore，包含一个字段 factor.name（与 factor.run(panel) 的结果一致）
+    """
+    out_path = out_path or os.path.join(os.path.dirname(os.path.abspath(store.path)), f'factor_{factor.name}')
+    out = ArrayStore.create(out_path, store.dates, store.codes)
+    result = out.create_field(factor.name)
+    n_dates, n_codes = store.shape
+    fields = _factor_inputs(factor, store)
+    axis = getattr(factor, 'chunk_axis', 'code')
+
+    # 1. 时间序列阶段
+    with stage_timer(f'{factor.name}.run_chunked/calculate', rows=n_dates * n_codes):
+        if axis == 'code':
+            size = _block_size(n_dates, len(fields), max_memory_mb, overhead)
+            ranges = list(_blocks(n_codes, size))
+            loaders = (partial(store.read_block, fields, cols=slice(c0, c1)) for c0, c1 in ranges)
+            for (c0, c1), block in zip(ranges, prefetch(loaders)):
+                raw = factor.calculate(block)
+                result[:, c0:c1] = _to_values(raw, factor, block.index, (n_dates, c1 - c0))
+                del block, raw
+        elif axis == 'date':
+            warmup = factor.warmup
+            size = max(_block_size(n_codes, len(fields), max_memory_mb, overhead) - warmup, 1)
+            ranges = list(_blocks(n_dates, size))
+            loaders = (partial(store.read_block, fields, rows=slice(max(r0 - warmup, 0), r1)) for r0, r1 in ranges)
+            for (r0, r1), block in zip(ranges, prefetch(loaders)):
+                w0 = max(r0 - warmup, 0)
+                raw = factor.calculate(block)
+                values = _to_values(raw, factor, block.index, (r1 - w0, n_codes))
+                result[r0:r1, :] = values[r0 - w0:]
+                del block, raw, values
+        else:
+            raise ValueError(f"不支持的 chunk_axis: {axis}")
+        result.flush()
+
+    # 2. 横截面阶段（按日期行分块）
+    cs_fields = []
+    for c in factor.neutralize_cols + [factor.industry_col]:
+        # 可派生的风格列（如 ln_mkt_cap）读取其依赖字段
+        for f in STYLE_COLUMNS[c][0] if c not in store.fields and c in STYLE_COLUMNS else [c]:
+            if f in store.fields and f not in cs_fields:
+                cs_fields.append(f)
+    if factor.do_winsor or factor.do_zscore or factor.neutralize_cols or factor.industry_col:
+        with stage_timer(f'{factor.name}.run_chunked/_post_process', rows=n_dates * n_codes):
+            size = _block_size(n_codes, len(cs_fields) + 1, max_memory_mb, overhead)
+            for r0, r1 in _blocks(n_dates, size):
+                rows = slice(r0, r1)
+                panel = store.read_block(cs_fields, rows=rows) if cs_fields else out.read_block([], rows=rows)
+                factor_df = pd.DataFrame({factor.name: np.ascontiguousarray(result[rows, :]).ravel()},
+                                         index=panel.index)
+                factor_df = factor._post_process(panel, factor_df)
+                result[rows, :] = align_to(factor_df[factor.name], panel.index).to_numpy().reshape(r1 - r0, n_codes)
+            result.flush()
+
+    # 3. 滞后：整体下移 lag 行（从后往前复制，避免覆盖尚未移动的数据）
+    lag = factor.lag
+    if lag > 0:
+        size = _block_size(n_codes, 1, max_memory_mb, 1)
+        for r0, r1 in reversed(list(_blocks(n_dates - lag, size))):
+            result[r0 + lag:r1 + lag, :] = np.array(result[r0:r1, :])
+        result[:min(lag, n_dates), :] = np.nan
+        result.flush()
+
+    return out
+
+
+def main():
+    import argparse
+    from factors.base_factor import get_factor
+    from utils.io import DATA_PATH, INTERIM_PATH
+
+    parser = argparse.ArgumentParser(description="分块计算因子（数据从 data/store 流式读取）")
+    parser.add_argument('factor_name', type=str)
+    parser.add_argument('--max-memory-mb', type=float, default=512)
+    parser.add_argument('--store', type=str, default=os.path.join(DATA_PATH, 'store', 'panel'))
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.store, 'meta.json')):
+        # 由对齐后的宽表逐个字段建立存储（一次只读一张表）
+        fields = ['close', 'high', 'low', 'open_price', 'volume',
+                  'market_capitalization', 'turnover', 'daily_turnover_rate']
+        files = {f: os.path.join(INTERIM_PATH, f'{f}_aligned.pkl') for f in fields}
+        print(f"建立数组存储: {args.store}")
+        ArrayStore.from_wide_files(files, args.store)
+
+    store = ArrayStore(args.store)
+    factor = get_factor(args.factor_name)
+    out = factor.run_chunked(store, max_memory_mb=args.max_memory_mb)
+    print(f"因子已写入: {out.path} ({store.shape[0]} dates × {store.shape[1]} codes)")
+
+
+if __name__ == "__main__":
+    main()
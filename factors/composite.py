@@ -0,0 +1,93 @@
+# factors/composite.py
+"""
+合成因子：从因子库读取多个单因子，按滚动权重合成一个新因子（见 factor_processing/combination.py）
+
+用法:
+    python -m factors.composite --factors illiq_guiji panic_factor --method icir --lookback 60
+    python run.py --factor_name composite
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from factors.base_factor import BaseFactor, register_factor
+from factor_processing.combination import (combination_weights, combine, from_grid,
+                                           load_factor_cube, to_grid)
+
+
+@register_factor("composite")
+class CompositeFactor(BaseFactor):
+    """
+    参数:
+        factors: 参与合成的因子名称（须已保存在因子库 data/factors）
+        method: 'equal' / 'ic' / 'icir' / 'regression'
+        lookback: 滚动估计窗口（交易日）
+        ret_col: panel 中用于估计权重的前瞻收益列
+        horizon: ret_col 的前瞻期数（t 日权重只用 t - horizon 及之前的信息）
+        name: 保存到因子库的名称
+    """
+
+    chunk_axis = 'date'
+
+    def __init__(self, factors=('illiq_guiji', 'panic_factor'), method='ic', lookback=60,
+                 ret_col='ret_fwd_1d', horizon=1, name='composite', **kwargs):
+        super().__init__(name=name, lookback=lookback, **kwargs)
+        self.factors = list(factors)
+        self.method = method
+        self.ret_col = ret_col
+        self.horizon = horizon
+        self.weights_ = None
+
+    @property
+    def warmup(self) -> int:
+        return self.lookback + self.horizon
+
+    @property
+    def inputs(self):
+        return [] if self.method == 'equal' else [self.ret_col]
+
+    def calculate(self, panel: pd.DataFrame) -> pd.Series:
+        index = panel.index.remove_unused_levels()
+        dates, codes = index.levels[index.names.index('date')], index.levels[index.names.index('code')]
+
+        cube = load_factor_cube(self.factors, dates, codes)
+        ret = None
+        if self.method != 'equal':
+            if self.ret_col not in panel.columns:
+                raise ValueError(f"panel 中缺少前瞻收益列: {self.ret_col}")
+            ret = to_grid(panel[self.ret_col], dates, codes)
+
+        weights = combination_weights(cube, ret, method=self.method, lookback=self.lookback,
+                                      horizon=self.horizon)
+        self.weights_ = pd.DataFrame(weights, index=dates, columns=self.factors)
+        return from_grid(combine(cube, weights), dates, codes, panel.index, name=self.name)
+
+
+def main():
+    from utils.io import PROCESSED_PATH, save_factor
+
+    parser = argparse.ArgumentParser(description="多因子合成")
+    parser.add_argument('--factors', nargs='+', default=['illiq_guiji', 'panic_factor'])
+    parser.add_argument('--method', type=str, default='ic', choices=['equal', 'ic', 'icir', 'regression'])
+    parser.add_argument('--lookback', type=int, default=60)
+    parser.add_argument('--ret_col', type=str, default='ret_fwd_1d')
+    parser.add_argument('--horizon', type=int, default=1)
+    parser.add_argument('--name', type=str, default='composite', help='保存到因子库的名称')
+    args = parser.parse_args()
+
+    panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    factor = CompositeFactor(args.factors, method=args.method, lookback=args.lookback,
+                             ret_col=args.ret_col, horizon=args.horizon, name=args.name)
+    result = factor.run(panel)
+    path = save_factor(result, args.name)
+
+    print("最近权重:")
+    print(factor.weights_.dropna().tail())
+    print(f"有效因子值: {np.isfinite(result[args.name]).sum()} / {len(result)}")
+    print(f"合成因子已保存至: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# factors/illiq_minute.py
+"""
+分钟频非流动性因子：illiq_guiji 的高频版本
+
+分子由日度 log(1 + |日收益|) 换成当天分钟收益的 Σ log(1 + |r_m|)（preprocess/minute_bars.py 的 minute_logret），
+分母为全天成交额，两者各自做 lookback 日滚动求和后相除。
+
+panel 需要先并入分钟聚合字段:
+    from preprocess.minute_bars import aggregate, join_panel
+    panel = join_panel(panel, aggregate(['minute_logret', 'amount']))
+    get_factor("illiq_minute").run(panel)
+"""
+import numpy as np
+import pandas as pd
+
+from factors.base_factor import BaseFactor, register_factor
+from utils.dense_panel import from_wide, to_wide
+
+
+@register_factor("illiq_minute")
+class IlliqMinuteFactor(BaseFactor):
+
+    inputs = ['minute_logret', 'amount']
+
+    def __init__(self, lookback=20, **kwargs):
+        super().__init__(name="illiq_minute", lookback=lookback, **kwargs)
+
+    @property
+    def warmup(self) -> int:
+        return self.lookback   # 分钟收益在日内计算，不需要前一天
+
+    def calculate(self, panel: pd.DataFrame) -> pd.Series:
+        """
+        公式: sum(Σ_m log(1 + |r_m|)) / sum(amount) over lookback window
+        当天没有分钟线（停牌 / 未入库）的位置为 NaN
+        """
+        missing = [c for c in self.inputs if c not in panel.columns]
+        if missing:
+            raise ValueError(f"panel 中缺少分钟聚合字段: {missing}，请先用 preprocess.minute_bars.join_panel 并入")
+
+        min_p = self.lookback // 2
+        # 稠密 panel 上 to_wide 是 reshape 视图，from_wide 直接展平，不需要 unstack / stack
+        logret = to_wide(panel['minute_logret'])
+        logsum = logret.rolling(self.lookback, min_periods=min_p).sum()
+        amountsum = to_wide(panel['amount']).rolling(self.lookback, min_periods=min_p).sum()
+        result = (logsum / amountsum.replace(0, np.nan)).where(logret.notna())
+
+        return from_wide(result, panel.index, name=self.name)
@@ -2,6 +2,7 @@
 
 # 1. Import the tools from your base file
 from factors.base_factor import BaseFactor, register_factor
+from utils.dense_panel import from_wide, to_wide
 
 import pandas as pd
 import numpy as np
@@ -9,13 +10,21 @@ import numpy as np
 # 2. Use the decorator to give it a name for the registry
 @register_factor("panic_factor") 
 class PanicFactor(BaseFactor):
-    
+
+    # 市场收益 r_m,t 需要当天全部股票，分块计算时只能按日期分块
+    chunk_axis = 'date'
+
     # Optional: Override __init__ if you want to set default defaults
     def __init__(self, lookback=21, weight_method='equal', **kwargs):
         # Pass arguments back to the parent (BaseFactor)
         super().__init__(name="panic_factor", lookback=lookback, **kwargs)
         self.weight_method = weight_method  # 'equal' 等权, 'market_cap' 流通市值权重, 'turnover' 成交额权重
 
+    @property
+    def inputs(self) -> list[str]:
+        extra = {'market_cap': ['market_capitalization'], 'turnover': ['turnover']}
+        return ['close'] + extra.get(self.weight_method, [])
+
     # 3. Implement the REQUIRED calculate method
    
     def calculate(self, panel: pd.DataFrame) -> pd.Series:
@@ -38,103 +47,60 @@ class PanicFactor(BaseFactor):
         min_p = lookback // 2  # 放宽 min_periods 条件
         
         # 2. 计算个股日收益率 r_i,t
-        # 按 code 分组计算收益率，避免跨股票计算
-        r_i = panel['close'].groupby('code').pct_change(fill_method=None)
-        
-        # 3. 计算市场收益 r_m,t
-        # 按日期分组，计算每日的市场收益
+        # 在宽表 (date × code) 上按列计算，避免跨股票计算；稠密 panel 上宽表是 reshape 视图
+        r_i = to_wide(panel['close']).pct_change(fill_method=None)
+
+        # 3. 计算市场收益 r_m,t（每个日期一个值，按行广播）
         r_m = self._calculate_market_return(panel, r_i)
-        
+
         # 4. 计算惊恐度 panic_i,t = |r_i,t - r_m,t| / (|r_i,t| + |r_m,t| + 0.1)
         r_i_abs = r_i.abs()
         r_m_abs = r_m.abs()
-        panic = (r_i - r_m).abs() / (r_i_abs + r_m_abs + 0.1)
-        
+        panic = r_i.sub(r_m, axis=0).abs() / (r_i_abs.add(r_m_abs, axis=0) + 0.1)
+
         # 5. 计算惊恐收益 x_i,t = panic_i,t * r_i,t
         x_i = panic * r_i
-        
-        # 6. 计算因子值：21日滚动标准差
-        # 按 code 分组，计算滚动标准差
-        result = x_i.groupby('code').rolling(
-            window=lookback,
-            min_periods=min_p
-        ).std()
-        
-        # --- 步骤 B: 核心索引對齊邏輯 (解決 (code, date) vs (date, code) 問題) ---
-        
-        # 7. 如果索引層級 > 2，則假設最外層是冗餘的分組鍵並將其移除
-        if result.index.nlevels > 2:
-            result = result.droplevel(level=0)
-            
-        # 8. 確保索引名稱存在並與 panel 一致
-        if result.index.nlevels == 2 and result.index.names != panel.index.names:
-            # 複製 panel 的 index name，以便後續判斷
-            result.index.set_names(panel.index.names, inplace=True)
-            
-        # 9. 檢查並修正索引順序：如果當前是 ['code', 'date'] 而目標是 ['date', 'code']，則交換
-        if result.index.names[0] == panel.index.names[1] and result.index.names[1] == panel.index.names[0]:
-            result = result.swaplevel('date', 'code')
-
-        # 10. 排序和最終對齊 (reindex)
-        result = result.sort_index()
-        result = result.reindex(panel.index)
-
-        # 11. 最終清理：若當天無收盤價（如停牌），該值設為 NaN
+
+        # 6. 计算因子值：21日滚动标准差（按列滚动 = 按股票滚动）
+        result = x_i.rolling(window=lookback, min_periods=min_p).std()
+
+        # 7. 按 panel 的 index 展平回長表（稠密布局下不需要 reindex）
+        result = from_wide(result, panel.index)
+
+        # 8. 最終清理：若當天無收盤價（如停牌），該值設為 NaN
         mask_no_close = panel['close'].isna()
         result[mask_no_close] = np.nan
 
         return result
     
-    def _calculate_market_return(self, panel: pd.DataFrame, r_i: pd.Series) -> pd.Series:
+    def _calculate_market_return(self, panel: pd.DataFrame, r_i: pd.DataFrame) -> pd.Series:
         """
         计算市场收益 r_m,t
         
         参数:
             panel: MultiIndex DataFrame, index=['date', 'code']
-            r_i: 个股收益率 Series, index=['date', 'code']
+            r_i: 个股收益率宽表, index=date, columns=code
         
         返回:
-            r_m: 市场收益率 Series, index=['date', 'code']，每个日期所有股票的值相同
+            r_m: 市场收益率 Series, index=date
         """
         if self.weight_method == 'equal':
-            # 等权：r_m,t = (1/N_t) * Σ r_i,t
-            # 按日期分组，计算等权平均（自动忽略 NaN）
-            # 将每个日期的市场收益广播到该日期的所有股票
-            r_m = r_i.groupby('date').transform('mean')
-        elif self.weight_method == 'market_cap':
+            # 等权：r_m,t = (1/N_t) * Σ r_i,t（自动忽略 NaN）
+            return r_i.mean(axis=1)
+        if self.weight_method == 'market_cap':
             # 流通市值加权
             if 'market_capitalization' not in panel.columns:
                 raise ValueError("使用市值加权需要 panel 中包含 'market_capitalization' 列")
-            market_cap = panel['market_capitalization']
-            # 先计算每个日期的市场收益（只考虑有效数据）
-            r_m_by_date = {}
-            for date, date_group in r_i.groupby('date'):
-                valid_mask = date_group.notna() & market_cap.loc[date].notna()
-                if valid_mask.sum() == 0:
-                    r_m_by_date[date] = np.nan
-                else:
-                    weights = market_cap.loc[date, valid_mask] / market_cap.loc[date, valid_mask].sum()
-                    r_m_by_date[date] = (date_group[valid_mask] * weights).sum()
-            # 将每个日期的市场收益广播到该日期的所有股票
-            r_m = r_i.groupby('date').transform(lambda x: r_m_by_date.get(x.name, np.nan))
+            weight = to_wide(panel['market_capitalization'])
         elif self.weight_method == 'turnover':
             # 成交额加权
             if 'turnover' not in panel.columns:
                 raise ValueError("使用成交额加权需要 panel 中包含 'turnover' 列")
-            turnover = panel['turnover']
-            # 先计算每个日期的市场收益（只考虑有效数据）
-            r_m_by_date = {}
-            for date, date_group in r_i.groupby('date'):
-                valid_mask = date_group.notna() & turnover.loc[date].notna()
-                if valid_mask.sum() == 0:
-                    r_m_by_date[date] = np.nan
-                else:
-                    weights = turnover.loc[date, valid_mask] / turnover.loc[date, valid_mask].sum()
-                    r_m_by_date[date] = (date_group[valid_mask] * weights).sum()
-            # 将每个日期的市场收益广播到该日期的所有股票
-            r_m = r_i.groupby('date').transform(lambda x: r_m_by_date.get(x.name, np.nan))
+            weight = to_wide(panel['turnover'])
         else:
             raise ValueError(f"不支持的权重方法: {self.weight_method}")
-        
-        return r_m
 
+        # 只考虑收益和权重都有效的股票；某日没有有效股票时为 NaN
+        weight = weight.where(r_i.notna() & weight.notna())
+        total = weight.sum(axis=1)
+        return (r_i * weight).sum(axis=1) / total.where(total > 0)
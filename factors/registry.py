@@ -0,0 +1,139 @@
+# factors/registry.py
+"""
+因子插件发现：不导入因子模块就知道有哪些因子、各自在哪个模块
+
+- 扫描 factors/*.py 的源码文本，找 @register_factor("name")，记录 名字 -> 模块（只读文件，不 import）
+- 已安装的第三方包可以通过 entry point 提供因子（group = 'factor_research.factors'）:
+      [project.entry-points."factor_research.factors"]
+      my_factor = "my_pkg.factors:MyFactor"
+- get_factor(name) 第一次用到某个因子时才导入它所在的模块（模块里的 @register_factor 完成注册）
+
+因此脚本里不再需要 `import factors.panic_factor` 这种只为注册而写的导入，
+新加的 factors/xxx.py 也不需要改任何调用方。
+
+命令行（list 不导入 pandas / numpy，启动很快）:
+    python -m factors.registry list
+    python -m factors.registry compute illiq_guiji --param lookback=20
+"""
+import importlib
+import os
+import re
+
+FACTORS_DIR = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINT_GROUP = 'factor_research.factors'
+
+# 只认模块顶层（行首）的类装饰器，文档字符串里缩进的示例不算
+_DECORATOR = re.compile(r'^@register_factor\(\s*[\'"]([^\'"]+)[\'"]', re.MULTILINE)
+
+# 名字 -> 模块名（或 entry point 的 'module:attr'）
+_DISCOVERED: dict[str, str] | None = None
+
+
+def _scan_dir(directory: str = FACTORS_DIR, package: str = 'factors') -> dict[str, str]:
+    found = {}
+    for fname in sorted(os.listdir(directory)):
+        if not fname.endswith('.py') or fname.startswith('_'):
+            continue
+        with open(os.path.join(directory, fname), encoding='utf-8') as f:
+            source = f.read()
+        for name in _DECORATOR.findall(source):
+            found[name] = f'{package}.{fname[:-3]}'
+    return found
+
+
+def _scan_entry_points() -> dict[str, str]:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return {}
+    return {ep.name: ep.value for ep in entry_points(group=ENTRY_POINT_GROUP)}
+
+
+def discover(refresh: bool = False) -> dict[str, str]:
+    """
+    返回 {因子名: 模块}，本目录的因子优先于同名的 entry point
+
+    参数:
+        refresh: 重新扫描（运行中新增了因子文件时使用）
+    """
+    global _DISCOVERED
+    if _DISCOVERED is None or refresh:
+        found = _scan_entry_points()
+        found.update(_scan_dir())
+        _DISCOVERED = found
+    return _DISCOVERED
+
+
+def available_factors() -> list[str]:
+    """全部可用的因子名（已发现的 + 已手动注册的），不导入因子模块"""
+    from factors.base_factor import FACTOR_REGISTRY
+    return sorted(set(discover()) | set(FACTOR_REGISTRY))
+
+
+def load(name: str):
+    """
+    导入 name 所在的模块并返回因子类
+
+    模块里的 @register_factor 负责注册；entry point 指向的类没有用装饰器时，按 entry point 的名字注册
+    """
+    from factors.base_factor import FACTOR_REGISTRY
+    if name in FACTOR_REGISTRY:
+        return FACTOR_REGISTRY[name]
+    target = discover().get(name) or discover(refresh=True).get(name)
+    if target is None:
+        raise ValueError(f"Factor {name} not found in registry. 可用因子: {available_factors()}")
+    module_name, _, attr = target.partition(':')
+    module = importlib.import_module(module_name)
+    if name not in FACTOR_REGISTRY and attr:
+        FACTOR_REGISTRY[name] = getattr(module, attr)
+    if name not in FACTOR_REGISTRY:
+        raise ValueError(f"模块 {module_name} 中没有注册因子 {name}")
+    return FACTOR_REGISTRY[name]
+
+
+def _parse_value(text: str):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return {'true': True, 'false': False, 'none': None}.get(text.lower(), text)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="列出 / 计算因子库中的因子")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='列出可用因子（不导入因子模块）')
+    p_compute = sub.add_parser('compute', help='用清洗后的 panel 计算一个因子并保存到 data/factors')
+    p_compute.add_argument('factor_name', type=str)
+    p_compute.add_argument('--param', action='append', default=[], metavar='KEY=VALUE', help='因子参数，可重复')
+    p_compute.add_argument('--no-save', action='store_true', help='只计算、不写文件')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name, target in sorted(discover().items()):
+            print(f"{name:<20s} {target}")
+        return
+
+    import pandas as pd
+    from factors.base_factor import get_factor
+    from utils.io import PROCESSED_PATH, save_factor
+
+    params = {}
+    for item in args.param:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"参数格式应为 KEY=VALUE: {item}")
+        params[key] = _parse_value(value)
+    factor = get_factor(args.factor_name, **params)
+    panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    result = factor.run(panel)
+    print(result[factor.name].describe())
+    if not args.no_save:
+        print(f"因子已保存至: {save_factor(result, factor.name)}")
+
+
+if __name__ == "__main__":
+    main()
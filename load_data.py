@@ -3,6 +3,8 @@
 import os
 import pandas as pd
 
+from utils.dense_panel import ensure_dense
+
 def load_panel_data():
     """
     加载处理后的 panel 数据
@@ -35,8 +37,8 @@ def load_panel_data():
     if panel.index.names[0] != 'date':
         panel = panel.swaplevel('date', 'code')
     
-    # 排序
-    panel = panel.sort_index()
+    # 排序，并保证为完整的 (date × code) 稠密网格（已是稠密布局时不复制）
+    panel = ensure_dense(panel.sort_index())
     
     print(f"成功加载 panel 数据:")
     print(f"  - 形状: {panel.shape}")
@@ -5,11 +5,12 @@ import pandas as pd
 
 # 兼容直接运行和作为模块导入
 try:
-    from preprocess.load_data import load_data
+    from preprocess.load_data import RAW_FIELDS, load_fields
 except ImportError:
     # 如果作为脚本直接运行，使用相对导入
     sys.path.insert(0, os.path.dirname(__file__))
-    from load_data import load_data
+    from load_data import RAW_FIELDS, load_fields
+from utils.log import timed
 
 
 # 路径设置
@@ -19,21 +20,13 @@ INTERIM_PATH = os.path.join(ROOT, 'data', 'interim')
 os.makedirs(INTERIM_PATH, exist_ok=True)
 
 def load_raw():
-    close, high, low, open_price, volume, market_capitalization, turnover, daily_turnover_rate = load_data()
-    return {
-        "close": close,
-        "high": high,
-        "low": low,
-        "open_price": open_price,
-        "volume": volume,
-        "market_capitalization": market_capitalization,
-        "turnover": turnover,
-        "daily_turnover_rate": daily_turnover_rate
-    }
+    # 8 个原始字段并发读取，键与 RAW_FIELDS 一致
+    return load_fields(RAW_FIELDS)
 
 import pandas as pd
 import os # 假设你在 load_raw() 或其他地方导入了 os
 
+@timed('align_data')
 def align_data(dfs: dict):
     # 统一日期 & 代码：取所有表的交集
     # 注意：这里取的是原始数据的交集，确保所有 df 都有这些日期和代码
@@ -99,10 +92,7 @@ def align_data(dfs: dict):
     )
     panel.index.set_names(["date", "code"], inplace=True)
     
-    # 4. 移除调试代码
-    for code in codes:
-         print(code)
-    print(len(codes))
+    print(f"对齐后: {len(dates)} 个交易日 × {len(codes)} 只股票")
 
     return aligned, panel
 if __name__ == "__main__":
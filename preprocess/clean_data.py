@@ -1,9 +1,20 @@
 # preprocess/clean_data.py
 import os
+import sys
 import numpy as np
 import pandas as pd
 
 ROOT = os.path.dirname(os.path.dirname(__file__))    # factor/
+
+# 兼容直接运行和作为模块导入
+try:
+    from utils.dense_panel import ensure_dense
+    from utils.log import timed
+except ImportError:
+    sys.path.insert(0, os.path.abspath(ROOT))
+    from utils.dense_panel import ensure_dense
+    from utils.log import timed
+
 INTERIM_PATH = os.path.join(ROOT, 'data', 'interim')
 PROCESSED_PATH = os.path.join(ROOT, 'data', 'processed')
 os.makedirs(PROCESSED_PATH, exist_ok=True)
@@ -11,6 +22,7 @@ os.makedirs(PROCESSED_PATH, exist_ok=True)
 def load_panel():
     panel = pd.read_pickle(os.path.join(INTERIM_PATH, 'panel_aligned.pkl'))
     return panel
+@timed('add_status_fields')
 def add_status_fields(panel: pd.DataFrame) -> pd.DataFrame:
     """
     增加以下辅助字段:
@@ -124,7 +136,8 @@ def add_status_fields(panel: pd.DataFrame) -> pd.DataFrame:
         .apply(calc_ret_fwd_5d)
     )
 
-    return df
+    # 保证并标记稠密 (date × code) 布局，下游因子计算不再需要 reindex
+    return ensure_dense(df)
 
 
 if __name__ == "__main__":
@@ -1,108 +1,79 @@
 import os
-from tkinter import N
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
-# 使用 os.path.join
-def load_data():
-    datapath = os.path.join(os.path.dirname(__file__), '../data/raw/')
-    
-    close = pd.read_pickle(os.path.join(datapath,'CLOSE.pkl'))
-    high = pd.read_pickle(os.path.join(datapath,'HIGH.pkl'))
-    low = pd.read_pickle(os.path.join(datapath,'LOW.pkl'))
-    open_price = pd.read_pickle(os.path.join(datapath,'OPEN.pkl'))
-    volume = pd.read_pickle(os.path.join(datapath,'VOLUME.pkl'))
-    market_capitalization = pd.read_pickle(os.path.join(datapath,'market_cap.pkl'))
-    #print(market_capitalization.head())     # 打印market_capitalization的前20行
-    turnover = pd.read_pickle(os.path.join(datapath,'TURNOVER.pkl'))
-    daily_turnover_rate = pd.read_pickle(os.path.join(datapath,'DAILY_TURNOVER_RATE.pkl'))
-    
-    return close, high, low, open_price, volume, market_capitalization, turnover, daily_turnover_rate
+# 兼容直接运行和作为模块导入
+try:
+    from utils.log import timed
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.log import timed
 
-if __name__ == "__main__":
-    close, high, low, open_price, volume, market_capitalization, turnover, daily_turnover_rate = load_data()
-    print(close.head())
-    print(high.head())
-    print(low.head())
-    print(open_price.head())
-    print(volume.head())
-    print(market_capitalization.head())
-    print(turnover.head())
-    print(daily_turnover_rate.head())
-   
-    """
-    print("close.info()")
-    print(high.info())
-    print(low.info())
-    print(open_price.info())
-    print(volume.info())
-    print(market_capitalization.info())
-    print(turnover.info())
-    print(daily_turnover_rate.info())
+RAW_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'raw')
 
-    print(close.isnull().sum())
-    print(high.isnull().sum())
-    print(low.isnull().sum())
-    print(open_price.isnull().sum())
-    print(volume.isnull().sum())
-    print(market_capitalization.isnull().sum())
-    print(turnover.isnull().sum())
-    print(daily_turnover_rate.isnull().sum())
-    """
+# 字段注册表：字段名 -> data/raw 下的文件名（顺序即 load_data() 的返回顺序）
+FIELD_REGISTRY = {
+    'close': 'CLOSE.pkl',
+    'high': 'HIGH.pkl',
+    'low': 'LOW.pkl',
+    'open_price': 'OPEN.pkl',
+    'volume': 'VOLUME.pkl',
+    'market_capitalization': 'market_cap.pkl',
+    'turnover': 'TURNOVER.pkl',
+    'daily_turnover_rate': 'DAILY_TURNOVER_RATE.pkl',
+}
 
-    # 对同一个column，检查close和high,low,open_price,volume,market_capitalization,turnover,daily_turnover_rate是否同时存在缺失值
-    # 检查每个col是否在所有DataFrame中都缺失，或者都不缺失，否则报错
-    
-    dataframes = {
-        "close": close,
-        "high": high,
-        "low": low,
-        "open_price": open_price,
-        "volume": volume,
-        "market_capitalization": market_capitalization,
-        "turnover": turnover,
-        "daily_turnover_rate": daily_turnover_rate
-    }
 
-    # 所有出现过的列
-    all_columns = set()
-    for df in dataframes.values():
-        all_columns |= set(df.columns)
+# load_data() / align_data 使用的 8 个基础字段
+RAW_FIELDS = ['close', 'high', 'low', 'open_price', 'volume',
+              'market_capitalization', 'turnover', 'daily_turnover_rate']
 
-    # 记录每列的缺失数量
-    missing_summary = {}
 
-    for col in all_columns:
-        col_missing_info = {}  # 每个 df 中 col 的缺失情况
+def register_field(name: str, filename: str):
+    """注册新的原始字段（文件放在 data/raw 下）"""
+    FIELD_REGISTRY[name] = filename
 
-        is_missing_list = []
 
-        for name, df in dataframes.items():
-            if col not in df.columns:
-                col_missing_info[name] = "不存在"
-                is_missing_list.append(True)  # 当作全缺失处理
-            else:
-                missing_count = df[col].isna().sum()
-                col_missing_info[name] = missing_count
-                is_missing_list.append(missing_count == len(df))
+@timed('load_data')
+def load_fields(fields=None, datapath: str | None = None, max_workers: int | None = None) -> dict:
+    """
+    并发读取原始字段（线程池，文件 I/O 与反序列化重叠）
+
+    参数:
+        fields: 需要的字段名列表，默认 FIELD_REGISTRY 中全部字段
+        datapath: 原始数据目录，默认 data/raw
+        max_workers: 线程数，默认等于字段数（最多 8）
+    返回:
+        dict: {字段名: DataFrame(index=date, columns=code)}，顺序与 fields 一致
+    """
+    fields = list(FIELD_REGISTRY) if fields is None else list(fields)
+    unknown = [f for f in fields if f not in FIELD_REGISTRY]
+    if unknown:
+        raise ValueError(f"未注册的字段: {unknown}，可用字段: {list(FIELD_REGISTRY)}")
+    datapath = datapath or RAW_PATH
+    paths = {f: os.path.join(datapath, FIELD_REGISTRY[f]) for f in fields}
+    if len(fields) <= 1:
+        return {f: pd.read_pickle(p) for f, p in paths.items()}
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(fields), 8)) as pool:
+        futures = {f: pool.submit(pd.read_pickle, p) for f, p in paths.items()}
+        return {f: fut.result() for f, fut in futures.items()}
 
-        missing_summary[col] = col_missing_info
 
-        # 判断缺失情况是否一致
-        if all(is_missing_list):
-            print(f"列 {col} 在所有表中都完全缺失")
-        elif not any(is_missing_list):
-            print(f"列 {col} 在所有表中都存在（无全缺失情况）")
-        else:
-            print(f"⚠ 列 {col} 缺失情况不一致：")
-            for name, info in col_missing_info.items():
-                print(f" - {name}: {info}")
-            print("请检查该列！\n")
+# 使用 os.path.join
+def load_data(datapath: str | None = None):
+    data = load_fields(RAW_FIELDS, datapath=datapath)
+    return tuple(data[f] for f in RAW_FIELDS)
 
-    # 打印汇总表
-    #print("\n===== 缺失统计汇总 =====")
-    #print(pd.DataFrame(missing_summary).T)
-    
-    
-    print(len(close.index))
-    #print(market_capitalization.head(20))
+if __name__ == "__main__":
+    close, high, low, open_price, volume, market_capitalization, turnover, daily_turnover_rate = load_data()
+    print(close.head())
+    print(f"{len(close.index)} 个交易日 × {len(close.columns)} 只股票")
 
+    # 缺失一致性、价格关系、零成交、跳空等检查（向量化，见 preprocess/validate_data.py）
+    from preprocess.validate_data import save_issues, summarize, validate
+    issues = validate(dict(zip(RAW_FIELDS, (close, high, low, open_price, volume,
+                                            market_capitalization, turnover, daily_turnover_rate))))
+    print(f"数据校验: {len(issues)} 条问题记录，已保存至 {save_issues(issues)}")
+    if len(issues):
+        print(summarize(issues))
@@ -0,0 +1,364 @@
+# preprocess/minute_bars.py
+"""
+分钟线数据：按日列式存储 + 流式聚合成日度字段
+
+存储格式（data/minute/YYYYMMDD.npz，每个交易日一个文件）:
+    codes:   (n_codes,)            股票代码
+    minutes: (n_minutes,)          分钟时间戳 HHMM（如 931、1500）
+    close / volume / amount ...:   (n_codes, n_minutes) float32，每个字段一块连续数组（同一股票的分钟连续存放）
+
+聚合时一次只读一个交易日（后台线程预读下一天），内存占用与样本天数无关；
+每个聚合函数把一天的分钟数据压成每只股票一个数，结果拼成日度宽表 (date × code)，
+可以写成 data/raw 下的宽表并注册为原始字段，或直接用 join_panel() 并入 panel 供 BaseFactor.run 使用。
+
+用法:
+    from preprocess.minute_bars import ingest, aggregate, join_panel
+    ingest(bars)                                   # 长表 -> data/minute/YYYYMMDD.npz
+    fields = aggregate(['realized_vol', 'vwap', 'intraday_amihud'])
+    panel = join_panel(panel, fields)
+
+    python -m preprocess.minute_bars ingest bars_2024*.pkl
+    python -m preprocess.minute_bars aggregate --features realized_vol vwap --save
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.io import DATA_PATH, RAW_PATH, prefetch
+
+MINUTE_PATH = os.path.join(DATA_PATH, 'minute')
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+# =========================
+# 存储
+# =========================
+class MinuteDay:
+    """一个交易日的分钟线: codes × minutes 的若干字段数组"""
+
+    def __init__(self, date, codes: np.ndarray, minutes: np.ndarray, fields: dict):
+        self.date = pd.Timestamp(date)
+        self.codes = codes
+        self.minutes = minutes
+        self.fields = fields
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        if field not in self.fields:
+            raise KeyError(f"{self.date.date()} 的分钟线中没有字段: {field}")
+        return self.fields[field]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.fields
+
+    def __repr__(self):
+        return f"MinuteDay({self.date.date()}, codes={len(self.codes)}, minutes={len(self.minutes)})"
+
+
+def day_file(date, root: str = MINUTE_PATH) -> str:
+    return os.path.join(root, f'{pd.Timestamp(date):%Y%m%d}.npz')
+
+
+def write_day(day: MinuteDay, root: str = MINUTE_PATH) -> str:
+    """把一个交易日写成 npz（已存在则覆盖）"""
+    os.makedirs(root, exist_ok=True)
+    path = day_file(day.date, root)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, codes=day.codes.astype(str), minutes=day.minutes.astype(np.int16),
+             **{k: np.asarray(v, dtype=np.float32) for k, v in day.fields.items()})
+    os.replace(tmp, path)
+    return path
+
+
+def read_day(date, root: str = MINUTE_PATH, fields: list[str] | None = None) -> MinuteDay:
+    """读取一个交易日；fields 只加载需要的字段（npz 按成员惰性解压）"""
+    path = day_file(date, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到分钟线文件: {path}")
+    with np.load(path) as z:
+        names = [k for k in z.files if k not in ('codes', 'minutes')]
+        missing = [f for f in fields or [] if f not in names]
+        if missing:
+            raise ValueError(f"{path} 中缺少字段: {missing}，已有字段: {names}")
+        return MinuteDay(date, z['codes'], z['minutes'], {k: z[k] for k in (fields or names)})
+
+
+def list_days(root: str = MINUTE_PATH, start=None, end=None) -> pd.DatetimeIndex:
+    """已入库的交易日（升序），可按 [start, end] 截取"""
+    if not os.path.isdir(root):
+        return pd.DatetimeIndex([], name='date')
+    stems = sorted(f[:8] for f in os.listdir(root) if f.endswith('.npz') and f[:8].isdigit() and len(f) == 12)
+    days = pd.DatetimeIndex(pd.to_datetime(stems, format='%Y%m%d'), name='date')
+    if start is not None:
+        days = days[days >= pd.Timestamp(start)]
+    if end is not None:
+        days = days[days <= pd.Timestamp(end)]
+    return days
+
+
+def iter_days(days=None, root: str = MINUTE_PATH, fields: list[str] | None = None):
+    """按日期顺序逐日产出 MinuteDay；读下一天与处理当天重叠，内存中最多两天"""
+    days = list_days(root) if days is None else days
+    return prefetch(((lambda d=d: read_day(d, root, fields)) for d in days), depth=1)
+
+
+def _frame_to_day(date, bars: pd.DataFrame) -> MinuteDay:
+    """一天的长表 (code, time, 字段...) -> MinuteDay"""
+    code_pos, codes = pd.factorize(bars['code'], sort=True)      # 哈希分桶，比 np.unique 对字符串排序快
+    minute_pos, minutes = pd.factorize(bars['time'], sort=True)
+    fields = {}
+    for field in BAR_FIELDS:
+        if field not in bars.columns:
+            continue
+        arr = np.full((len(codes), len(minutes)), np.nan, dtype=np.float32)
+        arr[code_pos, minute_pos] = bars[field].to_numpy(dtype=np.float32)
+        fields[field] = arr
+    if 'close' not in fields:
+        raise ValueError("分钟线中必须有 'close' 列")
+    return MinuteDay(date, np.asarray(codes, dtype=str), np.asarray(minutes, dtype=np.int16), fields)
+
+
+def ingest(bars, root: str = MINUTE_PATH) -> list[str]:
+    """
+    分钟线长表入库
+
+    参数:
+        bars: DataFrame 或 DataFrame 的可迭代对象（逐块读入，每块须包含完整的交易日）；
+              列为 code + ('datetime' 或 'date' 与 HHMM 整数 'time') + BAR_FIELDS 中的若干字段（至少 close）
+        root: 存储目录，默认 data/minute
+    返回:
+        写入的文件路径列表
+    """
+    chunks = [bars] if isinstance(bars, pd.DataFrame) else bars
+    paths = []
+    for chunk in chunks:
+        if 'datetime' in chunk.columns:
+            ts = pd.to_datetime(chunk['datetime'])
+            chunk = chunk.assign(date=ts.dt.normalize(), time=ts.dt.hour * 100 + ts.dt.minute)
+        elif not {'date', 'time'}.issubset(chunk.columns):
+            raise ValueError("分钟线必须有 'datetime' 列，或 'date' + 'time' (HHMM) 两列")
+        for date, day in chunk.groupby(pd.to_datetime(chunk['date']), sort=True):
+            paths.append(write_day(_frame_to_day(date, day), root))
+    return paths
+
+
+# =========================
+# 日内聚合（一天 -> 每只股票一个数）
+# =========================
+AGGREGATORS = {}
+
+
+def register_aggregator(name: str):
+    """
+    注册聚合函数：func(day: MinuteDay) -> np.ndarray (n_codes,)
+    @register_aggregator("realized_vol")
+    def realized_vol(day): ...
+    """
+    def decorator(func):
+        AGGREGATORS[name] = func
+        return func
+    return decorator
+
+
+def _minute_returns(day: MinuteDay) -> np.ndarray:
+    """日内分钟对数收益 (n_codes, n_minutes - 1)，不含隔夜；缺失分钟处为 NaN"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_close = np.log(day['close'].astype(np.float64))
+    return np.diff(log_close, axis=1)
+
+
+def _amount(day: MinuteDay) -> np.ndarray:
+    """每分钟成交额；没有 amount 字段时用 close × volume 近似"""
+    if 'amount' in day:
+        return day['amount'].astype(np.float64)
+    return day['close'].astype(np.float64) * day['volume']
+
+
+def _valid_ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, num / den, np.nan)
+
+
+@register_aggregator("realized_vol")
+def realized_vol(day: MinuteDay) -> np.ndarray:
+    """已实现波动率 sqrt(Σ r_m²)，有效分钟收益不足 2 个时为 NaN"""
+    r = _minute_returns(day)
+    valid = np.isfinite(r)
+    rv = np.sqrt(np.where(valid, r * r, 0.0).sum(axis=1))
+    return np.where(valid.sum(axis=1) >= 2, rv, np.nan)
+
+
+@register_aggregator("vwap")
+def vwap(day: MinuteDay) -> np.ndarray:
+    """成交量加权均价 Σ amount / Σ volume"""
+    volume = day['volume'].astype(np.float64)
+    amount = _amount(day)
+    valid = np.isfinite(volume) & np.isfinite(amount)
+    return _valid_ratio(np.where(valid, amount, 0.0).sum(axis=1), np.where(valid, volume, 0.0).sum(axis=1))
+
+
+@register_aggregator("intraday_amihud")
+def intraday_amihud(day: MinuteDay) -> np.ndarray:
+    """日内 Amihud: 有成交分钟上 |r_m| / amount_m 的均值"""
+    r = np.abs(_minute_returns(day))
+    amount = _amount(day)[:, 1:]
+    term = _valid_ratio(r, amount)
+    valid = np.isfinite(term)
+    return _valid_ratio(np.where(valid, term, 0.0).sum(axis=1), valid.sum(axis=1))
+
+
+@register_aggregator("minute_logret")
+def minute_logret(day: MinuteDay) -> np.ndarray:
+    """Σ log(1 + |r_m|)：分钟频的 illiq_guiji 分子（与 amount 配合做滚动比值）"""
+    r = _minute_returns(day)
+    valid = np.isfinite(r)
+    out = np.log1p(np.abs(np.where(valid, r, 0.0))).sum(axis=1)
+    return np.where(valid.any(axis=1), out, np.nan)
+
+
+@register_aggregator("amount")
+def amount(day: MinuteDay) -> np.ndarray:
+    """全天成交额 Σ amount_m"""
+    a = _amount(day)
+    valid = np.isfinite(a)
+    return np.where(valid.any(axis=1), np.where(valid, a, 0.0).sum(axis=1), np.nan)
+
+
+# 聚合结果写成 data/raw 宽表时使用的文件名（与 preprocess.load_data.FIELD_REGISTRY 的写法一致）
+MINUTE_FIELDS = {
+    'realized_vol': 'MINUTE_REALIZED_VOL.pkl',
+    'vwap': 'MINUTE_VWAP.pkl',
+    'intraday_amihud': 'MINUTE_AMIHUD.pkl',
+    'minute_logret': 'MINUTE_LOGRET.pkl',
+    'amount': 'MINUTE_AMOUNT.pkl',
+}
+
+# 各聚合函数需要的原始分钟字段（只从 npz 中解压这些数组）
+_NEEDS = {
+    'realized_vol': ['close'],
+    'vwap': ['close', 'volume', 'amount'],
+    'intraday_amihud': ['close', 'volume', 'amount'],
+    'minute_logret': ['close'],
+    'amount': ['close', 'volume', 'amount'],
+}
+
+
+def aggregate(features: list[str] | None = None, start=None, end=None,
+              root: str = MINUTE_PATH) -> dict[str, pd.DataFrame]:
+    """
+    逐日流式聚合分钟线
+
+    参数:
+        features: 聚合函数名（AGGREGATORS 的键），默认全部
+        start, end: 日期范围（含两端），默认全部已入库日期
+        root: 分钟线存储目录
+    返回:
+        dict: {特征名: DataFrame(index=date, columns=code)}
+    """
+    features = list(AGGREGATORS) if features is None else list(features)
+    unknown = [f for f in features if f not in AGGREGATORS]
+    if unknown:
+        raise ValueError(f"未注册的聚合函数: {unknown}，可用: {list(AGGREGATORS)}")
+    days = list_days(root, start, end)
+    if len(days) == 0:
+        raise FileNotFoundError(f"{root} 中没有分钟线数据，请先运行 ingest()")
+
+    with np.load(day_file(days[0], root)) as z:
+        available = set(z.files)
+    needs = sorted({n for f in features for n in _NEEDS.get(f, BAR_FIELDS) if n in available} | {'close'})
+
+    rows = {f: [] for f in features}
+    for day in iter_days(days, root, fields=needs):
+        for f in features:
+            rows[f].append(pd.Series(AGGREGATORS[f](day), index=day.codes))
+
+    out = {}
+    for f in features:
+        wide = pd.DataFrame(rows[f], index=days)
+        wide.index.name = 'date'
+        wide.columns.name = 'code'
+        out[f] = wide.sort_index(axis=1)
+    return out
+
+
+def save_fields(features: dict[str, pd.DataFrame], datapath: str = RAW_PATH) -> list[str]:
+    """
+    把聚合结果写成 data/raw 下的宽表，并注册到 preprocess.load_data.FIELD_REGISTRY，
+    之后可以像 CLOSE.pkl 一样通过 load_fields() 读取
+    """
+    from preprocess.load_data import register_field
+
+    paths = []
+    for name, wide in features.items():
+        filename = MINUTE_FIELDS.get(name, f'MINUTE_{name.upper()}.pkl')
+        path = os.path.join(datapath, filename)
+        wide.to_pickle(path)
+        register_field(name, filename)
+        paths.append(path)
+    return paths
+
+
+def register_minute_fields(datapath: str = RAW_PATH) -> list[str]:
+    """把 data/raw 中已存在的分钟聚合宽表注册为原始字段，返回注册的字段名"""
+    from preprocess.load_data import register_field
+
+    names = [n for n, f in MINUTE_FIELDS.items() if os.path.exists(os.path.join(datapath, f))]
+    for name in names:
+        register_field(name, MINUTE_FIELDS[name])
+    return names
+
+
+def join_panel(panel: pd.DataFrame, features: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    把日度宽表按 (date, code) 并入 panel（panel 中没有分钟数据的行为 NaN）
+
+    参数:
+        panel: index=['date', 'code'] 的长面板
+        features: {列名: DataFrame(index=date, columns=code)}，如 aggregate() 的返回值
+    返回:
+        新增了这些列的 panel（副本）
+    """
+    panel = panel.copy()
+    dates = panel.index.get_level_values('date')
+    codes = panel.index.get_level_values('code')
+    for name, wide in features.items():
+        d = wide.index.get_indexer(dates)
+        c = wide.columns.get_indexer(codes)
+        hit = (d >= 0) & (c >= 0)
+        col = np.full(len(panel), np.nan)
+        col[hit] = wide.to_numpy(dtype=np.float64)[d[hit], c[hit]]
+        panel[name] = col
+    return panel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分钟线入库与日度聚合")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('ingest', help='分钟线长表 (pkl / csv) 入库')
+    p.add_argument('files', nargs='+')
+
+    p = sub.add_parser('aggregate', help='聚合成日度宽表')
+    p.add_argument('--features', nargs='*', default=None, help=f'默认全部: {list(AGGREGATORS)}')
+    p.add_argument('--start', type=str, default=None)
+    p.add_argument('--end', type=str, default=None)
+    p.add_argument('--save', action='store_true', help='写成 data/raw 下的宽表')
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        def read(path):
+            return pd.read_csv(path) if path.endswith('.csv') else pd.read_pickle(path)
+        paths = ingest(read(f) for f in args.files)
+        print(f"已写入 {len(paths)} 个交易日到 {MINUTE_PATH}")
+    else:
+        features = aggregate(args.features, args.start, args.end)
+        for name, wide in features.items():
+            print(f"{name}: {wide.shape[0]} 天 × {wide.shape[1]} 只股票")
+        if args.save:
+            for path in save_fields(features):
+                print(f"已保存: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# preprocess/validate_data.py
+"""
+原始数据质量校验（对齐之前运行）
+
+把 8 个原始字段堆成 (field, date, code) 的 float32 数组，整块向量化检查:
+    missing_mismatch   同一 (date, code) 上部分字段缺失、部分字段有值（按缺失的字段报告）
+    column_absent      某字段的表中根本没有这只股票
+    price_bounds       low > close / low > open / high < close / high < open / low > high
+    non_positive_price 价格 <= 0
+    negative_value     成交量 / 成交额 / 市值 / 换手率 < 0
+    zero_volume_price  成交量为 0 但有收盘价；或成交量与成交额一个为 0 一个不为 0
+    jump_outlier       相对上一个有效收盘价的对数收益偏离该股票中位数超过 jump_z 个稳健标准差（MAD）且绝对值 > jump_min
+
+结果是一张紧凑的问题表，每行对应 (check, field, code)：出现次数、首次 / 末次日期、严重程度。
+severity='error' 的问题（价格关系错误、非正价格、负值）超过 max_errors 时 gate() 抛出 ValueError，流水线在对齐前停止；
+'warning' 只记录。
+
+float32 的舍入是单调的，只可能把 a > b 变成 a == b、不会反过来，因此价格关系检查不会因降精度产生误报。
+
+用法:
+    python -m preprocess.validate_data                       # 校验 data/raw，问题表写到 data/interim/data_issues.csv
+    issues = validate(load_fields(RAW_FIELDS)); gate(issues)
+"""
+import argparse
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# 兼容直接运行和作为模块导入
+try:
+    from preprocess.load_data import RAW_FIELDS, load_fields
+except ImportError:
+    sys.path.insert(0, os.path.dirname(__file__))
+    from load_data import RAW_FIELDS, load_fields
+from utils.log import timed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ISSUES_PATH = os.path.join(ROOT, 'data', 'interim', 'data_issues.csv')
+
+PRICE_FIELDS = ['close', 'high', 'low', 'open_price']
+NON_NEGATIVE_FIELDS = ['volume', 'turnover', 'market_capitalization', 'daily_turnover_rate']
+
+ERROR_CHECKS = {'price_bounds', 'non_positive_price', 'negative_value'}
+ISSUE_COLUMNS = ['check', 'field', 'code', 'count', 'first_date', 'last_date', 'severity']
+
+
+def stack_fields(dfs: dict, fields=None, dtype=np.float32):
+    """
+    把宽表字段堆成 (field, date, code) 数组（日期 / 股票取各表的并集，缺失为 NaN）
+
+    返回:
+        cube, fields, dates, codes, has_column (field, code) 布尔数组：该字段的表中是否有这只股票
+    """
+    fields = [f for f in (fields or list(dfs)) if f in dfs]
+    dates = pd.DatetimeIndex(sorted(set().union(*(dfs[f].index for f in fields))), name='date')
+    codes = pd.Index(sorted(set().union(*(dfs[f].columns for f in fields))), name='code')
+    cube = np.full((len(fields), len(dates), len(codes)), np.nan, dtype=dtype)
+    has_column = np.zeros((len(fields), len(codes)), dtype=bool)
+    for i, f in enumerate(fields):
+        df = dfs[f]
+        rows = dates.get_indexer(df.index)
+        cols = codes.get_indexer(df.columns)
+        cube[i][np.ix_(rows, cols)] = df.to_numpy(dtype=dtype, na_value=np.nan)
+        has_column[i, cols] = True
+    return cube, fields, dates, codes, has_column
+
+
+def _issues(check: str, field: str, mask: np.ndarray, dates, codes) -> list[dict]:
+    """(date, code) 布尔矩阵 → 每只出问题的股票一行"""
+    counts = mask.sum(axis=0)
+    hit = np.flatnonzero(counts)
+    if not len(hit):
+        return []
+    sub = mask[:, hit]
+    first = sub.argmax(axis=0)
+    last = len(dates) - 1 - sub[::-1].argmax(axis=0)
+    severity = 'error' if check in ERROR_CHECKS else 'warning'
+    return [{'check': check, 'field': field, 'code': codes[j], 'count': int(counts[j]),
+             'first_date': dates[f], 'last_date': dates[l], 'severity': severity}
+            for j, f, l in zip(hit, first, last)]
+
+
+def _prev_valid(values: np.ndarray) -> np.ndarray:
+    """每个位置之前（不含当天）最近一个非 NaN 值，按列（股票）沿时间方向"""
+    n = len(values)
+    idx = np.where(np.isnan(values), -1, np.arange(n)[:, None])
+    idx = np.maximum.accumulate(idx, axis=0)
+    prev_idx = np.vstack([np.full((1, values.shape[1]), -1), idx[:-1]])
+    out = np.take_along_axis(values, np.maximum(prev_idx, 0), axis=0)
+    out[prev_idx < 0] = np.nan
+    return out
+
+
+@timed('validate_data')
+def validate(dfs: dict, fields=None, rel_tol: float = 1e-6, jump_z: float = 10.0, jump_min: float = 0.1) -> pd.DataFrame:
+    """
+    参数:
+        dfs: {字段名: 宽表 (index=date, columns=code)}，如 load_fields(RAW_FIELDS)
+        fields: 参与校验的字段，默认 dfs 中全部
+        rel_tol: 价格关系检查的相对容差
+        jump_z: 跳空检查的稳健 z 值阈值
+        jump_min: 跳空检查的最小绝对对数收益
+    返回:
+        问题表 DataFrame，列为 ISSUE_COLUMNS，按 severity、check、field、count 排序
+    """
+    cube, fields, dates, codes, has_column = stack_fields(dfs, fields)
+    pos = {f: i for i, f in enumerate(fields)}
+    issues = []
+
+    # 1. 缺失一致性（不存在的列单独报告，不计入逐日比较）
+    missing = np.isnan(cube)
+    n_missing = missing.sum(axis=0, where=has_column[:, None, :])
+    n_fields = has_column.sum(axis=0)
+    partial = (n_missing > 0) & (n_missing < n_fields)
+    for f, i in pos.items():
+        issues += _issues('missing_mismatch', f, missing[i] & partial & has_column[i], dates, codes)
+        absent = ~has_column[i] & has_column.any(axis=0)
+        issues += [{'check': 'column_absent', 'field': f, 'code': codes[j], 'count': len(dates),
+                    'first_date': dates[0], 'last_date': dates[-1], 'severity': 'warning'}
+                   for j in np.flatnonzero(absent)]
+
+    # 2. 价格关系与取值范围（NaN 比较为 False，不会误报）
+    g = {f: cube[pos[f]] for f in PRICE_FIELDS + NON_NEGATIVE_FIELDS if f in pos}
+    scale = 1 + rel_tol
+    with np.errstate(invalid='ignore'):
+        bounds = [('low', 'close', 'low>close'), ('low', 'open_price', 'low>open'),
+                  ('close', 'high', 'close>high'), ('open_price', 'high', 'open>high'), ('low', 'high', 'low>high')]
+        for lo, hi, label in bounds:
+            if lo in g and hi in g:
+                issues += _issues('price_bounds', label, g[lo] > g[hi] * scale, dates, codes)
+        for f in PRICE_FIELDS:
+            if f in g:
+                issues += _issues('non_positive_price', f, g[f] <= 0, dates, codes)
+        for f in NON_NEGATIVE_FIELDS:
+            if f in g:
+                issues += _issues('negative_value', f, g[f] < 0, dates, codes)
+
+        # 3. 成交量为 0 却有价格 / 成交量与成交额不一致
+        if 'volume' in g and 'close' in g:
+            issues += _issues('zero_volume_price', 'volume', (g['volume'] == 0) & np.isfinite(g['close']), dates, codes)
+        if 'volume' in g and 'turnover' in g:
+            mismatch = ((g['volume'] == 0) != (g['turnover'] == 0)) & np.isfinite(g['volume']) & np.isfinite(g['turnover'])
+            issues += _issues('zero_volume_price', 'turnover', mismatch, dates, codes)
+
+        # 4. 跳空异常：相对上一个有效收盘价，按股票做稳健 z 值
+        if 'close' in g:
+            close = g['close'].astype(np.float64)
+            ret = np.log(close / _prev_valid(close))
+            ret[~np.isfinite(ret)] = np.nan
+            if np.isfinite(ret).any():
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)   # 全 NaN 的列
+                    med = np.nanmedian(ret, axis=0)
+                    mad = np.nanmedian(np.abs(ret - med), axis=0) * 1.4826
+                z = np.abs(ret - med) / np.where(mad > 0, mad, np.nan)
+                issues += _issues('jump_outlier', 'close', (z > jump_z) & (np.abs(ret) > jump_min), dates, codes)
+
+    table = pd.DataFrame(issues, columns=ISSUE_COLUMNS)
+    if len(table):
+        table = table.sort_values(['severity', 'check', 'field', 'count'], ascending=[True, True, True, False])
+    return table.reset_index(drop=True)
+
+
+def summarize(issues: pd.DataFrame) -> pd.DataFrame:
+    """按 (severity, check, field) 汇总：涉及股票数与单元格数"""
+    if issues.empty:
+        return pd.DataFrame(columns=['codes', 'cells'])
+    return issues.groupby(['severity', 'check', 'field']).agg(codes=('code', 'nunique'), cells=('count', 'sum'))
+
+
+def gate(issues: pd.DataFrame, max_errors: int = 0) -> pd.DataFrame:
+    """error 级问题的单元格数超过 max_errors 时抛出 ValueError；否则原样返回问题表"""
+    errors = issues[issues['severity'] == 'error']
+    n_cells = int(errors['count'].sum())
+    if n_cells > max_errors:
+        raise ValueError(f"原始数据校验未通过: {n_cells} 个 error 级单元格（允许 {max_errors}）\n"
+                         f"{summarize(errors)}\n详见问题表 {ISSUES_PATH}")
+    return issues
+
+
+def save_issues(issues: pd.DataFrame, path: str = ISSUES_PATH) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    issues.to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原始数据质量校验")
+    parser.add_argument('--max-errors', type=int, default=0, help='允许的 error 级单元格数')
+    parser.add_argument('--jump-z', type=float, default=10.0)
+    parser.add_argument('--jump-min', type=float, default=0.1)
+    args = parser.parse_args()
+
+    dfs = load_fields(RAW_FIELDS)
+    issues = validate(dfs, jump_z=args.jump_z, jump_min=args.jump_min)
+    print(f"校验完成: {len(issues)} 条问题记录，已保存至 {save_issues(issues)}")
+    if len(issues):
+        print(summarize(issues))
+    gate(issues, max_errors=args.max_errors)
+    print("没有 error 级问题")
+
+
+if __name__ == "__main__":
+    main()
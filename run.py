@@ -2,6 +2,7 @@
 import os
 import pandas as pd
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 # 導入自定義模塊 (確保 factor_evaluation 文件夾裡有 __init__.py，或者為空文件)
 from factor_evaluation.util import get_clean_factor_and_forward_returns
@@ -17,24 +18,40 @@ import argparse
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--factor_name', type=str, default='illiq_guiji', help='因子名称, 用于自动设定path')
+parser.add_argument('--no-show', action='store_true', help='只保存图片，不弹出窗口（服务器上使用）')
+parser.add_argument('--walk_forward', action='store_true', help='样本外滚动评估（训练窗口拟合、测试窗口评估，只保存图片）')
+parser.add_argument('--train', type=int, default=252, help='walk-forward 训练窗口长度（交易日）')
+parser.add_argument('--test', type=int, default=21, help='walk-forward 测试窗口长度（交易日）')
+parser.add_argument('--mode', type=str, default='rolling', choices=['rolling', 'expanding'], help='walk-forward 窗口方式')
+parser.add_argument('--neutralize', nargs='*', default=None, help='walk-forward 中性化风格列，如 ln_mkt_cap')
+parser.add_argument('--screen', action='store_true', help='先在抽樣日期 / 股票上快速篩選，未通過則不做完整評估')
+parser.add_argument('--screen_threshold', type=float, default=0.02, help='篩選的 |IC Mean| 門檻')
 args, unknown = parser.parse_known_args()
 FACTOR_NAME = args.factor_name
 FACTOR_PATH = os.path.join('data', 'factors', f'{FACTOR_NAME}.pkl')
 
 def main():
-    # 1. 讀取數據
+    # 1. 讀取數據（Panel 與因子並發讀取）
     print(f"正在讀取 Panel 數據: {PANEL_PATH}")
     if not os.path.exists(PANEL_PATH):
         print("錯誤：找不到 Panel 文件，請先運行 clean_data.py")
         return
-    panel = pd.read_pickle(PANEL_PATH)
 
     print(f"正在讀取 因子 數據: {FACTOR_PATH}")
     if not os.path.exists(FACTOR_PATH):
         print("錯誤：找不到因子文件，請先運行因子計算腳本")
         return
-    factor = pd.read_pickle(FACTOR_PATH)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        panel_future = pool.submit(pd.read_pickle, PANEL_PATH)
+        factor_future = pool.submit(pd.read_pickle, FACTOR_PATH)
+        panel = panel_future.result()
+        factor = factor_future.result()
     factor=factor.set_index(['date', 'code'])
+    if args.screen and not run_screen(panel, factor):
+        return
+    if args.walk_forward:
+        run_walk_forward(panel, factor)
+        return
     # 2. 數據融合與清洗
     print("\n[1/3] 正在合併因子與未來收益...")
     # 使用 ret_fwd_1d (T+1收益) 進行評估
@@ -61,7 +78,7 @@ def main():
     ic_plot_path = os.path.join(results_dir, f'{FACTOR_NAME}_ic_analysis.png')
     
     # 畫圖
-    ic_analyzer.plot_ic(save_path=ic_plot_path) 
+    ic_analyzer.plot_ic(save_path=ic_plot_path, show=not args.no_show)
    
 
     # 4. 分層回測
@@ -77,9 +94,49 @@ def main():
     layer_plot_path = os.path.join(results_dir, f'{FACTOR_NAME}_layer_backtest.png')
     
     # 畫圖
-    layer_tester.plot_cumulative(layer_ret, save_path=layer_plot_path)
+    layer_tester.plot_cumulative(layer_ret, save_path=layer_plot_path, show=not args.no_show)
     
     print("\n分析完成！")
 
+def run_screen(panel, factor):
+    """快速篩選：抽樣 IC 的置信區間明確低於門檻時返回 False（跳過完整評估）"""
+    from factor_evaluation.screening import FactorScreener
+
+    screener = FactorScreener(panel)
+    print(f"\n[screen] {screener}，門檻 |IC| = {args.screen_threshold}")
+    result = screener.screen(factor[FACTOR_NAME], threshold=args.screen_threshold, name=FACTOR_NAME)
+    print(result)
+    if result['Decision'] == 'reject':
+        print("\n篩選未通過（IC 顯著低於門檻），跳過完整評估")
+        return False
+    print(f"篩選結論: {result['Decision']}，繼續完整評估")
+    return True
+
+def run_walk_forward(panel, factor):
+    """樣本外滾動評估：每個窗口只用訓練期擬合方向 / 中性化 / 分位點，在測試期上評估"""
+    from factor_evaluation.walk_forward import WalkForward
+    from utils import plot
+
+    print(f"\n[walk-forward] 訓練 {args.train} 天 / 測試 {args.test} 天 ({args.mode})...")
+    wf = WalkForward(panel, factor[[FACTOR_NAME]], fwd_ret_col='ret_fwd_1d',
+                     neutralize_cols=args.neutralize, groups=5)
+    windows = wf.run(train=args.train, test=args.test, mode=args.mode)
+    print(windows)
+    print("-" * 30)
+    print("樣本外績效指標:")
+    print(wf.get_summary())
+    print("-" * 30)
+
+    results_dir = os.path.join('data', 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    windows.to_csv(os.path.join(results_dir, f'{FACTOR_NAME}_walk_forward.csv'))
+    wf.layer_ret.assign(IC=wf.ic_series).to_csv(os.path.join(results_dir, f'{FACTOR_NAME}_walk_forward_daily.csv'))
+
+    layer_plot_path = os.path.join(results_dir, f'{FACTOR_NAME}_walk_forward.png')
+    plot.plot_cumulative(wf.layer_ret, f'{FACTOR_NAME} (walk-forward)', save_path=layer_plot_path, groups=5)
+    print(f"樣本外分層回測圖已保存至: {layer_plot_path}")
+    print("\n分析完成！")
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+# strategy/position_sizing.py
+"""
+仓位管理：把"选中哪些股票"的布尔矩阵转换成目标权重矩阵
+
+所有函数都在宽表 (index=调仓日, columns=code) 上整体向量化计算，不逐日循环。
+多头部分权重和为 1；多空组合中空头部分权重和为 -1。
+"""
+import numpy as np
+import pandas as pd
+
+
+def _normalize(raw: pd.DataFrame) -> pd.DataFrame:
+    """按行归一化，使每行权重和为 1（整行为 0 / NaN 时保持 0）"""
+    raw = raw.fillna(0.0)
+    total = raw.sum(axis=1)
+    return raw.div(total.where(total > 0), axis=0).fillna(0.0)
+
+
+def equal_weight(selected: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """等权：选中的股票平分权重"""
+    return _normalize(selected.astype(float))
+
+
+def market_cap_weight(selected: pd.DataFrame, market_cap: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """
+    市值加权
+
+    参数:
+        selected: 布尔矩阵 (调仓日 × code)
+        market_cap: 市值宽表，index 至少覆盖 selected.index
+    """
+    mcap = market_cap.reindex(index=selected.index, columns=selected.columns)
+    return _normalize(mcap.where(selected & (mcap > 0)))
+
+
+def inverse_vol_weight(selected: pd.DataFrame, volatility: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """
+    波动率倒数加权（波动率缺失的股票不持有）
+
+    参数:
+        selected: 布尔矩阵 (调仓日 × code)
+        volatility: 波动率宽表（如过去 20 日收益标准差），index 至少覆盖 selected.index
+    """
+    vol = volatility.reindex(index=selected.index, columns=selected.columns)
+    inv = 1.0 / vol.where(selected & (vol > 0))
+    return _normalize(inv.replace([np.inf, -np.inf], np.nan))
+
+
+SIZERS = {
+    'equal': equal_weight,
+    'market_cap': market_cap_weight,
+    'inverse_vol': inverse_vol_weight,
+}
+
+
+def size_positions(selected: pd.DataFrame, method: str = 'equal', **data) -> pd.DataFrame:
+    """
+    按指定方法给选中的股票分配权重
+
+    参数:
+        selected: 布尔矩阵 (调仓日 × code)
+        method: 'equal' / 'market_cap' / 'inverse_vol'
+        data: 对应方法需要的宽表，market_cap=... 或 volatility=...
+    返回:
+        DataFrame: 权重矩阵，每行和为 1（无选中股票的行为 0）
+    """
+    sizer = SIZERS.get(method)
+    if sizer is None:
+        raise ValueError(f"不支持的仓位方法: {method}，可选: {list(SIZERS)}")
+    return sizer(selected, **data)
+
+
+def rolling_volatility(returns: pd.DataFrame, lookback: int = 20) -> pd.DataFrame:
+    """收益宽表的滚动标准差（按列向量化），用于 inverse_vol"""
+    return returns.rolling(lookback, min_periods=max(lookback // 2, 2)).std()
@@ -0,0 +1,425 @@
+# strategy/risk_model.py
+"""
+多因子风险模型：Σ = X F X' + diag(d)
+
+输入为 factor_evaluation/factor_return_regression.py 的横截面回归结果:
+    因子收益 f[t] (K)、特异收益 u[t, i] (N)、最新一期暴露 X (N × K)
+
+因子协方差 F
+    1. 指数加权（半衰期 half_life），逐日增量更新：只保存加权和 Σλ^s·f f' 与最近 nw_lags 天的因子收益，
+       新的一天进来 O(K²·L) 更新，不重算历史
+    2. Newey-West 自相关调整: F = Γ0 + Σ_{l=1..L} (1 - l/(L+1)) (Γl + Γl')，Γl 为滞后 l 的加权交叉协方差
+    3. 向对角阵收缩: F ← (1-δ) F + δ diag(F)；δ='auto' 时按 Ledoit-Wolf 公式用加权四阶矩与有效样本数估计
+日收益均值按 0 处理（日度因子收益的均值远小于其波动，估计均值只会增加噪声）。
+
+特异方差 d
+    每只股票残差平方的指数加权均值（半衰期 specific_half_life），同样逐日增量更新；
+    有效样本数不足 min_obs 的股票用当天横截面中位数代替。
+
+组合风险查询全部走低秩形式，不构造 N × N 矩阵:
+    σ²(w) = (X'w)' F (X'w) + Σ d_i w_i²         O(N·K)
+5000 只股票、5 个因子时单次查询为微秒级，多个组合（N × P 权重矩阵）一次算完。
+
+用法:
+    estimator = RiskModelEstimator(half_life=90, nw_lags=2, shrinkage='auto')
+    estimator.fit(reg.factor_returns_, reg.residuals_)        # 或每天 estimator.update(date, f_row, resid_row)
+    model = estimator.model(reg.exposures())
+    model.portfolio_risk(weights)                               # 年化波动
+    model.risk_contributions(weights)
+    model.save('data/results/risk_model.npz'); FactorRiskModel.load(...)
+
+    python -m strategy.risk_model --factors illiq_guiji panic_factor --half_life 90 --nw_lags 2
+"""
+import argparse
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from utils.log import timed
+
+ANNUAL_DAYS = 252
+
+
+def _decay(half_life: float) -> float:
+    if half_life <= 0:
+        raise ValueError(f"半衰期必须为正数: {half_life}")
+    return 0.5 ** (1.0 / half_life)
+
+
+class RiskModelEstimator:
+    """
+    因子协方差与特异方差的增量估计器
+
+    参数:
+        half_life: 因子协方差的半衰期（交易日）
+        nw_lags: Newey-West 滞后阶数，0 为不调整
+        shrinkage: 向对角阵收缩的强度 δ ∈ [0, 1]，或 'auto'（Ledoit-Wolf）
+        specific_half_life: 特异方差的半衰期（交易日）
+        min_obs: 特异方差至少需要的有效样本数，不足时用横截面中位数
+    """
+
+    def __init__(self, half_life: float = 90, nw_lags: int = 2, shrinkage: float | str = 'auto',
+                 specific_half_life: float = 42, min_obs: float = 20):
+        if nw_lags < 0:
+            raise ValueError(f"nw_lags 不能为负数: {nw_lags}")
+        if shrinkage != 'auto' and not 0 <= float(shrinkage) <= 1:
+            raise ValueError(f"shrinkage 必须在 [0, 1] 之间或为 'auto': {shrinkage}")
+        self.half_life = half_life
+        self.nw_lags = nw_lags
+        self.shrinkage = shrinkage
+        self.specific_half_life = specific_half_life
+        self.min_obs = min_obs
+        self.lam = _decay(half_life)
+        self.lam_s = _decay(specific_half_life)
+        self.factors = None
+        self.codes = pd.Index([], name='code')
+        self.last_date = None
+
+    # =========================
+    # 状态
+    # =========================
+    def _init_factors(self, factors):
+        K, L = len(factors), self.nw_lags
+        self.factors = list(factors)
+        self.cross = np.zeros((L + 1, K, K))    # Σ λ^s f[t-s] f[t-s-l]'，l = 0..L
+        self.wsum = np.zeros(L + 1)             # 对应的权重和
+        self.w2sum = 0.0                        # Σ λ^{2s}（有效样本数）
+        self.fourth = np.zeros((K, K))          # Σ λ^s (f_i f_j)²（Ledoit-Wolf）
+        self.recent = deque(maxlen=L)           # 最近 L 个有效日的因子收益，recent[0] 为最近一天
+        self.n_factor_obs = 0
+
+    def _ensure_codes(self, codes: pd.Index):
+        """新出现的股票追加到状态末尾（股票池随时间扩张）"""
+        new = codes.difference(self.codes)
+        if len(new):
+            self.codes = self.codes.append(pd.Index(new, name='code'))
+            pad = np.zeros(len(new))
+            self.sq = np.concatenate([getattr(self, 'sq', pad[:0]), pad])
+            self.sw = np.concatenate([getattr(self, 'sw', pad[:0]), pad])
+            self.sw2 = np.concatenate([getattr(self, 'sw2', pad[:0]), pad])
+
+    def update(self, date, factor_ret: pd.Series, resid: pd.Series | None = None) -> 'RiskModelEstimator':
+        """
+        追加一个交易日
+
+        参数:
+            date: 交易日，必须晚于上一次更新的日期
+            factor_ret: 当天各因子收益 (index=因子名)；含 NaN 时当天不更新因子协方差
+            resid: 当天各股票特异收益 (index=code)，NaN 为无观测
+        """
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f"日期必须递增: {date.date()} <= {self.last_date.date()}")
+        self.last_date = date
+
+        if self.factors is None:
+            self._init_factors(factor_ret.index)
+        f = factor_ret.reindex(self.factors).to_numpy(dtype=np.float64)
+        if np.isfinite(f).all():
+            lam = self.lam
+            self.cross *= lam
+            self.wsum *= lam
+            self.w2sum *= lam * lam
+            self.fourth *= lam
+            outer = np.outer(f, f)
+            self.cross[0] += outer
+            self.wsum[0] += 1.0
+            self.w2sum += 1.0
+            self.fourth += outer * outer
+            for l, prev in enumerate(self.recent, start=1):
+                self.cross[l] += np.outer(f, prev)
+                self.wsum[l] += 1.0
+            self.recent.appendleft(f)
+            self.n_factor_obs += 1
+
+        if resid is not None:
+            self._ensure_codes(resid.index)
+            u = resid.reindex(self.codes).to_numpy(dtype=np.float64)
+            ok = np.isfinite(u)
+            lam = self.lam_s
+            self.sq *= lam
+            self.sw *= lam
+            self.sw2 *= lam * lam
+            self.sq[ok] += u[ok] ** 2
+            self.sw[ok] += 1.0
+            self.sw2[ok] += 1.0
+        return self
+
+    @timed('RiskModelEstimator.fit')
+    def fit(self, factor_returns: pd.DataFrame, residuals: pd.DataFrame | None = None) -> 'RiskModelEstimator':
+        """按日期顺序逐日 update（factor_returns: date × 因子，residuals: date × code）"""
+        if residuals is not None:
+            residuals = residuals.reindex(factor_returns.index)
+            self._ensure_codes(residuals.columns)
+        for t, date in enumerate(factor_returns.index):
+            self.update(date, factor_returns.iloc[t], None if residuals is None else residuals.iloc[t])
+        return self
+
+    # =========================
+    # 估计
+    # =========================
+    def raw_covariance(self) -> np.ndarray:
+        """指数加权的同期协方差 Γ0（日度）"""
+        self._check()
+        return self.cross[0] / self.wsum[0]
+
+    def newey_west(self) -> np.ndarray:
+        """Newey-West 调整后的日度因子协方差（尚未收缩）"""
+        cov = self.raw_covariance()
+        for l in range(1, self.nw_lags + 1):
+            if self.wsum[l] > 0:
+                gamma = self.cross[l] / self.wsum[l]
+                cov = cov + (1 - l / (self.nw_lags + 1)) * (gamma + gamma.T)
+        return (cov + cov.T) / 2
+
+    def effective_obs(self) -> float:
+        """指数加权的有效样本数 (Σw)² / Σw²"""
+        self._check()
+        return self.wsum[0] ** 2 / self.w2sum
+
+    def shrinkage_intensity(self, cov: np.ndarray | None = None) -> float:
+        """
+        向对角阵收缩的强度 δ
+
+        'auto' 时为 Ledoit-Wolf: δ = Σ_{i≠j} Var(ŝ_ij) / Σ_{i≠j} ŝ_ij²，
+        Var(ŝ_ij) ≈ (E[(f_i f_j)²] - ŝ_ij²) / n_eff
+        """
+        if self.shrinkage != 'auto':
+            return float(self.shrinkage)
+        s = self.raw_covariance() if cov is None else cov
+        off = ~np.eye(len(s), dtype=bool)
+        denom = (s[off] ** 2).sum()
+        if denom <= 0:
+            return 1.0
+        var = np.maximum(self.fourth / self.wsum[0] - self.raw_covariance() ** 2, 0) / self.effective_obs()
+        return float(np.clip(var[off].sum() / denom, 0.0, 1.0))
+
+    def factor_covariance(self) -> np.ndarray:
+        """Newey-West + 收缩后的日度因子协方差，特征值截断为非负"""
+        cov = self.newey_west()
+        delta = self.shrinkage_intensity(cov)
+        cov = (1 - delta) * cov + delta * np.diag(np.diag(cov))
+        vals, vecs = np.linalg.eigh(cov)
+        floor = max(vals.max(), 0.0) * 1e-10
+        if vals.min() < floor:
+            cov = (vecs * np.maximum(vals, floor)) @ vecs.T
+        self.shrinkage_ = delta
+        return cov
+
+    def specific_variance(self) -> pd.Series:
+        """各股票日度特异方差；有效样本不足的用横截面中位数"""
+        if not len(self.codes):
+            raise ValueError("没有特异收益数据，请在 update / fit 时传入残差")
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = self.sq / self.sw
+            n_eff = self.sw ** 2 / self.sw2
+        ok = np.isfinite(var) & (n_eff >= self.min_obs)
+        fallback = np.median(var[ok]) if ok.any() else np.nan
+        return pd.Series(np.where(ok, var, fallback), index=self.codes, name='specific_var')
+
+    def model(self, exposures: pd.DataFrame) -> 'FactorRiskModel':
+        """
+        用某一天的暴露 (index=code, columns=因子名) 生成风险模型快照
+
+        暴露表中没有特异方差记录的股票同样用横截面中位数
+        """
+        missing = [f for f in self.factors if f not in exposures.columns]
+        if missing:
+            raise ValueError(f"暴露表缺少因子: {missing}")
+        d = self.specific_variance()
+        fallback = np.nanmedian(d.to_numpy())
+        spec = d.reindex(exposures.index).fillna(fallback)
+        X = exposures[self.factors].fillna(0.0).to_numpy(dtype=np.float64)
+        return FactorRiskModel(X, self.factor_covariance(), spec.to_numpy(), exposures.index, self.factors,
+                               date=self.last_date)
+
+    def _check(self):
+        if self.factors is None or self.wsum[0] == 0:
+            raise ValueError("还没有有效的因子收益，请先调用 update / fit")
+
+
+class FactorRiskModel:
+    """
+    低秩 + 对角形式的风险模型快照（日度单位）
+
+    参数:
+        exposures: 暴露 (N, K)
+        factor_cov: 因子协方差 (K, K)
+        specific_var: 特异方差 (N,)
+        codes: 股票代码 (N)
+        factors: 因子名 (K)
+    """
+
+    def __init__(self, exposures: np.ndarray, factor_cov: np.ndarray, specific_var: np.ndarray,
+                 codes, factors, date=None):
+        self.X = np.asarray(exposures, dtype=np.float64)
+        self.F = np.asarray(factor_cov, dtype=np.float64)
+        self.d = np.asarray(specific_var, dtype=np.float64)
+        self.codes = pd.Index(codes, name='code')
+        self.factors = list(factors)
+        self.date = None if date is None else pd.Timestamp(date)
+        N, K = self.X.shape
+        if self.F.shape != (K, K) or self.d.shape != (N,) or len(self.codes) != N or len(self.factors) != K:
+            raise ValueError(f"维度不一致: X {self.X.shape}, F {self.F.shape}, d {self.d.shape}, "
+                             f"codes {len(self.codes)}, factors {len(self.factors)}")
+
+    def __repr__(self):
+        return f"FactorRiskModel({len(self.codes)} codes × {len(self.factors)} factors, date={self.date})"
+
+    def _weights(self, w) -> np.ndarray:
+        """权重对齐到 self.codes: Series / DataFrame 按 code 对齐（不在模型中的股票报错），ndarray 按位置"""
+        if isinstance(w, (pd.Series, pd.DataFrame)):
+            unknown = w.index.difference(self.codes)
+            if len(unknown):
+                raise ValueError(f"风险模型中没有这些股票: {list(unknown[:10])}")
+            w = w.reindex(self.codes).fillna(0.0).to_numpy(dtype=np.float64)
+        w = np.asarray(w, dtype=np.float64)
+        if w.shape[0] != len(self.codes):
+            raise ValueError(f"权重长度 {w.shape[0]} 与股票数 {len(self.codes)} 不一致")
+        return w
+
+    def factor_exposure(self, w) -> pd.Series | pd.DataFrame:
+        """组合的因子暴露 X'w"""
+        x = self.X.T @ self._weights(w)
+        if x.ndim == 1:
+            return pd.Series(x, index=self.factors)
+        return pd.DataFrame(x, index=self.factors, columns=getattr(w, 'columns', None))
+
+    def portfolio_variance(self, w) -> float | np.ndarray:
+        """
+        组合日度方差 (X'w)' F (X'w) + Σ d w²
+
+        参数:
+            w: 权重 (N,) 或多个组合 (N, P)
+        返回:
+            标量或 (P,) 数组
+        """
+        w = self._weights(w)
+        x = self.X.T @ w
+        var = np.einsum('k...,k...->...', x, self.F @ x) + self.d @ (w * w)
+        return float(var) if np.ndim(var) == 0 else var
+
+    def portfolio_risk(self, w, annualize: bool = True) -> float | np.ndarray:
+        """组合波动率（默认年化）"""
+        var = self.portfolio_variance(w) * (ANNUAL_DAYS if annualize else 1)
+        return np.sqrt(var)
+
+    def cov_dot(self, w) -> np.ndarray:
+        """Σ w = X F X'w + d ∘ w，不构造 N × N 矩阵"""
+        w = self._weights(w)
+        return self.X @ (self.F @ (self.X.T @ w)) + (self.d * w.T).T
+
+    def risk_contributions(self, w) -> pd.DataFrame:
+        """
+        各股票对组合日度波动的贡献 w_i (Σw)_i / σ，合计等于组合波动
+
+        返回:
+            DataFrame(index=code, columns=[weight, marginal, contribution, factor, specific])
+        """
+        wv = self._weights(w)
+        if wv.ndim != 1:
+            raise ValueError("risk_contributions 只支持单个组合")
+        factor_part = self.X @ (self.F @ (self.X.T @ wv))
+        specific_part = self.d * wv
+        sigma = np.sqrt(self.portfolio_variance(wv))
+        if sigma == 0:
+            raise ValueError("组合方差为 0")
+        return pd.DataFrame({
+            'weight': wv,
+            'marginal': (factor_part + specific_part) / sigma,
+            'contribution': wv * (factor_part + specific_part) / sigma,
+            'factor': wv * factor_part / sigma,
+            'specific': wv * specific_part / sigma,
+        }, index=self.codes)
+
+    def factor_risk_decomposition(self, w) -> pd.Series:
+        """组合方差按因子拆分 x_k (F x)_k，外加特异部分"""
+        wv = self._weights(w)
+        x = self.X.T @ wv
+        parts = pd.Series(x * (self.F @ x), index=self.factors)
+        parts['specific'] = self.d @ (wv * wv)
+        return parts
+
+    def covariance(self, codes=None) -> pd.DataFrame:
+        """
+        股票协方差矩阵（密集），只用于少量股票的检查 / 展示
+
+        参数:
+            codes: 股票子集，默认全部（股票多时会很大）
+        """
+        idx = self.codes if codes is None else pd.Index(codes)
+        pos = self.codes.get_indexer(idx)
+        if (pos < 0).any():
+            raise ValueError(f"风险模型中没有这些股票: {list(idx[pos < 0][:10])}")
+        X = self.X[pos]
+        cov = X @ self.F @ X.T
+        cov[np.diag_indices_from(cov)] += self.d[pos]
+        return pd.DataFrame(cov, index=idx, columns=idx)
+
+    def factor_volatility(self, annualize: bool = True) -> pd.Series:
+        return pd.Series(np.sqrt(np.diag(self.F) * (ANNUAL_DAYS if annualize else 1)), index=self.factors)
+
+    def factor_correlation(self) -> pd.DataFrame:
+        sd = np.sqrt(np.diag(self.F))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = self.F / np.outer(sd, sd)
+        return pd.DataFrame(corr, index=self.factors, columns=self.factors)
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(path, exposures=self.X, factor_cov=self.F, specific_var=self.d,
+                 codes=np.asarray(self.codes, dtype=str), factors=np.asarray(self.factors, dtype=str),
+                 date=np.asarray('' if self.date is None else str(self.date.date())))
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'FactorRiskModel':
+        z = np.load(path)
+        date = str(z['date'])
+        return cls(z['exposures'], z['factor_cov'], z['specific_var'], z['codes'], list(z['factors']),
+                   date=date or None)
+
+
+def main():
+    from factor_evaluation.factor_return_regression import FactorReturnRegression
+    from utils.io import PROCESSED_PATH, RESULTS_PATH
+
+    parser = argparse.ArgumentParser(description="多因子风险模型估计")
+    parser.add_argument('--factors', type=str, nargs='*', default=['illiq_guiji', 'panic_factor'],
+                        help='因子库中的因子')
+    parser.add_argument('--style', type=str, nargs='*', default=['ln_mkt_cap'], help='风格列')
+    parser.add_argument('--weight', type=str, default='sqrt_cap', choices=['sqrt_cap', 'equal'])
+    parser.add_argument('--half_life', type=float, default=90)
+    parser.add_argument('--nw_lags', type=int, default=2)
+    parser.add_argument('--shrinkage', type=str, default='auto', help="'auto' 或 0~1 之间的数")
+    parser.add_argument('--specific_half_life', type=float, default=42)
+    args = parser.parse_args()
+
+    panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    reg = FactorReturnRegression(panel, factors=args.factors, style_cols=args.style,
+                                 weight=None if args.weight == 'equal' else args.weight)
+    reg.run()
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(reg.get_summary())
+
+    shrinkage = args.shrinkage if args.shrinkage == 'auto' else float(args.shrinkage)
+    estimator = RiskModelEstimator(half_life=args.half_life, nw_lags=args.nw_lags, shrinkage=shrinkage,
+                                   specific_half_life=args.specific_half_life)
+    estimator.fit(reg.factor_returns_, reg.residuals_)
+    model = estimator.model(reg.exposures())
+    print(f"\n{model}，收缩强度 δ = {estimator.shrinkage_:.3f}，有效样本数 {estimator.effective_obs():.1f}")
+    print("\n因子年化波动:")
+    print(model.factor_volatility().round(4))
+    print("\n因子相关系数:")
+    print(model.factor_correlation().round(3))
+    equal = pd.Series(1.0 / len(model.codes), index=model.codes)
+    print(f"\n等权组合年化波动: {model.portfolio_risk(equal):.2%}")
+
+    out = model.save(os.path.join(RESULTS_PATH, 'risk_model.npz'))
+    print(f"风险模型已保存至: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# strategy/single_factor_strategy.py
+"""
+单因子轮动策略：因子值 → 调仓日选股 → 仓位分配 → 每日目标权重矩阵
+
+只在调仓日 (R 行) 上做排序/选股/定权，之后前向填充到全部交易日，
+全部以宽表 (index=date, columns=code) 向量化完成，没有逐日循环。
+输出的权重矩阵可以直接交给 backtest.engine.run_backtest。
+
+用法:
+    python -m strategy.single_factor_strategy --factor_name illiq_guiji --method top_quantile --rebalance W
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from strategy.position_sizing import rolling_volatility, size_positions
+from utils.calendar import TradingCalendar
+from utils.dense_panel import to_wide
+from utils.io import PROCESSED_PATH, load_factor
+
+
+def rebalance_dates(dates, freq: str = 'W') -> pd.DatetimeIndex:
+    """
+    调仓日：每个周期的最后一个交易日
+
+    参数:
+        dates: 交易日序列，或已构建好的 TradingCalendar
+        freq: 'D' 每日, 'W' 每周, 'M' 每月, 'Q' 每季
+    """
+    calendar = dates if isinstance(dates, TradingCalendar) else TradingCalendar(dates)
+    return calendar.rebalance_dates(freq)
+
+
+class SingleFactorStrategy:
+    """
+    参数:
+        factor_name: 因子名称（从因子库 data/factors 读取）
+        method: 'top_n' 前 N 只, 'top_quantile' 前 quantile 比例, 'long_short' 多前 quantile 空后 quantile
+        n: top_n 的股票数量
+        quantile: top_quantile / long_short 的分位比例
+        rebalance: 'D' / 'W' / 'M' 调仓频率
+        sizing: 'equal' / 'market_cap' / 'inverse_vol' 仓位方法
+        ascending: False 表示因子值越大越好；True 表示越小越好
+        vol_lookback: inverse_vol 使用的波动率窗口
+    """
+
+    def __init__(self, factor_name: str, method: str = 'top_quantile', n: int = 50, quantile: float = 0.2,
+                 rebalance: str = 'W', sizing: str = 'equal', ascending: bool = False, vol_lookback: int = 20):
+        if method not in ('top_n', 'top_quantile', 'long_short'):
+            raise ValueError(f"不支持的选股方法: {method}")
+        self.factor_name = factor_name
+        self.method = method
+        self.n = n
+        self.quantile = quantile
+        self.rebalance = rebalance
+        self.sizing = sizing
+        self.ascending = ascending
+        self.vol_lookback = vol_lookback
+
+    def _select(self, score: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+        """在调仓日横截面上选股，返回 (多头布尔矩阵, 空头布尔矩阵或 None)；score 越大越好"""
+        if self.method == 'top_n':
+            rank = score.rank(axis=1, ascending=False, method='first')
+            return rank <= self.n, None
+        pct = score.rank(axis=1, pct=True)
+        long = pct > 1 - self.quantile
+        if self.method == 'top_quantile':
+            return long, None
+        return long, pct <= self.quantile
+
+    def _sizing_data(self, panel: pd.DataFrame, dates: pd.DatetimeIndex) -> dict:
+        if self.sizing == 'market_cap':
+            return {'market_cap': to_wide(panel['market_capitalization']).reindex(dates)}
+        if self.sizing == 'inverse_vol':
+            vol = rolling_volatility(to_wide(panel['ret_1d']), self.vol_lookback)
+            return {'volatility': vol.reindex(dates)}
+        return {}
+
+    def generate_weights(self, panel: pd.DataFrame, factor: pd.Series | pd.DataFrame | None = None) -> pd.DataFrame:
+        """
+        生成每日目标权重
+
+        参数:
+            panel: 清洗后的 panel (index=['date', 'code'])，用到 suspended / listed 以及仓位方法需要的列
+            factor: 因子值（长表）；None 时从因子库读取 self.factor_name
+        返回:
+            DataFrame: 权重矩阵 index=全部交易日, columns=code；t 日的权重表示 t 日收盘后的目标持仓
+        """
+        if factor is None:
+            factor = load_factor(self.factor_name)
+        if isinstance(factor, pd.DataFrame):
+            factor = factor[self.factor_name] if self.factor_name in factor.columns else factor.iloc[:, 0]
+
+        calendar = TradingCalendar.from_panel(panel)
+        all_dates = calendar.dates
+        rb = calendar.rebalance_dates(self.rebalance)
+        codes = panel.index.get_level_values('code').unique()
+
+        # 1. 调仓日的因子截面，剔除不可交易（停牌 / 未上市）的股票
+        score = to_wide(factor).reindex(index=rb, columns=codes)
+        if {'suspended', 'listed'}.issubset(panel.columns):
+            tradable = (to_wide(panel['suspended']) == 0) & (to_wide(panel['listed']) == 1)
+            score = score.where(tradable.reindex(index=rb, columns=codes, fill_value=False))
+        if self.ascending:
+            score = -score
+
+        # 2. 选股 + 定权（只在 R 个调仓日上计算）
+        long, short = self._select(score)
+        data = self._sizing_data(panel, rb)
+        weights = size_positions(long, self.sizing, **data)
+        if short is not None:
+            weights = weights - size_positions(short, self.sizing, **data)
+
+        # 3. 前向填充到全部交易日（第一个调仓日之前空仓）
+        return weights.reindex(all_dates).ffill().fillna(0.0)
+
+
+def main():
+    from backtest.engine import run_backtest
+    from backtest.performance import performance_summary
+
+    parser = argparse.ArgumentParser(description="单因子轮动策略回测")
+    parser.add_argument('--factor_name', type=str, default='illiq_guiji')
+    parser.add_argument('--method', type=str, default='top_quantile', choices=['top_n', 'top_quantile', 'long_short'])
+    parser.add_argument('--n', type=int, default=50)
+    parser.add_argument('--quantile', type=float, default=0.2)
+    parser.add_argument('--rebalance', type=str, default='W', choices=['D', 'W', 'M', 'Q'])
+    parser.add_argument('--sizing', type=str, default='equal', choices=['equal', 'market_cap', 'inverse_vol'])
+    parser.add_argument('--ascending', action='store_true', help='因子值越小越好')
+    parser.add_argument('--cost', type=float, default=0.0, help='单边交易费率')
+    args = parser.parse_args()
+
+    panel = pd.read_pickle(os.path.join(PROCESSED_PATH, 'panel_cleaned.pkl'))
+    strategy = SingleFactorStrategy(args.factor_name, method=args.method, n=args.n, quantile=args.quantile,
+                                    rebalance=args.rebalance, sizing=args.sizing, ascending=args.ascending)
+    weights = strategy.generate_weights(panel)
+    result = run_backtest(weights, to_wide(panel['ret_1d']), cost_rate=args.cost)
+    print(performance_summary(result['net_return']))
+
+
+if __name__ == "__main__":
+    main()
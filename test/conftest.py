@@ -0,0 +1,8 @@
+# test/conftest.py
+# 让测试可以 import 仓库内的模块（不依赖从仓库根目录以 python -m pytest 启动）
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
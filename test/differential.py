@@ -0,0 +1,296 @@
+# test/differential.py
+"""
+差分测试：快速实现 vs 冻结的参考实现（test/reference/）
+
+参考实现是各热点路径最初的 pandas 写法（groupby / apply / rolling），逐字保留、不再修改；
+之后对这些路径的任何优化都必须在下列场景上与参考实现一致（NaN 位置相同，数值在容差内），否则视为回归。
+
+用例 (CASES):
+    clean                   preprocess.clean_data.add_status_fields
+    post_process            BaseFactor._post_process（去极值 + 标准化 + 对 ln_mkt_cap 中性化）
+    illiq_guiji             IlliqGuijiFactor.calculate
+    panic_factor            PanicFactor.calculate（等权市场收益）
+    panic_factor:market_cap / panic_factor:turnover
+                            PanicFactor.calculate（流通市值 / 成交额加权市场收益）
+    ic / ic:ties            ICAnalyzer.calculate_daily_ic（连续因子 / 每天只有 10 个取值的因子）
+    layer                   LayerBacktester.run
+
+场景 (SCENARIOS): utils.synthetic.make_raw 生成的随机面板，分别加重停牌、晚上市、涨跌停；
+以及 data/interim 中的样本数据 (sample，文件不存在时跳过)。
+
+两边的输入完全相同：因子、后处理、IC、分层用例的输入都由参考实现从同一份面板算出，
+面板额外带一列 ln_mkt_cap（参考实现只使用 panel 中已有的列）。
+
+用法:
+    python test/differential.py                                   # 全部场景 × 全部用例，打印误差与加速比
+    python test/differential.py --cases ic layer --scenarios base sample --dates 500 --codes 300
+    python -m pytest -q test/test_differential.py
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+# 兼容直接运行（python test/differential.py）和 pytest
+for _path in (ROOT, HERE):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from factor_evaluation.ic_analysis import ICAnalyzer                          # noqa: E402
+from factor_evaluation.layer_backtest import LayerBacktester                  # noqa: E402
+from factor_evaluation.util import get_clean_factor_and_forward_returns       # noqa: E402
+from factors.base_factor import get_factor                                    # noqa: E402
+from preprocess.clean_data import add_status_fields                           # noqa: E402
+from reference import evaluation as ref_eval                                  # noqa: E402
+from reference import factors as ref_factors                                  # noqa: E402
+from reference.clean_data import add_status_fields as ref_add_status_fields   # noqa: E402
+from utils import log                                                         # noqa: E402
+from utils.synthetic import FIELDS, make_raw, raw_to_panel                    # noqa: E402
+
+SAMPLE_PATH = os.path.join(ROOT, 'data', 'interim')
+
+# 场景: make_raw 的参数；None 表示读取样本数据
+SCENARIOS = {
+    'base': {},
+    'heavy_suspension': dict(suspend_rate=0.15, suspend_len=5, suspend_nan_price=0.8),
+    'late_listing': dict(unlisted_rate=0.6),
+    'limit_hits': dict(limit_rate=0.2),
+    'sample': None,
+}
+
+
+# =========================
+# 场景数据
+# =========================
+def load_sample() -> pd.DataFrame:
+    """data/interim/{field}_aligned.pkl → (date, code) 长面板；缺文件时抛 FileNotFoundError"""
+    raw = {}
+    for field in FIELDS:
+        path = os.path.join(SAMPLE_PATH, f'{field}_aligned.pkl')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"样本数据不存在: {path}")
+        raw[field] = pd.read_pickle(path)
+    raw = {k: v.rename_axis(index='date', columns='code') for k, v in raw.items()}
+    return raw_to_panel(raw)
+
+
+def load_scenario(name: str, n_dates: int = 250, n_codes: int = 80, seed: int = 0) -> pd.DataFrame:
+    """返回场景的原始长面板（未经 add_status_fields）"""
+    if name not in SCENARIOS:
+        raise ValueError(f"未知场景: {name}，可选: {list(SCENARIOS)}")
+    params = SCENARIOS[name]
+    if params is None:
+        return load_sample()
+    return raw_to_panel(make_raw(n_dates, n_codes, seed=seed, **params))
+
+
+def build_context(panel: pd.DataFrame) -> dict:
+    """用参考实现准备各用例共同的输入（两边拿到的输入完全相同）"""
+    cleaned = ref_add_status_fields(panel)
+    cleaned['ln_mkt_cap'] = np.log(cleaned['market_capitalization'])
+    raw_factor = ref_factors.illiq_guiji(cleaned)
+    merged = get_clean_factor_and_forward_returns(raw_factor.rename('factor').to_frame(), cleaned,
+                                                  factor_name='factor')
+    # 大量并列值：每天按因子排名分成 10 档
+    ties = merged.copy()
+    ties['factor'] = np.ceil(ties.groupby(level='date')['factor'].rank(pct=True) * 10)
+    return {'panel': panel, 'cleaned': cleaned, 'raw_factor': raw_factor, 'merged': merged, 'ties': ties}
+
+
+# =========================
+# 用例：name -> (fast(ctx), reference(ctx), 容差)
+# =========================
+POST_PROCESS = dict(do_winsor=True, do_zscore=True, neutralize_cols=['ln_mkt_cap'])
+
+
+def _fast_clean(ctx):
+    return add_status_fields(ctx['panel'])
+
+
+def _fast_post_process(ctx):
+    factor = get_factor('illiq_guiji', **POST_PROCESS)
+    return factor._post_process(ctx['cleaned'], ctx['raw_factor'].rename(factor.name).to_frame())
+
+
+def _ref_post_process(ctx):
+    name = 'illiq_guiji'
+    return ref_factors.post_process(ctx['cleaned'], ctx['raw_factor'].rename(name).to_frame(), name,
+                                    **POST_PROCESS)
+
+
+def _fast_factor(name, **params):
+    def fast(ctx):
+        return get_factor(name, **params).calculate(ctx['cleaned'])
+    return fast
+
+
+def _fast_ic(key):
+    def fast(ctx):
+        return ICAnalyzer(ctx[key]).calculate_daily_ic()
+    return fast
+
+
+def _fast_layer(ctx):
+    return LayerBacktester(ctx['merged'], groups=5).run()
+
+
+CASES = {
+    'clean': (_fast_clean, lambda ctx: ref_add_status_fields(ctx['panel']), dict(rtol=1e-12, atol=0)),
+    'post_process': (_fast_post_process, _ref_post_process, dict(rtol=1e-9, atol=1e-9)),
+    'illiq_guiji': (_fast_factor('illiq_guiji'), lambda ctx: ref_factors.illiq_guiji(ctx['cleaned']),
+                    dict(rtol=1e-9, atol=0)),
+    # 宽表 rolling 与 groupby rolling 的累加顺序不同，std 可能有 1e-12 量级的差异
+    'panic_factor': (_fast_factor('panic_factor'), lambda ctx: ref_factors.panic_factor(ctx['cleaned']),
+                     dict(rtol=1e-7, atol=1e-10)),
+    'panic_factor:market_cap': (_fast_factor('panic_factor', weight_method='market_cap'),
+                                lambda ctx: ref_factors.panic_factor(ctx['cleaned'], weight_method='market_cap'),
+                                dict(rtol=1e-7, atol=1e-10)),
+    'panic_factor:turnover': (_fast_factor('panic_factor', weight_method='turnover'),
+                              lambda ctx: ref_factors.panic_factor(ctx['cleaned'], weight_method='turnover'),
+                              dict(rtol=1e-7, atol=1e-10)),
+    'ic': (_fast_ic('merged'), lambda ctx: ref_eval.daily_ic(ctx['merged']), dict(rtol=1e-9, atol=1e-12)),
+    'ic:ties': (_fast_ic('ties'), lambda ctx: ref_eval.daily_ic(ctx['ties']), dict(rtol=1e-9, atol=1e-12)),
+    'layer': (_fast_layer, lambda ctx: ref_eval.layer_returns(ctx['merged']), dict(rtol=1e-9, atol=1e-12)),
+}
+
+
+# =========================
+# 比较
+# =========================
+def _as_frame(obj) -> pd.DataFrame:
+    if isinstance(obj, pd.Series):
+        return obj.to_frame('value')
+    return obj
+
+
+def compare(fast, ref, rtol: float = 1e-9, atol: float = 0.0) -> tuple[float, list[str]]:
+    """
+    比较两份结果（Series / DataFrame）
+
+    返回:
+        (最大绝对误差, 不一致描述列表)；列表为空表示一致
+    """
+    fast, ref = _as_frame(fast), _as_frame(ref)
+    problems = []
+    if len(fast) != len(ref) or not fast.index.equals(ref.index):
+        # 只允许索引名称不同（如 IC 序列的 'date'），顺序与取值必须一致
+        if not np.array_equal(fast.index.to_numpy(), ref.index.to_numpy()):
+            return np.inf, [f"索引不一致: {len(fast)} 行 vs 参考 {len(ref)} 行"]
+    if fast.shape[1] == 1 and ref.shape[1] == 1:
+        # 单列结果（因子值 / IC 序列）不比较列名
+        fast = fast.set_axis(ref.columns, axis=1)
+    else:
+        missing = [c for c in ref.columns if c not in fast.columns]
+        if missing:
+            problems.append(f"缺少列: {missing}")
+        fast = fast.reindex(columns=ref.columns)
+
+    worst = 0.0
+    for col in ref.columns:
+        a = fast[col].to_numpy(dtype=np.float64)
+        b = ref[col].to_numpy(dtype=np.float64)
+        nan_a, nan_b = np.isnan(a), np.isnan(b)
+        if (nan_a != nan_b).any():
+            problems.append(f"{col}: NaN 位置不一致 {int((nan_a != nan_b).sum())} 处")
+        both = ~nan_a & ~nan_b
+        if not both.any():
+            continue
+        diff = np.abs(a[both] - b[both])
+        worst = max(worst, float(diff.max()))
+        bad = diff > atol + rtol * np.abs(b[both])
+        if bad.any():
+            problems.append(f"{col}: {int(bad.sum())} 处超出容差，最大误差 {diff.max():.3g}")
+    return worst, problems
+
+
+def _best_time(fn, ctx, repeat: int):
+    result, best = None, np.inf
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        result = fn(ctx)
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def run_case(name: str, ctx: dict, repeat: int = 1) -> dict:
+    """跑一个用例的两边实现，返回误差、是否一致、耗时与加速比"""
+    fast_fn, ref_fn, tol = CASES[name]
+    fast, fast_s = _best_time(fast_fn, ctx, repeat)
+    ref, ref_s = _best_time(ref_fn, ctx, repeat)
+    max_abs, problems = compare(fast, ref, **tol)
+    return {
+        'case': name,
+        'ok': not problems,
+        'max_abs': max_abs,
+        'fast_s': fast_s,
+        'ref_s': ref_s,
+        'speedup': ref_s / fast_s if fast_s > 0 else np.inf,
+        'problems': '; '.join(problems),
+    }
+
+
+def run(cases=None, scenarios=None, n_dates: int = 250, n_codes: int = 80, seed: int = 0,
+        repeat: int = 1) -> pd.DataFrame:
+    """全部场景 × 用例，返回结果表（场景缺数据时跳过）"""
+    cases = cases or list(CASES)
+    # 预热：先在很小的面板上跑一遍两边实现，懒加载的模块（如 spearman 用到的 scipy）不计入耗时
+    warm = build_context(load_scenario('base', 40, 20, seed))
+    for name in cases:
+        CASES[name][0](warm)
+        CASES[name][1](warm)
+
+    rows = []
+    for scenario in scenarios or list(SCENARIOS):
+        try:
+            panel = load_scenario(scenario, n_dates, n_codes, seed)
+        except FileNotFoundError as e:
+            print(f"跳过场景 {scenario}: {e}")
+            continue
+        ctx = build_context(panel)
+        for name in cases:
+            row = run_case(name, ctx, repeat=repeat)
+            row['scenario'] = scenario
+            rows.append(row)
+            print(f"  {scenario:<17s} {name:<24s} {'✓' if row['ok'] else '✗'}  "
+                  f"max|Δ|={row['max_abs']:9.2e}  fast {row['fast_s']:8.3f} s  "
+                  f"ref {row['ref_s']:8.3f} s  ×{row['speedup']:6.1f}  {row['problems']}")
+    return pd.DataFrame(rows, columns=['scenario', 'case', 'ok', 'max_abs', 'fast_s', 'ref_s', 'speedup',
+                                       'problems'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="快速实现 vs 参考实现的差分测试")
+    parser.add_argument('--cases', nargs='*', default=None, choices=list(CASES))
+    parser.add_argument('--scenarios', nargs='*', default=None, choices=list(SCENARIOS))
+    parser.add_argument('--dates', type=int, default=250, help='合成面板的交易日数')
+    parser.add_argument('--codes', type=int, default=80, help='合成面板的股票数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='计时重复次数（取最好一次）')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+    log.configure(enabled=False)     # 不写埋点日志
+
+    table = run(args.cases, args.scenarios, args.dates, args.codes, args.seed, args.repeat)
+    if table.empty:
+        print("没有可运行的场景")
+        return 1
+    print("\n加速比（参考耗时 / 快速耗时）:")
+    with pd.option_context('display.width', 200, 'display.float_format', '{:.1f}'.format):
+        print(table.pivot(index='case', columns='scenario', values='speedup').reindex(index=table['case'].unique()))
+    failed = table[~table['ok']]
+    if len(failed):
+        print(f"\n{len(failed)} 项与参考实现不一致")
+        return 1
+    print(f"\n全部 {len(table)} 项与参考实现一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# test/reference/evaluation.py
+"""
+参考实现（冻结）：原始的 pandas 版 IC 与分层回测，逐字保留，只作为差分测试的对照
+
+- daily_ic:      ICAnalyzer.calculate_daily_ic（groupby(level='date').apply(corr)）
+- layer_returns: LayerBacktester.run（逐日 qcut 分组）
+
+输入与 ICAnalyzer / LayerBacktester 相同：get_clean_factor_and_forward_returns 的结果（列 factor / ret）。
+不要为了性能或风格修改这里的代码。
+"""
+import numpy as np
+import pandas as pd
+
+
+def daily_ic(data: pd.DataFrame, method: str = 'spearman', min_stocks: int = 10) -> pd.Series:
+    """
+    計算每日 IC 序列
+    min_stocks: 當天有效股票少於此數則不計算 (避免早期數據噪音)
+    """
+    def _calc(group):
+        if len(group) < min_stocks:
+            return np.nan
+        return group['factor'].corr(group['ret'], method=method)
+
+    return data.groupby(level='date').apply(_calc)
+
+
+def layer_returns(data: pd.DataFrame, groups: int = 5) -> pd.DataFrame:
+    """每日按因子 qcut 分成 groups 组，返回各组等权收益与多空收益"""
+    data = data.copy()
+
+    # 使用 qcut 進行等頻分箱，labels=False 得到 0, 1, 2, 3, 4
+    def get_group(x):
+        try:
+            return pd.qcut(x, groups, labels=False, duplicates='drop')
+        except ValueError:
+            return pd.Series(index=x.index, data=-1)
+
+    raw_groups = data.groupby(level='date')['factor'].apply(get_group)
+    data['group'] = raw_groups.droplevel(0)
+    # 過濾掉無法分組的日子
+    valid_grouped = data[data['group'] != -1]
+
+    # 計算各組平均收益 (等權重，單利)
+    layer_ret = valid_grouped.groupby(['date', 'group'])['ret'].mean().unstack()
+
+    # 重命名列 Group_1 (因子最小) ~ Group_5 (因子最大)
+    layer_ret.columns = [f'G{i+1}' for i in range(groups)]
+
+    # 計算多空收益 (Top - Bottom)
+    layer_ret['Long-Short'] = layer_ret[f'G{groups}'] - layer_ret['G1']
+
+    return layer_ret
@@ -0,0 +1,220 @@
+# test/reference/factors.py
+"""
+参考实现（冻结）：原始的 pandas 版因子计算与后处理，逐字保留，只作为差分测试的对照
+
+- post_process: BaseFactor._post_process（去极值 → 标准化 → 中性化，groupby 逐日回归）
+- illiq_guiji:  IlliqGuijiFactor.calculate（groupby('code').rolling）
+- panic_factor: PanicFactor.calculate（groupby('code').rolling）
+
+原来的方法体搬成函数，self.xxx 改为同名参数；两个因子相同的索引对齐步骤抽成 _align，
+计算逻辑不变（panic_factor 的加权市场收益改为逐日 groupby，见 _market_return）。不要为了性能或风格修改这里的代码。
+"""
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# BaseFactor._post_process
+# =========================
+def post_process(panel: pd.DataFrame, factor_df: pd.DataFrame, name: str, do_winsor: bool = False,
+                 winsor_limit: float = 0.01, do_zscore: bool = False,
+                 neutralize_cols: list[str] | None = None) -> pd.DataFrame:
+    """封装：去极值 → 标准化 → 中性化"""
+    neutralize_cols = neutralize_cols or []
+
+    # 1. 去极值（横截面 winsor）
+    if do_winsor:
+        factor_df[name] = factor_df.groupby(level=0)[name].transform(
+            lambda x: _winsorize(x, winsor_limit)
+        )
+
+    # 2. 标准化（横截面 zscore）
+    if do_zscore:
+        factor_df[name] = factor_df.groupby(level=0)[name].transform(_zscore)
+
+    # 3. 中性化（对市值、行业等）
+    if neutralize_cols:
+        factor_df[name] = _neutralize(panel, factor_df[name], name, neutralize_cols)
+
+    return factor_df
+
+
+def _winsorize(x: pd.Series, limit: float) -> pd.Series:
+    """按百分位数去极值"""
+    lower = x.quantile(limit)
+    upper = x.quantile(1 - limit)
+    return x.clip(lower, upper)
+
+
+def _zscore(x: pd.Series) -> pd.Series:
+    """横截面标准化"""
+    mu = x.mean()
+    sigma = x.std()
+    if sigma == 0 or np.isnan(sigma):
+        return x * np.nan
+    return (x - mu) / sigma
+
+
+def _neutralize(panel: pd.DataFrame, factor: pd.Series, name: str, neutralize_cols: list[str]) -> pd.Series:
+    """
+    简单线性回归中性化：
+    因子 ~ neutralize_cols
+    残差作为新的因子值
+    """
+    # panel 和 factor 已经是 MultiIndex 对齐的
+    df = panel.copy()
+    df[name] = factor
+
+    results = []
+
+    for date, sub in df.groupby(level=0):
+        y = sub[name]
+        X_cols = [c for c in neutralize_cols if c in sub.columns]
+        if not X_cols:
+            results.append(y)
+            continue
+
+        X = sub[X_cols].astype(float)
+        X = X.fillna(X.mean())  # 简单填充
+        X = np.column_stack([np.ones(len(X)), X.values])  # 加截距
+
+        mask = ~y.isna() & ~np.isnan(X).any(axis=1)
+        if mask.sum() < len(X_cols) + 2:
+            results.append(y)
+            continue
+
+        beta, *_ = np.linalg.lstsq(X[mask], y[mask].values, rcond=None)
+        y_hat = X @ beta
+        resid = y - y_hat
+        resid[~mask] = np.nan
+        results.append(resid)
+
+    resid_all = pd.concat(results).sort_index()
+    return resid_all
+
+
+# =========================
+# 索引对齐（illiq_guiji / panic_factor 共用的原始写法）
+# =========================
+def _align(result: pd.Series, panel: pd.DataFrame) -> pd.Series:
+    # 7. 如果索引層級 > 2，則假設最外層是冗餘的分組鍵並將其移除
+    if result.index.nlevels > 2:
+        result = result.droplevel(level=0)
+
+    # 8. 確保索引名稱存在並與 panel 一致
+    if result.index.nlevels == 2 and result.index.names != panel.index.names:
+        # 複製 panel 的 index name，以便後續判斷
+        result.index.set_names(panel.index.names, inplace=True)
+
+    # 9. 檢查並修正索引順序：如果當前是 ['code', 'date'] 而目標是 ['date', 'code']，則交換
+    if result.index.names[0] == panel.index.names[1] and result.index.names[1] == panel.index.names[0]:
+        result = result.swaplevel('date', 'code')
+
+    # 10. 排序和最終對齊 (reindex)
+    result = result.sort_index()
+    result = result.reindex(panel.index)
+
+    # 11. 最終清理：若當天無收盤價（如停牌），該值設為 NaN
+    mask_no_close = panel['close'].isna()
+    result[mask_no_close] = np.nan
+
+    return result
+
+
+# =========================
+# IlliqGuijiFactor.calculate
+# =========================
+def illiq_guiji(panel: pd.DataFrame, lookback: int = 20) -> pd.Series:
+    """
+    计算 Illiq Guiji 因子（非流动性因子）
+    公式: sum(log(1 + |ret|)) / sum(amount) over lookback window
+    """
+    if not isinstance(panel.index, pd.MultiIndex) or panel.index.names != ['date', 'code']:
+        raise ValueError("panel 必须是 MultiIndex, 且 index 顺序为 ('date', 'code')")
+
+    # 放宽 min_periods 条件，避免历史初期数据丢失
+    min_p = lookback // 2
+
+    # 先 groupby 'code'，计算每日绝对收益 (daily_term)
+    daily_ret_abs = panel['close'].groupby('code').pct_change(fill_method=None).abs()
+    daily_term = np.log(1 + daily_ret_abs)
+
+    # 确定分母 (target_vol)：优先使用 turnover
+    if 'turnover' in panel.columns:
+        target_vol = panel['turnover']
+    elif 'volume' in panel.columns:
+        target_vol = panel['volume']
+    else:
+        raise ValueError("panel 中必须有 'turnover' 或 'volume' 列")
+
+    # 滾動求和 (確保 groupby 後 rolling 不跨股票)
+    logsum = daily_term.groupby('code').rolling(
+        window=lookback,
+        min_periods=min_p
+    ).sum()
+    amountsum = target_vol.groupby('code').rolling(
+        window=lookback,
+        min_periods=min_p
+    ).sum()
+
+    result = logsum / amountsum.replace(0, np.nan)
+    return _align(result, panel)
+
+
+# =========================
+# PanicFactor.calculate
+# =========================
+def panic_factor(panel: pd.DataFrame, lookback: int = 21, weight_method: str = 'equal') -> pd.Series:
+    """
+    计算惊恐因子（Panic Factor）
+    panic_i,t = |r_i,t - r_m,t| / (|r_i,t| + |r_m,t| + 0.1)，x_i,t = panic_i,t * r_i,t，因子 = x 的滚动标准差
+    """
+    if not isinstance(panel.index, pd.MultiIndex) or panel.index.names != ['date', 'code']:
+        raise ValueError("panel 必须是 MultiIndex, 且 index 顺序为 ('date', 'code')")
+
+    min_p = lookback // 2  # 放宽 min_periods 条件
+
+    # 按 code 分组计算收益率，避免跨股票计算
+    r_i = panel['close'].groupby('code').pct_change(fill_method=None)
+    r_m = _market_return(panel, r_i, weight_method)
+
+    r_i_abs = r_i.abs()
+    r_m_abs = r_m.abs()
+    panic = (r_i - r_m).abs() / (r_i_abs + r_m_abs + 0.1)
+    x_i = panic * r_i
+
+    result = x_i.groupby('code').rolling(
+        window=lookback,
+        min_periods=min_p
+    ).std()
+    return _align(result, panel)
+
+
+def _market_return(panel: pd.DataFrame, r_i: pd.Series, weight_method: str) -> pd.Series:
+    """计算市场收益 r_m,t（广播到该日期的所有股票）"""
+    if weight_method == 'equal':
+        # 等权：r_m,t = (1/N_t) * Σ r_i,t，按日期分组（自动忽略 NaN）
+        r_m = r_i.groupby('date').transform('mean')
+    elif weight_method in ('market_cap', 'turnover'):
+        # 市值 / 成交额加权：逐日只取收益和权重都有效的股票，权重归一化后加权求和。
+        # 原来的写法用 MultiIndex 上的布尔 Series 做 .loc[date, mask]，在 pandas 2.x 下报错；
+        # 这里改为按日期 groupby 同一张 (r, w) 表，逐日的计算步骤不变
+        col = 'market_capitalization' if weight_method == 'market_cap' else 'turnover'
+        if col not in panel.columns:
+            raise ValueError(f"使用 {weight_method} 加权需要 panel 中包含 '{col}' 列")
+        df = pd.DataFrame({'r': r_i, 'w': panel[col]})
+        r_m_by_date = df.groupby(level='date').apply(_weighted_return)
+        # 将每个日期的市场收益广播到该日期的所有股票
+        r_m = pd.Series(r_m_by_date.reindex(r_i.index.get_level_values('date')).to_numpy(), index=r_i.index)
+    else:
+        raise ValueError(f"不支持的权重方法: {weight_method}")
+    return r_m
+
+
+def _weighted_return(date_group: pd.DataFrame) -> float:
+    """某一日的加权市场收益；没有有效股票（或权重和不为正）时为 NaN"""
+    valid_mask = date_group['r'].notna() & date_group['w'].notna()
+    if valid_mask.sum() == 0 or date_group.loc[valid_mask, 'w'].sum() <= 0:
+        return np.nan
+    weights = date_group.loc[valid_mask, 'w'] / date_group.loc[valid_mask, 'w'].sum()
+    return (date_group.loc[valid_mask, 'r'] * weights).sum()
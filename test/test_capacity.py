@@ -0,0 +1,91 @@
+# test/test_capacity.py
+"""
+backtest.capacity.CapacityAnalyzer：
+- AUM>0 的成交受 participation × ADV / AUM 限制，未成交部分顺延；收益衰减随 AUM 增大，AUM→0 时为 0
+- trading_limits=False 时 AUM=0 档位与 backtest.engine.run_backtest 完全相同
+- 默认 AUM=0 档位受停牌 / 涨跌停 / 没有 ADV 的限制：不能成交的部分顺延
+
+用法:
+    python -m pytest -q test/test_capacity.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.capacity import CapacityAnalyzer
+from backtest.engine import run_backtest
+from preprocess.clean_data import add_status_fields
+from utils.dense_panel import to_wide
+from utils.synthetic import make_panel
+
+
+@pytest.fixture(scope='module')
+def panel():
+    return add_status_fields(make_panel(80, 30, seed=2, suspend_rate=0.05, limit_rate=0.1))
+
+
+@pytest.fixture(scope='module')
+def weights(panel):
+    """每 5 天按收盘价排名取前 10 只等权"""
+    close = to_wide(panel['close'])
+    rank = close.rank(axis=1, ascending=False)
+    w = (rank <= 10).astype(float).div((rank <= 10).sum(axis=1), axis=0)
+    return w.iloc[::5]
+
+
+def test_fills_capped_by_adv_and_carried_forward():
+    dates = pd.date_range('2024-01-01', periods=5, name='date')
+    codes = pd.Index(['A', 'B'], name='code')
+    turnover = pd.DataFrame({'A': 1000.0, 'B': 100.0}, index=dates, columns=codes)
+    returns = pd.DataFrame({'A': 0.01, 'B': 0.02}, index=dates, columns=codes)
+    weights = pd.DataFrame({'A': [0.25, 0.25, 0.25, 0.25, 0.0], 'B': 0.02}, index=dates, columns=codes)
+    # adv_window=2：第 0 天没有 ADV；之后 ADV = (1000, 100)，AUM=1000 时单日上限为 (0.1, 0.01)
+    analyzer = CapacityAnalyzer(weights, returns, turnover, participation=0.1, adv_window=2)
+    summary = analyzer.run([1.0, 1000.0, 1e5])
+
+    base = [0.0, 0.27, 0.0, 0.0, 0.25]              # 第 0 天没有 ADV，基准也不能交易
+    capped = [0.0, 0.11, 0.11, 0.05, 0.1]           # A: 0.1 + 0.1 + 0.05 分三天买满，卖出同样受上限限制
+    np.testing.assert_allclose(analyzer.turnover_[0.0], base)
+    np.testing.assert_allclose(analyzer.turnover_[1.0], base)
+    np.testing.assert_allclose(analyzer.turnover_[1000.0], capped)
+    # 持仓: (0.1, 0.01) → (0.2, 0.02) → (0.25, 0.02)
+    np.testing.assert_allclose(analyzer.returns_[1000.0], [0.0, 0.0, 0.0012, 0.0024, 0.0029])
+    np.testing.assert_allclose(analyzer.returns_[0.0], [0.0, 0.0, 0.0029, 0.0029, 0.0029])
+    np.testing.assert_allclose(analyzer.gap_[1000.0], [0.27, 0.16, 0.05, 0.0, 0.15])
+    assert summary.loc[1000.0, 'Capped Orders'] == 6 / 8    # 订单 2+2+2+1+1，未全部成交 2+2+1+0+1
+    np.testing.assert_allclose(summary.loc[1000.0, 'Max Participation'], 0.1)
+
+    drag = summary['Return Drag']
+    assert drag[0.0] == drag[1.0] == 0
+    assert 0 < drag[1000.0] < drag[1e5]
+
+
+def test_unconstrained_baseline_matches_run_backtest(panel, weights):
+    analyzer = CapacityAnalyzer.from_panel(weights, panel, trading_limits=False, cost_rate=0.001)
+    analyzer.run([1e8])
+    expected = run_backtest(weights, to_wide(panel['ret_1d']), cost_rate=0.001)
+    np.testing.assert_allclose(analyzer.returns_[0.0].to_numpy(), expected['net_return'].to_numpy(),
+                               rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(analyzer.turnover_[0.0].to_numpy(), expected['turnover'].to_numpy(),
+                               rtol=1e-12, atol=1e-15)
+
+
+def test_default_baseline_respects_trading_limits(panel, weights):
+    analyzer = CapacityAnalyzer.from_panel(weights, panel)
+    analyzer.run([1e8])
+    unconstrained = run_backtest(weights, to_wide(panel['ret_1d']))
+    # 合成数据中有停牌和涨跌停，限制会改变基准的路径
+    assert not np.allclose(analyzer.returns_[0.0].to_numpy(), unconstrained['net_return'].to_numpy())
+
+    # 重放 AUM=0 的持仓：没有 ADV 或停牌不成交、涨停不买、跌停不卖，未成交部分顺延
+    target, ret = analyzer.target, analyzer.ret
+    halted = to_wide(panel['suspended']).to_numpy() == 1
+    up, down = to_wide(panel['limit_up']).to_numpy() == 1, to_wide(panel['limit_down']).to_numpy() == 1
+    hold = np.zeros(target.shape[1])
+    gross = np.zeros(len(target))
+    for t in range(len(target)):
+        gross[t] = hold @ ret[t]
+        order = target[t] - hold
+        blocked = (analyzer.adv[t] <= 0) | halted[t] | (up[t] & (order > 0)) | (down[t] & (order < 0))
+        hold = hold + np.where(blocked, 0.0, order)
+    np.testing.assert_allclose(analyzer.returns_[0.0].to_numpy(), gross, rtol=1e-12, atol=1e-15)
@@ -0,0 +1,43 @@
+# test/test_differential.py
+"""
+快速实现与冻结参考实现（test/reference/）的差分测试，场景与用例见 test/differential.py
+
+用法:
+    python -m pytest -q test/test_differential.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import differential
+
+
+@pytest.fixture(scope='module', params=list(differential.SCENARIOS))
+def ctx(request):
+    try:
+        panel = differential.load_scenario(request.param, n_dates=150, n_codes=60, seed=1)
+    except FileNotFoundError as e:
+        pytest.skip(str(e))
+    return differential.build_context(panel)
+
+
+@pytest.mark.parametrize('case', list(differential.CASES))
+def test_matches_reference(ctx, case):
+    row = differential.run_case(case, ctx)
+    assert row['ok'], row['problems']
+
+
+def test_compare_detects_mismatch():
+    index = pd.MultiIndex.from_product([pd.date_range('2020-01-01', periods=3), ['a', 'b']],
+                                       names=['date', 'code'])
+    ref = pd.Series(np.arange(1, 7, dtype=float), index=index)
+
+    assert differential.compare(ref.copy(), ref)[1] == []
+    assert differential.compare(ref + 1e-12, ref, rtol=1e-9)[1] == []
+    assert differential.compare(ref + 1e-3, ref, rtol=1e-9)[1]
+
+    moved_nan = ref.copy()
+    moved_nan.iloc[2] = np.nan
+    assert 'NaN' in differential.compare(moved_nan, ref)[1][0]
+
+    assert differential.compare(ref.iloc[::-1], ref)[0] == np.inf
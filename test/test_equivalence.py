@@ -0,0 +1,189 @@
+# test/test_equivalence.py
+"""
+各优化路径声称的等价关系：快速 / 增量 / 分块的写法必须与直接的写法给出相同结果
+
+- factors/chunked.run_chunked                         == BaseFactor.run（按股票 / 按日期分块，含后处理与滞后）
+- utils/panel_versions.refresh_factor                 == 对最新快照整体重算
+- factor_processing/neutralize.neutralize             == 逐日 [行业哑变量, 风格列] lstsq 残差
+- factor_processing/combination.combination_weights   == 逐日用窗口内样本重新估计
+- factor_evaluation/significance.SignificanceTester   观测值 == ICAnalyzer / LayerBacktester
+- factor_evaluation/correlation.rank_correlation     按日期块流式计算 == 逐日 Spearman 的平均
+
+用法:
+    python -m pytest -q test/test_equivalence.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from factor_evaluation.correlation import rank_correlation
+from factor_evaluation.ic_analysis import ICAnalyzer
+from factor_evaluation.layer_backtest import LayerBacktester
+from factor_evaluation.significance import SignificanceTester
+from factor_evaluation.util import get_clean_factor_and_forward_returns
+from factor_processing.combination import combination_weights, daily_rank_ic
+from factor_processing.neutralize import neutralize
+from factors.base_factor import get_factor
+from factors.chunked import run_chunked
+from preprocess.clean_data import add_status_fields
+from utils.array_store import ArrayStore
+from utils.panel_versions import VersionedPanelStore, refresh_factor
+from utils.synthetic import make_panel
+
+N_INDUSTRIES = 4
+
+
+@pytest.fixture(scope='module')
+def cleaned():
+    panel = add_status_fields(make_panel(120, 40, seed=5, suspend_rate=0.05))
+    codes = panel.index.get_level_values('code')
+    panel['industry'] = pd.Series(codes).astype('category').cat.codes.to_numpy() % N_INDUSTRIES
+    return panel
+
+
+def _assert_same(fast, slow, rtol=1e-9, atol=1e-12):
+    fast, slow = pd.Series(fast), pd.Series(slow)
+    assert fast.index.equals(slow.index)
+    np.testing.assert_array_equal(fast.isna().to_numpy(), slow.isna().to_numpy())
+    np.testing.assert_allclose(fast.to_numpy(dtype=float), slow.to_numpy(dtype=float), rtol=rtol, atol=atol)
+
+
+# =========================
+# 分块执行
+# =========================
+@pytest.mark.parametrize('name, params', [
+    ('illiq_guiji', dict(lag=1, do_winsor=True, do_zscore=True, neutralize_cols=['ln_mkt_cap'],
+                         industry_col='industry')),
+    ('panic_factor', dict(lag=2, do_zscore=True, neutralize_cols=['ln_mkt_cap'])),
+    ('panic_factor', dict(weight_method='turnover')),
+])
+def test_chunked_matches_run(tmp_path, cleaned, name, params):
+    factor = get_factor(name, **params)
+    store = ArrayStore.from_panel(cleaned, str(tmp_path / 'panel'))
+    # 很小的内存上限，保证两个阶段都切成多块
+    out = run_chunked(factor, store, str(tmp_path / 'out'), max_memory_mb=0.02, overhead=1)
+    expected = factor.run(cleaned)[factor.name]
+    _assert_same(out.to_frame()[factor.name], expected)
+
+
+# =========================
+# 增量重算
+# =========================
+def test_refresh_factor_matches_full_rerun(tmp_path, cleaned):
+    factor = get_factor('illiq_guiji', lag=1, do_zscore=True)
+    store = VersionedPanelStore(str(tmp_path))
+    v1 = store.commit(cleaned)
+    cached = factor.run(store.snapshot())
+
+    dates = cleaned.index.get_level_values('date').unique()
+    d = cleaned.index.get_level_values('date')
+    update = cleaned[(d >= dates[60]) & (d <= dates[65])].copy()
+    update['turnover'] = update['turnover'] * 1.5
+    store.commit(update)
+
+    refreshed = refresh_factor(factor, store, cached, since=v1)
+    expected = factor.run(store.snapshot())
+    _assert_same(refreshed[factor.name], expected[factor.name])
+
+
+# =========================
+# 中性化
+# =========================
+def test_neutralize_matches_dummy_regression(cleaned):
+    factor = get_factor('illiq_guiji').calculate(cleaned).rename('factor')
+    resid = neutralize(factor, cleaned, ['ln_mkt_cap'], 'industry')
+
+    expected = pd.Series(np.nan, index=factor.index)
+    ln_cap = np.log(cleaned['market_capitalization'].where(cleaned['market_capitalization'] > 0))
+    for date in factor.index.get_level_values('date').unique():
+        y, x = factor.xs(date, drop_level=False), ln_cap.xs(date, drop_level=False)
+        x = x.fillna(x.mean())
+        industry = cleaned['industry'].xs(date, drop_level=False)
+        mask = (y.notna() & x.notna()).to_numpy()
+        dummies = np.eye(N_INDUSTRIES)[industry.to_numpy()]
+        X = np.column_stack([dummies, x.to_numpy()])[mask]
+        if mask.sum() < np.unique(industry[mask]).size + 2:
+            expected.loc[y.index] = y
+            continue
+        beta, *_ = np.linalg.lstsq(X, y.to_numpy()[mask], rcond=None)
+        rows = y.index[mask]
+        expected.loc[rows] = y.to_numpy()[mask] - X @ beta
+    _assert_same(resid, expected, rtol=1e-7, atol=1e-12)
+
+
+# =========================
+# 合成权重
+# =========================
+@pytest.mark.parametrize('method', ['ic', 'icir', 'regression'])
+def test_rolling_weights_match_naive_refit(method):
+    rng = np.random.default_rng(0)
+    t, n, k, lookback, horizon = 40, 30, 3, 10, 2
+    cube = rng.standard_normal((t, n, k))
+    ret = 0.1 * cube[:, :, 0] + rng.standard_normal((t, n))
+    cube[rng.random((t, n, k)) < 0.05] = np.nan
+    ret[rng.random((t, n)) < 0.05] = np.nan
+    fast = combination_weights(cube, ret, method=method, lookback=lookback, horizon=horizon)
+
+    ic = daily_rank_ic(cube, ret)
+    naive = np.full((t, k), np.nan)
+    for day in range(t):
+        end = day - horizon + 1
+        window = slice(max(end - lookback, 0), max(end, 0))
+        if method in ('ic', 'icir'):
+            sample = ic[window]
+            counts = np.isfinite(sample).sum(axis=0)
+            if counts.min() < max(lookback // 2, 2):
+                continue
+            raw = np.nanmean(sample, axis=0)
+            if method == 'icir':
+                raw = raw / np.nanstd(sample, axis=0, ddof=1)
+        else:
+            xs, ys = [], []
+            for s in range(window.start, window.stop):
+                mask = np.isfinite(ret[s]) & np.isfinite(cube[s]).all(axis=1)
+                if mask.sum() <= k:
+                    continue
+                y = ret[s, mask]
+                xs.append(cube[s, mask])
+                ys.append((y - y.mean()) / y.std(ddof=1))
+            if len(xs) < lookback // 2:
+                continue
+            raw, *_ = np.linalg.lstsq(np.vstack(xs), np.concatenate(ys), rcond=None)
+        naive[day] = raw / np.abs(raw).sum()
+    np.testing.assert_allclose(fast, naive, rtol=1e-8, atol=1e-12)
+
+
+# =========================
+# 显著性检验的观测值
+# =========================
+def test_significance_observed_matches_analyzers(cleaned):
+    raw = get_factor('illiq_guiji').calculate(cleaned)
+    merged = get_clean_factor_and_forward_returns(raw.rename('factor').to_frame(), cleaned, factor_name='factor')
+    tester = SignificanceTester(merged, groups=5)
+
+    ic = ICAnalyzer(merged).calculate_daily_ic().dropna()
+    _assert_same(tester.daily_ic().to_numpy(), ic.to_numpy())
+    assert tester.daily_ic().index.equals(pd.DatetimeIndex(ic.index))
+
+    ls = LayerBacktester(merged, groups=5).run()['Long-Short'].dropna()
+    _assert_same(tester.daily_long_short().to_numpy(), ls.to_numpy())
+
+
+# =========================
+# 因子相关性
+# =========================
+def test_blocked_rank_correlation_matches_daily_spearman(cleaned):
+    frame = pd.DataFrame({
+        'illiq': get_factor('illiq_guiji').calculate(cleaned),
+        'panic': get_factor('panic_factor').calculate(cleaned),
+        'size': np.log(cleaned['market_capitalization']),
+    }).dropna()
+    dates = frame.index.get_level_values('date').unique()
+    codes = frame.index.get_level_values('code').unique().sort_values()
+    series = {name: frame[name].sample(frac=1.0, random_state=0) for name in frame.columns}   # 乱序输入
+
+    daily = [sub.corr(method='spearman').to_numpy() for _, sub in frame.groupby(level='date') if len(sub) >= 10]
+    expected = np.mean(daily, axis=0)
+    for max_memory_mb in (256, 0.01):
+        rank_corr, _ = rank_correlation(series, dates, codes, pairwise=True, max_memory_mb=max_memory_mb)
+        np.testing.assert_allclose(rank_corr.to_numpy(), expected, rtol=1e-6, atol=1e-7)
@@ -0,0 +1,57 @@
+# test/test_factor_server.py
+"""
+utils.factor_server.FactorCache 的热更新：某一轮重读出错时保留旧快照，轮询线程继续运行
+
+用法:
+    python -m pytest -q test/test_factor_server.py
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.factor_server import FactorCache
+
+
+def _save(root, name, n_dates, value):
+    index = pd.MultiIndex.from_product([pd.date_range('2024-01-01', periods=n_dates, name='date'),
+                                        ['a', 'b', 'c']], names=['date', 'code'])
+    pd.DataFrame({name: np.full(len(index), value)}, index=index).to_pickle(os.path.join(root, f'{name}.pkl'))
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_watch_survives_reload_errors(tmp_path, monkeypatch):
+    _save(tmp_path, 'f', 5, 1.0)
+    cache = FactorCache(root=str(tmp_path), days=10)
+    before = cache.snapshot
+
+    calls = []
+    reload = cache.reload
+
+    def flaky():
+        calls.append(cache.snapshot is before)
+        if len(calls) <= 2:
+            raise OSError('因子目录暂时不可读')
+        return reload()
+    monkeypatch.setattr(cache, 'reload', flaky)
+
+    _save(tmp_path, 'f', 6, 2.0)
+    os.utime(os.path.join(tmp_path, 'f.pkl'), ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    thread = cache.watch(interval=0.01)
+
+    assert _wait(lambda: len(calls) >= 3 and cache.snapshot is not before)
+    assert thread.is_alive()
+    # 出错的两轮之后快照仍是旧的，第三轮成功后才替换
+    assert calls[:3] == [True, True, True]
+    assert cache.snapshot.info()['n_dates'] == 6
+    _, _, _, block = cache.snapshot.select()
+    assert (block == 2.0).all()
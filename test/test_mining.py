@@ -0,0 +1,107 @@
+# test/test_mining.py
+"""
+factor_mining：有效 IC 天数不足的候选适应度为 -inf；select 去掉近似重复的表达式；数据内容变化时重建存储；
+导出默认写入暂存目录，显式 install 才进入 factors/
+
+用法:
+    python -m pytest -q test/test_mining.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from factor_mining import export
+from factor_mining.search import FactorMiner, _fitness, build_store
+from factors import registry
+from preprocess.clean_data import add_status_fields
+from utils.synthetic import make_panel
+
+
+def test_fitness_requires_min_days():
+    rng = np.random.default_rng(0)
+    values = rng.standard_normal((40, 30))
+    ret = 0.3 * values + rng.standard_normal((40, 30))
+    # 只有前 5 天有值：覆盖率检查关掉，天数检查拦下
+    sparse = values.copy()
+    sparse[5:] = np.nan
+    assert np.isfinite(_fitness(values, ret, 10, 0.0, min_days=20)['IC Mean'])
+    out = _fitness(sparse, ret, 10, 0.0, min_days=20)
+    assert out['Days'] == 5 and np.isnan(out['IC Mean'])
+    assert np.isfinite(_fitness(sparse, ret, 10, 0.0, min_days=5)['IC Mean'])
+
+
+def test_failed_candidates_rank_last(tmp_path):
+    panel = add_status_fields(make_panel(60, 20, seed=4))
+    miner = FactorMiner(build_store(panel, str(tmp_path)), population=6, generations=1, workers=1, min_days=0.5)
+    assert miner.min_days == int(np.ceil(0.5 * (miner.n_train - 1)))
+    miner.scores = {'good': {'IC Mean': 0.001}, 'short': {'IC Mean': np.nan}}
+    assert miner._fitness_of('short') == -np.inf
+    assert sorted(miner.scores, key=miner._fitness_of, reverse=True) == ['good', 'short']
+
+
+def test_select_drops_near_duplicates(tmp_path):
+    panel = add_status_fields(make_panel(120, 50, seed=0))
+    miner = FactorMiner(build_store(panel, str(tmp_path)), train_frac=1.0, workers=1)
+    # 两者在有数据的日期上秩相关约 0.8，但 60 日预热期两者都为 NaN
+    exprs = ['ts_sum(ts_min(volume, 60), 10)', 'ts_sum(ts_sum(ts_min(volume, 60), 20), 20)', 'ts_std(close, 5)']
+    miner.candidates_ = pd.DataFrame({'IC Mean': [0.05, 0.04, 0.03], 'ICIR': 0.5, 'Coverage': 1.0, 'Size': 4},
+                                     index=pd.Index(exprs, name='expression'))
+    survivors = miner.select(min_ic=0.0, max_corr=0.7)
+    assert list(survivors.index) == [exprs[0], exprs[2]]
+
+
+def test_build_store_rebuilds_on_changed_data(tmp_path):
+    panel = add_status_fields(make_panel(30, 10, seed=1))
+    path = str(tmp_path / 'store')
+    store = build_store(panel, path)
+    close = np.array(store.array('close'))
+    assert build_store(panel, path).info == store.info
+
+    # 同一日期 / 股票 / 字段，数据被修正
+    fixed = panel.copy()
+    fixed['close'] = fixed['close'] * 1.01
+    np.testing.assert_allclose(build_store(fixed, path).array('close'), close * 1.01)
+
+    # 按来源文件判断：只 touch 不重建，内容变化才重建
+    source = str(tmp_path / 'panel.pkl')
+    fixed.to_pickle(source)
+    first = build_store(fixed, path, source=source).info['fingerprint']
+    os.utime(source, ns=(first['mtime'] + 10 ** 9, first['mtime'] + 10 ** 9))
+    touched = build_store(fixed, path, source=source).info['fingerprint']
+    assert touched['hash'] == first['hash'] and touched['mtime'] != first['mtime']
+    panel.to_pickle(source)
+    np.testing.assert_allclose(build_store(panel, path, source=source).array('close'), close)
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    staging, factors = tmp_path / 'staging', tmp_path / 'factors'
+    factors.mkdir()
+    monkeypatch.setattr(export, 'STAGING_DIR', str(staging))
+    monkeypatch.setattr(export, 'FACTORS_DIR', str(factors))
+    refreshed = []
+    monkeypatch.setattr(export, 'discover', lambda refresh=False: refreshed.append(refresh))
+    return staging, factors, refreshed
+
+
+def test_export_defaults_to_staging(dirs):
+    staging, factors, refreshed = dirs
+    name, path = export.export_factor('cs_rank(ts_std(ts_ret(close, 1), 20))')
+    assert os.path.dirname(path) == str(staging) and os.listdir(factors) == []
+    assert refreshed == []
+
+    installed = export.install_factor(name)
+    assert installed == os.path.join(str(factors), f'{name}.py')
+    assert not os.path.exists(path) and refreshed == [True]
+
+
+def test_export_install_writes_factors_dir(dirs):
+    _, factors, refreshed = dirs
+    name, path = export.export_factor('ts_mean(volume, 5)', install=True)
+    assert path == os.path.join(str(factors), f'{name}.py') and refreshed == [True]
+    with pytest.raises(ValueError):
+        export.export_factor('ts_mean(volume, 5)', directory=str(factors), install=True)
+    # 真实的 factors/ 目录没有被写入
+    assert not os.path.exists(os.path.join(registry.FACTORS_DIR, f'{name}.py'))
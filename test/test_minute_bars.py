@@ -0,0 +1,127 @@
+# test/test_minute_bars.py
+"""
+preprocess.minute_bars：按日 npz 存储的写入 / 读取往返；流式日度聚合与直接对长表 groupby 的结果一致；
+factors/illiq_minute 与逐股票滚动求和的写法一致
+
+用法:
+    python -m pytest -q test/test_minute_bars.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from factors.base_factor import get_factor
+from preprocess.minute_bars import (AGGREGATORS, MinuteDay, aggregate, ingest, join_panel, list_days, read_day,
+                                    write_day)
+from utils.synthetic import make_minute_bars
+
+
+@pytest.fixture(scope='module')
+def bars():
+    # 停牌与零星缺失都要出现
+    return pd.concat(make_minute_bars(n_dates=6, n_codes=12, seed=7, suspend_rate=0.1, missing_rate=0.05),
+                     ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def root(tmp_path_factory, bars):
+    root = str(tmp_path_factory.mktemp('minute'))
+    # 分两块入库，每块是完整的交易日
+    dates = bars['date'].unique()
+    ingest((bars[bars['date'].isin(dates[:3])], bars[bars['date'].isin(dates[3:])]), root)
+    return root
+
+
+def test_write_read_roundtrip(tmp_path):
+    rng = np.random.default_rng(0)
+    close = rng.random((3, 4)).astype(np.float32)
+    close[1, 2] = np.nan
+    day = MinuteDay('2024-01-02', np.array(['a', 'b', 'c']), np.array([931, 932, 933, 1500]),
+                    {'close': close, 'volume': np.arange(12, dtype=np.float32).reshape(3, 4)})
+    write_day(day, str(tmp_path))
+
+    back = read_day('2024-01-02', str(tmp_path))
+    assert back.date == pd.Timestamp('2024-01-02')
+    np.testing.assert_array_equal(back.codes, day.codes)
+    np.testing.assert_array_equal(back.minutes, day.minutes)
+    assert set(back.fields) == {'close', 'volume'}
+    np.testing.assert_array_equal(back['close'], close)
+    np.testing.assert_array_equal(back['volume'], day['volume'])
+
+    assert list(read_day('2024-01-02', str(tmp_path), fields=['volume']).fields) == ['volume']
+    with pytest.raises(ValueError):
+        read_day('2024-01-02', str(tmp_path), fields=['amount'])
+    with pytest.raises(FileNotFoundError):
+        read_day('2024-01-03', str(tmp_path))
+    assert list_days(str(tmp_path)).equals(pd.DatetimeIndex(['2024-01-02'], name='date'))
+
+
+def test_ingest_scatters_long_bars(root, bars):
+    assert list_days(root).equals(pd.DatetimeIndex(sorted(bars['date'].unique()), name='date'))
+    for date, day_bars in bars.groupby('date'):
+        day = read_day(date, root)
+        grid = day_bars.pivot(index='code', columns='time', values='close')
+        # 当天有分钟线的股票与分钟（停牌股票不出现，缺失分钟为 NaN）
+        np.testing.assert_array_equal(day.codes, grid.index.to_numpy())
+        np.testing.assert_array_equal(day.minutes, grid.columns.to_numpy())
+        np.testing.assert_array_equal(day['close'], grid.to_numpy(dtype=np.float32))
+
+
+def _expected(bars: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """直接对长表按 (date, code) 分组计算；分钟收益在当天的分钟网格上取相邻差分（缺失分钟两侧的收益为 NaN）"""
+    bars = bars.copy()
+    for col in ('close', 'volume', 'amount'):
+        bars[col] = bars[col].astype(np.float32).astype(np.float64)
+    out = {name: {} for name in AGGREGATORS}
+    for date, day_bars in bars.groupby('date'):
+        minutes = np.sort(day_bars['time'].unique())
+        for code, g in day_bars.groupby('code'):
+            g = g.set_index('time').reindex(minutes)
+            r = np.log(g['close']).diff().iloc[1:]
+            amount = g['amount'].iloc[1:]
+            valid = g['volume'].notna() & g['amount'].notna()
+            term = (r.abs() / amount.where(amount > 0)).dropna()
+            key = (date, code)
+            out['realized_vol'][key] = np.sqrt((r.dropna() ** 2).sum()) if r.notna().sum() >= 2 else np.nan
+            out['vwap'][key] = g['amount'][valid].sum() / g['volume'][valid].sum()
+            out['intraday_amihud'][key] = term.mean() if len(term) else np.nan
+            out['minute_logret'][key] = np.log1p(r.dropna().abs()).sum() if r.notna().any() else np.nan
+            out['amount'][key] = g['amount'].sum(min_count=1)
+    return {name: pd.Series(values).unstack() for name, values in out.items()}
+
+
+def test_streamed_aggregate_matches_groupby(root, bars):
+    streamed = aggregate(root=root)
+    expected = _expected(bars)
+    assert set(streamed) == set(AGGREGATORS)
+    for name, wide in streamed.items():
+        exp = expected[name]
+        assert wide.index.equals(pd.DatetimeIndex(exp.index, name='date'))
+        assert wide.columns.equals(exp.columns)
+        np.testing.assert_allclose(wide.to_numpy(), exp.to_numpy(dtype=np.float64), rtol=1e-6, err_msg=name)
+
+    # 按日期区间只聚合其中几天
+    days = list_days(root)
+    part = aggregate(['vwap'], start=days[2], end=days[4], root=root)['vwap']
+    assert part.index.equals(days[2:5])
+
+
+def test_illiq_minute_matches_rolling_by_code(root):
+    features = aggregate(['minute_logret', 'amount'], root=root)
+    dates, codes = features['amount'].index, features['amount'].columns
+    panel = pd.DataFrame(index=pd.MultiIndex.from_product([dates, codes], names=['date', 'code']))
+    panel['close'] = 1.0
+    panel = join_panel(panel, features)
+
+    lookback = 4
+    result = get_factor('illiq_minute', lookback=lookback).calculate(panel)
+    g = panel.groupby(level='code')
+    logsum = g['minute_logret'].transform(lambda s: s.rolling(lookback, min_periods=lookback // 2).sum())
+    amountsum = g['amount'].transform(lambda s: s.rolling(lookback, min_periods=lookback // 2).sum())
+    expected = (logsum / amountsum).where(panel['minute_logret'].notna())
+    assert result.index.equals(panel.index)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-12)
+    # 非稠密（乱序）的 panel 结果相同
+    shuffled = panel.sample(frac=1.0, random_state=0)
+    np.testing.assert_allclose(get_factor('illiq_minute', lookback=lookback).calculate(shuffled).to_numpy(),
+                               expected.reindex(shuffled.index).to_numpy(), rtol=1e-12)
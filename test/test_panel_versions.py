@@ -0,0 +1,138 @@
+# test/test_panel_versions.py
+"""
+utils.panel_versions.VersionedPanelStore：入库 / 快照往返（含追加日期上全部字段为 NaN 的行）、重叠增量、压缩，以及按日期区间跳过增量文件
+
+用法:
+    python -m pytest -q test/test_panel_versions.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.panel_versions import VersionedPanelStore
+from utils.synthetic import make_panel
+
+
+@pytest.fixture
+def panel():
+    return make_panel(60, 8, seed=3).sort_index()
+
+
+def _dates(panel):
+    return panel.index.get_level_values('date').unique()
+
+
+def _rows(panel, start, end):
+    d = panel.index.get_level_values('date')
+    return panel[(d >= start) & (d <= end)]
+
+
+def _revise(panel, start, end, field='close', factor=1.1):
+    """返回 [start, end] 日期区间、field 乘以 factor 的修订数据，以及修订后的完整 panel"""
+    update = _rows(panel, start, end).copy()
+    update[field] = update[field] * factor
+    full = panel.copy()
+    full.loc[update.index, field] = update[field]
+    return update, full
+
+
+def test_commit_snapshot_roundtrip(tmp_path, panel):
+    store = VersionedPanelStore(str(tmp_path))
+    dates = _dates(panel)
+    v1 = store.commit(_rows(panel, dates[0], dates[39]))
+    # 日更：追加新日期
+    v2 = store.commit(_rows(panel, dates[40], dates[-1]))
+    assert (v1, v2) == (1, 2)
+    pd.testing.assert_frame_equal(store.snapshot(), panel, check_freq=False)
+    pd.testing.assert_frame_equal(store.snapshot(v1), _rows(panel, dates[0], dates[39]), check_freq=False)
+    # 重新打开存储，同一个数据不新建版本
+    store = VersionedPanelStore(str(tmp_path))
+    assert store.commit(panel) == v2
+    assert store.dates().equals(pd.DatetimeIndex(dates, name='date'))
+
+
+def test_overlapping_deltas_last_revision_wins(tmp_path, panel):
+    store = VersionedPanelStore(str(tmp_path))
+    dates = _dates(panel)
+    store.commit(panel)
+    up1, after1 = _revise(panel, dates[10], dates[30], factor=1.1)
+    v2 = store.commit(up1)
+    up2, after2 = _revise(after1, dates[20], dates[40], factor=0.5)
+    v3 = store.commit(up2)
+
+    pd.testing.assert_frame_equal(store.snapshot(), after2, check_freq=False)
+    pd.testing.assert_frame_equal(store.snapshot(v2), after1, check_freq=False)
+    pd.testing.assert_frame_equal(store.snapshot(v3, start=dates[15], end=dates[25]),
+                                  _rows(after2, dates[15], dates[25]), check_freq=False)
+    assert store.affected_dates(since=v2).equals(pd.DatetimeIndex(dates[20:41], name='date'))
+
+
+def test_reads_skip_deltas_outside_window(tmp_path, panel):
+    store = VersionedPanelStore(str(tmp_path))
+    dates = _dates(panel)
+    store.commit(panel)
+    v_early = store.commit(_revise(panel, dates[0], dates[5])[0])
+    store.commit(_revise(panel, dates[50], dates[55])[0])
+
+    # 早期区间的增量文件不存在也不影响后期区间的读取与入库：说明没有被读取
+    os.remove(store._delta_file(v_early))
+    late = store.snapshot(start=dates[45], end=dates[-1])
+    assert len(late) == 15 * 8
+    update, _ = _revise(panel, dates[58], dates[59], field='volume', factor=2.0)
+    assert store.commit(update) == v_early + 2
+    # 列出日期只用 manifest，不读取基准分区和增量
+    assert store.dates().equals(pd.DatetimeIndex(dates, name='date'))
+
+
+def test_compact_keeps_snapshots(tmp_path, panel):
+    store = VersionedPanelStore(str(tmp_path))
+    dates = _dates(panel)
+    store.commit(panel)
+    update, revised = _revise(panel, dates[5], dates[15])
+    v2 = store.commit(update)
+
+    assert store.compact() == v2
+    pd.testing.assert_frame_equal(store.snapshot(), revised, check_freq=False)
+    pd.testing.assert_frame_equal(store.snapshot(1), panel, check_freq=False)
+
+    store.compact(prune=True)
+    assert store.manifest['bases'] == [v2]
+    assert not os.path.exists(store._base_dir(1))
+    pd.testing.assert_frame_equal(store.snapshot(), revised, check_freq=False)
+    with pytest.raises(ValueError):
+        store.snapshot(1)
+    # 压缩后继续入库
+    update, revised2 = _revise(revised, dates[-3], dates[-1], factor=np.e)
+    store.commit(update)
+    pd.testing.assert_frame_equal(store.snapshot(), revised2, check_freq=False)
+
+
+def test_all_nan_rows_on_appended_dates(tmp_path, panel):
+    store = VersionedPanelStore(str(tmp_path))
+    dates = _dates(panel)
+    codes = panel.index.get_level_values('code').unique()
+    store.commit(_rows(panel, dates[0], dates[39]))
+    # 后 20 天中有两只股票已对齐但尚未上市：全部字段为 NaN，没有任何变化的单元格
+    update = _rows(panel, dates[40], dates[-1]).copy()
+    update.loc[update.index.get_level_values('code').isin(codes[:2])] = np.nan
+    v2 = store.commit(update)
+    expected = pd.concat([_rows(panel, dates[0], dates[39]), update])
+
+    assert store.versions[-1]['n_rows'] == len(update)
+    pd.testing.assert_frame_equal(store.snapshot(), expected, check_freq=False)
+    pd.testing.assert_frame_equal(store.snapshot(v2, start=dates[50], end=dates[-1]),
+                                  _rows(expected, dates[50], dates[-1]), check_freq=False)
+    assert store.commit(update) == v2
+
+    # 只有全 NaN 新行的一次入库也会新建版本，压缩后行仍在
+    blank = pd.DataFrame(np.nan, columns=panel.columns,
+                         index=pd.MultiIndex.from_product([[dates[-1] + pd.Timedelta(days=1)], codes],
+                                                          names=['date', 'code']))
+    v3 = store.commit(blank)
+    assert v3 == v2 + 1 and store.versions[-1]['n_cells'] == 0
+    expected = pd.concat([expected, blank])
+    pd.testing.assert_frame_equal(store.snapshot(), expected, check_freq=False)
+    store.compact(prune=True)
+    pd.testing.assert_frame_equal(store.snapshot(), expected, check_freq=False)
@@ -0,0 +1,103 @@
+# test/test_pipeline.py
+"""
+factor_processing.factor_pipeline 的缓存：第二次运行全部跳过；修改依赖的源文件只让依赖它的 Stage 及下游重算
+
+用法:
+    python -m pytest -q test/test_pipeline.py
+"""
+import json
+import os
+import sys
+
+import pytest
+
+from factor_processing import factor_pipeline
+from factor_processing.factor_pipeline import Pipeline, Stage, build_default_pipeline
+
+TOY = {
+    '__init__.py': '',
+    'helper_a.py': 'def value():\n    return 1\n',
+    'helper_b.py': 'def scale(x):\n    return x * 2\n',
+    'stages.py': (
+        'from toy.helper_a import value\n'
+        '\n\n'
+        'def stage_a():\n'
+        '    return value()\n'
+        '\n\n'
+        'def stage_b(a):\n'
+        '    from toy.helper_b import scale\n'
+        '    return scale(a)\n'
+        '\n\n'
+        'def stage_c(b):\n'
+        '    return b + 1\n'
+    ),
+}
+
+
+@pytest.fixture
+def toy(tmp_path, monkeypatch):
+    """tmp_path/toy 包：a → b → c 三个 Stage，b 在函数内延迟 import helper_b"""
+    pkg = tmp_path / 'toy'
+    pkg.mkdir()
+    for name, source in TOY.items():
+        (pkg / name).write_text(source, encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, 'dont_write_bytecode', True)
+    monkeypatch.setattr(factor_pipeline, 'ROOT', str(tmp_path))
+    yield tmp_path
+    for mod in [m for m in sys.modules if m == 'toy' or m.startswith('toy.')]:
+        del sys.modules[mod]
+
+
+def _pipeline(root):
+    import toy.stages as stages
+
+    def stage(name, func, deps=()):
+        path = os.path.join(root, f'{name}.json')
+
+        def save(result):
+            with open(path, 'w') as f:
+                json.dump(result, f)
+
+        def load():
+            with open(path) as f:
+                return json.load(f)
+        return Stage(name, func, deps=deps, outputs=[path], save=save, load=load)
+
+    return Pipeline([stage('a', stages.stage_a), stage('b', stages.stage_b, ['a']),
+                     stage('c', stages.stage_c, ['b'])], cache_file=os.path.join(root, 'cache.json'))
+
+
+def test_second_run_skips_everything(toy):
+    assert _pipeline(toy).run(workers=1) == {'a': 'ran', 'b': 'ran', 'c': 'ran'}
+    assert _pipeline(toy).run(workers=1) == {'a': 'skipped', 'b': 'skipped', 'c': 'skipped'}
+
+
+def test_editing_dependency_invalidates_only_downstream(toy):
+    _pipeline(toy).run(workers=1)
+    (toy / 'toy' / 'helper_b.py').write_text('def scale(x):\n    return x * 30\n', encoding='utf-8')
+    del sys.modules['toy.helper_b']
+
+    pipe = _pipeline(toy)
+    assert pipe.run(workers=1) == {'a': 'skipped', 'b': 'ran', 'c': 'ran'}
+    assert pipe.get('c') == 31
+
+
+def test_untouched_output_keeps_downstream_cached(toy):
+    _pipeline(toy).run(workers=1)
+    # 只改了注释，b 的输出不变，c 不需要重算
+    (toy / 'toy' / 'helper_b.py').write_text('def scale(x):\n    # 注释\n    return x * 2\n', encoding='utf-8')
+    del sys.modules['toy.helper_b']
+    assert _pipeline(toy).run(workers=1) == {'a': 'skipped', 'b': 'ran', 'c': 'skipped'}
+
+
+def test_default_stage_fingerprints_follow_imports():
+    root = factor_pipeline.ROOT
+    code = {name: {os.path.relpath(p, root) for p in stage.code_files()}
+            for name, stage in build_default_pipeline().stages.items()}
+    assert {'preprocess/clean_data.py', 'utils/dense_panel.py'} <= code['clean']
+    assert {'factors/base_factor.py', 'factors/illiq_guiji.py', 'factor_processing/neutralize.py',
+            'utils/dense_panel.py'} <= code['factor:illiq_guiji']
+    assert {'factor_evaluation/ic_analysis.py', 'utils/calendar.py'} <= code['evaluate:illiq_guiji']
+    # 同一文件中的 Stage 函数只依赖各自用到的模块
+    assert 'factors/base_factor.py' not in code['clean']
@@ -0,0 +1,165 @@
+# utils/array_store.py
+"""
+磁盘上的 dates × codes 数组存储（numpy .npy + memmap）
+
+目录结构:
+    {path}/meta.json       {'dates': [...], 'codes': [...], 'fields': [...], 'info': {...}}
+    {path}/{field}.npy     float64 (n_dates, n_codes)，按列 (code) 连续存放（Fortran order）
+
+按列存放使得"取若干只股票的全部历史"是连续读取（时间序列计算按 code 分块）；
+按日期分块读取时是跨步读取，但只会把需要的行读进内存。
+所有读取都通过 np.load(mmap_mode='r')，不会整张表读入内存。
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.dense_panel import mark_dense
+
+
+class ArrayStore:
+    def __init__(self, path: str):
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"找不到数组存储: {meta_path}")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.dates = pd.DatetimeIndex(pd.to_datetime(meta['dates']), name='date')
+        self.codes = pd.Index(meta['codes'], name='code')
+        self.fields = list(meta['fields'])
+        self.info = meta.get('info', {})      # 调用方记录的附加信息（如数据来源指纹）
+        self._arrays = {}
+
+    # -------- 创建 --------
+    @classmethod
+    def create(cls, path: str, dates, codes, fields=()) -> 'ArrayStore':
+        """创建空存储（字段之后用 create_field / write_field 写入）"""
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            'dates': [pd.Timestamp(d).strftime('%Y-%m-%d %H:%M:%S') for d in dates],
+            'codes': [str(c) for c in codes],
+            'fields': [],
+        }
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        store = cls(path)
+        for field in fields:
+            store.create_field(field)
+        return store
+
+    @classmethod
+    def from_panel(cls, panel: pd.DataFrame, path: str, fields=None) -> 'ArrayStore':
+        """
+        由 (date, code) 长面板建立存储，逐列转换，额外内存只有一张宽表
+
+        参数:
+            panel: MultiIndex DataFrame, index=['date', 'code']
+            fields: 需要写入的列，默认全部数值列
+        """
+        dates = panel.index.get_level_values('date').unique().sort_values()
+        codes = panel.index.get_level_values('code').unique().sort_values()
+        fields = fields or [c for c in panel.columns if pd.api.types.is_numeric_dtype(panel[c])]
+        store = cls.create(path, dates, codes)
+        for field in fields:
+            wide = panel[field].unstack('code').reindex(index=dates, columns=codes)
+            store.write_field(field, wide.values)
+        return store
+
+    @classmethod
+    def from_wide_files(cls, files: dict, path: str) -> 'ArrayStore':
+        """
+        由已对齐的宽表文件（如 data/interim/{field}_aligned.pkl）建立存储，一次只读一张表
+
+        参数:
+            files: {字段名: pickle 路径}，宽表 index=date, columns=code，且各表已对齐
+        """
+        store = None
+        for field, file in files.items():
+            wide = pd.read_pickle(file)
+            if store is None:
+                store = cls.create(path, wide.index, wide.columns)
+            wide = wide.reindex(index=store.dates, columns=store.codes)
+            store.write_field(field, wide.values)
+            del wide
+        return store
+
+    def create_field(self, field: str, fill=np.nan) -> np.memmap:
+        """新建一个字段文件并返回可写 memmap（用于增量写入结果）；fill=None 时不初始化"""
+        file = self._file(field)
+        arr = np.lib.format.open_memmap(
+            file, mode='w+', dtype=np.float64, shape=self.shape, fortran_order=True
+        )
+        if fill is not None:
+            arr[:] = fill
+            arr.flush()
+        self._register(field)
+        self._arrays[field] = arr
+        return arr
+
+    def write_field(self, field: str, values: np.ndarray):
+        arr = self.create_field(field, fill=None)
+        arr[:] = values
+        arr.flush()
+
+    # -------- 读取 --------
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.dates), len(self.codes)
+
+    def array(self, field: str, mode: str = 'r') -> np.memmap:
+        """字段的 memmap（mode='r' 只读, 'r+' 可写）"""
+        if field not in self.fields:
+            raise KeyError(f"存储中没有字段: {field}")
+        key = field if mode == 'r' else (field, mode)
+        if key not in self._arrays:
+            self._arrays[key] = np.load(self._file(field), mmap_mode=mode)
+        return self._arrays[key]
+
+    def read_block(self, fields=None, rows=slice(None), cols=slice(None)) -> pd.DataFrame:
+        """
+        读取一个 (日期块 × 股票块) 的长面板
+
+        返回:
+            DataFrame, index=['date', 'code']（完整网格，date 外层），columns=fields
+        """
+        fields = self.fields if fields is None else fields
+        dates = self.dates[rows]
+        codes = self.codes[cols]
+        index = pd.MultiIndex.from_product([dates, codes], names=['date', 'code'])
+        data = {f: np.ascontiguousarray(self.array(f)[rows, cols]).ravel() for f in fields}
+        return mark_dense(pd.DataFrame(data, index=index))
+
+    def to_frame(self, fields=None) -> pd.DataFrame:
+        """整体读成长面板（仅在内存允许时使用）"""
+        return self.read_block(fields)
+
+    def flush(self):
+        for arr in self._arrays.values():
+            if isinstance(arr, np.memmap) and arr.mode != 'r':
+                arr.flush()
+
+    def set_info(self, **info):
+        """更新 meta.json 中的附加信息（JSON 可序列化的值）"""
+        self.info.update(info)
+        self._update_meta(info=self.info)
+
+    # -------- 内部 --------
+    def _file(self, field: str) -> str:
+        return os.path.join(self.path, f'{field}.npy')
+
+    def _register(self, field: str):
+        if field in self.fields:
+            return
+        self.fields.append(field)
+        self._update_meta(fields=self.fields)
+
+    def _update_meta(self, **values):
+        meta_path = os.path.join(self.path, 'meta.json')
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        meta.update(values)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
@@ -0,0 +1,127 @@
+# utils/calendar.py
+"""
+交易日历：由 panel 的日期一次性构建，之后所有日期运算都用整数位置完成
+
+- date ↔ 整数位置：哈希表 O(1) 查找（批量用 get_indexer / MultiIndex 的 level codes）
+- 偏移运算：t + k 个交易日 = 位置 + k
+- 调仓日：每周 / 月 / 季最后一个交易日（整数位置数组）
+- 周期分桶：每个交易日所属的周 / 月 / 年编号，用于月度 / 年度汇总
+
+用法:
+    cal = TradingCalendar.from_panel(panel)
+    cal.offset('2020-01-03', 5)           # 5 个交易日后的日期
+    cal.rebalance_positions('M')          # 每月最后一个交易日的位置
+    cal.period_ids('M')                   # 每个交易日所属月份的编号 0, 0, ..., 1, 1, ...
+"""
+import numpy as np
+import pandas as pd
+
+
+class TradingCalendar:
+    def __init__(self, dates):
+        self.dates = pd.DatetimeIndex(pd.unique(pd.DatetimeIndex(dates))).sort_values()
+        self.dates.name = 'date'
+        self._i8 = self.dates.asi8
+        self._lookup = {v: i for i, v in enumerate(self._i8)}
+        self._period_cache = {}
+
+    @classmethod
+    def from_panel(cls, panel: pd.DataFrame | pd.Series) -> 'TradingCalendar':
+        """由 (date, code) 长面板构建（用 MultiIndex 的 date level + codes，不对日期做排序去重）"""
+        index = panel.index
+        if isinstance(index, pd.MultiIndex):
+            level_num = index.names.index('date')
+            level, codes = index.levels[level_num], index.codes[level_num]
+            # level 中可能残留切片后已不存在的日期，只保留实际出现的
+            used = np.bincount(codes[codes >= 0], minlength=len(level)) > 0
+            return cls(level[used])
+        return cls(index)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __repr__(self):
+        if len(self) == 0:
+            return "TradingCalendar(empty)"
+        return f"TradingCalendar({self.dates[0].date()} ~ {self.dates[-1].date()}, {len(self)} days)"
+
+    # -------- 日期 ↔ 位置 --------
+    def pos(self, date) -> int:
+        """交易日 → 整数位置（O(1)）；不是交易日时抛出 KeyError"""
+        try:
+            return self._lookup[pd.Timestamp(date).value]
+        except KeyError:
+            raise KeyError(f"{date} 不是交易日") from None
+
+    def positions(self, dates) -> np.ndarray:
+        """批量 日期 → 位置，不是交易日的为 -1"""
+        return self.dates.get_indexer(pd.DatetimeIndex(dates))
+
+    def date(self, pos: int) -> pd.Timestamp:
+        return self.dates[pos]
+
+    def panel_positions(self, index: pd.MultiIndex) -> np.ndarray:
+        """
+        (date, code) MultiIndex 每一行的日期位置
+
+        如果 index 的 date level 就是本日历的日期，直接返回 level codes（无需任何查找）
+        """
+        level_num = index.names.index('date')
+        level = index.levels[level_num]
+        codes = index.codes[level_num]
+        if level.equals(self.dates):
+            return np.asarray(codes)
+        return self.positions(level)[codes]
+
+    def locate(self, date, side: str = 'prev') -> int:
+        """
+        任意日期 → 交易日位置（非交易日时取之前 / 之后最近的交易日）
+        side: 'prev' 或 'next'
+        """
+        v = pd.Timestamp(date).value
+        if v in self._lookup:
+            return self._lookup[v]
+        i = int(np.searchsorted(self._i8, v, side='left'))
+        return i - 1 if side == 'prev' else i
+
+    # -------- 偏移 --------
+    def offset(self, date, k: int):
+        """t + k 个交易日；超出日历范围返回 None"""
+        p = self.pos(date) + k
+        return self.dates[p] if 0 <= p < len(self) else None
+
+    def slice(self, start=None, end=None) -> slice:
+        """[start, end] 日期区间对应的位置切片（端点可以不是交易日）"""
+        i0 = 0 if start is None else self.locate(start, side='next')
+        i1 = len(self) if end is None else self.locate(end, side='prev') + 1
+        return slice(i0, i1)
+
+    # -------- 周期 --------
+    def period_ids(self, freq: str = 'M') -> np.ndarray:
+        """每个交易日所属周期的编号（0 起，单调不减）；freq: 'W' / 'M' / 'Q' / 'Y'"""
+        if freq not in self._period_cache:
+            periods = self.dates.to_period('Y' if freq == 'A' else freq)
+            new_period = np.empty(len(periods), dtype=bool)
+            new_period[:1] = True
+            new_period[1:] = periods[1:] != periods[:-1]
+            ids = np.cumsum(new_period) - 1
+            self._period_cache[freq] = (ids, periods[new_period])
+        return self._period_cache[freq][0]
+
+    def period_labels(self, freq: str = 'M') -> pd.PeriodIndex:
+        """各周期的标签，与 period_ids 的编号一一对应"""
+        self.period_ids(freq)
+        return self._period_cache[freq][1]
+
+    def rebalance_positions(self, freq: str = 'W') -> np.ndarray:
+        """调仓日位置：'D' 每日，'W' / 'M' / 'Q' 每个周期最后一个交易日"""
+        if freq == 'D':
+            return np.arange(len(self))
+        if freq not in ('W', 'M', 'Q', 'Y'):
+            raise ValueError(f"不支持的调仓频率: {freq}")
+        ids = self.period_ids(freq)
+        is_last = np.append(ids[1:] != ids[:-1], True) if len(ids) else np.zeros(0, dtype=bool)
+        return np.flatnonzero(is_last)
+
+    def rebalance_dates(self, freq: str = 'W') -> pd.DatetimeIndex:
+        return self.dates[self.rebalance_positions(freq)]
@@ -0,0 +1,210 @@
+# utils/dense_panel.py
+"""
+稠密 panel 布局：index 为完整的 dates × codes 网格，date 在外层、按行优先排列
+
+第 i 个日期、第 j 只股票固定在第 i * n_codes + j 行，因此
+- 长表一列 reshape 成 (n_dates, n_codes) 即为宽表（不复制、不 unstack）
+- 定位是算术运算而不是 MultiIndex 哈希查找
+- 按股票的时间序列平移 k 天 = 整列平移 k * n_codes 行
+
+ensure_dense() 保证并标记这种布局（panel.attrs['dense_layout']，随 pickle 保存）；
+已经是稠密布局时直接返回原对象，calcu_factor / 各因子中的 reindex 因此都变成空操作。
+
+attrs 会随 sort_index / reindex 等操作传给被重排过的对象，因此标记只作说明、不作为判断依据：
+DenseLayout.of 对每个 index 对象完整核对一次 level codes，结果按对象身份缓存（index 不可变，重排会产生新的 index 对象）。
+
+用法:
+    from utils.dense_panel import DenseLayout, ensure_dense, to_wide, from_wide
+    panel = ensure_dense(panel)
+    layout = DenseLayout.of(panel)
+    close = layout.to_grid(panel['close'])          # (n_dates, n_codes) 视图
+"""
+import weakref
+
+import numpy as np
+import pandas as pd
+
+DENSE_ATTR = 'dense_layout'
+
+# 已核对为稠密布局的 index：id → weakref（index 被回收时自动移除）
+_VERIFIED: dict[int, weakref.ref] = {}
+
+
+def _remember(index: pd.MultiIndex):
+    key = id(index)
+    _VERIFIED[key] = weakref.ref(index, lambda _, key=key: _VERIFIED.pop(key, None))
+
+
+def _verified(index: pd.MultiIndex) -> bool:
+    ref = _VERIFIED.get(id(index))
+    return ref is not None and ref() is index
+
+
+class DenseLayout:
+    """完整 dates × codes 网格的行优先布局"""
+
+    def __init__(self, dates: pd.Index, codes: pd.Index, index: pd.MultiIndex | None = None):
+        self.dates = dates
+        self.codes = codes
+        self._index = index
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.dates), len(self.codes)
+
+    def __len__(self):
+        return len(self.dates) * len(self.codes)
+
+    def __repr__(self):
+        return f"DenseLayout(dates={len(self.dates)}, codes={len(self.codes)})"
+
+    @property
+    def index(self) -> pd.MultiIndex:
+        """对应的 (date, code) MultiIndex（来自 panel 时直接复用 panel.index）"""
+        if self._index is None:
+            self._index = pd.MultiIndex.from_product([self.dates, self.codes], names=['date', 'code'])
+        return self._index
+
+    @classmethod
+    def of(cls, obj) -> 'DenseLayout | None':
+        """
+        obj (DataFrame / Series / MultiIndex) 若为稠密布局则返回其 DenseLayout，否则返回 None
+
+        每个 index 对象只完整核对一次 level codes（整数比较，无哈希），之后按对象身份 O(1) 命中
+        """
+        index = obj if isinstance(obj, pd.MultiIndex) else getattr(obj, 'index', None)
+        if not isinstance(index, pd.MultiIndex) or list(index.names) != ['date', 'code']:
+            return None
+        n_dates, n_codes = len(index.levels[0]), len(index.levels[1])
+        if len(index) != n_dates * n_codes or len(index) == 0:
+            return None
+        if not _verified(index):
+            rows, cols = index.codes
+            ok = (np.array_equal(rows.reshape(n_dates, n_codes)[:, 0], np.arange(n_dates))
+                  and (rows.reshape(n_dates, n_codes) == rows.reshape(n_dates, n_codes)[:, :1]).all()
+                  and (cols.reshape(n_dates, n_codes) == np.arange(n_codes)).all())
+            if not ok:
+                return None
+            _remember(index)
+        return cls(index.levels[0], index.levels[1], index)
+
+    # -------- 定位 --------
+    def offset(self, date_pos, code_pos):
+        """(日期位置, 股票位置) → 行号，支持数组"""
+        return np.asarray(date_pos) * len(self.codes) + np.asarray(code_pos)
+
+    def loc(self, date, code) -> int:
+        """(date, code) 标签 → 行号"""
+        return int(self.offset(self.dates.get_loc(pd.Timestamp(date)), self.codes.get_loc(code)))
+
+    # -------- 长表 <-> 宽表 --------
+    def to_grid(self, values) -> np.ndarray:
+        """长表一列 → (n_dates, n_codes) 数组（不复制）"""
+        return np.asarray(values).reshape(self.shape)
+
+    def to_wide(self, series: pd.Series) -> pd.DataFrame:
+        """长表一列 → 宽表 DataFrame (index=dates, columns=codes)"""
+        return pd.DataFrame(self.to_grid(series), index=self.dates, columns=self.codes, copy=False)
+
+    def from_grid(self, values, name: str | None = None) -> pd.Series:
+        """(n_dates, n_codes) 数组 / 宽表 → 按本布局排列的长表"""
+        values = values.to_numpy() if isinstance(values, pd.DataFrame) else np.asarray(values)
+        return pd.Series(values.reshape(-1), index=self.index, name=name)
+
+    def shift(self, values: np.ndarray, periods: int = 1) -> np.ndarray:
+        """按股票沿时间平移 periods 天（等价于 groupby('code').shift(periods)），空出的位置为 NaN"""
+        values = np.asarray(values, dtype=np.float64)
+        out = np.full_like(values, np.nan)
+        k = periods * len(self.codes)
+        if 0 < k < len(values):
+            out[k:] = values[:-k]
+        elif -len(values) < k < 0:
+            out[:k] = values[-k:]
+        elif k == 0:
+            out[:] = values
+        return out
+
+
+def mark_dense(panel):
+    """标记为稠密布局（只是说明，DenseLayout.of 仍会核对 index），返回原对象"""
+    panel.attrs[DENSE_ATTR] = True
+    return panel
+
+
+def is_dense(obj) -> bool:
+    return DenseLayout.of(obj) is not None
+
+
+def ensure_dense(panel: pd.DataFrame, dates: pd.Index | None = None, codes: pd.Index | None = None) -> pd.DataFrame:
+    """
+    保证 panel 为稠密布局并打上标记
+
+    已是稠密布局（且与给定的 dates / codes 一致）时原样返回、不复制；
+    否则按列逐个把数据散布到完整网格上（整数偏移定位，不构造哈希索引、不整表 reindex），
+    补出来的行与停牌日的处理一致：suspended=1、listed 按此前是否出现过收盘价推断，其余字段为 NaN。
+
+    参数:
+        panel: index=['date', 'code'] 的长面板
+        dates, codes: 目标网格的两个轴，默认 panel 中出现过的全部日期 / 股票（升序）
+    返回:
+        稠密布局的 panel
+    """
+    if not isinstance(panel.index, pd.MultiIndex) or list(panel.index.names) != ['date', 'code']:
+        raise ValueError("panel 必须是 MultiIndex, 且 index 顺序为 ('date', 'code')")
+    layout = DenseLayout.of(panel)
+    if layout is not None and (dates is None or layout.dates.equals(dates)) \
+            and (codes is None or layout.codes.equals(codes)):
+        return mark_dense(panel)
+
+    index = panel.index.remove_unused_levels()
+    dates = index.levels[0] if dates is None else pd.Index(dates, name='date')
+    codes = index.levels[1] if codes is None else pd.Index(codes, name='code')
+    layout = DenseLayout(dates, codes)
+    rows = dates.get_indexer(index.levels[0])[index.codes[0]]
+    cols = codes.get_indexer(index.levels[1])[index.codes[1]]
+    ok = (rows >= 0) & (cols >= 0)
+    pos = layout.offset(rows[ok], cols[ok])
+    if np.bincount(pos, minlength=len(layout)).max(initial=0) > 1:
+        raise ValueError("panel 中存在重复的 (date, code)")
+    present = np.zeros(len(layout), dtype=bool)
+    present[pos] = True
+
+    data = {}
+    for col in panel.columns:
+        src = panel[col].to_numpy()
+        if src.dtype.kind in 'biu':
+            src = src.astype(np.float64)
+        kind = src.dtype.kind
+        fill = np.nan if kind in 'fc' else np.datetime64('NaT') if kind in 'mM' else None
+        out = np.full(len(layout), fill, dtype=src.dtype if kind in 'fcmMO' else object)
+        out[pos] = src[ok]
+        data[col] = out
+    if 'suspended' in data:
+        data['suspended'][~present] = 1.0
+    if 'listed' in data and 'close' in data:
+        seen = np.logical_or.accumulate(np.isfinite(layout.to_grid(data['close']).astype(float)), axis=0).ravel()
+        data['listed'][~present] = seen[~present].astype(float)
+    return mark_dense(pd.DataFrame(data, index=layout.index))
+
+
+def to_wide(series: pd.Series) -> pd.DataFrame:
+    """长表一列 → 宽表；稠密布局时为 reshape 视图，否则 unstack"""
+    layout = DenseLayout.of(series)
+    if layout is not None:
+        return layout.to_wide(series)
+    return series.unstack('code')
+
+
+def from_wide(wide: pd.DataFrame, index: pd.MultiIndex, name: str | None = None) -> pd.Series:
+    """宽表 → 按 index 排列的长表；index 为同一网格的稠密布局时直接展平，否则 stack + reindex"""
+    layout = DenseLayout.of(index)
+    if layout is not None and layout.dates.equals(wide.index) and layout.codes.equals(wide.columns):
+        return layout.from_grid(wide, name=name)
+    return wide.stack(future_stack=True).reindex(index).rename(name)
+
+
+def align_to(series: pd.Series, index: pd.MultiIndex) -> pd.Series:
+    """reindex 到 index；已经是同一个 index 时直接返回"""
+    if series.index is index:
+        return series
+    return series.reindex(index)
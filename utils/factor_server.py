@@ -0,0 +1,395 @@
+# utils/factor_server.py
+"""
+本地因子查询服务（localhost HTTP，只用标准库 + numpy / pandas）
+
+下游的交易 / 风控任务每天多次需要"这 300 只股票最新的因子值"，以前每次都要反序列化整个 data/factors/{name}.pkl。
+这里由常驻进程把因子库中全部因子最近 N 个交易日的数据放在内存里：
+
+- 布局：(n_factors, n_dates, n_codes) 的 float64 数组，日期 / 股票 / 因子的定位都是字典查找或二分，不经过 pandas 索引
+- 查询：点（单股票单日）、横截面（一个日期）、时间区间（start ~ end），均可指定 factors / codes，
+  日期不是交易日时取不晚于它的最近交易日（as-of），不指定日期时为最新一天
+- 响应：二进制列式格式（见 encode / decode），数值部分就是数组的原始字节，客户端 np.frombuffer 即可，不经过 JSON
+- 热更新：后台线程轮询因子文件的 mtime，夜间批处理追加新日期后只重读变化的因子，构建新快照后整体替换引用，
+  正在处理的请求继续使用旧快照；读取失败（文件写了一半）时保留旧快照，下一轮再试
+
+接口（GET 参数或 POST JSON，字段相同；codes / factors 在 GET 中用逗号分隔）:
+    GET  /factors                          因子列表与日期范围（JSON）
+    GET  /query?factors=a,b&codes=x,y&date=2024-06-03
+    POST /query   {"factors": [...], "codes": [...], "start": "2024-05-01", "end": "2024-06-03"}
+    POST /reload                           立即检查并重读有变化的因子
+
+用法:
+    python -m utils.factor_server --days 250 --port 8765
+    client = FactorClient(port=8765)
+    frames = client.query(codes=codes, factors=['illiq_guiji'])     # {因子名: DataFrame(dates × codes)}
+
+压测: python -m benchmarks.bench_factor_server
+"""
+import argparse
+import http.client
+import json
+import os
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from utils.io import FACTOR_PATH
+
+MAGIC = b'FQ01'
+DEFAULT_DAYS = 250
+DEFAULT_PORT = 8765
+
+
+# =========================
+# 二进制列式响应
+# =========================
+def encode(names, dates, codes, values: np.ndarray) -> bytes:
+    """
+    MAGIC | uint32 头部长度 | 头部 JSON | 数值
+
+    头部: {'factors': [...], 'dates': ['YYYY-MM-DD', ...], 'codes': [...], 'shape': [F, D, C], 'dtype': '<f8'}
+    数值: shape 为 (F, D, C) 的 C 连续数组，每个因子的 D × C 块连续存放（列式）
+    """
+    values = np.ascontiguousarray(values, dtype='<f8')
+    header = json.dumps({
+        'factors': list(names),
+        'dates': [str(d)[:10] for d in dates],
+        'codes': list(codes),
+        'shape': list(values.shape),
+        'dtype': '<f8',
+    }).encode('utf-8')
+    return b''.join([MAGIC, struct.pack('<I', len(header)), header, values.tobytes()])
+
+
+def decode(payload: bytes) -> dict:
+    """encode() 的逆操作，返回 {因子名: DataFrame(index=dates, columns=codes)}；数值不复制"""
+    if payload[:4] != MAGIC:
+        raise ValueError("不是因子服务的响应格式")
+    (n,) = struct.unpack_from('<I', payload, 4)
+    header = json.loads(payload[8:8 + n])
+    values = np.frombuffer(payload, dtype=header['dtype'], offset=8 + n).reshape(header['shape'])
+    dates = pd.DatetimeIndex(header['dates'], name='date')
+    codes = pd.Index(header['codes'], name='code')
+    return {name: pd.DataFrame(values[i], index=dates, columns=codes, copy=False)
+            for i, name in enumerate(header['factors'])}
+
+
+# =========================
+# 内存快照
+# =========================
+class FactorSnapshot:
+    """某一时刻全部因子最近 N 天的只读快照"""
+
+    def __init__(self, wides: dict, days: int, mtimes: dict):
+        self.names = sorted(wides)
+        self.mtimes = dict(mtimes)
+        dates = pd.DatetimeIndex([], name='date')
+        codes = pd.Index([], name='code')
+        for wide in wides.values():
+            dates = dates.union(wide.index)
+            codes = codes.union(wide.columns)
+        self.dates = dates[-days:] if days else dates
+        self.codes = codes
+        self.values = np.full((len(self.names), len(self.dates), len(self.codes)), np.nan)
+        for i, name in enumerate(self.names):
+            wide = wides[name]
+            rows = self.dates.get_indexer(wide.index)
+            cols = self.codes.get_indexer(wide.columns)
+            keep = rows >= 0
+            self.values[i][np.ix_(rows[keep], cols)] = wide.to_numpy()[keep]
+        self._date_ns = self.dates.asi8
+        self._factor_pos = {name: i for i, name in enumerate(self.names)}
+        self._code_pos = {code: j for j, code in enumerate(self.codes)}
+
+    def info(self) -> dict:
+        return {
+            'factors': self.names,
+            'n_codes': len(self.codes),
+            'n_dates': len(self.dates),
+            'start': str(self.dates[0])[:10] if len(self.dates) else None,
+            'end': str(self.dates[-1])[:10] if len(self.dates) else None,
+        }
+
+    def _date_pos(self, date) -> int:
+        """不晚于 date 的最近交易日的位置（as-of）"""
+        pos = int(np.searchsorted(self._date_ns, pd.Timestamp(date).value, side='right')) - 1
+        if pos < 0:
+            raise ValueError(f"日期 {date} 早于缓存的最早日期 {str(self.dates[0])[:10]}")
+        return pos
+
+    def select(self, factors=None, codes=None, date=None, start=None, end=None):
+        """
+        返回 (factors, dates, codes, values[F, D, C])；缓存中没有的股票对应 NaN
+
+        参数:
+            date: 单个日期（横截面 / 点查询）；date / start / end 都不给时为最新一天
+            start, end: 时间区间（闭区间）
+        """
+        if not len(self.dates):
+            raise ValueError("缓存为空：因子库中没有因子")
+        if factors:
+            unknown = [f for f in factors if f not in self._factor_pos]
+            if unknown:
+                raise KeyError(f"未知因子: {unknown}，可用: {self.names}")
+            fpos = [self._factor_pos[f] for f in factors]
+        else:
+            factors, fpos = self.names, slice(None)
+
+        if start is None and end is None:
+            t = self._date_pos(date) if date is not None else len(self.dates) - 1
+            rows = slice(t, t + 1)
+        else:
+            t0 = 0 if start is None else int(np.searchsorted(self._date_ns, pd.Timestamp(start).value, side='left'))
+            t1 = len(self.dates) if end is None else self._date_pos(end) + 1
+            rows = slice(t0, max(t0, t1))
+
+        block = self.values[fpos, rows]
+        if codes:
+            cpos = np.fromiter((self._code_pos.get(c, -1) for c in codes), dtype=np.int64, count=len(codes))
+            block = block[:, :, cpos]
+            if (cpos < 0).any():
+                block[:, :, cpos < 0] = np.nan
+        else:
+            codes = self.codes
+        return factors, self.dates[rows], codes, block
+
+
+def load_recent(name: str, days: int | None = DEFAULT_DAYS, root: str = FACTOR_PATH) -> pd.DataFrame:
+    """读取因子库中某个因子最近 days 个交易日，返回宽表 (dates × codes)"""
+    df = pd.read_pickle(os.path.join(root, f'{name}.pkl'))
+    if isinstance(df.index, pd.MultiIndex):
+        df = df.reset_index()
+    dates = pd.DatetimeIndex(df['date'].unique()).sort_values()
+    if days and len(dates) > days:
+        df = df[df['date'] >= dates[-days]]
+    date_codes, date_uniques = pd.factorize(df['date'], sort=True)
+    code_codes, code_uniques = pd.factorize(df['code'], sort=True)
+    values = np.full((len(date_uniques), len(code_uniques)), np.nan)
+    values[date_codes, code_codes] = df[name].to_numpy(dtype=np.float64)
+    return pd.DataFrame(values, index=pd.DatetimeIndex(date_uniques, name='date'),
+                        columns=pd.Index(code_uniques, name='code'))
+
+
+class FactorCache:
+    """
+    维护当前快照；reload() 只重读 mtime 变化的因子，新快照构建完成后一次性替换 self.snapshot
+
+    参数:
+        root: 因子库目录
+        days: 保留最近多少个交易日
+        factors: 只缓存这些因子，默认目录下全部
+    """
+
+    def __init__(self, root: str = FACTOR_PATH, days: int = DEFAULT_DAYS, factors=None):
+        self.root = root
+        self.days = days
+        self.factors = list(factors) if factors else None
+        self._wides = {}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+        self.snapshot = FactorSnapshot({}, days, {})
+        self.reload()
+
+    def _scan(self) -> dict:
+        if not os.path.isdir(self.root):
+            return {}
+        names = self.factors or [os.path.splitext(f)[0] for f in os.listdir(self.root) if f.endswith('.pkl')]
+        mtimes = {}
+        for name in names:
+            try:
+                mtimes[name] = os.stat(os.path.join(self.root, f'{name}.pkl')).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+    def reload(self) -> list[str]:
+        """检查因子文件，重读新增 / 变化的因子并替换快照；返回重读了的因子名"""
+        with self._lock:
+            mtimes = self._scan()
+            changed = [n for n, m in mtimes.items() if self._mtimes.get(n) != m]
+            removed = [n for n in self._wides if n not in mtimes]
+            if not changed and not removed:
+                return []
+            wides = {n: w for n, w in self._wides.items() if n in mtimes}
+            loaded = []
+            for name in changed:
+                try:
+                    wides[name] = load_recent(name, self.days, self.root)
+                except Exception as e:   # 文件可能正在被写入，保留旧数据，下一轮再试
+                    print(f"[factor_server] 读取 {name} 失败，保留旧快照: {e}")
+                    mtimes[name] = self._mtimes.get(name)
+                    continue
+                loaded.append(name)
+            self._wides = wides
+            self._mtimes = {n: m for n, m in mtimes.items() if m is not None}
+            self.snapshot = FactorSnapshot(wides, self.days, self._mtimes)
+            return loaded
+
+    def watch(self, interval: float = 5.0) -> threading.Thread:
+        """启动后台轮询线程（守护线程）；某一轮重读出错时保留当前快照，打印错误后继续轮询"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    loaded = self.reload()
+                except Exception as e:   # 如因子目录暂时不可读；reload 只在成功时替换快照
+                    print(f"[factor_server] 热更新失败，继续使用旧快照: {type(e).__name__}: {e}")
+                    continue
+                if loaded:
+                    print(f"[factor_server] 已重新加载: {loaded}，最新日期 {self.snapshot.info()['end']}")
+        thread = threading.Thread(target=loop, name='factor-cache-watch', daemon=True)
+        thread.start()
+        return thread
+
+
+# =========================
+# HTTP 服务
+# =========================
+def _parse_request(query: dict) -> dict:
+    def as_list(value):
+        if value is None or isinstance(value, list):
+            return value
+        return [v for v in str(value).split(',') if v]
+    return {
+        'factors': as_list(query.get('factors')),
+        'codes': as_list(query.get('codes')),
+        'date': query.get('date'),
+        'start': query.get('start'),
+        'end': query.get('end'),
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive：客户端复用连接
+    disable_nagle_algorithm = True   # 头部和正文分两次写出，不关 Nagle 会和客户端的延迟 ACK 叠加出约 40ms 的等待
+    cache: FactorCache = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, obj):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+    def _query(self, params: dict):
+        try:
+            result = self.cache.snapshot.select(**_parse_request(params))
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {'error': str(e.args[0]) if e.args else str(e)})
+            return
+        self._send(200, encode(*result), 'application/octet-stream')
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/factors':
+            self._send_json(200, self.cache.snapshot.info())
+        elif url.path == '/query':
+            self._query({k: v[-1] for k, v in parse_qs(url.query).items()})
+        else:
+            self._send_json(404, {'error': f'未知路径: {url.path}'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if url.path == '/reload':
+            try:
+                reloaded = self.cache.reload()
+            except Exception as e:
+                self._send_json(500, {'error': f'重新加载失败，继续使用旧快照: {type(e).__name__}: {e}',
+                                      **self.cache.snapshot.info()})
+                return
+            self._send_json(200, {'reloaded': reloaded, **self.cache.snapshot.info()})
+        elif url.path == '/query':
+            try:
+                params = json.loads(body or b'{}')
+            except json.JSONDecodeError as e:
+                self._send_json(400, {'error': f'请求体不是合法 JSON: {e}'})
+                return
+            self._query(params)
+        else:
+            self._send_json(404, {'error': f'未知路径: {url.path}'})
+
+
+def make_server(cache: FactorCache, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """创建（未启动的）HTTP 服务；port=0 时由系统分配端口（server.server_address[1]）"""
+    handler = type('FactorHandler', (_Handler,), {'cache': cache})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# =========================
+# 客户端
+# =========================
+class FactorClient:
+    """复用同一个 HTTP 连接的客户端（非线程安全，每个线程一个）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, timeout: float = 10.0):
+        self.conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method: str, path: str, body: bytes | None = None) -> bytes:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        self.conn.request(method, path, body=body, headers=headers)
+        resp = self.conn.getresponse()
+        payload = resp.read()
+        if resp.status != 200:
+            raise ValueError(json.loads(payload).get('error', payload.decode('utf-8', 'replace')))
+        return payload
+
+    def query_raw(self, factors=None, codes=None, date=None, start=None, end=None) -> bytes:
+        params = {k: v for k, v in dict(factors=factors, codes=codes, date=date, start=start, end=end).items()
+                  if v is not None}
+        return self._request('POST', '/query', json.dumps(params, default=str).encode('utf-8'))
+
+    def query(self, factors=None, codes=None, date=None, start=None, end=None) -> dict:
+        """返回 {因子名: DataFrame(index=dates, columns=codes)}"""
+        return decode(self.query_raw(factors, codes, date, start, end))
+
+    def info(self) -> dict:
+        return json.loads(self._request('GET', '/factors'))
+
+    def reload(self) -> dict:
+        return json.loads(self._request('POST', '/reload', b''))
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地因子查询服务")
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='内存中保留最近多少个交易日')
+    parser.add_argument('--factors', nargs='*', default=None, help='只加载这些因子，默认因子库中全部')
+    parser.add_argument('--interval', type=float, default=5.0, help='热更新轮询间隔（秒）')
+    args = parser.parse_args()
+
+    cache = FactorCache(days=args.days, factors=args.factors)
+    info = cache.snapshot.info()
+    print(f"已加载 {len(info['factors'])} 个因子, {info['n_dates']} 天 × {info['n_codes']} 只股票 "
+          f"({info['start']} ~ {info['end']})")
+    cache.watch(args.interval)
+    server = make_server(cache, args.host, args.port)
+    print(f"因子服务已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# utils/io.py
+# 文件读写 & 因子库（data/factors）存取工具
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))   # factor/
+DATA_PATH = os.path.join(ROOT, 'data')
+RAW_PATH = os.path.join(DATA_PATH, 'raw')
+INTERIM_PATH = os.path.join(DATA_PATH, 'interim')
+PROCESSED_PATH = os.path.join(DATA_PATH, 'processed')
+FACTOR_PATH = os.path.join(DATA_PATH, 'factors')
+RESULTS_PATH = os.path.join(DATA_PATH, 'results')
+
+
+def factor_file(name: str) -> str:
+    """因子库中某个因子的文件路径: data/factors/{name}.pkl"""
+    return os.path.join(FACTOR_PATH, f'{name}.pkl')
+
+
+def save_factor(result: pd.DataFrame, name: str) -> str:
+    """
+    保存因子结果到因子库（与 calcu_factor.py 相同的长表格式: date, code, name）
+
+    参数:
+        result: BaseFactor.run() 的返回值, index=['date', 'code']
+        name: 因子名称
+    返回:
+        保存路径
+    """
+    os.makedirs(FACTOR_PATH, exist_ok=True)
+    path = factor_file(name)
+    # 先写临时文件再替换：因子服务 (utils/factor_server.py) 热更新时不会读到写了一半的文件
+    tmp = f'{path}.tmp'
+    result.reset_index().to_pickle(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def load_factor(name: str) -> pd.DataFrame:
+    """
+    从因子库读取因子
+
+    返回:
+        DataFrame, index=['date', 'code']，包含一列 name
+    """
+    path = factor_file(name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到因子文件: {path}\n请先运行因子计算脚本")
+    df = pd.read_pickle(path)
+    if not isinstance(df.index, pd.MultiIndex):
+        df = df.set_index(['date', 'code'])
+    return df
+
+
+def list_factors() -> list[str]:
+    """列出因子库中已保存的全部因子名称"""
+    if not os.path.isdir(FACTOR_PATH):
+        return []
+    return sorted(
+        os.path.splitext(f)[0] for f in os.listdir(FACTOR_PATH) if f.endswith('.pkl')
+    )
+
+
+def prefetch(loaders, depth: int = 1):
+    """
+    预取迭代器：当前这一块在被计算时，后台线程已经在读取下一块
+
+    参数:
+        loaders: 可迭代对象，每个元素是无参函数 loader() -> data
+        depth: 最多提前读取几块（内存中同时最多有 depth + 1 块）
+    返回:
+        生成器，按顺序产出 loader() 的结果
+    """
+    loaders = iter(loaders)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        queue = deque()
+        for loader in loaders:
+            queue.append(pool.submit(loader))
+            if len(queue) > depth:
+                yield queue.popleft().result()
+        while queue:
+            yield queue.popleft().result()
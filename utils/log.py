@@ -0,0 +1,220 @@
+# utils/log.py
+"""
+耗时 / 内存埋点工具
+
+每个被埋点的阶段记录一行 JSON（追加写入 timings.jsonl），字段:
+    run_id      本次进程运行的标识（同一次运行的记录可以放在一起比较）
+    stage       阶段名称，嵌套阶段为 "父阶段/子阶段"
+    wall_s      墙钟时间（秒）
+    cpu_s       CPU 时间（秒，本进程所有线程）
+    rss_peak_delta_mb  本阶段期间进程峰值 RSS 的增量（MB，拿不到时为 null）
+    rows        行数（输入或输出行数，由调用方给出或从返回值推断）
+    ts          结束时间戳
+
+用法:
+    from utils.log import timed, stage_timer
+
+    @timed('load_data')
+    def load_data(): ...
+
+    with stage_timer('calculate', rows=len(panel)) as rec:
+        result = ...
+        rec['rows_out'] = len(result)
+
+环境变量:
+    FACTOR_TIMING=0            关闭埋点
+    FACTOR_TIMING_LOG=path     JSON lines 输出文件，默认 data/logs/timings.jsonl
+    FACTOR_TIMING_ECHO=1       同时打印到 stderr
+    FACTOR_PROFILE_DIR=dir     对每个阶段做 cProfile，结果写到 dir/{stage}_{run_id}.prof
+    FACTOR_PROFILE_STAGES=a,b  只对这些阶段做 cProfile（默认全部最外层阶段）
+    FACTOR_TIMING_KEEP=n       内存中保留的最近记录条数（RECORDS），默认 10000，0 表示不保留
+"""
+import collections
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))   # factor/
+DEFAULT_LOG_PATH = os.path.join(ROOT, 'data', 'logs', 'timings.jsonl')
+
+RUN_ID = time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+
+_config = {
+    'enabled': os.environ.get('FACTOR_TIMING', '1') != '0',
+    'log_path': os.environ.get('FACTOR_TIMING_LOG', DEFAULT_LOG_PATH),
+    'echo': os.environ.get('FACTOR_TIMING_ECHO', '0') == '1',
+    'profile_dir': os.environ.get('FACTOR_PROFILE_DIR') or None,
+    'profile_stages': {s for s in os.environ.get('FACTOR_PROFILE_STAGES', '').split(',') if s},
+    'keep': int(os.environ.get('FACTOR_TIMING_KEEP', '10000')),
+}
+_write_lock = threading.Lock()
+_local = threading.local()
+_profiling = threading.Lock()     # 同一时刻只能有一个 cProfile 生效
+
+# 本进程内最近的 keep 条记录，方便在 notebook / 基准测试里直接取用；长时间运行的进程（如因子服务）不会无限增长，
+# 完整记录见 timings.jsonl
+RECORDS: collections.deque = collections.deque(maxlen=_config['keep'])
+
+
+def configure(enabled=None, log_path=None, echo=None, profile_dir=None, profile_stages=None, keep=None):
+    """在代码中修改埋点配置（覆盖环境变量）；log_path='' 表示不写文件，keep 为 RECORDS 保留的条数"""
+    global RECORDS
+    if enabled is not None:
+        _config['enabled'] = enabled
+    if log_path is not None:
+        _config['log_path'] = log_path
+    if echo is not None:
+        _config['echo'] = echo
+    if profile_dir is not None:
+        _config['profile_dir'] = profile_dir or None
+    if profile_stages is not None:
+        _config['profile_stages'] = set(profile_stages)
+    if keep is not None:
+        _config['keep'] = keep
+        RECORDS = collections.deque(RECORDS, maxlen=keep)
+
+
+# =========================
+# 资源读取
+# =========================
+def peak_rss_mb() -> float | None:
+    """进程峰值 RSS（MB）；Linux/macOS 用 resource，Windows 需要 psutil，都没有返回 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位是 KB，macOS 是字节
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024 / 1024
+    except ImportError:
+        return None
+
+
+def count_rows(obj) -> int | None:
+    """从返回值推断行数：DataFrame / Series / ndarray 取 len，tuple/list/dict 取其中最大的"""
+    if obj is None:
+        return None
+    if hasattr(obj, 'shape') and len(getattr(obj, 'shape', ())) > 0:
+        return int(obj.shape[0])
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (tuple, list)):
+        counts = [c for c in (count_rows(o) for o in obj) if c is not None]
+        return max(counts) if counts else None
+    return None
+
+
+# =========================
+# 记录输出
+# =========================
+def _emit(record: dict):
+    RECORDS.append(record)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    if _config['echo']:
+        print(line, file=sys.stderr)
+    path = _config['log_path']
+    if path:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+def _stack() -> list:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextlib.contextmanager
+def stage_timer(stage: str, rows: int | None = None, **extra):
+    """
+    记录一个阶段的墙钟时间、CPU 时间、峰值 RSS 增量和行数
+
+    参数:
+        stage: 阶段名称
+        rows: 行数（可选）；也可以在 with 块里通过 rec['rows'] = ... 填写
+        extra: 其它需要一并记录的字段
+    返回:
+        rec: dict，with 块中可以往里追加字段（如 rows_out）
+    """
+    rec = {'rows': rows, **extra}
+    if not _config['enabled']:
+        yield rec
+        return
+
+    stack = _stack()
+    full_name = '/'.join(stack + [stage])
+    stack.append(stage)
+
+    profiler = None
+    profile_dir = _config['profile_dir']
+    if profile_dir and (stage in _config['profile_stages'] or (not _config['profile_stages'] and len(stack) == 1)):
+        if _profiling.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+    rss0 = peak_rss_mb()
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        rss1 = peak_rss_mb()
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
+            os.makedirs(profile_dir, exist_ok=True)
+            safe = full_name.replace('/', '__').replace(':', '_')
+            profiler.dump_stats(os.path.join(profile_dir, f'{safe}_{RUN_ID}.prof'))
+        stack.pop()
+        _emit({
+            'run_id': RUN_ID,
+            'stage': full_name,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'rss_peak_delta_mb': None if rss0 is None or rss1 is None else round(rss1 - rss0, 3),
+            **rec,
+            'ts': time.time(),
+        })
+
+
+def timed(stage: str | None = None, rows=None):
+    """
+    装饰器版本的 stage_timer
+
+    参数:
+        stage: 阶段名称，默认取函数的 __qualname__
+        rows: 可选，rows(result) -> int；默认用 count_rows 从返回值推断
+    """
+    def decorator(func):
+        name = stage or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(name) as rec:
+                result = func(*args, **kwargs)
+                if rec.get('rows') is None:
+                    rec['rows'] = rows(result) if rows is not None else count_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def read_timings(path: str | None = None):
+    """读取 timings.jsonl 为 DataFrame，便于按 run_id / stage 对比前后两次运行"""
+    import pandas as pd
+    path = path or _config['log_path'] or DEFAULT_LOG_PATH
+    with open(path, 'r', encoding='utf-8') as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
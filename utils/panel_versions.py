@@ -0,0 +1,442 @@
+# utils/panel_versions.py
+"""
+按版本追加写入的 panel 存储（point-in-time）
+
+原始数据会被修订（补录的公司行为、更正的成交量），而 align_data / clean_data 每次整体覆盖 pkl 文件。
+这里改为只追加：每次入库只写入新增或变化的 (date, code, field) 单元格，作为一个 delta 分区，
+另外记录新出现的 (date, code) 行（全部字段为 NaN 的行没有单元格，例如已对齐但尚未上市的股票），
+可以读取任一历史版本的快照，下游的因子缓存也只需要让受影响的日期区间失效。
+
+目录结构:
+    {path}/manifest.json                版本记录（含每个增量的日期、每个基准的全部日期）
+    {path}/base_v000001/2020-01.pkl     基准快照，按月分区的长表 (index=[date, code], columns=字段)
+    {path}/deltas/v000002.pkl           增量：变化的单元格 (date, code, field, value)
+    {path}/deltas/v000002_rows.pkl      增量：新出现的行 (date, code)，没有新行时不写
+
+- commit(update)：update 只需包含本次入库的日期（如当天新数据或被修订的历史区间），
+  只读取这些日期所在月份的基准分区 + 日期区间与之重叠的增量来比较（按 manifest 中记录的区间跳过其余增量文件），
+  入库成本与更新量成正比，而不是与增量个数成正比
+- snapshot(version)：版本 ≤ version 的最近基准 + 其后的增量依次覆盖，并补齐增量记录的新行
+- compact()：把最新快照写成新的基准，之后的读取不再回放旧增量（旧版本仍可读取，prune=True 时删除）
+- affected_dates(since)：某版本之后被改动过的日期，用于让因子缓存只重算这部分
+
+用法:
+    store = VersionedPanelStore('data/store/panel_versions')
+    v = store.commit(panel_today, note='2024-06-03 日更')
+    panel = store.snapshot()                      # 最新
+    panel_asof = store.snapshot(version=v - 1)    # 入库之前
+    start, end = store.invalidation_range(since=v - 1, lookahead=20)
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.calendar import TradingCalendar
+
+MANIFEST = 'manifest.json'
+
+
+def _partition_key(dates: pd.DatetimeIndex) -> pd.Index:
+    return pd.Index(dates.strftime('%Y-%m'))
+
+
+def _date_strings(dates) -> list[str]:
+    return pd.DatetimeIndex(dates).unique().sort_values().strftime('%Y-%m-%d').tolist()
+
+
+class VersionedPanelStore:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        manifest_path = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'versions': [], 'bases': []}
+
+    # -------- 版本信息 --------
+    @property
+    def versions(self) -> list[dict]:
+        return self.manifest['versions']
+
+    @property
+    def latest(self) -> int:
+        """最新版本号（空存储为 0）"""
+        return self.versions[-1]['version'] if self.versions else 0
+
+    def log(self) -> pd.DataFrame:
+        """版本记录表"""
+        return pd.DataFrame(self.versions).set_index('version') if self.versions else pd.DataFrame()
+
+    def _save_manifest(self):
+        tmp = os.path.join(self.path, MANIFEST + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def _base_dir(self, version: int) -> str:
+        return os.path.join(self.path, f'base_v{version:06d}')
+
+    def _delta_file(self, version: int) -> str:
+        return os.path.join(self.path, 'deltas', f'v{version:06d}.pkl')
+
+    def _rows_file(self, version: int) -> str:
+        return os.path.join(self.path, 'deltas', f'v{version:06d}_rows.pkl')
+
+    def _base_for(self, version: int) -> int:
+        """版本 ≤ version 的最近基准"""
+        bases = [b for b in self.manifest['bases'] if b <= version]
+        if not bases:
+            raise ValueError(f"版本 {version} 之前没有基准快照")
+        return max(bases)
+
+    # -------- 写入 --------
+    def _write_base(self, panel: pd.DataFrame, version: int):
+        base_dir = self._base_dir(version)
+        os.makedirs(base_dir, exist_ok=True)
+        keys = _partition_key(panel.index.get_level_values('date'))
+        for key, part in panel.groupby(keys.to_numpy()):
+            part.to_pickle(os.path.join(base_dir, f'{key}.pkl'))
+
+    def _record(self, kind: str, n_cells: int, dates: pd.Index, fields, note: str, n_rows: int = 0) -> int:
+        version = self.latest + 1
+        record = {
+            'version': version,
+            'kind': kind,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'n_cells': int(n_cells),
+            'start': str(dates.min().date()) if len(dates) else None,
+            'end': str(dates.max().date()) if len(dates) else None,
+            'fields': sorted(map(str, fields)),
+            'note': note,
+        }
+        if kind == 'delta':
+            record['n_rows'] = int(n_rows)
+            record['dates'] = _date_strings(dates)
+        self.versions.append(record)
+        return version
+
+    def _record_base(self, version: int, dates: pd.Index):
+        """登记基准及其全部日期（dates() / affected_dates() 不必读取基准分区）"""
+        self.manifest['bases'].append(version)
+        self.manifest.setdefault('base_dates', {})[str(version)] = _date_strings(dates)
+
+    def commit(self, update: pd.DataFrame, note: str = '') -> int:
+        """
+        入库：只写入与当前最新快照不同的单元格
+
+        参数:
+            update: (date, code) 长面板，只需包含本次新增 / 修订的日期；不在 update 中的单元格保持不变
+            note: 版本说明
+        返回:
+            新版本号；没有任何变化时返回当前版本号（不新建版本）
+        """
+        update = update.select_dtypes(include=[np.number]).astype(np.float64).sort_index()
+        dates = update.index.get_level_values('date').unique()
+
+        # 空存储：整体写为第一个基准
+        if not self.versions:
+            version = self._record('base', update.size, dates, update.columns, note)
+            self._write_base(update, version)
+            self._record_base(version, dates)
+            self._save_manifest()
+            print(f"写入基准快照 v{version}: {update.shape[0]} 行 × {update.shape[1]} 列")
+            return version
+
+        # 只读取 update 覆盖的日期区间做比较
+        current = self.snapshot(start=dates.min(), end=dates.max())
+        new_rows = update.index.difference(current.index)
+        current = current.reindex(update.index)
+        cells = []
+        for field in update.columns:
+            new = update[field].to_numpy()
+            old = current[field].to_numpy() if field in current.columns else np.full(len(new), np.nan)
+            changed = ~((new == old) | (np.isnan(new) & np.isnan(old)))
+            if changed.any():
+                idx = update.index[changed]
+                cells.append(pd.DataFrame({
+                    'date': idx.get_level_values('date'),
+                    'code': idx.get_level_values('code'),
+                    'field': field,
+                    'value': new[changed],
+                }))
+        if not cells and not len(new_rows):
+            print(f"没有变化，保持版本 v{self.latest}")
+            return self.latest
+
+        delta = pd.concat(cells, ignore_index=True) if cells else \
+            pd.DataFrame({'date': pd.DatetimeIndex([]), 'code': [], 'field': [], 'value': np.array([])})
+        changed = pd.DatetimeIndex(delta['date'].unique()).union(new_rows.get_level_values('date').unique())
+        version = self._record('delta', len(delta), changed, delta['field'].unique(), note, n_rows=len(new_rows))
+        os.makedirs(os.path.dirname(self._delta_file(version)), exist_ok=True)
+        delta.to_pickle(self._delta_file(version))
+        if len(new_rows):
+            new_rows.to_frame(index=False).to_pickle(self._rows_file(version))
+        self._save_manifest()
+        print(f"写入增量 v{version}: {len(delta)} 个单元格, {len(new_rows)} 个新行, "
+              f"日期 {changed.min().date()} ~ {changed.max().date()}")
+        return version
+
+    # -------- 读取 --------
+    def _read_base(self, base: int, start=None, end=None, fields=None) -> pd.DataFrame:
+        base_dir = self._base_dir(base)
+        files = sorted(f for f in os.listdir(base_dir) if f.endswith('.pkl'))
+        lo = pd.Timestamp(start).strftime('%Y-%m') if start is not None else None
+        hi = pd.Timestamp(end).strftime('%Y-%m') if end is not None else None
+        parts = []
+        for f in files:
+            key = f[:-4]
+            if (lo and key < lo) or (hi and key > hi):
+                continue
+            part = pd.read_pickle(os.path.join(base_dir, f))
+            parts.append(part if fields is None else part.reindex(columns=fields))
+        if not parts:
+            return pd.DataFrame(columns=fields or [],
+                                index=pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), []], names=['date', 'code']))
+        return pd.concat(parts)
+
+    def deltas(self, after: int = 0, until: int | None = None, start=None, end=None) -> pd.DataFrame:
+        """
+        版本在 (after, until] 之间的增量单元格，按版本顺序拼接（含 version 列）
+
+        给定 start / end 时只返回该日期区间内的单元格；manifest 中记录的日期区间与之不重叠的增量文件不会被读取
+        """
+        until = self.latest if until is None else until
+        lo = pd.Timestamp(start) if start is not None else None
+        hi = pd.Timestamp(end) if end is not None else None
+        parts = []
+        for v in self.versions:
+            if v['kind'] != 'delta' or not after < v['version'] <= until:
+                continue
+            if v.get('start') and ((hi is not None and pd.Timestamp(v['start']) > hi)
+                                   or (lo is not None and pd.Timestamp(v['end']) < lo)):
+                continue
+            d = pd.read_pickle(self._delta_file(v['version']))
+            if lo is not None:
+                d = d[d['date'] >= lo]
+            if hi is not None:
+                d = d[d['date'] <= hi]
+            d['version'] = v['version']
+            parts.append(d)
+        if not parts:
+            return pd.DataFrame(columns=['date', 'code', 'field', 'value', 'version'])
+        return pd.concat(parts, ignore_index=True)
+
+    def appended_rows(self, after: int = 0, until: int | None = None, start=None, end=None) -> pd.MultiIndex:
+        """版本在 (after, until] 之间新出现的 (date, code) 行；与 deltas() 一样按 manifest 中的日期区间跳过文件"""
+        until = self.latest if until is None else until
+        lo = pd.Timestamp(start) if start is not None else None
+        hi = pd.Timestamp(end) if end is not None else None
+        parts = []
+        for v in self.versions:
+            if v['kind'] != 'delta' or not v.get('n_rows') or not after < v['version'] <= until:
+                continue
+            if (hi is not None and pd.Timestamp(v['start']) > hi) or (lo is not None and pd.Timestamp(v['end']) < lo):
+                continue
+            rows = pd.read_pickle(self._rows_file(v['version']))
+            if lo is not None:
+                rows = rows[rows['date'] >= lo]
+            if hi is not None:
+                rows = rows[rows['date'] <= hi]
+            parts.append(rows)
+        if not parts:
+            return pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), []], names=['date', 'code'])
+        return pd.MultiIndex.from_frame(pd.concat(parts, ignore_index=True)).unique()
+
+    def snapshot(self, version: int | None = None, start=None, end=None, fields=None) -> pd.DataFrame:
+        """
+        某个版本的 panel 快照
+
+        参数:
+            version: 版本号，默认最新
+            start, end: 只读取该日期区间（只加载对应月份的基准分区）
+            fields: 只读取这些字段
+        返回:
+            DataFrame, index=['date', 'code']
+        """
+        version = self.latest if version is None else version
+        if version <= 0 or not self.versions:
+            raise ValueError("存储为空，请先 commit")
+        base = self._base_for(version)
+        panel = self._read_base(base, start, end, fields)
+        if start is not None or end is not None:
+            dates = panel.index.get_level_values('date')
+            keep = np.ones(len(panel), dtype=bool)
+            if start is not None:
+                keep &= dates >= pd.Timestamp(start)
+            if end is not None:
+                keep &= dates <= pd.Timestamp(end)
+            panel = panel[keep]
+
+        delta = self.deltas(after=base, until=version, start=start, end=end)
+        if fields is not None:
+            delta = delta[delta['field'].isin(fields)]
+        if len(delta):
+            # 同一单元格多次修订只保留最后一次
+            delta = delta.drop_duplicates(['date', 'code', 'field'], keep='last')
+            cell_index = pd.MultiIndex.from_arrays([delta['date'], delta['code']], names=['date', 'code'])
+            new_rows = cell_index.unique().difference(panel.index)
+            if len(new_rows):
+                panel = panel.reindex(panel.index.append(new_rows))
+            for field in delta['field'].unique():
+                if field not in panel.columns:
+                    panel[field] = np.nan
+                sel = (delta['field'] == field).to_numpy()
+                pos = panel.index.get_indexer(cell_index[sel])
+                values = panel[field].to_numpy(dtype=np.float64, copy=True)
+                values[pos] = delta['value'].to_numpy()[sel]
+                panel[field] = values
+        # 全部字段为 NaN 的新行没有单元格，按增量记录的行补齐
+        rows = self.appended_rows(after=base, until=version, start=start, end=end)
+        missing = rows.difference(panel.index)
+        if len(missing):
+            panel = panel.reindex(panel.index.append(missing))
+        return panel.sort_index()
+
+    def _base_dates(self, base: int) -> pd.DatetimeIndex:
+        recorded = self.manifest.get('base_dates', {}).get(str(base))
+        if recorded is not None:
+            return pd.DatetimeIndex(recorded, name='date')
+        # 旧版 manifest 没有记录日期：读取基准分区的索引
+        return pd.DatetimeIndex(self._read_base(base, fields=[]).index.get_level_values('date').unique(), name='date')
+
+    def _delta_dates(self, after: int, until: int) -> pd.DatetimeIndex:
+        dates = []
+        for v in self.versions:
+            if v['kind'] == 'delta' and after < v['version'] <= until:
+                recorded = v.get('dates')
+                if recorded is None:
+                    recorded = pd.read_pickle(self._delta_file(v['version']))['date'].unique()
+                dates.append(pd.DatetimeIndex(recorded))
+        return pd.DatetimeIndex(np.concatenate(dates) if dates else [], name='date').unique().sort_values()
+
+    def dates(self, version: int | None = None) -> pd.DatetimeIndex:
+        """某个版本快照中的全部日期（来自 manifest，不读取数据文件）"""
+        version = self.latest if version is None else version
+        base = self._base_for(version)
+        dates = self._base_dates(base).union(self._delta_dates(base, version))
+        return pd.DatetimeIndex(dates, name='date').sort_values()
+
+    # -------- 维护 --------
+    def compact(self, prune: bool = False) -> int:
+        """
+        把最新快照写成新的基准（之后读取最新版本不再回放旧增量）
+
+        参数:
+            prune: 是否删除更早的基准和增量（删除后无法再读取更早的版本）
+        返回:
+            新基准对应的版本号
+        """
+        if not self.versions:
+            raise ValueError("存储为空，请先 commit")
+        latest = self.latest
+        if latest not in self.manifest['bases']:
+            panel = self.snapshot(latest)
+            self._write_base(panel, latest)
+            self._record_base(latest, panel.index.get_level_values('date').unique())
+            print(f"已压缩为基准 v{latest}: {panel.shape[0]} 行 × {panel.shape[1]} 列")
+        if prune:
+            for b in self.manifest['bases']:
+                if b != latest:
+                    shutil.rmtree(self._base_dir(b), ignore_errors=True)
+            for v in self.versions:
+                if v['kind'] == 'delta' and v['version'] <= latest:
+                    for path in (self._delta_file(v['version']), self._rows_file(v['version'])):
+                        if os.path.exists(path):
+                            os.remove(path)
+            self.manifest['bases'] = [latest]
+            base_dates = self.manifest.get('base_dates', {})
+            self.manifest['base_dates'] = {k: d for k, d in base_dates.items() if k == str(latest)}
+            self.manifest['versions'] = [v for v in self.versions if v['version'] >= latest]
+            self.versions[0]['kind'] = 'base'
+            print(f"已删除 v{latest} 之前的基准和增量")
+        self._save_manifest()
+        return latest
+
+    def affected_dates(self, since: int, until: int | None = None) -> pd.DatetimeIndex:
+        """版本 (since, until] 中被改动过的日期（since 早于保留的最早基准时视为全部日期变化）"""
+        until = self.latest if until is None else until
+        if since < self.versions[0]['version'] <= until:
+            return self._base_dates(self.versions[0]['version']).sort_values()
+        return self._delta_dates(since, until)
+
+    def invalidation_range(self, since: int, lookahead: int = 0, calendar: TradingCalendar | None = None):
+        """
+        因子缓存需要重算的日期区间 (start, end)
+
+        被改动的最早日期之后 lookahead 个交易日内的滚动窗口都会受影响（通常取 lookback + lag），
+        所以区间为 [最早改动日期, 最晚改动日期 + lookahead 个交易日]；没有改动时返回 None
+        """
+        dates = self.affected_dates(since)
+        if not len(dates):
+            return None
+        if calendar is None:
+            calendar = TradingCalendar(self.dates())
+        end_pos = min(calendar.locate(dates.max(), side='prev') + lookahead, len(calendar) - 1)
+        return dates.min(), calendar.date(end_pos)
+
+
+def refresh_factor(factor, store: VersionedPanelStore, cached: pd.DataFrame, since: int) -> pd.DataFrame:
+    """
+    增量更新因子缓存：只重算版本 since 之后受影响的日期区间
+
+    参数:
+        factor: BaseFactor 实例
+        store: 版本化 panel 存储
+        cached: 版本 since 时计算的因子结果（factor.run() 的返回值）
+        since: cached 对应的版本号
+    返回:
+        与 factor.run(store.snapshot()) 相同的结果
+    """
+    lookahead = factor.warmup + factor.lag
+    span = store.invalidation_range(since, lookahead=lookahead)
+    if span is None:
+        return cached
+    start, end = span
+    calendar = TradingCalendar(store.dates())
+    # 向前多读 warmup + lag 行历史，保证滚动窗口和滞后在区间起点处完整
+    load_start = calendar.date(max(calendar.locate(start, side='next') - lookahead, 0))
+    fresh = factor.run(store.snapshot(start=load_start, end=end))
+
+    fresh_dates = fresh.index.get_level_values('date')
+    fresh = fresh[(fresh_dates >= start) & (fresh_dates <= end)]
+    cached_dates = cached.index.get_level_values('date')
+    kept = cached[(cached_dates < start) | (cached_dates > end)]
+    return pd.concat([kept, fresh]).sort_index()
+
+
+def main():
+    import argparse
+
+    from utils.io import DATA_PATH
+
+    parser = argparse.ArgumentParser(description="版本化 panel 存储")
+    parser.add_argument('command', choices=['commit', 'log', 'compact', 'affected'])
+    parser.add_argument('panel', nargs='?', help='commit: 要入库的 panel pkl 文件')
+    parser.add_argument('--store', type=str, default=os.path.join(DATA_PATH, 'store', 'panel_versions'))
+    parser.add_argument('--note', type=str, default='')
+    parser.add_argument('--since', type=int, default=0, help='affected: 起始版本（不含）')
+    parser.add_argument('--lookahead', type=int, default=0, help='affected: 受影响区间向后延伸的交易日数')
+    parser.add_argument('--prune', action='store_true', help='compact: 删除旧基准和增量')
+    args = parser.parse_args()
+
+    store = VersionedPanelStore(args.store)
+    if args.command == 'commit':
+        if not args.panel:
+            parser.error("commit 需要 panel 文件路径")
+        store.commit(pd.read_pickle(args.panel), note=args.note or os.path.basename(args.panel))
+    elif args.command == 'log':
+        print(store.log())
+    elif args.command == 'compact':
+        store.compact(prune=args.prune)
+    else:
+        print(store.invalidation_range(args.since, lookahead=args.lookahead))
+
+
+if __name__ == "__main__":
+    main()
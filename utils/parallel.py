@@ -0,0 +1,39 @@
+# utils/parallel.py
+"""
+进程池：worker 启动时调用 initializer 把只读数据放进模块级变量，任务函数直接读取
+
+Linux 上用 fork 启动，子进程继承父进程中已经构造好的数组 / panel（写时复制，不重复读取、不经 pickle 序列化）；
+没有 fork 的平台（Windows / macOS 默认 spawn）退回默认启动方式，initargs 会被序列化后传给每个 worker。
+
+用法:
+    _SHARED = None
+
+    def _init_worker(payload):
+        global _SHARED
+        _SHARED = payload
+
+    pool = fork_pool(_init_worker, (payload,), workers)
+    if pool is None:                  # workers <= 1：已在当前进程中初始化，顺序执行
+        results = [task(x) for x in items]
+    else:
+        with pool:
+            results = list(pool.map(task, items))
+"""
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+
+def fork_pool(initializer, initargs: tuple = (), workers: int | None = None) -> ProcessPoolExecutor | None:
+    """
+    参数:
+        initializer: 每个 worker 启动时调用 initializer(*initargs)
+        initargs: initializer 的参数
+        workers: 进程数；<= 1（或 None）时不建进程池，直接在当前进程中调用 initializer
+    返回:
+        ProcessPoolExecutor；workers <= 1 时为 None
+    """
+    if not workers or workers <= 1:
+        initializer(*initargs)
+        return None
+    ctx = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else mp.get_context()
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=initializer, initargs=initargs)
@@ -0,0 +1,165 @@
+# utils/plot.py
+"""
+评估图表（无界面、快速）
+
+- 不经过 pyplot：直接用 matplotlib.figure.Figure + Agg 画布，不依赖显示环境，不会阻塞
+- 长序列先降采样（默认最多 2000 个点），IC 用折线 + 面积代替几千根柱子
+- 同一进程内按图表类型复用 Figure 对象（clf 后重画），批量出图不反复创建窗口 / 画布
+- render_many() 在进程池中并行渲染多个因子的图表
+
+ICAnalyzer.plot_ic / LayerBacktester.plot_cumulative 使用这里的 draw_* 函数画图：
+show=False 时走本模块的无界面路径，show=True 时在 pyplot 窗口中画同样的内容。
+
+用法:
+    from utils.plot import plot_ic, plot_cumulative, render_many
+    plot_ic(ic_series, 'illiq_guiji', save_path='data/results/illiq_guiji_ic_analysis.png')
+    render_many([('ic', {'ic_series': ic, 'factor_name': name, 'save_path': path}), ...], workers=4)
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 2000
+DEFAULT_DPI = 100
+
+# 按 (类型, 尺寸) 缓存的 Figure，同一线程内复用
+_local = threading.local()
+
+
+def downsample(series: pd.Series | pd.DataFrame, max_points: int = MAX_POINTS, how: str = 'mean'):
+    """
+    把长序列降采样到最多 max_points 个点（按顺序分桶）
+
+    参数:
+        how: 'mean' 桶内均值（噪声序列，如日度 IC）；'last' 取每桶最后一个值（累计曲线）
+    """
+    n = len(series)
+    if n <= max_points:
+        return series
+    bucket = np.arange(n) * max_points // n
+    last = np.flatnonzero(np.append(bucket[1:] != bucket[:-1], True))   # 每桶最后一个位置
+    if how == 'last':
+        return series.iloc[last]
+    out = series.groupby(bucket).mean()
+    out.index = series.index[last]
+    return out
+
+
+def _figure(kind: str, figsize=(12, 5)):
+    """取出（或创建）可复用的 Figure，清空后返回 (fig, ax)"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    cache = getattr(_local, 'figures', None)
+    if cache is None:
+        cache = _local.figures = {}
+    key = (kind, tuple(figsize))
+    fig = cache.get(key)
+    if fig is None:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        cache[key] = fig
+    else:
+        fig.clf()
+    # 固定边距代替 tight_layout / bbox_inches='tight'（后两者各需要额外完整绘制一遍）
+    fig.subplots_adjust(left=0.06, right=0.98, bottom=0.08, top=0.92)
+    return fig, fig.add_subplot(111)
+
+
+def _save(fig, save_path: str, dpi: int):
+    if os.path.dirname(save_path):
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    fig.savefig(save_path, dpi=dpi)
+
+
+# =========================
+# 绘制（ax 上作画，供无界面路径和 pyplot 路径共用）
+# =========================
+def draw_ic(ax, ic_series: pd.Series, factor_name: str = 'factor', ma_window: int = 20,
+            max_points: int = MAX_POINTS):
+    """日度 IC（面积）+ 滚动均值 + 全样本均值"""
+    ic = ic_series.dropna()
+    ma = ic.rolling(window=ma_window).mean()
+    daily = downsample(ic, max_points, how='mean')
+    ma = downsample(ma, max_points, how='mean')
+    x = daily.index
+    ax.fill_between(x, 0, daily.to_numpy(dtype=float), color='skyblue', alpha=0.6, linewidth=0, label='Daily IC')
+    ax.plot(ma.index, ma.to_numpy(dtype=float), color='orange', linewidth=1.2, label=f'{ma_window}D MA')
+    mean = ic.mean()
+    ax.axhline(mean, color='red', linestyle='--', linewidth=1, label=f'Mean: {mean:.3f}')
+    ax.axhline(0, color='grey', linewidth=0.5)
+    ax.set_title(f"Factor Rank IC Series - {factor_name}")
+    ax.legend(loc='upper left')
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+
+
+def draw_cumulative(ax, layer_ret: pd.DataFrame, factor_name: str = 'factor', groups: int | None = None,
+                    max_points: int = MAX_POINTS):
+    """各组累计收益（单利累加）+ 加粗的多空曲线"""
+    cum_ret = downsample(layer_ret.cumsum(), max_points, how='last')
+    for col in cum_ret.columns:
+        if col == 'Long-Short':
+            continue
+        ax.plot(cum_ret.index, cum_ret[col].to_numpy(dtype=float), label=col, alpha=0.6, linewidth=1)
+    if 'Long-Short' in cum_ret.columns:
+        ax.plot(cum_ret.index, cum_ret['Long-Short'].to_numpy(dtype=float), label='Long-Short',
+                color='black', linewidth=2.5)
+    groups = groups or sum(c != 'Long-Short' for c in layer_ret.columns)
+    ax.set_title(f"Layered Cumulative Return - {factor_name} (Groups={groups})")
+    ax.legend(loc='upper left')
+    ax.grid(True, alpha=0.3)
+
+
+# =========================
+# 无界面出图
+# =========================
+def plot_ic(ic_series: pd.Series, factor_name: str = 'factor', save_path: str | None = None,
+            ma_window: int = 20, dpi: int = DEFAULT_DPI, max_points: int = MAX_POINTS):
+    """画 IC 图并保存（不显示）；返回复用的 Figure"""
+    fig, ax = _figure('ic')
+    draw_ic(ax, ic_series, factor_name, ma_window, max_points)
+    if save_path:
+        _save(fig, save_path, dpi)
+    return fig
+
+
+def plot_cumulative(layer_ret: pd.DataFrame, factor_name: str = 'factor', save_path: str | None = None,
+                    groups: int | None = None, dpi: int = DEFAULT_DPI, max_points: int = MAX_POINTS):
+    """画分层累计收益图并保存（不显示）；返回复用的 Figure"""
+    fig, ax = _figure('cumulative', figsize=(12, 6))
+    draw_cumulative(ax, layer_ret, factor_name, groups, max_points)
+    if save_path:
+        _save(fig, save_path, dpi)
+    return fig
+
+
+PLOTTERS = {
+    'ic': plot_ic,
+    'cumulative': plot_cumulative,
+}
+
+
+def _render(kind: str, kwargs: dict) -> str | None:
+    PLOTTERS[kind](**kwargs)
+    return kwargs.get('save_path')
+
+
+def render_many(tasks: list[tuple[str, dict]], workers: int | None = None) -> list[str | None]:
+    """
+    批量渲染图表
+
+    参数:
+        tasks: [(类型, 参数)]，类型为 PLOTTERS 的键，参数传给对应函数（需包含 save_path）
+        workers: 进程数，默认 CPU 数；1 表示当前进程顺序渲染（复用同一个 Figure）
+    返回:
+        各图的保存路径
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        return [_render(kind, kwargs) for kind, kwargs in tasks]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render, [k for k, _ in tasks], [kw for _, kw in tasks], chunksize=chunksize))
@@ -0,0 +1,162 @@
+# utils/synthetic.py
+"""
+合成面板数据生成器（用于基准测试 / 对比测试，不依赖 data/raw 中的真实数据）
+
+生成的数据与 preprocess.load_data.load_data / align_data.load_raw 的格式一致：
+8 张宽表 (index=date, columns=code)，并覆盖 add_status_fields 需要处理的几种情况：
+- 未上市：上市日之前所有字段为 NaN
+- 停牌：volume / turnover / daily_turnover_rate 为 0，价格为 NaN 或沿用前收盘价
+- 涨跌停：close == high（涨停）或 close == low（跌停）
+- 零星缺失：个别字段的个别单元格为 NaN
+"""
+import numpy as np
+import pandas as pd
+
+FIELDS = ['close', 'high', 'low', 'open_price', 'volume',
+          'market_capitalization', 'turnover', 'daily_turnover_rate']
+
+
+def make_raw(
+    n_dates: int = 500,
+    n_codes: int = 300,
+    seed: int = 0,
+    suspend_rate: float = 0.02,      # 停牌单元格比例
+    suspend_len: int = 3,            # 每次停牌持续天数
+    suspend_nan_price: float = 0.5,  # 停牌时价格为 NaN 的股票比例（其余沿用前收盘价）
+    unlisted_rate: float = 0.2,      # 样本期内才上市的股票比例
+    limit_rate: float = 0.01,        # 涨跌停单元格比例
+    nan_rate: float = 0.001,         # 单个字段零星缺失比例
+    start: str = '2010-01-04',
+) -> dict:
+    """
+    生成 8 张原始宽表
+
+    返回:
+        dict: {字段名: DataFrame(index=DatetimeIndex 'date', columns=code)}，键与 align_data.load_raw() 一致
+    """
+    rng = np.random.default_rng(seed)
+    T, N = n_dates, n_codes
+    dates = pd.bdate_range(start, periods=T)
+    codes = [f'{i:06d}.SYN' for i in range(N)]
+
+    # 1. 价格路径
+    ret = rng.normal(0.0003, 0.02, size=(T, N)).clip(-0.0999, 0.0999)
+    limit = rng.random((T, N)) < limit_rate
+    limit_up = limit & (rng.random((T, N)) < 0.5)
+    ret[limit_up] = 0.1
+    ret[limit & ~limit_up] = -0.1
+    close = 10 * np.exp(rng.normal(0, 0.5, size=N)) * np.cumprod(1 + ret, axis=0)
+    prev_close = np.vstack([close[:1] / (1 + ret[:1]), close[:-1]])
+    open_price = prev_close * (1 + rng.normal(0, 0.005, size=(T, N)))
+    high = np.maximum(open_price, close) * (1 + np.abs(rng.normal(0, 0.01, size=(T, N))))
+    low = np.minimum(open_price, close) * (1 - np.abs(rng.normal(0, 0.01, size=(T, N))))
+    high[limit_up] = close[limit_up]
+    low[limit & ~limit_up] = close[limit & ~limit_up]
+
+    shares = np.exp(rng.normal(20, 1, size=N))
+    volume = np.exp(rng.normal(15, 1, size=(T, N)))
+    market_cap = close * shares
+    turnover = volume * close
+    turnover_rate = volume / shares * 100
+
+    # 2. 停牌：以 suspend_len 天为一段
+    starts = rng.random((T, N)) < suspend_rate / max(suspend_len, 1)
+    cs = np.cumsum(starts, axis=0)
+    lagged = np.vstack([np.zeros((suspend_len, N)), cs[:-suspend_len]]) if T > suspend_len else np.zeros_like(cs)
+    suspended = (cs - lagged) > 0
+    volume[suspended] = 0
+    turnover[suspended] = 0
+    turnover_rate[suspended] = 0
+    nan_price_codes = rng.random(N) < suspend_nan_price
+    price_nan = suspended & nan_price_codes[None, :]
+    price_flat = suspended & ~nan_price_codes[None, :]
+    # 沿用前收盘价：停牌期间价格不变
+    flat_close = pd.DataFrame(np.where(price_flat, np.nan, close)).ffill().values
+    for arr in (close, high, low, open_price):
+        arr[price_flat] = flat_close[price_flat]
+    for arr in (close, high, low, open_price):
+        arr[price_nan] = np.nan
+
+    data = {
+        'close': close, 'high': high, 'low': low, 'open_price': open_price,
+        'volume': volume, 'market_capitalization': market_cap,
+        'turnover': turnover, 'daily_turnover_rate': turnover_rate,
+    }
+
+    # 3. 未上市：上市日之前全部为 NaN
+    list_pos = np.zeros(N, dtype=int)
+    late = rng.random(N) < unlisted_rate
+    list_pos[late] = rng.integers(1, max(T // 3, 2), size=late.sum())
+    unlisted = np.arange(T)[:, None] < list_pos[None, :]
+
+    # 4. 零星缺失
+    for name, arr in data.items():
+        arr[unlisted] = np.nan
+        if nan_rate > 0:
+            arr[rng.random((T, N)) < nan_rate] = np.nan
+
+    index = pd.DatetimeIndex(dates, name='date')
+    columns = pd.Index(codes, name='code')
+    return {name: pd.DataFrame(arr, index=index, columns=columns) for name, arr in data.items()}
+
+
+def make_panel(n_dates: int = 500, n_codes: int = 300, seed: int = 0, **kwargs) -> pd.DataFrame:
+    """
+    生成与 align_data() 输出格式一致的长面板（未经 add_status_fields 处理）
+
+    返回:
+        DataFrame, index=['date', 'code']（date 外层、完整 dates × codes 网格），columns=FIELDS
+    """
+    raw = make_raw(n_dates, n_codes, seed=seed, **kwargs)
+    return raw_to_panel(raw)
+
+
+def raw_to_panel(raw: dict) -> pd.DataFrame:
+    """把已对齐的宽表拼成 (date, code) 长面板，等价于 align_data 中的 stack(dropna=False)"""
+    first = raw[FIELDS[0]]
+    index = pd.MultiIndex.from_product([first.index, first.columns], names=['date', 'code'])
+    return pd.DataFrame({name: raw[name].values.ravel() for name in FIELDS}, index=index)
+
+
+# A 股连续竞价分钟：09:31-11:30, 13:01-15:00，共 240 根
+MINUTES = np.array([h * 100 + m for h in (9, 10, 11, 13, 14) for m in range(60)
+                    if (h, m) >= (9, 31) and not (h == 11 and m > 30) and not (h == 13 and m == 0)]
+                   + [1500], dtype=np.int16)
+
+
+def make_minute_bars(n_dates: int = 20, n_codes: int = 50, seed: int = 0, start: str = '2010-01-04',
+                     suspend_rate: float = 0.02, missing_rate: float = 0.01):
+    """
+    逐日生成分钟线长表（生成器，一次只占用一天的内存），格式与 preprocess.minute_bars.ingest() 的输入一致
+
+    - 停牌：当天没有任何分钟线
+    - 零星缺失：个别分钟没有成交（该行不出现）
+
+    产出:
+        DataFrame: columns=['code', 'date', 'time', 'open', 'high', 'low', 'close', 'volume', 'amount']
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=n_dates)
+    codes = np.array([f'{i:06d}.SYN' for i in range(n_codes)])
+    M = len(MINUTES)
+    last = 10 * np.exp(rng.normal(0, 0.5, size=n_codes))
+    liquidity = np.exp(rng.normal(9, 1, size=n_codes))        # 每分钟成交量尺度
+    for date in dates:
+        ret = rng.normal(0, 0.02 / np.sqrt(M), size=(n_codes, M))
+        close = last[:, None] * np.exp(np.cumsum(ret, axis=1))
+        open_ = np.hstack([last[:, None], close[:, :-1]])
+        noise = np.abs(rng.normal(0, 0.0005, size=(n_codes, M)))
+        high = np.maximum(open_, close) * (1 + noise)
+        low = np.minimum(open_, close) * (1 - noise)
+        volume = np.round(liquidity[:, None] * np.exp(rng.normal(0, 0.7, size=(n_codes, M))), -2)
+        amount = volume * (open_ + close) / 2
+        last = close[:, -1]
+
+        keep = rng.random((n_codes, M)) >= missing_rate
+        keep[rng.random(n_codes) < suspend_rate] = False
+        ci, mi = np.nonzero(keep)
+        yield pd.DataFrame({
+            'code': codes[ci], 'date': date, 'time': MINUTES[mi],
+            'open': open_[keep], 'high': high[keep], 'low': low[keep], 'close': close[keep],
+            'volume': volume[keep], 'amount': amount[keep],
+        })